@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from permissions.resolver import has_effective_perms
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
@@ -11,4 +12,23 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return request.user and request.user.is_authenticated
         
         # Write permissions only to admin users
-        return request.user and request.user.is_staff
\ No newline at end of file
+        return request.user and request.user.is_staff
+
+class HasEffectivePermission(permissions.BasePermission):
+    """
+    Checks the view's required permissions against the cached effective permission set.
+    
+    The view declares either a list (``required_permissions = ['domenico.can_export_data']``)
+    or a dict by HTTP method (``{'GET': [...], 'POST': [...]}``).
+    """
+    
+    def get_required_permissions(self, request, view):
+        required = getattr(view, 'required_permissions', [])
+        if isinstance(required, dict):
+            return required.get(request.method, [])
+        return required
+    
+    def has_permission(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return False
+        return has_effective_perms(request.user, self.get_required_permissions(request, view))
@@ -18,15 +18,11 @@ from axes.decorators import axes_dispatch
 import json
 from .serializers import UserRegistrationSerializer, LoginSerializer
 from users.models import User, LoginAttempt
+from core.audit import audit_writer
+from core.utils import SecurityUtils
 from django_otp.plugins.otp_totp.models import TOTPDevice
 from django_otp.util import random_hex
 from django.contrib.auth.hashers import check_password
-try:
-    from qrcode import QRCode
-    QRCODE_AVAILABLE = True
-except ImportError:
-    QRCODE_AVAILABLE = False
-    QRCode = None
 import io
 import base64
 
@@ -42,13 +38,14 @@ class AuthenticationView(View):
             ip = request.META.get('REMOTE_ADDR')
         return ip
     
-    def log_login_attempt(self, request, email, success):
-        LoginAttempt.objects.create(
+    def log_login_attempt(self, request, email, success, blocked=False):
+        audit_writer.record(LoginAttempt(
             email=email,
             ip_address=self.get_client_ip(request),
             success=success,
+            blocked=blocked,
             user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
+        ))
 
 class LoginView(AuthenticationView):
     """Enhanced login view with security features"""
@@ -67,6 +64,12 @@ class LoginView(AuthenticationView):
             messages.error(request, 'Email and password are required.')
             return render(request, 'authentication/login.html')
         
+        if SecurityUtils.is_login_blocked(email, self.get_client_ip(request)):
+            # authenticate() is skipped, so the signal won't log this attempt
+            self.log_login_attempt(request, email, False, blocked=True)
+            messages.error(request, 'Too many failed login attempts. Please try again later.')
+            return render(request, 'authentication/login.html')
+        
         user = authenticate(request, username=email, password=password)
         
         if user is not None:
@@ -78,10 +81,12 @@ class LoginView(AuthenticationView):
                 
                 login(request, user)
                 
-                # Update user login info
-                user.last_login_ip = self.get_client_ip(request)
-                user.login_attempts = 0
-                user.save(update_fields=['last_login_ip', 'login_attempts'])
+                # Update user login info (only when it changed)
+                client_ip = self.get_client_ip(request)
+                if user.last_login_ip != client_ip or user.login_attempts:
+                    user.last_login_ip = client_ip
+                    user.login_attempts = 0
+                    user.save(update_fields=['last_login_ip', 'login_attempts'])
                 
                 # Set session expiry
                 if not remember_me:
@@ -94,7 +99,7 @@ class LoginView(AuthenticationView):
             else:
                 messages.error(request, 'Your account is disabled.')
         else:
-            self.log_login_attempt(request, email, False)
+            # The failed attempt is counted and logged by the user_login_failed signal
             messages.error(request, 'Invalid email or password.')
         
         return render(request, 'authentication/login.html')
@@ -208,8 +213,13 @@ def setup_two_factor(request):
                 confirmed=False
             )
         
-        # Generate QR code if available
-        if QRCODE_AVAILABLE:
+        # Generate QR code if available (qrcode + Pillow are imported only here)
+        try:
+            from qrcode import QRCode
+        except ImportError:
+            QRCode = None
+
+        if QRCode is not None:
             qr = QRCode(version=1, box_size=10, border=5)
             qr.add_data(device.config_url)
             qr.make(fit=True)
@@ -225,7 +235,7 @@ def setup_two_factor(request):
             'qr_code': img_str,
             'secret_key': device.key,
             'device_id': device.id,
-            'config_url': device.config_url if not QRCODE_AVAILABLE else None
+            'config_url': device.config_url if QRCode is None else None
         })
     
     elif request.method == 'POST':
@@ -0,0 +1,123 @@
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from core.metrics import AUDIT_BUFFER_DEPTH
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    """
+    Buffers security audit rows (LoginAttempt, UserSession) and writes them with
+    bulk_create from a background thread, so a burst of logins costs one INSERT
+    per batch instead of one per request.
+
+    Rows are never dropped: a full buffer is flushed inline, a failed bulk insert
+    falls back to row-by-row inserts, and pending rows are flushed at process exit.
+    The created_at of buffered rows is the flush time (at most the flush interval later).
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_pending=None):
+        self.batch_size = batch_size or getattr(settings, 'AUTH_AUDIT_BATCH_SIZE', 100)
+        self.flush_interval = flush_interval or getattr(settings, 'AUTH_AUDIT_FLUSH_INTERVAL', 2.0)
+        self.max_pending = max_pending or self.batch_size * 10
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def async_enabled(self):
+        return getattr(settings, 'AUTH_AUDIT_ASYNC', True)
+
+    def record(self, instance):
+        """Queue an unsaved model instance for insertion"""
+        if not self.async_enabled:
+            instance.save()
+            return
+
+        self._ensure_thread()
+        with self._lock:
+            self._pending.append(instance)
+            pending = len(self._pending)
+            AUDIT_BUFFER_DEPTH.set(pending)
+
+        if pending >= self.max_pending:
+            # The writer is falling behind: write inline rather than grow without bound
+            self.flush()
+        elif pending >= self.batch_size:
+            self._wakeup.set()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write all pending rows; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                AUDIT_BUFFER_DEPTH.set(0)
+            if not batch:
+                return 0
+
+            by_model = defaultdict(list)
+            for instance in batch:
+                by_model[type(instance)].append(instance)
+
+            written = 0
+            for model, instances in by_model.items():
+                try:
+                    model.objects.bulk_create(instances, batch_size=self.batch_size)
+                    written += len(instances)
+                except Exception as e:
+                    logger.error(f'Bulk audit write failed for {model.__name__}: {e}')
+                    written += self._write_one_by_one(instances)
+            return written
+
+    def _write_one_by_one(self, instances):
+        written = 0
+        for instance in instances:
+            try:
+                instance.save()
+                written += 1
+            except Exception as e:
+                # Last resort: keep the audit trail in the logs
+                values = {f.attname: getattr(instance, f.attname) for f in instance._meta.concrete_fields}
+                logger.error(f'Audit row lost from database ({type(instance).__name__}): {values} - {e}')
+        return written
+
+    def _ensure_thread(self):
+        # After a fork (gunicorn preload) the thread of the parent does not exist in the child
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception as e:
+                logger.error(f'Audit writer error: {e}')
+            finally:
+                connection.close()
+
+
+audit_writer = AuditWriter()
+atexit.register(audit_writer.flush)
@@ -0,0 +1,72 @@
+import logging
+import logging.handlers
+import os
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.structured_logging import JsonFormatter, make_async, reset_request_id, set_request_id
+
+
+class Command(BaseCommand):
+    help = 'Measure the caller-side cost of a log call, synchronous file handler vs queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=20000, help='Log calls per run')
+        parser.add_argument('--per-request', type=int, default=10, help='Log calls in a typical request')
+
+    def _run(self, logger, records):
+        timings = []
+        token = set_request_id('benchmark-request')
+        try:
+            for i in range(records):
+                started = time.perf_counter_ns()
+                logger.info('Trattamento %s aggiornato', i, extra={'trattamento_id': i, 'stato': 'programmato'})
+                timings.append(time.perf_counter_ns() - started)
+        finally:
+            reset_request_id(token)
+        timings.sort()
+        return statistics.fmean(timings) / 1000, timings[int(len(timings) * 0.99)] / 1000
+
+    def _logger(self, name, path):
+        logger = logging.getLogger(f'benchmark_logging.{name}')
+        logger.handlers.clear()
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = logging.handlers.WatchedFileHandler(path)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        return logger, handler
+
+    def handle(self, *args, **options):
+        records = options['records']
+        per_request = options['per_request']
+        results = {}
+
+        with tempfile.TemporaryDirectory() as directory:
+            logger, handler = self._logger('sync', os.path.join(directory, 'sync.log'))
+            results['sync'] = self._run(logger, records)
+            handler.close()
+
+            logger, handler = self._logger('async', os.path.join(directory, 'async.log'))
+            listeners = make_async([logger], queue_size=records + 1)
+            results['async'] = self._run(logger, records)
+            started = time.perf_counter()
+            for listener in listeners:
+                listener.stop()
+            drain = time.perf_counter() - started
+            handler.close()
+            logger.handlers.clear()
+
+        self.stdout.write(f'{records} records, JSON to a watched file (rotated externally)')
+        for name, (mean, p99) in results.items():
+            self.stdout.write(
+                f'{name:>6}: mean {mean:7.2f} us, p99 {p99:7.2f} us, '
+                f'{per_request} calls per request {mean * per_request:8.2f} us'
+            )
+        self.stdout.write(f'Listener drained the queue in {drain * 1000:.1f} ms after the run')
+        self.stdout.write(self.style.SUCCESS(
+            f'Async saves {(results["sync"][0] - results["async"][0]) * per_request:.2f} us per request'
+        ))
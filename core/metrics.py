@@ -0,0 +1,176 @@
+"""
+Prometheus metrics.
+
+Metrics are module-level objects updated by the code they measure and exposed in the
+Prometheus text format at /metrics (core.views.metrics_view). Under gunicorn every worker
+writes its values to mmap files in PROMETHEUS_MULTIPROC_DIR (set by gunicorn.conf.py before
+the app is loaded) and the scrape aggregates all of them; without that variable the values
+live in the process, which is what runserver and the tests use.
+
+Without prometheus_client installed every metric is a no-op and /metrics returns 503.
+"""
+import logging
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'gestionale'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Collectors evaluated at scrape time (e.g. counts read from the database)
+_scrape_collectors = []
+
+
+class _NoopMetric:
+    """Stand-in for a metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, amount):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labelnames, namespace=NAMESPACE, buckets=buckets)
+
+
+def counter(name, documentation, labelnames=()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return prometheus_client.Counter(name, documentation, labelnames, namespace=NAMESPACE)
+
+
+def gauge(name, documentation, labelnames=(), multiprocess_mode='livesum'):
+    """Per-process gauge; across workers the live values are summed by default"""
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return prometheus_client.Gauge(
+        name, documentation, labelnames, namespace=NAMESPACE, multiprocess_mode=multiprocess_mode
+    )
+
+
+def register_collector(collector):
+    """Add a collector with a collect() method, run on every scrape by the serving worker"""
+    _scrape_collectors.append(collector)
+
+
+def multiprocess_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR') or None
+
+
+class _Scrape:
+    def __init__(self, collectors):
+        self.collectors = collectors
+
+    def collect(self):
+        for collector in self.collectors:
+            try:
+                yield from collector.collect()
+            except Exception as e:
+                # A broken collector must not hide all the other metrics
+                logger.error(f'Metrics collector {type(collector).__name__} failed: {e}')
+
+
+def render_metrics():
+    """Returns (body, content_type) of the Prometheus exposition"""
+    path = multiprocess_dir()
+    if path:
+        process_metrics = multiprocess.MultiProcessCollector(None, path=path)
+    else:
+        process_metrics = prometheus_client.REGISTRY
+    body = prometheus_client.generate_latest(_Scrape([process_metrics, *_scrape_collectors]))
+    return body, prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop the live gauges of a worker that exited (gunicorn child_exit hook)"""
+    path = multiprocess_dir()
+    if PROMETHEUS_AVAILABLE and path:
+        multiprocess.mark_process_dead(pid, path)
+
+
+REQUEST_LATENCY = histogram(
+    'http_request_duration_seconds',
+    'Request latency by URL name',
+    ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = histogram(
+    'http_request_db_queries',
+    'Database queries per request by URL name',
+    ['view'],
+    buckets=QUERY_BUCKETS,
+)
+AUDIT_BUFFER_DEPTH = gauge(
+    'audit_buffer_depth',
+    'Security audit rows waiting to be written (core.audit)',
+)
+LOG_RECORDS_DROPPED = counter(
+    'log_records_dropped',
+    'Log records dropped because the async logging queue was full (core.structured_logging)',
+)
+
+
+class _QueryCounter:
+    """execute_wrapper counting the queries of a request on every alias"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Records latency and query count of every request, labelled with the resolved URL name
+    ('unmatched' for 404s outside the URLconf, to keep label cardinality bounded).
+    Goes first in MIDDLEWARE so the latency covers the whole middleware stack.
+    """
+
+    def __init__(self, get_response):
+        if not PROMETHEUS_AVAILABLE or not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = _QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all(initialized_only=False):
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        REQUEST_LATENCY.labels(view, request.method, f'{response.status_code // 100}xx').observe(duration)
+        REQUEST_QUERIES.labels(view).observe(queries.count)
+        return response
@@ -1,3 +1,6 @@
+import re
+import uuid
+
 try:
     import pytz
     PYTZ_AVAILABLE = True
@@ -7,6 +10,12 @@ except ImportError:
 from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
+from core.structured_logging import reset_request_id, set_request_id
+
+# Ids accepted from the proxy or the client; anything else is replaced
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{8,64}$')
+
+
 class TimezoneMiddleware(MiddlewareMixin):
     """Automatically set timezone based on user preference"""
     
@@ -18,4 +27,27 @@ class TimezoneMiddleware(MiddlewareMixin):
             except:
                 timezone.deactivate()
         else:
-            timezone.deactivate()
\ No newline at end of file
+            timezone.deactivate()
+
+class RequestIdMiddleware:
+    """
+    Assigns a request id (the incoming X-Request-ID when well formed, a new one otherwise),
+    exposes it to the structured logs of the request and returns it in X-Request-ID.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        request_id = request.META.get('HTTP_X_REQUEST_ID', '')
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        
+        token = set_request_id(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_request_id(token)
+        response['X-Request-ID'] = request_id
+        return response
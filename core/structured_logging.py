@@ -0,0 +1,181 @@
+"""
+Structured, non-blocking logging.
+
+- JsonFormatter renders one JSON object per line: timestamp, level, logger, message,
+  request id (set by core.middleware.RequestIdMiddleware) and any `extra=` fields.
+- DebugSamplingFilter keeps a fraction of DEBUG records, for high-volume debug events.
+- configure_logging (LOGGING_CONFIG) applies LOGGING and then puts the handlers of every
+  configured logger behind a QueueHandler: request threads only enqueue the record, a
+  QueueListener thread does the formatting and the disk/console I/O.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+import random
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from core.metrics import LOG_RECORDS_DROPPED
+
+_request_id = ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+# (listener, queue handler) pairs started by configure_logging
+_listeners = []
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def set_request_id(value):
+    return _request_id.set(value)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': record.__dict__.get('request_id', get_request_id()),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Lets through every record above DEBUG and a `rate` fraction of DEBUG records"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: when the queue is full (the listener cannot keep up
+    with the disk) the record is dropped and counted instead of stalling the request.
+    The count is exposed on /metrics as gestionale_log_records_dropped_total.
+    """
+
+    _traceback_formatter = logging.Formatter()
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Message and traceback are rendered in the calling thread: args may be mutated
+        # after the call, and exc_info would keep the request's frames alive in the queue
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        if 'request_id' not in record.__dict__:
+            record.request_id = get_request_id()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Blocking put: on shutdown the sentinel must get in even if the queue is full
+        self.queue.put(self._sentinel)
+
+
+def stop_listeners():
+    """Write out the queued records and stop the listener threads"""
+    while _listeners:
+        listener, handler = _listeners.pop()
+        if listener._thread is not None:
+            listener.stop()
+
+
+def _restart_after_fork():
+    # gunicorn forks its workers after loading the app: the listener threads of the
+    # master do not exist in the child, and its queues may hold the master's records
+    for listener, handler in _listeners:
+        handler.queue = listener.queue = queue.Queue(handler.queue.maxsize)
+        listener._thread = None
+        listener.start()
+
+
+def make_async(loggers, queue_size=10000):
+    """
+    Move the handlers of the given loggers behind queues. Loggers with the same handlers
+    share a queue and a listener thread; handler filters (e.g. sampling) run there too.
+
+    Returns:
+        the started listeners
+    """
+    started = []
+    groups = {}
+    for logger in loggers:
+        handlers = tuple(logger.handlers)
+        if handlers:
+            groups.setdefault(handlers, []).append(logger)
+
+    for handlers, group in groups.items():
+        handler = AsyncQueueHandler(queue.Queue(queue_size))
+        listener = _Listener(handler.queue, *handlers, respect_handler_level=True)
+        for logger in group:
+            for target in handlers:
+                logger.removeHandler(target)
+            logger.addHandler(handler)
+        listener.start()
+        _listeners.append((listener, handler))
+        started.append(listener)
+    return started
+
+
+def configure_logging(logging_settings):
+    """LOGGING_CONFIG callable: dictConfig, then asynchronous handlers unless LOG_ASYNC is off"""
+    stop_listeners()
+    logging.config.dictConfig(logging_settings)
+    if not getattr(settings, 'LOG_ASYNC', True):
+        return
+    names = ['', *logging_settings.get('loggers', {})]
+    make_async([logging.getLogger(name) for name in names], getattr(settings, 'LOG_QUEUE_SIZE', 10000))
+
+
+atexit.register(stop_listeners)
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -1,8 +1,22 @@
-from django.test import TestCase
-from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.urls import reverse
-from users.models import UserProfile
-from permissions.models import Role
+from core.audit import AuditWriter
+from core.metrics import PROMETHEUS_AVAILABLE
+from core.structured_logging import AsyncQueueHandler, DebugSamplingFilter, JsonFormatter, make_async, reset_request_id, set_request_id
+from core.utils import SecurityUtils, SlidingWindowCounter
+from core.views import metrics_allowed
+from users.models import LoginAttempt, UserProfile
+import json
+import logging
+import queue
+from datetime import timedelta
+from django.contrib.auth.models import Permission
+from django.utils import timezone
+from permissions.models import Role, UserRole
+from permissions.resolver import get_effective_permissions
 
 User = get_user_model()
 
@@ -43,6 +57,7 @@ class UserModelTest(TestCase):
         expected = f"{user.first_name} {user.last_name}"
         self.assertEqual(user.full_name, expected)
 
+@override_settings(AUTH_AUDIT_ASYNC=False)
 class AuthenticationViewTest(TestCase):
     """Test cases for authentication views"""
     
@@ -99,4 +114,282 @@ class RoleModelTest(TestCase):
     def test_role_str_method(self):
         """Test role string representation"""
         role = Role.objects.create(**self.role_data)
-        self.assertEqual(str(role), role.name)
\ No newline at end of file
+        self.assertEqual(str(role), role.name)
+
+class SlidingWindowCounterTest(TestCase):
+    """Test cases for the cache-backed sliding window counter"""
+    
+    def setUp(self):
+        cache.clear()
+    
+    def test_increment_and_count(self):
+        """Test counts are per identifier and reset clears them"""
+        counter = SlidingWindowCounter('test', window=60)
+        for _ in range(3):
+            counter.increment('1.2.3.4')
+        counter.increment('5.6.7.8')
+        
+        self.assertEqual(counter.count('1.2.3.4'), 3)
+        self.assertEqual(counter.count('5.6.7.8'), 1)
+        
+        counter.reset('1.2.3.4')
+        self.assertEqual(counter.count('1.2.3.4'), 0)
+
+@override_settings(LOGIN_MAX_FAILURES_PER_EMAIL=3, AUTH_AUDIT_ASYNC=False)
+class LoginSecurityTest(TestCase):
+    """Test cases for failed login counters and batched audit rows"""
+    
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().post('/auth/login/', REMOTE_ADDR='10.0.0.1')
+        User.objects.create_user(email='test@example.com', password='testpass123456')
+    
+    def test_failed_logins_block_email(self):
+        """Test failures are counted in the cache and logged once each"""
+        for _ in range(3):
+            self.assertIsNone(authenticate(self.request, username='test@example.com', password='wrong'))
+        
+        self.assertTrue(SecurityUtils.is_login_blocked('TEST@example.com', '10.0.0.2'))
+        self.assertFalse(SecurityUtils.is_login_blocked('other@example.com', '10.0.0.2'))
+        self.assertEqual(LoginAttempt.objects.filter(success=False).count(), 3)
+    
+    def test_blocked_login_is_logged(self):
+        """Test a login rejected by the limits is still recorded"""
+        for _ in range(3):
+            authenticate(self.request, username='test@example.com', password='wrong')
+        
+        response = self.client.post('/auth/login/', {
+            'email': 'test@example.com',
+            'password': 'testpass123456'
+        }, REMOTE_ADDR='10.0.0.3')
+        
+        self.assertContains(response, 'Too many failed login attempts')
+        attempt = LoginAttempt.objects.get(blocked=True)
+        self.assertEqual(attempt.email, 'test@example.com')
+        self.assertEqual(attempt.ip_address, '10.0.0.3')
+        self.assertFalse(attempt.success)
+    
+    def test_audit_writer_batches(self):
+        """Test queued rows are written together on flush"""
+        writer = AuditWriter(batch_size=10, flush_interval=3600)
+        writer._ensure_thread = lambda: None
+        
+        with override_settings(AUTH_AUDIT_ASYNC=True):
+            for i in range(3):
+                writer.record(LoginAttempt(email=f'user{i}@example.com', ip_address='10.0.0.1', success=False, user_agent=''))
+        
+        self.assertEqual(LoginAttempt.objects.count(), 0)
+        self.assertEqual(writer.pending_count(), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(writer.flush(), 3)
+        self.assertEqual(LoginAttempt.objects.count(), 3)
+
+
+class EffectivePermissionTest(TestCase):
+    """Test cases for the cached effective permission set"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='perm@example.com', password='testpass123456')
+        self.role = Role.objects.create(name='Reviewer', role_type='custom')
+        self.role.permissions.add(Permission.objects.get(codename='change_role'))
+    
+    def fresh_user(self):
+        # New instance: no permission set memoized from a previous check
+        return User.objects.get(pk=self.user.pk)
+    
+    def test_role_permissions_cached(self):
+        """Test role permissions are granted and served from the cache"""
+        UserRole.objects.create(user=self.user, role=self.role)
+        
+        self.assertTrue(self.fresh_user().has_perm('permissions.change_role'))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm('permissions.change_role'))
+            self.assertFalse(user.has_perm('permissions.delete_role'))
+    
+    def test_invalidation(self):
+        """Test role, permission and activation changes are picked up"""
+        user_role = UserRole.objects.create(user=self.user, role=self.role)
+        self.assertTrue(self.fresh_user().has_perm('permissions.change_role'))
+        
+        self.role.permissions.add(Permission.objects.get(codename='delete_role'))
+        self.assertTrue(self.fresh_user().has_perm('permissions.delete_role'))
+        
+        user_role.is_active = False
+        user_role.save()
+        self.assertFalse(self.fresh_user().has_perm('permissions.change_role'))
+    
+    def test_expired_role_ignored(self):
+        """Test expired roles grant nothing and bound the cache lifetime"""
+        UserRole.objects.create(user=self.user, role=self.role, expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertNotIn('permissions.change_role', get_effective_permissions(self.fresh_user()))
+    
+    def test_profile_flags(self):
+        """Test domenico profile flags are exposed as permissions"""
+        from domenico.models import UserProfile as DomenicoProfile
+        DomenicoProfile.objects.create(user=self.user, role='viewer', can_export_data=True)
+        
+        perms = get_effective_permissions(self.fresh_user())
+        self.assertIn('domenico.can_export_data', perms)
+        self.assertNotIn('domenico.can_manage_users', perms)
+
+
+@override_settings(AUTH_AUDIT_ASYNC=False)
+class MetricsEndpointTest(TestCase):
+    """Test cases for the Prometheus /metrics endpoint"""
+    
+    def setUp(self):
+        if not PROMETHEUS_AVAILABLE:
+            self.skipTest('prometheus_client not installed')
+    
+    def scrape(self, **extra):
+        return self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token', **extra)
+    
+    def sample(self, body, line_prefix):
+        for line in body.decode().splitlines():
+            if line.startswith(line_prefix):
+                return float(line.rsplit(' ', 1)[1])
+        return 0.0
+    
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_access_control(self):
+        """Test the bearer token or a staff session is required"""
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        self.assertEqual(self.scrape().status_code, 200)
+        
+        staff = User.objects.create_user(email='staff@example.com', password='testpass123456', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+    
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_not_public_without_token(self):
+        """Test DEBUG without a token does not open the endpoint"""
+        request = RequestFactory().get('/metrics')
+        request.user = AnonymousUser()
+        self.assertFalse(metrics_allowed(request))
+    
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_request_latency_and_queries_by_url_name(self):
+        """Test requests are counted by URL name with their database queries"""
+        count = 'gestionale_http_request_duration_seconds_count{method="GET",status="2xx",view="metrics"}'
+        queries = 'gestionale_http_request_db_queries_sum{view="metrics"}'
+        
+        first = self.scrape().content
+        second = self.scrape().content
+        
+        self.assertEqual(self.sample(second, count), self.sample(first, count) + 1)
+        # The treatment count collector runs a query on every scrape
+        self.assertGreaterEqual(self.sample(second, queries), self.sample(first, queries) + 1)
+        self.assertIn(b'gestionale_trattamenti{stato="programmato"}', second)
+    
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_dropped_log_records(self):
+        """Test records dropped by a full logging queue are counted"""
+        dropped = 'gestionale_log_records_dropped_total'
+        before = self.sample(self.scrape().content, dropped)
+        
+        handler = AsyncQueueHandler(queue.Queue(1))
+        for _ in range(3):
+            handler.handle(logging.LogRecord('test', logging.INFO, __file__, 1, 'message', None, None))
+        
+        self.assertEqual(self.sample(self.scrape().content, dropped), before + 2)
+    
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_audit_buffer_depth(self):
+        """Test the audit buffer gauge follows pending rows"""
+        writer = AuditWriter(batch_size=10, flush_interval=3600)
+        writer._ensure_thread = lambda: None
+        
+        with override_settings(AUTH_AUDIT_ASYNC=True):
+            for i in range(2):
+                writer.record(LoginAttempt(email=f'user{i}@example.com', ip_address='10.0.0.1', success=False, user_agent=''))
+        self.assertEqual(self.sample(self.scrape().content, 'gestionale_audit_buffer_depth '), 2)
+        
+        writer.flush()
+        self.assertEqual(self.sample(self.scrape().content, 'gestionale_audit_buffer_depth '), 0)
+
+
+class _CaptureHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+    
+    def emit(self, record):
+        self.records.append(record)
+
+
+class StructuredLoggingTest(TestCase):
+    def make_record(self, msg='hello %s', args=('world',), level=logging.INFO, exc_info=None, **extra):
+        record = logging.LogRecord('core.test', level, __file__, 1, msg, args, exc_info)
+        record.__dict__.update(extra)
+        return record
+    
+    def test_json_formatter(self):
+        """Test JSON lines carry the request id, extra fields and the traceback"""
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            import sys
+            exc_info = sys.exc_info()
+        
+        token = set_request_id('req-12345678')
+        try:
+            entry = json.loads(JsonFormatter().format(self.make_record(exc_info=exc_info, trattamento_id=7)))
+        finally:
+            reset_request_id(token)
+        
+        self.assertEqual(entry['message'], 'hello world')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['request_id'], 'req-12345678')
+        self.assertEqual(entry['trattamento_id'], 7)
+        self.assertIn('ValueError: boom', entry['exception'])
+    
+    def test_request_id_header(self):
+        """Test a well formed X-Request-ID is echoed and anything else is replaced"""
+        response = self.client.get(reverse('login'), HTTP_X_REQUEST_ID='abcd-1234-efgh')
+        self.assertEqual(response['X-Request-ID'], 'abcd-1234-efgh')
+        
+        response = self.client.get(reverse('login'), HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+    
+    def test_make_async_moves_handlers_behind_queue(self):
+        """Test records reach the original handler through the listener thread"""
+        logger = logging.getLogger('core.tests.async')
+        logger.propagate = False
+        capture = _CaptureHandler()
+        logger.addHandler(capture)
+        listeners = make_async([logger], queue_size=100)
+        try:
+            self.assertIsInstance(logger.handlers[0], AsyncQueueHandler)
+            token = set_request_id('req-async-1')
+            try:
+                logger.warning('value %s', [1, 2])
+            finally:
+                reset_request_id(token)
+        finally:
+            for listener in listeners:
+                listener.stop()
+            logger.handlers.clear()
+        
+        self.assertEqual(len(capture.records), 1)
+        record = capture.records[0]
+        self.assertEqual(record.getMessage(), 'value [1, 2]')
+        self.assertEqual(record.request_id, 'req-async-1')
+    
+    def test_full_queue_drops_records(self):
+        """Test a full queue drops the record instead of blocking the caller"""
+        handler = AsyncQueueHandler(queue.Queue(1))
+        handler.handle(self.make_record())
+        handler.handle(self.make_record())
+        
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(handler.dropped, 1)
+    
+    def test_debug_sampling(self):
+        """Test sampling only applies to DEBUG records"""
+        sampling = DebugSamplingFilter(rate=0)
+        self.assertFalse(sampling.filter(self.make_record(level=logging.DEBUG)))
+        self.assertTrue(sampling.filter(self.make_record(level=logging.INFO)))
+        self.assertTrue(DebugSamplingFilter(rate=1).filter(self.make_record(level=logging.DEBUG)))
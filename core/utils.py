@@ -1,12 +1,59 @@
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+
+class SlidingWindowCounter:
+    """
+    Event counter over a sliding time window, stored in the shared cache.
+
+    The window is split into fixed buckets (one cache key each): recording an event is
+    one add + one incr, reading the count is a single get_many over the buckets.
+    """
+
+    def __init__(self, name, window, buckets=12):
+        self.name = name
+        self.window = window
+        self.buckets = buckets
+        self.bucket_size = max(1, window // buckets)
+
+    def _key(self, identifier, bucket):
+        return f'swc:{self.name}:{identifier}:{bucket}'
+
+    def _current_bucket(self):
+        return int(time.time() // self.bucket_size)
+
+    def increment(self, identifier):
+        key = self._key(identifier, self._current_bucket())
+        timeout = self.window + self.bucket_size
+        cache.add(key, 0, timeout)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # The key expired between add and incr
+            cache.set(key, 1, timeout)
+            return 1
+
+    def count(self, identifier):
+        current = self._current_bucket()
+        keys = [self._key(identifier, bucket) for bucket in range(current - self.buckets + 1, current + 1)]
+        return sum(cache.get_many(keys).values())
+
+    def reset(self, identifier):
+        current = self._current_bucket()
+        cache.delete_many([self._key(identifier, bucket) for bucket in range(current - self.buckets + 1, current + 1)])
+
+
+login_failures_by_email = SlidingWindowCounter('login-fail-email', getattr(settings, 'LOGIN_FAILURE_WINDOW', 3600))
+login_failures_by_ip = SlidingWindowCounter('login-fail-ip', getattr(settings, 'LOGIN_FAILURE_WINDOW', 3600))
+
 class EmailService:
     """Centralized email service"""
     
@@ -49,18 +96,27 @@ class EmailService:
 class SecurityUtils:
     """Security utility functions"""
     
+    @staticmethod
+    def record_login_failure(email, ip_address):
+        """Count a failed login for the email and the IP (cache only, no DB query)"""
+        if email:
+            login_failures_by_email.increment(email.lower())
+        if ip_address:
+            login_failures_by_ip.increment(ip_address)
+
+    @staticmethod
+    def is_login_blocked(email, ip_address):
+        """True if the email or the IP exceeded the failed login limits in the window"""
+        if email and login_failures_by_email.count(email.lower()) >= settings.LOGIN_MAX_FAILURES_PER_EMAIL:
+            return True
+        if ip_address and login_failures_by_ip.count(ip_address) >= settings.LOGIN_MAX_FAILURES_PER_IP:
+            return True
+        return False
+
     @staticmethod
     def is_suspicious_activity(user, ip_address):
         """Check for suspicious login activity"""
-        from users.models import LoginAttempt
-        
-        # Check for multiple failed attempts
-        recent_attempts = LoginAttempt.objects.filter(
-            email=user.email,
-            created_at__gte=timezone.now() - timedelta(hours=1)
-        ).count()
-        
-        return recent_attempts > 10
+        return SecurityUtils.is_login_blocked(user.email, ip_address)
     
     @staticmethod
     def log_security_event(user, event_type, details, ip_address):
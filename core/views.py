@@ -0,0 +1,28 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
+
+from core import metrics
+
+
+def metrics_allowed(request):
+    """Bearer METRICS_TOKEN or staff users (also used by domenico's stats APIs)"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint: bearer METRICS_TOKEN or staff users"""
+    if not metrics_allowed(request):
+        raise Http404
+    if not metrics.PROMETHEUS_AVAILABLE:
+        return HttpResponse('prometheus_client is not installed\n', status=503, content_type='text/plain')
+    body, content_type = metrics.render_metrics()
+    return HttpResponse(body, content_type=content_type)
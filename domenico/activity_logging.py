@@ -23,9 +23,9 @@ def log_activity(activity_type, title, description='', related_object=None,
         from .models import ActivityLog
         
         # Prepara dati dell'oggetto correlato
-        related_object_type = None
+        related_object_type = ''
         related_object_id = None
-        related_object_name = None
+        related_object_name = ''
         
         if related_object:
             related_object_type = related_object.__class__.__name__
@@ -60,7 +60,7 @@ def log_activity(activity_type, title, description='', related_object=None,
             extra_data=extra_data or {}
         )
         
-        logger.info(f"✅ Attività registrata: {title}")
+        logger.debug("✅ Attività registrata: %s", title)
         
     except Exception as e:
         logger.error(f"❌ Errore nel logging attività: {str(e)}")
@@ -205,4 +205,66 @@ def log_cascina_created(cascina, request=None):
             'contoterzista_id': cascina.contoterzista.id if cascina.contoterzista else None,
             'contoterzista_nome': cascina.contoterzista.nome if cascina.contoterzista else None
         }
-    )
\ No newline at end of file
+    )
+
+# ============ RETENTION E STATISTICHE ============
+
+def cleanup_old_logs(days_to_keep=90, batch_size=None, pause=None):
+    """
+    Elimina i log più vecchi di `days_to_keep` giorni.
+
+    Su PostgreSQL con tabella partizionata i mesi interamente scaduti vengono
+    eliminati con DROP della partizione; le righe rimanenti (mese a cavallo del
+    limite, o SQLite) vengono cancellate a blocchi di `batch_size`, ognuno nella
+    propria transazione, per non tenere lock lunghi.
+
+    Returns:
+        numero di log eliminati (stimato per le partizioni)
+    """
+    import time
+    from datetime import timedelta
+    from django.conf import settings
+    from django.db import transaction
+    from .models import ActivityLog
+    from .activity_partitions import is_partitioned, drop_partitions_before
+
+    batch_size = batch_size or getattr(settings, 'ACTIVITY_LOG_DELETE_BATCH_SIZE', 1000)
+    pause = pause if pause is not None else getattr(settings, 'ACTIVITY_LOG_DELETE_PAUSE', 0)
+    cutoff = timezone.now() - timedelta(days=days_to_keep)
+
+    deleted = 0
+    if is_partitioned():
+        deleted += drop_partitions_before(cutoff)
+
+    vecchi = ActivityLog.objects.filter(timestamp__lt=cutoff).order_by()
+    while True:
+        ids = list(vecchi.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            count, _ = vecchi.filter(id__in=ids).delete()
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+    logger.info(f"Pulizia log attività: {deleted} log più vecchi di {days_to_keep} giorni eliminati")
+    return deleted
+
+
+def get_activity_stats(days=7):
+    """
+    Statistiche delle attività degli ultimi `days` giorni di calendario (oggi incluso),
+    lette dal riepilogo giornaliero ActivityDailyRollup
+
+    Returns:
+        dict con 'total', 'activities_by_type' e 'activities_by_day'
+    """
+    from .activity_rollup import activities_by_day, activities_by_type
+
+    by_type = activities_by_type(days)
+    return {
+        'days': days,
+        'total': sum(item['count'] for item in by_type),
+        'activities_by_type': by_type,
+        'activities_by_day': activities_by_day(days),
+    }
@@ -0,0 +1,244 @@
+# domenico/activity_partitions.py
+# Partizionamento mensile di ActivityLog su PostgreSQL: la retention diventa un DROP della partizione
+
+import logging
+import re
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.db import connection as default_connection, transaction
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'domenico_activitylog'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_part_id_seq'
+
+# Indici del modello (stessi nomi della migrazione 0001)
+INDEXES = [
+    ('domenico_ac_timesta_924c7e_idx', '("timestamp" DESC)'),
+    ('domenico_ac_activit_4b29fb_idx', '("activity_type")'),
+    ('domenico_ac_related_82dc54_idx', '("related_object_type", "related_object_id")'),
+]
+
+_PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    years, month = divmod(value.month - 1 + months, 12)
+    return date(value.year + years, month + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def _bound(month):
+    """Limite della partizione in UTC come letterale SQL"""
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def is_partitioned(connection=None):
+    """True se la tabella di ActivityLog è partizionata (solo PostgreSQL)"""
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection=None):
+    """
+    Partizioni mensili esistenti.
+
+    Returns:
+        lista di dict con 'name', 'start', 'end' (date) e 'rows' (stima da pg_class), in ordine
+    """
+    connection = connection or default_connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, c.reltuples FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [TABLE]
+        )
+        rows = cursor.fetchall()
+
+    partizioni = []
+    for name, reltuples in rows:
+        match = _PARTITION_RE.match(name)
+        if not match:
+            continue
+        start = date(int(match.group(1)), int(match.group(2)), 1)
+        partizioni.append({
+            'name': name,
+            'start': start,
+            'end': add_months(start, 1),
+            'rows': max(int(reltuples), 0),
+        })
+    return sorted(partizioni, key=lambda p: p['start'])
+
+
+def estimated_row_count(connection=None):
+    """
+    Numero di log stimato dalle statistiche di pg_class (tabella o sue partizioni),
+    senza scansionare la tabella. Su database diversi da PostgreSQL è il COUNT esatto.
+    """
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        from .models import ActivityLog
+        return ActivityLog.objects.using(connection.alias).count()
+
+    with connection.cursor() as cursor:
+        # reltuples vale -1 per le tabelle mai analizzate e per il padre partizionato
+        cursor.execute(
+            "SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0) FROM pg_class c "
+            "WHERE c.relkind = 'r' AND (c.oid = %s::regclass OR c.oid IN ("
+            "SELECT i.inhrelid FROM pg_inherits i WHERE i.inhparent = %s::regclass))",
+            [TABLE, TABLE]
+        )
+        return int(cursor.fetchone()[0])
+
+
+def create_partition(month, connection=None):
+    """
+    Crea la partizione del mese indicato se non esiste. Le righe di quel mese finite nella
+    partizione di default (partizione mancante al momento dell'inserimento) vengono spostate
+    nella nuova partizione: con righe corrispondenti nel default PostgreSQL rifiuterebbe
+    CREATE TABLE ... PARTITION OF.
+    """
+    connection = connection or default_connection
+    month = month_start(month)
+    name = partition_name(month)
+    bounds = f'FOR VALUES FROM ({_bound(month)}) TO ({_bound(add_months(month, 1))})'
+    in_range = f'"timestamp" >= {_bound(month)} AND "timestamp" < {_bound(add_months(month, 1))}'
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # Blocca gli inserimenti nel default finché la partizione non è agganciata
+        cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN SHARE ROW EXCLUSIVE MODE')
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE {in_range})')
+        if not cursor.fetchone()[0]:
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{TABLE}" {bounds}')
+            return 0
+
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH spostate AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE {in_range} RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM spostate'
+        )
+        spostate = cursor.rowcount
+        # ATTACH crea sulla partizione gli indici e la chiave primaria della tabella madre
+        cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" {bounds}')
+    logger.warning(f"Partizione {name} creata spostando {spostate} righe dalla partizione di default")
+    return spostate
+
+
+def ensure_partitions(months_ahead=2, since=None, connection=None):
+    """
+    Crea le partizioni dal mese di `since` (default: mese corrente) fino a
+    `months_ahead` mesi nel futuro.
+
+    Returns:
+        lista dei nomi delle partizioni create
+    """
+    connection = connection or default_connection
+    esistenti = {p['name'] for p in list_partitions(connection)}
+    oggi = datetime.now(dt_timezone.utc).date()
+    month = month_start(since or oggi)
+    ultimo = add_months(month_start(oggi), months_ahead)
+
+    create = []
+    while month <= ultimo:
+        if partition_name(month) not in esistenti:
+            create_partition(month, connection)
+            create.append(partition_name(month))
+        month = add_months(month, 1)
+
+    if create:
+        logger.info(f"Partizioni ActivityLog create: {', '.join(create)}")
+    return create
+
+
+def drop_partitions_before(cutoff, connection=None):
+    """
+    Elimina le partizioni interamente precedenti a `cutoff` (DETACH + DROP):
+    il costo non dipende dal numero di righe.
+
+    Returns:
+        numero stimato di righe eliminate
+    """
+    connection = connection or default_connection
+    cutoff_date = cutoff.date() if isinstance(cutoff, datetime) else cutoff
+
+    eliminate = 0
+    for partizione in list_partitions(connection):
+        if partizione['end'] > cutoff_date:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{partizione["name"]}"')
+            cursor.execute(f'DROP TABLE "{partizione["name"]}"')
+        eliminate += partizione['rows']
+        logger.info(f"Partizione {partizione['name']} eliminata (~{partizione['rows']} righe)")
+    return eliminate
+
+
+def _create_indexes(cursor):
+    cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY ("id", "timestamp")')
+    for name, columns in INDEXES:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{TABLE}" {columns}')
+
+
+def convert_to_partitioned(connection, months_ahead=2):
+    """
+    Converte la tabella esistente in una tabella partizionata per mese su "timestamp".
+
+    La chiave primaria diventa (id, timestamp), come richiesto da PostgreSQL; per Django
+    il pk resta `id`, ancora univoco perché generato dalla sequenza.
+    """
+    legacy = f'{TABLE}_legacy'
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{legacy}" INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")'
+        )
+        # Le colonne identity non sono supportate sulle tabelle partizionate prima di PG 17
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{SEQUENCE}"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{SEQUENCE}"\')')
+        cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'SELECT MIN("timestamp") FROM "{legacy}"')
+        primo = cursor.fetchone()[0]
+
+    ensure_partitions(months_ahead=months_ahead, since=primo.date() if primo else None, connection=connection)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{legacy}"')
+        cursor.execute(
+            f'SELECT setval(\'"{SEQUENCE}"\', COALESCE((SELECT MAX("id") FROM "{TABLE}"), 0) + 1, false)'
+        )
+        cursor.execute(f'DROP TABLE "{legacy}"')
+        _create_indexes(cursor)
+
+
+def convert_to_plain(connection):
+    """Operazione inversa di convert_to_partitioned"""
+    partitioned = f'{TABLE}_partitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{partitioned}"')
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{partitioned}" INCLUDING DEFAULTS)')
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{partitioned}"')
+        cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'DROP TABLE "{partitioned}" CASCADE')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY ("id")')
+        for name, columns in INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{TABLE}" {columns}')
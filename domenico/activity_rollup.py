@@ -0,0 +1,122 @@
+# domenico/activity_rollup.py
+# Riepilogo giornaliero delle attività: le statistiche leggono poche decine di righe
+# di ActivityDailyRollup invece di contare i log grezzi
+
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ActivityDailyRollup, ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+def record_activity(activity_type, timestamp=None):
+    """Incrementa il contatore del giorno per il tipo di attività"""
+    giorno = timezone.localdate(timestamp) if timestamp else timezone.localdate()
+    aggiornati = ActivityDailyRollup.objects.filter(
+        giorno=giorno, activity_type=activity_type
+    ).update(count=F('count') + 1)
+    if aggiornati:
+        return
+
+    try:
+        with transaction.atomic():
+            ActivityDailyRollup.objects.create(giorno=giorno, activity_type=activity_type, count=1)
+    except IntegrityError:
+        # Un'altra richiesta ha creato la riga nel frattempo
+        ActivityDailyRollup.objects.filter(
+            giorno=giorno, activity_type=activity_type
+        ).update(count=F('count') + 1)
+
+
+def rebuild_rollup(start=None, end=None):
+    """
+    Ricalcola il riepilogo dai log grezzi per i giorni da `start` a `end` inclusi
+    (default: tutto lo storico presente in ActivityLog).
+
+    I giorni senza più log grezzi (eliminati dalla retention) non vengono toccati.
+
+    Returns:
+        numero di righe di riepilogo scritte
+    """
+    logs = ActivityLog.objects.order_by()
+    if start:
+        logs = logs.filter(timestamp__date__gte=start)
+    if end:
+        logs = logs.filter(timestamp__date__lte=end)
+
+    conteggi = list(
+        logs.annotate(giorno=TruncDate('timestamp'))
+        .values('giorno', 'activity_type')
+        .annotate(totale=Count('id'))
+    )
+    if not conteggi:
+        return 0
+
+    giorni = {riga['giorno'] for riga in conteggi}
+    with transaction.atomic():
+        ActivityDailyRollup.objects.filter(giorno__in=giorni).delete()
+        ActivityDailyRollup.objects.bulk_create([
+            ActivityDailyRollup(giorno=riga['giorno'], activity_type=riga['activity_type'], count=riga['totale'])
+            for riga in conteggi
+        ], batch_size=500)
+
+    logger.info(f"Riepilogo attività ricalcolato per {len(giorni)} giorni ({len(conteggi)} righe)")
+    return len(conteggi)
+
+
+def _window(days, offset=0):
+    """Giorni [oggi - offset - days + 1, oggi - offset]: `days` giorni di calendario"""
+    fine = timezone.localdate() - timedelta(days=offset)
+    return fine - timedelta(days=days - 1), fine
+
+
+def count_activities(days, offset=0, activity_type=None):
+    """Numero di attività negli ultimi `days` giorni (spostati indietro di `offset`)"""
+    inizio, fine = _window(days, offset)
+    righe = ActivityDailyRollup.objects.filter(giorno__gte=inizio, giorno__lte=fine)
+    if activity_type:
+        righe = righe.filter(activity_type=activity_type)
+    return righe.aggregate(totale=Sum('count'))['totale'] or 0
+
+
+def activities_by_type(days, limit=None):
+    """Lista di {'activity_type', 'count'} in ordine decrescente"""
+    inizio, fine = _window(days)
+    righe = (
+        ActivityDailyRollup.objects.filter(giorno__gte=inizio, giorno__lte=fine)
+        .values('activity_type')
+        .annotate(count=Sum('count'))
+        .order_by('-count', 'activity_type')
+    )
+    return list(righe[:limit] if limit else righe)
+
+
+def activities_by_day(days):
+    """Lista di {'date', 'count'} in ordine cronologico (solo giorni con attività)"""
+    inizio, fine = _window(days)
+    return [
+        {'date': riga['giorno'], 'count': riga['count']}
+        for riga in ActivityDailyRollup.objects.filter(giorno__gte=inizio, giorno__lte=fine)
+        .values('giorno')
+        .annotate(count=Sum('count'))
+        .order_by('giorno')
+    ]
+
+
+def activity_summary():
+    """Riepilogo usato dalle dashboard: oggi, settimana, crescita e tipi più frequenti"""
+    settimana = count_activities(7)
+    settimana_precedente = count_activities(7, offset=7)
+    return {
+        'attivita_oggi': count_activities(1),
+        'attivita_settimana': settimana,
+        'attivita_settimana_precedente': settimana_precedente,
+        'crescita': settimana - settimana_precedente,
+        'top_activities': activities_by_type(7, limit=5),
+    }
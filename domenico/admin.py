@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Terreno, Cascina
+from .models import Terreno, Cascina, EmailOutbox
 
 # Register your models here.
 
@@ -14,5 +14,12 @@ class CascinaAdmin(admin.ModelAdmin):
     list_filter = ('cliente',)
     search_fields = ('nome',)
 
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'oggetto', 'stato', 'tentativi', 'prossimo_tentativo', 'creato_il', 'inviato_il')
+    list_filter = ('stato',)
+    search_fields = ('oggetto',)
+    readonly_fields = ('bloccato_da', 'bloccato_il', 'creato_il', 'inviato_il')
+
 admin.site.register(Terreno, TerrenoAdmin)
-admin.site.register(Cascina, CascinaAdmin)
\ No newline at end of file
+admin.site.register(Cascina, CascinaAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
@@ -0,0 +1,224 @@
+# domenico/analytics.py
+# Fabbisogno di prodotti previsto dai trattamenti programmati e comunicati, per prodotto,
+# settimana di esecuzione e contoterzista. I dati vengono letti in poche query come array
+# NumPy colonnari e aggregati con operazioni vettoriali (niente quantita_totale riga per riga).
+
+import csv
+import io
+import logging
+
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from .models import Contoterzista, Prodotto, Terreno, Trattamento, TrattamentoProdotto
+
+logger = logging.getLogger(__name__)
+
+STATI_PREVISIONE = ('programmato', 'comunicato')
+
+# Codici numerici di livello_applicazione negli array
+LIVELLO_CLIENTE, LIVELLO_CASCINA, LIVELLO_TERRENO = 0, 1, 2
+LIVELLI = {'cliente': LIVELLO_CLIENTE, 'cascina': LIVELLO_CASCINA, 'terreno': LIVELLO_TERRENO}
+
+# Settimana "non pianificata" (trattamenti senza data di esecuzione) e "senza contoterzista"
+NESSUNA_SETTIMANA = -1
+NESSUN_CONTOTERZISTA = 0
+
+
+class AnalyticsUnavailable(Exception):
+    """NumPy non installato"""
+
+
+def _require_numpy():
+    if not NUMPY_AVAILABLE:
+        raise AnalyticsUnavailable("NumPy non disponibile: installa numpy per le analisi del fabbisogno")
+
+
+def _column(rows, index, dtype):
+    return np.fromiter((row[index] for row in rows), dtype=dtype, count=len(rows))
+
+
+def _week_start(days):
+    """Giorni dall'epoca -> lunedì della settimana (l'1/1/1970 era un giovedì)"""
+    return days - (days + 3) % 7
+
+
+# ---------- Caricamento colonnare ----------
+
+def load_columns(stati=STATI_PREVISIONE, data_da=None, data_a=None):
+    """
+    Legge in quattro query terreni, trattamenti, terreni dei trattamenti e prodotti dei
+    trattamenti, e li restituisce come array NumPy.
+
+    Returns:
+        dict di array: 'area' (superficie per trattamento), 'settimana' e 'contoterzista'
+        per trattamento, 'riga_trattamento', 'prodotto', 'dose' per riga TrattamentoProdotto
+    """
+    _require_numpy()
+
+    trattamenti = Trattamento.objects.filter(stato__in=stati)
+    if data_da:
+        trattamenti = trattamenti.filter(data_esecuzione__gte=data_da)
+    if data_a:
+        trattamenti = trattamenti.filter(data_esecuzione__lte=data_a)
+
+    righe = list(trattamenti.values_list(
+        'id', 'livello_applicazione', 'cliente_id', 'cascina_id', 'cascina__contoterzista_id', 'data_esecuzione'
+    ).order_by('id'))
+    ids = _column(righe, 0, np.int64)
+    livello = np.fromiter((LIVELLI.get(r[1], LIVELLO_CLIENTE) for r in righe), dtype=np.int8, count=len(righe))
+    cliente = _column(righe, 2, np.int64)
+    cascina = np.fromiter((r[3] or 0 for r in righe), dtype=np.int64, count=len(righe))
+    contoterzista = np.fromiter((r[4] or NESSUN_CONTOTERZISTA for r in righe), dtype=np.int64, count=len(righe))
+    senza_data = np.fromiter((r[5] is None for r in righe), dtype=bool, count=len(righe))
+    giorni = np.array([r[5] for r in righe], dtype='datetime64[D]').astype(np.int64)
+    settimana = np.where(senza_data, NESSUNA_SETTIMANA, _week_start(np.where(senza_data, 0, giorni)))
+
+    def indice(valori_id):
+        # id del trattamento -> posizione negli array (ids è ordinato)
+        return np.searchsorted(ids, valori_id)
+
+    # Superfici per terreno, cascina e cliente (array indicizzati per id)
+    terreni = list(Terreno.objects.annotate(ettari=Cast('superficie', FloatField())).values_list(
+        'id', 'cascina_id', 'cascina__cliente_id', 'ettari'
+    ))
+    terreno_id = _column(terreni, 0, np.int64)
+    terreno_ettari = _column(terreni, 3, np.float64)
+
+    def per_id(indici, dimensione):
+        return np.bincount(indici, weights=terreno_ettari, minlength=dimensione)
+
+    ettari_cascina = per_id(_column(terreni, 1, np.int64), int(cascina.max(initial=0)) + 1)
+    ettari_cliente = per_id(_column(terreni, 2, np.int64), int(cliente.max(initial=0)) + 1)
+    ettari_terreno = per_id(terreno_id, 1)
+
+    # Livello "terreno": somma dei terreni selezionati
+    selezionati = np.array(list(Trattamento.terreni.through.objects.filter(
+        trattamento__in=trattamenti.filter(livello_applicazione='terreno')
+    ).values_list('trattamento_id', 'terreno_id')), dtype=np.int64).reshape(-1, 2)
+    ettari_selezionati = np.bincount(
+        indice(selezionati[:, 0]), weights=ettari_terreno[selezionati[:, 1]], minlength=len(righe)
+    )
+
+    # Stessa regola di Trattamento.get_superficie_interessata
+    area = np.select(
+        [livello == LIVELLO_CLIENTE, (livello == LIVELLO_CASCINA) & (cascina > 0), livello == LIVELLO_TERRENO],
+        [ettari_cliente[cliente], ettari_cascina[cascina], ettari_selezionati],
+        default=0.0,
+    )
+
+    prodotti = list(TrattamentoProdotto.objects.filter(trattamento__in=trattamenti).annotate(
+        dose=Cast(F('quantita_per_ettaro'), FloatField())
+    ).values_list('trattamento_id', 'prodotto_id', 'dose'))
+
+    return {
+        'trattamento': ids,
+        'area': area,
+        'settimana': settimana,
+        'contoterzista': contoterzista,
+        'riga_trattamento': indice(_column(prodotti, 0, np.int64)),
+        'prodotto': _column(prodotti, 1, np.int64),
+        'dose': _column(prodotti, 2, np.float64),
+    }
+
+
+# ---------- Aggregazione ----------
+
+def compute_demand(colonne):
+    """
+    Fabbisogno = dose per ettaro × superficie del trattamento, sommato per
+    (prodotto, settimana, contoterzista) con un group-by vettoriale.
+
+    Returns:
+        dict con gli assi 'prodotti', 'settimane', 'contoterzisti' (valori ordinati) e
+        'matrice' di forma (prodotti, settimane, contoterzisti)
+    """
+    _require_numpy()
+
+    riga = colonne['riga_trattamento']
+    quantita = colonne['dose'] * colonne['area'][riga]
+
+    assi = []
+    codici = []
+    for valori in (colonne['prodotto'], colonne['settimana'][riga], colonne['contoterzista'][riga]):
+        unici, codice = np.unique(valori, return_inverse=True)
+        assi.append(unici)
+        codici.append(codice)
+
+    forma = tuple(len(asse) for asse in assi)
+    chiave = np.ravel_multi_index(codici, forma) if quantita.size else np.zeros(0, dtype=np.int64)
+    matrice = np.bincount(chiave, weights=quantita, minlength=int(np.prod(forma))).reshape(forma)
+
+    return {
+        'prodotti': assi[0],
+        'settimane': assi[1],
+        'contoterzisti': assi[2],
+        'matrice': matrice,
+    }
+
+
+def product_demand(stati=STATI_PREVISIONE, data_da=None, data_a=None):
+    """Matrice del fabbisogno dai trattamenti nel database (vedi compute_demand)"""
+    return compute_demand(load_columns(stati, data_da, data_a))
+
+
+# ---------- Esportazione ----------
+
+def _settimana_iso(giorni):
+    if giorni == NESSUNA_SETTIMANA:
+        return None
+    return str(np.datetime64(int(giorni), 'D'))
+
+
+def demand_rows(domanda):
+    """
+    Celle non nulle della matrice, con nomi di prodotti e contoterzisti (due query).
+
+    Returns:
+        lista di dict: settimana (lunedì, None se non pianificata), prodotto_id, prodotto,
+        unita_misura, contoterzista_id, contoterzista, quantita
+    """
+    prodotti = {
+        p['id']: p for p in Prodotto.objects.filter(id__in=domanda['prodotti'].tolist()).values('id', 'nome', 'unita_misura')
+    }
+    contoterzisti = dict(
+        Contoterzista.objects.filter(id__in=domanda['contoterzisti'].tolist()).values_list('id', 'nome')
+    )
+
+    righe = []
+    for i, j, k in zip(*np.nonzero(domanda['matrice'])):
+        prodotto_id = int(domanda['prodotti'][i])
+        contoterzista_id = int(domanda['contoterzisti'][k])
+        prodotto = prodotti.get(prodotto_id, {})
+        righe.append({
+            'settimana': _settimana_iso(domanda['settimane'][j]),
+            'prodotto_id': prodotto_id,
+            'prodotto': prodotto.get('nome', ''),
+            'unita_misura': prodotto.get('unita_misura', ''),
+            'contoterzista_id': contoterzista_id or None,
+            'contoterzista': contoterzisti.get(contoterzista_id, 'Senza contoterzista'),
+            'quantita': round(float(domanda['matrice'][i, j, k]), 3),
+        })
+    righe.sort(key=lambda r: (r['settimana'] or '9999', r['prodotto'], r['contoterzista']))
+    return righe
+
+
+def demand_csv(righe):
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=';')
+    writer.writerow(['Settimana', 'Prodotto', 'Unità', 'Contoterzista', 'Quantità'])
+    for riga in righe:
+        writer.writerow([
+            riga['settimana'] or 'Non pianificata',
+            riga['prodotto'],
+            riga['unita_misura'],
+            riga['contoterzista'],
+            f"{riga['quantita']:.3f}".replace('.', ','),
+        ])
+    return output.getvalue()
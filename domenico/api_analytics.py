@@ -0,0 +1,70 @@
+# domenico/api_analytics.py
+# API del fabbisogno di prodotti previsto (logica in domenico/analytics.py)
+
+import logging
+
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_http_methods
+
+from .analytics import STATI_PREVISIONE, AnalyticsUnavailable, demand_csv, demand_rows, product_demand
+from .db_routing import read_replica
+from .models import Trattamento
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_filters(params):
+    """
+    ?da=AAAA-MM-GG&a=AAAA-MM-GG&stati=programmato,comunicato
+
+    Returns:
+        (stati, data_da, data_a)
+    """
+    date = {}
+    for nome in ('da', 'a'):
+        valore = params.get(nome)
+        date[nome] = parse_date(valore) if valore else None
+        if valore and date[nome] is None:
+            raise ValueError(f"Data non valida per '{nome}': {valore}")
+
+    stati = tuple(s for s in params.get('stati', '').split(',') if s) or STATI_PREVISIONE
+    stati_validi = dict(Trattamento.STATI_CHOICES)
+    for stato in stati:
+        if stato not in stati_validi:
+            raise ValueError(f"Stato non valido: {stato}")
+    return stati, date['da'], date['a']
+
+
+@require_http_methods(["GET"])
+@read_replica
+def api_fabbisogno_prodotti(request):
+    """
+    Fabbisogno di prodotti per settimana e contoterzista dai trattamenti programmati e
+    comunicati; ?format=csv per scaricarlo come CSV
+    """
+    try:
+        stati, data_da, data_a = _parse_filters(request.GET)
+        righe = demand_rows(product_demand(stati, data_da, data_a))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except AnalyticsUnavailable as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=503)
+    except Exception as e:
+        logger.error(f"Errore calcolo fabbisogno prodotti: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(demand_csv(righe), content_type='text/csv; charset=utf-8')
+        filename = f"fabbisogno_prodotti_{timezone.localdate():%Y%m%d}.csv"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    return JsonResponse({
+        'success': True,
+        'stati': list(stati),
+        'da': data_da.isoformat() if data_da else None,
+        'a': data_a.isoformat() if data_a else None,
+        'righe': righe,
+    })
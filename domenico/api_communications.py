@@ -1,5 +1,5 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
@@ -8,21 +8,29 @@ from django.conf import settings
 from django.template.loader import render_to_string
 import json
 import io
+import logging
 from decimal import Decimal
 from .models import *
+from . import pdf_engine
+from .communication_preview import build_preview, stream_preview_json
+from .db_routing import read_replica
+
+logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@read_replica
 def api_communication_preview(request):
     """
     API per ottenere l'anteprima dei dati dei trattamenti da comunicare
-    raggruppati per azienda - con filtro automatico per i comunicati
+    raggruppati per azienda - con filtro automatico per i comunicati.
+    Una query per livello (aziende, trattamenti, prodotti, terreni), risposta in streaming.
     """
     try:
         data = json.loads(request.body)
         trattamenti_ids = data.get('trattamenti_ids', [])
-        exclude_communicated = data.get('exclude_communicated', False)  # NUOVO parametro
+        exclude_communicated = data.get('exclude_communicated', False)
         
         if not trattamenti_ids:
             return JsonResponse({
@@ -30,22 +38,9 @@ def api_communication_preview(request):
                 'error': 'Nessun trattamento specificato'
             }, status=400)
         
-        # Query base
-        query = Trattamento.objects.filter(id__in=trattamenti_ids)
-        
-        # NUOVO: Filtra automaticamente i comunicati se richiesto
-        if exclude_communicated:
-            query = query.exclude(stato='comunicato')
-            print(f"🔍 DEBUG: Filtrati trattamenti comunicati. Query aggiornata: {query.count()} rimanenti")
-        
-        # Recupera i trattamenti con tutte le relazioni necessarie
-        trattamenti = query.select_related(
-            'cliente', 'cascina'
-        ).prefetch_related(
-            'terreni', 'trattamentoprodotto_set__prodotto'
-        )
+        stats, companies = build_preview(trattamenti_ids, exclude_communicated)
         
-        if not trattamenti.exists():
+        if not stats['trattamenti_count']:
             return JsonResponse({
                 'success': True,
                 'companies': [],
@@ -57,82 +52,9 @@ def api_communication_preview(request):
                 }
             })
         
-        # Raggruppa per cliente e prepara i dati (logica esistente)
-        preview_data = []
-        clienti_map = {}
-        
-        for trattamento in trattamenti:
-            cliente_nome = trattamento.cliente.nome
-            
-            # Calcola superficie interessata
-            superficie = trattamento.get_superficie_interessata()
-            
-            # Prepara dati prodotti (logica esistente)
-            prodotti_data = []
-            for tp in trattamento.trattamentoprodotto_set.all():
-                if hasattr(tp, 'get_quantita_per_ettaro') and callable(getattr(tp, 'get_quantita_per_ettaro')):
-                    quantita = float(tp.get_quantita_per_ettaro())
-                elif hasattr(tp, 'quantita_per_ettaro'):
-                    quantita = float(tp.quantita_per_ettaro)
-                elif hasattr(tp, 'quantita'):
-                    quantita = float(tp.quantita)
-                else:
-                    quantita = 0.0
-                
-                prodotti_data.append({
-                    'nome': tp.prodotto.nome,
-                    'dose': quantita,
-                    'unita_misura': tp.prodotto.unita_misura or 'L'
-                })
-            
-            # Prepara dati terreni (logica esistente)
-            terreni_nomi = []
-            try:
-                terreni_list = list(trattamento.terreni.all())
-                terreni_nomi = [t.nome for t in terreni_list]
-            except Exception:
-                terreni_nomi = []
-            
-            # Inizializza cliente se non esiste
-            if cliente_nome not in clienti_map:
-                clienti_map[cliente_nome] = {
-                    'nome': cliente_nome,
-                    'id': trattamento.cliente.id,
-                    'trattamenti': [],
-                    'superficie_totale': 0,
-                    'count_trattamenti': 0
-                }
-            
-            # Aggiungi trattamento
-            clienti_map[cliente_nome]['trattamenti'].append({
-                'id': trattamento.id,
-                'cascina_nome': trattamento.cascina.nome if trattamento.cascina else '',
-                'data_programmata': trattamento.data_programmata.strftime('%d/%m/%Y') if hasattr(trattamento, 'data_programmata') and trattamento.data_programmata else '',
-                'superficie': float(superficie) if superficie else 0.0,
-                'prodotti': prodotti_data,
-                'stato': trattamento.stato,
-                'terreni_nomi': terreni_nomi
-            })
-            
-            clienti_map[cliente_nome]['superficie_totale'] += float(superficie) if superficie else 0.0
-            clienti_map[cliente_nome]['count_trattamenti'] += 1
-        
-        # Converti in lista
-        preview_data = list(clienti_map.values())
-        
-        # Log per debug
-        if exclude_communicated:
-            print(f"✅ DEBUG: Filtro comunicati attivo. Risultato: {len(preview_data)} aziende, {len(trattamenti)} trattamenti")
-        
-        return JsonResponse({
-            'success': True,
-            'companies': preview_data,
-            'stats': {
-                'trattamenti_count': len(trattamenti),
-                'clienti_count': len(clienti_map),
-                'excluded_communicated': exclude_communicated
-            }
-        })
+        stats['excluded_communicated'] = exclude_communicated
+        # Le query sono già state eseguite (dentro @read_replica): lo streaming serializza soltanto
+        return StreamingHttpResponse(stream_preview_json(stats, companies), content_type='application/json')
         
     except json.JSONDecodeError:
         return JsonResponse({
@@ -223,22 +145,18 @@ def api_generate_company_pdf(request):
             'error': f'Errore durante la generazione del PDF: {str(e)}'
         }, status=500)
 
-def generate_company_communication_pdf(trattamenti, custom_notes=''):
+def generate_company_communication_pdf(trattamenti, custom_notes='', intestazione=None):
     """
     Genera un PDF di comunicazione per un'azienda con tutti i suoi trattamenti
     PULITO dai campi inesistenti nel model
+
+    intestazione: titolo del documento al posto del nome azienda (es. per i digest
+    di un contoterzista che raggruppano trattamenti di più aziende)
     """
     try:
-        # Import per PDF (prova prima WeasyPrint, poi xhtml2pdf)
-        try:
-            from weasyprint import HTML, CSS
-            pdf_engine = 'weasyprint'
-        except ImportError:
-            try:
-                from xhtml2pdf import pisa
-                pdf_engine = 'xhtml2pdf'
-            except ImportError:
-                raise Exception("Nessun motore PDF disponibile. Installa WeasyPrint o xhtml2pdf.")
+        # Motore PDF (WeasyPrint o xhtml2pdf), caricato al primo utilizzo
+        if not pdf_engine.is_available():
+            raise Exception("Nessun motore PDF disponibile. Installa WeasyPrint o xhtml2pdf.")
     
         if not trattamenti:
             raise Exception("Nessun trattamento fornito per la generazione del PDF")
@@ -246,6 +164,7 @@ def generate_company_communication_pdf(trattamenti, custom_notes=''):
         # Prendi i dati dell'azienda dal primo trattamento
         primo_trattamento = trattamenti[0]
         azienda = primo_trattamento.cliente
+        intestazione = intestazione or azienda.nome
         
         # Raggruppa i trattamenti per area
         trattamenti_per_area = {}
@@ -272,9 +191,9 @@ def generate_company_communication_pdf(trattamenti, custom_notes=''):
                     }
                 trattamenti_per_area[area_key]['trattamenti'].append(trattamento)
             else:
-                area_key = f"{azienda.nome} - Intera Azienda"
+                area_key = f"{trattamento.cliente.nome} - Intera Azienda"
                 if area_key not in trattamenti_per_area:
-                    superficie = azienda.get_superficie_totale()
+                    superficie = trattamento.cliente.get_superficie_totale()
                     trattamenti_per_area[area_key] = {
                         'nome': area_key,
                         'superficie': float(superficie),
@@ -288,7 +207,7 @@ def generate_company_communication_pdf(trattamenti, custom_notes=''):
         <html>
         <head>
             <meta charset="utf-8">
-            <title>Comunicazione Trattamenti - {azienda.nome}</title>
+            <title>Comunicazione Trattamenti - {intestazione}</title>
             <style>
                 @import url('https://fonts.googleapis.com/css2?family=Roboto:wght@300;500&display=swap');
                 body {{
@@ -403,7 +322,7 @@ def generate_company_communication_pdf(trattamenti, custom_notes=''):
         <body>
             <div class="header">
                 <h1>COMUNICAZIONE TRATTAMENTI FITOSANITARI</h1>
-                <h2>{azienda.nome}</h2>
+                <h2>{intestazione}</h2>
                 <p>Data comunicazione: {timezone.now().strftime('%d/%m/%Y')}</p>
             </div>
             
@@ -475,7 +394,7 @@ def generate_company_communication_pdf(trattamenti, custom_notes=''):
                             """
                         html_template += "</div>"
                 except Exception as e:
-                    print(f"❌ Errore nell'aggiungere prodotti al PDF per trattamento {trattamento.id}: {e}")
+                    logger.error(f"Errore nell'aggiungere prodotti al PDF per trattamento {trattamento.id}: {e}")
                 
                 html_template += "</div>"
                 trattamento_numero += 1
@@ -485,25 +404,14 @@ def generate_company_communication_pdf(trattamenti, custom_notes=''):
             
             <div class="footer">
                 <p>Documento generato automaticamente il {timezone.now().strftime('%d/%m/%Y alle %H:%M')}</p>
-                <p>Sistema di Gestione Trattamenti Fitosanitari - {azienda.nome}</p>
+                <p>Sistema di Gestione Trattamenti Fitosanitari - {intestazione}</p>
             </div>
         </body>
         </html>
         """
         
         # Genera il PDF
-        if pdf_engine == 'weasyprint':
-            html = HTML(string=html_template)
-            pdf_content = html.write_pdf()
-        else:
-            from io import BytesIO
-            result = BytesIO()
-            pdf = pisa.pisaDocument(BytesIO(html_template.encode("UTF-8")), result)
-            if pdf.err:
-                raise Exception("Errore durante la generazione del PDF")
-            pdf_content = result.getvalue()
-        
-        return pdf_content
+        return pdf_engine.html_to_pdf(html_template)
         
     except Exception as e:
         import traceback
@@ -0,0 +1,49 @@
+# domenico/api_sync.py
+# API di sincronizzazione della PWA offline (logica in domenico/sync.py)
+
+import json
+import logging
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .sync import SyncError, apply_changes, changes_since
+
+logger = logging.getLogger(__name__)
+
+
+@require_http_methods(["GET"])
+def api_sync_changes(request):
+    """
+    Modifiche dal watermark ?since= (quello restituito dalla sincronizzazione precedente);
+    senza watermark restituisce l'intero dataset (full=true).
+    Legge dal primario: con la replica in ritardo oltre SYNC_WATERMARK_LAG le modifiche
+    cadrebbero prima del watermark e non verrebbero mai consegnate.
+    """
+    try:
+        return JsonResponse({'success': True, **changes_since(request.GET.get('since'))})
+    except SyncError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Errore sincronizzazione (download): {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_sync_upload(request):
+    """
+    Applica le modifiche accodate offline: {"changes": [{"id": ..., "tipo": "trattamento_stato", ...}]}.
+    Tutto in una transazione; i conflitti vengono restituiti senza bloccare le altre modifiche.
+    """
+    try:
+        data = json.loads(request.body)
+        return JsonResponse({'success': True, **apply_changes(data.get('changes'))})
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'JSON non valido'}, status=400)
+    except SyncError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Errore sincronizzazione (upload): {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
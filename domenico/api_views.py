@@ -1,7 +1,7 @@
 # domenico/api_views.py
 # API aggiuntive per la gestione del database
 
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import get_object_or_404
@@ -9,6 +9,7 @@ from django.db import transaction
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 import json
+import os
 import logging
 from django.core.paginator import Paginator
 from datetime import timedelta
@@ -22,6 +23,14 @@ from .activity_logging import (
 from .email_utils import (
     send_trattamento_communication
 )
+from .outbox import outbox_enabled, enqueue_trattamento_communication, outbox_metrics
+from .activity_rollup import activity_summary, count_activities
+from .reference_data import get_contoterzisti, get_prodotti
+from .db_routing import read_replica
+from .db_connections import connection_stats
+from .bulk_treatments import BulkCreationError, create_treatments
+from .season_clone import SeasonCloneError, clone_season
+from core.views import metrics_allowed
 
 from .models import *
 
@@ -64,18 +73,13 @@ def api_clienti_list(request):
 def api_clienti_create(request):
     """API per creare nuovo cliente con contatti e logging"""
     try:
-        print("🔍 DEBUG: api_clienti_create chiamata")
-        print(f"Content-Type: {request.content_type}")
-        print(f"POST data: {dict(request.POST)}")
-        
         # Gestisci sia JSON che FormData
         if request.content_type == 'application/json':
             import json
             data = json.loads(request.body)
-            print(f"JSON data: {data}")
         else:
             data = request.POST
-            print(f"Form data: {dict(data)}")
+        logger.debug("api_clienti_create: %s, campi %s", request.content_type, list(data.keys()))
             
         nome = data.get('nome', '').strip()
         
@@ -96,20 +100,15 @@ def api_clienti_create(request):
         with transaction.atomic():
             # Crea cliente
             cliente = Cliente.objects.create(nome=nome)
-            print(f"✅ Cliente creato: {cliente.nome} (ID: {cliente.id})")
             
             # 🔥 NUOVO: Log dell'attività
             log_cliente_created(cliente, request)
-            print(f"✅ Log cliente creato")
             
             # Gestisci contatti se presenti
             contatti = data.get('contatti', [])
             contatti_creati = 0
             
-            print(f"📧 Contatti da creare: {len(contatti)}")
-            
             for contatto_data in contatti:
-                print(f"Processando contatto: {contatto_data}")
                 if contatto_data.get('nome') and contatto_data.get('email'):
                     try:
                         contatto = ContattoEmail.objects.create(
@@ -121,12 +120,14 @@ def api_clienti_create(request):
                         
                         # Log anche per ogni contatto
                         log_contatto_created(contatto, request)
-                        print(f"✅ Contatto creato e loggato: {contatto.nome}")
                         
                     except Exception as e:
-                        print(f"❌ Errore creazione contatto: {e}")
+                        logger.error(f"Errore creazione contatto per il cliente {cliente.id}: {e}")
             
-            print(f"✅ Totale contatti creati: {contatti_creati}")
+            logger.info(
+                f"Cliente creato: {cliente.nome} (ID: {cliente.id}), {contatti_creati} contatti",
+                extra={'cliente_id': cliente.id, 'contatti': contatti_creati}
+            )
             
             return JsonResponse({
                 'success': True,
@@ -145,9 +146,7 @@ def api_clienti_create(request):
             'error': 'Dati JSON non validi'
         }, status=400)
     except Exception as e:
-        print(f"❌ Errore generale nella creazione cliente: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Errore generale nella creazione cliente: {e}")
         return JsonResponse({
             'success': False,
             'error': f'Errore nella creazione del cliente: {str(e)}'
@@ -198,21 +197,20 @@ def api_cascine_list(request):
 def api_cascine_create(request):
     """API per creare una nuova cascina con logging"""
     try:
-        print(f"🔍 DEBUG Cascina - Content-Type: {request.content_type}")
-        
         # Parse JSON data o form data
         if request.content_type == 'application/json':
             data = json.loads(request.body)
-            print(f"🔍 DEBUG Cascina - JSON data: {data}")
         else:
             data = request.POST
-            print(f"🔍 DEBUG Cascina - Form data: {dict(data)}")
             
         cliente_id = data.get('cliente_id')
         nome = data.get('nome', '').strip()
         contoterzista_id = data.get('contoterzista_id') or None
         
-        print(f"🔍 DEBUG Cascina - Parsed: cliente_id={cliente_id}, nome='{nome}', contoterzista_id={contoterzista_id}")
+        logger.debug(
+            "api_cascine_create: %s, cliente_id=%s, contoterzista_id=%s",
+            request.content_type, cliente_id, contoterzista_id
+        )
         
         # Validazione
         if not cliente_id:
@@ -260,15 +258,13 @@ def api_cascine_create(request):
                 contoterzista=contoterzista
             )
             
-            print(f"✅ Cascina creata: {cascina.nome} (ID: {cascina.id})")
+            logger.info(f"Cascina creata: {cascina.nome} (ID: {cascina.id})", extra={'cascina_id': cascina.id})
             
             # 🔥 Log dell'attività
             try:
                 log_cascina_created(cascina, request)
-                print(f"✅ Log cascina creato con successo")
             except Exception as log_error:
                 logger.error(f"Errore nel logging cascina: {str(log_error)}")
-                print(f"❌ Errore nel logging: {log_error}")
                 # Non bloccare la creazione se il log fallisce
             
             return JsonResponse({
@@ -289,10 +285,7 @@ def api_cascine_create(request):
             'error': 'Dati JSON non validi'
         }, status=400)
     except Exception as e:
-        logger.error(f"Errore nella creazione cascina: {str(e)}")
-        print(f"❌ Errore generale nella creazione cascina: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Errore nella creazione cascina: {str(e)}")
         return JsonResponse({
             'success': False,
             'error': 'Errore nella creazione della cascina'
@@ -434,16 +427,7 @@ def api_terreni_create(request):
 def api_contoterzisti_list(request):
     """API per ottenere la lista dei contoterzisti"""
     try:
-        contoterzisti = Contoterzista.objects.all().order_by('nome')
-        
-        contoterzisti_data = []
-        for contoterzista in contoterzisti:
-            contoterzisti_data.append({
-                'id': contoterzista.id,
-                'nome': contoterzista.nome,
-                'email': contoterzista.email,
-                'cascine_count': contoterzista.cascine.count()
-            })
+        contoterzisti_data = get_contoterzisti()
         
         return JsonResponse({
             'success': True,
@@ -464,17 +448,7 @@ def api_contoterzisti_list(request):
 def api_prodotti_list(request):
     """API per ottenere la lista dei prodotti"""
     try:
-        prodotti = Prodotto.objects.prefetch_related('principi_attivi').all().order_by('nome')
-        
-        prodotti_data = []
-        for prodotto in prodotti:
-            prodotti_data.append({
-                'id': prodotto.id,
-                'nome': prodotto.nome,
-                'unita_misura': prodotto.unita_misura,
-                'descrizione': prodotto.descrizione,
-                'principi_attivi': prodotto.get_principi_attivi_list()
-            })
+        prodotti_data = get_prodotti()
         
         return JsonResponse({
             'success': True,
@@ -1281,35 +1255,17 @@ def api_dashboard_summary(request):
             'principi_attivi_totali': PrincipioAttivo.objects.count(),
         }
         
-        # Attività recenti
-        settimana_fa = timezone.now() - timedelta(days=7)
-        attivita_settimana = ActivityLog.objects.filter(
-            timestamp__gte=settimana_fa
-        ).count()
-        
-        # Crescita rispetto alla settimana precedente
-        due_settimane_fa = timezone.now() - timedelta(days=14)
-        attivita_settimana_precedente = ActivityLog.objects.filter(
-            timestamp__gte=due_settimane_fa,
-            timestamp__lt=settimana_fa
-        ).count()
-        
-        crescita_attivita = attivita_settimana - attivita_settimana_precedente
-        
-        # Top attività per tipo
-        top_activities = list(ActivityLog.objects.filter(
-            timestamp__gte=settimana_fa
-        ).values('activity_type').annotate(
-            count=Count('id')
-        ).order_by('-count')[:5])
+        # Attività recenti, crescita sulla settimana precedente e top per tipo
+        # (dal riepilogo giornaliero, non dai log grezzi)
+        riepilogo = activity_summary()
         
         return JsonResponse({
             'success': True,
             'stats': stats,
             'activity_summary': {
-                'attivita_settimana': attivita_settimana,
-                'crescita': crescita_attivita,
-                'top_activities': top_activities
+                'attivita_settimana': riepilogo['attivita_settimana'],
+                'crescita': riepilogo['crescita'],
+                'top_activities': riepilogo['top_activities']
             }
         })
         
@@ -1329,9 +1285,7 @@ def api_create_trattamento(request):
 
     from decimal import Decimal
     
-    print("=== DEBUG API CREATE TRATTAMENTO ===")
-    print("POST data keys:", list(request.POST.keys()))
-    print("POST data:", dict(request.POST))
+    logger.debug("api_create_trattamento: campi %s", list(request.POST.keys()))
     
     try:
         with transaction.atomic():
@@ -1340,10 +1294,6 @@ def api_create_trattamento(request):
             cascina_id = request.POST.get('cascina') or None
             livello_applicazione = request.POST.get('livello_applicazione', 'cliente')
             data_esecuzione = request.POST.get('data_esecuzione') or None
-
-            print(f"Cliente ID: {cliente_id}")
-            print(f"Cascina ID: {cascina_id}")
-            print(f"Livello: {livello_applicazione}")
             
             # 2. Validazioni
             if not cliente_id:
@@ -1367,34 +1317,26 @@ def api_create_trattamento(request):
                 stato='programmato'
             )
             
-            print(f"✅ Trattamento creato: ID {trattamento.id}")
-            
             # 4. Gestisci terreni se livello è 'terreno'
             if livello_applicazione == 'terreno':
                 terreni_ids = request.POST.getlist('terreni_selezionati')
-                print(f"Terreni IDS: {terreni_ids}")
                 
                 if terreni_ids:
                     terreni = Terreno.objects.filter(id__in=terreni_ids)
                     trattamento.terreni.set(terreni)
-                    print(f"✅ Associati {terreni.count()} terreni")
             
             # 5. ⚠️ GESTIONE PRODOTTI - QUI ERA IL PROBLEMA!
             prodotti_data_str = request.POST.get('prodotti_data')
-            print(f"Prodotti data raw: {prodotti_data_str}")
             
             if prodotti_data_str:
                 try:
                     prodotti_data = json.loads(prodotti_data_str)
-                    print(f"Prodotti parsed: {prodotti_data}")
                     
                     prodotti_creati = 0
                     for prodotto_info in prodotti_data:
                         prodotto_id = prodotto_info.get('prodotto_id')
                         quantita_per_ettaro = prodotto_info.get('quantita_per_ettaro')
                         
-                        print(f"Elaboro prodotto: ID={prodotto_id}, Quantità/ha={quantita_per_ettaro}")
-                        
                         if prodotto_id and quantita_per_ettaro:
                             try:
                                 prodotto = Prodotto.objects.get(id=prodotto_id)
@@ -1407,36 +1349,36 @@ def api_create_trattamento(request):
                                 )
                                 
                                 prodotti_creati += 1
-                                print(f"✅ Prodotto salvato: {prodotto.nome} - {quantita_per_ettaro} {prodotto.unita_misura}/ha")
                                 
                             except Prodotto.DoesNotExist:
-                                print(f"❌ Prodotto non trovato: ID {prodotto_id}")
+                                logger.warning(f"Prodotto non trovato: ID {prodotto_id}", extra={'trattamento_id': trattamento.id})
                             except Exception as e:
-                                print(f"❌ Errore salvataggio prodotto {prodotto_id}: {e}")
+                                logger.error(f"Errore salvataggio prodotto {prodotto_id}: {e}", extra={'trattamento_id': trattamento.id})
                         else:
-                            print(f"⚠️ Dati prodotto incompleti: {prodotto_info}")
+                            logger.warning(f"Dati prodotto incompleti: {prodotto_info}", extra={'trattamento_id': trattamento.id})
                     
-                    print(f"✅ Salvati {prodotti_creati} prodotti su {len(prodotti_data)} forniti")
+                    if prodotti_creati < len(prodotti_data):
+                        logger.warning(
+                            f"Salvati {prodotti_creati} prodotti su {len(prodotti_data)} forniti",
+                            extra={'trattamento_id': trattamento.id}
+                        )
                     
                 except json.JSONDecodeError as e:
-                    print(f"❌ Errore parsing JSON prodotti: {e}")
+                    logger.warning(f"Errore parsing JSON prodotti: {e}")
                     return JsonResponse({
                         'success': False,
                         'error': 'Formato dati prodotti non valido'
                     }, status=400)
-            else:
-                print("⚠️ Nessun dato prodotti fornito")
             
             # 6. Verifica finale
             prodotti_count = trattamento.trattamentoprodotto_set.count()
             superficie = trattamento.get_superficie_interessata()
             contoterzista = trattamento.get_contoterzista()
             
-            print(f"✅ TRATTAMENTO COMPLETATO:")
-            print(f"   - ID: {trattamento.id}")
-            print(f"   - Prodotti associati: {prodotti_count}")
-            print(f"   - Superficie: {superficie} ha")
-            print(f"   - Contoterzista: {contoterzista.nome if contoterzista else 'N/A'}")
+            logger.info(
+                f"Trattamento creato: ID {trattamento.id}, {prodotti_count} prodotti, {superficie} ha",
+                extra={'trattamento_id': trattamento.id, 'cliente_id': cliente.id, 'livello': livello_applicazione}
+            )
             
             return JsonResponse({
                 'success': True,
@@ -1452,13 +1394,110 @@ def api_create_trattamento(request):
             })
             
     except Exception as e:
-        print(f"❌ ERRORE GENERALE: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"Errore nella creazione del trattamento: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Errore durante la creazione: {str(e)}'
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_bulk_create_trattamenti(request):
+    """
+    API per creare la stessa miscela di prodotti su molte destinazioni in una richiesta:
+    {"prodotti": [...], "data_esecuzione": "2026-06-03", "targets": [{"livello_applicazione": ...}, ...]}
+    Tutto o niente: con una destinazione non valida non viene creato nessun trattamento.
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError
+    except (json.JSONDecodeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'JSON non valido'}, status=400)
+    
+    try:
+        creati = create_treatments(data.get('targets'), data.get('prodotti'), data.get('data_esecuzione'))
+    except BulkCreationError as e:
+        return JsonResponse({'success': False, 'error': str(e), 'errors': e.errors}, status=400)
+    except Exception as e:
+        logger.exception(f"Errore nella creazione in blocco dei trattamenti: {e}")
         return JsonResponse({
             'success': False,
             'error': f'Errore durante la creazione: {str(e)}'
         }, status=500)
+    
+    ids = [c['trattamento_id'] for c in creati]
+    clienti_count = len({c['cliente_id'] for c in creati})
+    log_activity(
+        activity_type='trattamento_created',
+        title=f'{len(creati)} nuovi trattamenti programmati',
+        description=f'Trattamenti programmati in blocco per {clienti_count} clienti',
+        request=request,
+        extra_data={'trattamenti_ids': ids, 'prodotti_count': len(data['prodotti'])},
+    )
+    logger.info(
+        f"Trattamenti creati in blocco: {len(creati)} per {clienti_count} clienti",
+        extra={'trattamenti_count': len(creati)}
+    )
+    
+    return JsonResponse({
+        'success': True,
+        'message': f'Creati {len(creati)} trattamenti',
+        'trattamenti': creati,
+    })
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_clone_season(request):
+    """
+    API per clonare una stagione di trattamenti come nuovi trattamenti programmati:
+    {"clienti": [...], "cascine": [...], "dal": "2025-01-01", "al": "2025-12-31", "anni": 1,
+     "giorni": 0, "fattore_dose": 1, "dry_run": true}
+    Con dry_run restituisce le differenze (date e dosi prima/dopo) senza creare nulla.
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError
+    except (json.JSONDecodeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'JSON non valido'}, status=400)
+    
+    try:
+        risultato = clone_season(
+            clienti=data.get('clienti') or None,
+            cascine=data.get('cascine') or None,
+            dal=data.get('dal'),
+            al=data.get('al'),
+            anni=data.get('anni', 1),
+            giorni=data.get('giorni', 0),
+            fattore_dose=data.get('fattore_dose', 1),
+            dry_run=bool(data.get('dry_run')),
+        )
+    except SeasonCloneError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        logger.exception(f"Errore nella clonazione della stagione: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Errore durante la clonazione: {str(e)}'
+        }, status=500)
+    
+    if not risultato['dry_run'] and risultato['trattamenti']:
+        log_activity(
+            activity_type='trattamento_created',
+            title=f"{risultato['trattamenti']} trattamenti clonati dalla stagione precedente",
+            description=f"Stagione clonata per {risultato['clienti']} clienti",
+            request=request,
+            extra_data={k: risultato[k] for k in ('trattamenti', 'terreni', 'prodotti', 'clienti')},
+        )
+        logger.info(
+            f"Stagione clonata: {risultato['trattamenti']} trattamenti per {risultato['clienti']} clienti",
+            extra={'trattamenti_count': risultato['trattamenti']}
+        )
+    
+    return JsonResponse({'success': True, **risultato})
 
 
 @csrf_exempt
@@ -1513,7 +1552,7 @@ def api_add_contatto_cliente(request, cliente_id):
             # 🔥 NUOVO: Log dell'attività
             log_contatto_created(contatto, request)
             
-            print(f"✅ Contatto creato con logging: {contatto.nome}")
+            logger.info(f"Contatto creato: {contatto.nome}", extra={'cliente_id': contatto.cliente_id})
             
             return JsonResponse({
                 'success': True,
@@ -1532,7 +1571,7 @@ def api_add_contatto_cliente(request, cliente_id):
             'error': 'Cliente non trovato'
         }, status=404)
     except Exception as e:
-        print(f"❌ Errore nella creazione contatto: {str(e)}")
+        logger.exception(f"Errore nella creazione contatto: {str(e)}")
         return JsonResponse({
             'success': False,
             'error': f'Errore nell\'aggiunta del contatto: {str(e)}'
@@ -1589,7 +1628,7 @@ def api_cliente_create(request):
                     # Log anche per ogni contatto
                     log_contatto_created(contatto, request)
             
-            print(f"✅ Cliente creato con logging: {cliente.nome} + {len(contatti_creati)} contatti")
+            logger.info(f"Cliente creato: {cliente.nome} + {len(contatti_creati)} contatti", extra={'cliente_id': cliente.id})
             
             return JsonResponse({
                 'success': True,
@@ -1607,7 +1646,7 @@ def api_cliente_create(request):
             'error': 'Dati JSON non validi'
         }, status=400)
     except Exception as e:
-        print(f"❌ Errore nella creazione cliente: {str(e)}")
+        logger.exception(f"Errore nella creazione cliente: {str(e)}")
         return JsonResponse({
             'success': False,
             'error': 'Errore nella creazione del cliente'
@@ -1623,6 +1662,23 @@ def api_send_comunicazione(request, trattamento_id):
         # Ottieni il trattamento
         trattamento = get_object_or_404(Trattamento, id=trattamento_id)
         
+        if outbox_enabled():
+            # Accoda soltanto: invio, tentativi e log li gestisce dispatch_outbox
+            risultato = enqueue_trattamento_communication(trattamento_id, force_send=force_send)
+            if not risultato['success']:
+                return JsonResponse({
+                    'success': False,
+                    'error': risultato['error']
+                }, status=400)
+
+            return JsonResponse({
+                'success': True,
+                'queued': True,
+                'message': f'Comunicazione messa in coda per {risultato["destinatari_count"]} destinatari',
+                'destinatari': risultato['destinatari'],
+                'outbox_id': risultato['outbox_id']
+            })
+        
         # Invia la comunicazione
         risultato = send_trattamento_communication(trattamento_id, force_send=force_send)
         
@@ -1634,7 +1690,7 @@ def api_send_comunicazione(request, trattamento_id):
                 request
             )
             
-            print(f"✅ Comunicazione inviata con logging per trattamento {trattamento_id}")
+            logger.info(f"Comunicazione registrata per trattamento {trattamento_id}", extra={'trattamento_id': trattamento_id})
             
             return JsonResponse({
                 'success': True,
@@ -1654,14 +1710,51 @@ def api_send_comunicazione(request, trattamento_id):
             'error': 'Trattamento non trovato'
         }, status=404)
     except Exception as e:
-        print(f"❌ Errore nell'invio comunicazione: {str(e)}")
+        logger.exception(f"Errore nell'invio comunicazione: {str(e)}")
         return JsonResponse({
             'success': False,
             'error': f'Errore nell\'invio della comunicazione: {str(e)}'
         }, status=500)
+
+
+@require_http_methods(["GET"])
+def api_db_connection_stats(request):
+    """API con lo stato delle connessioni al database del worker (pool o persistenti), accesso come /metrics"""
+    if not metrics_allowed(request):
+        raise Http404
+    try:
+        return JsonResponse({
+            'success': True,
+            'pid': os.getpid(),
+            'databases': connection_stats()
+        })
+    except Exception as e:
+        logger.error(f"Errore metriche connessioni database: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+def api_outbox_stats(request):
+    """API con profondità ed età della coda email (outbox)"""
+    try:
+        return JsonResponse({
+            'success': True,
+            'enabled': outbox_enabled(),
+            'outbox': outbox_metrics()
+        })
+    except Exception as e:
+        logger.error(f"Errore metriche outbox: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
     
 
 @require_http_methods(["GET"])
+@read_replica
 def api_recent_activities(request):
     """API per ottenere le attività recenti"""
     try:
@@ -1720,6 +1813,7 @@ def api_recent_activities(request):
         }, status=500)
 
 @require_http_methods(["GET"])
+@read_replica
 def api_dashboard_summary(request):
     """API per ottenere riepilogo completo della dashboard"""
     try:
@@ -1742,35 +1836,17 @@ def api_dashboard_summary(request):
             'principi_attivi_totali': PrincipioAttivo.objects.count(),
         }
         
-        # Attività recenti
-        settimana_fa = timezone.now() - timedelta(days=7)
-        attivita_settimana = ActivityLog.objects.filter(
-            timestamp__gte=settimana_fa
-        ).count()
-        
-        # Crescita rispetto alla settimana precedente
-        due_settimane_fa = timezone.now() - timedelta(days=14)
-        attivita_settimana_precedente = ActivityLog.objects.filter(
-            timestamp__gte=due_settimane_fa,
-            timestamp__lt=settimana_fa
-        ).count()
-        
-        crescita_attivita = attivita_settimana - attivita_settimana_precedente
-        
-        # Top attività per tipo
-        top_activities = list(ActivityLog.objects.filter(
-            timestamp__gte=settimana_fa
-        ).values('activity_type').annotate(
-            count=Count('id')
-        ).order_by('-count')[:5])
+        # Attività recenti, crescita sulla settimana precedente e top per tipo
+        # (dal riepilogo giornaliero, non dai log grezzi)
+        riepilogo = activity_summary()
         
         return JsonResponse({
             'success': True,
             'stats': stats,
             'activity_summary': {
-                'attivita_settimana': attivita_settimana,
-                'crescita': crescita_attivita,
-                'top_activities': top_activities
+                'attivita_settimana': riepilogo['attivita_settimana'],
+                'crescita': riepilogo['crescita'],
+                'top_activities': riepilogo['top_activities']
             }
         })
         
@@ -1782,6 +1858,7 @@ def api_dashboard_summary(request):
         }, status=500)
 
 @require_http_methods(["GET"])
+@read_replica
 def api_database_stats(request):
     
     """API per ottenere statistiche aggiornate del database"""
@@ -1806,16 +1883,9 @@ def api_database_stats(request):
         
         stats['superficie_totale'] = float(superficie_totale)
         
-        # Statistiche attività
-        oggi_inizio = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        stats['attivita_oggi'] = ActivityLog.objects.filter(
-            timestamp__gte=oggi_inizio
-        ).count()
-        
-        settimana_fa = timezone.now() - timedelta(days=7)
-        stats['attivita_settimana'] = ActivityLog.objects.filter(
-            timestamp__gte=settimana_fa
-        ).count()
+        # Statistiche attività (dal riepilogo giornaliero)
+        stats['attivita_oggi'] = count_activities(1)
+        stats['attivita_settimana'] = count_activities(7)
         
         return JsonResponse({
             'success': True,
@@ -1851,6 +1921,7 @@ def api_cleanup_activities(request):
         }, status=500)
 
 @require_http_methods(["GET"])
+@read_replica
 def api_activity_stats(request):
     """API per ottenere statistiche delle attività"""
     try:
@@ -1965,6 +2036,7 @@ def api_cascina_terreni(request, cascina_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 @require_http_methods(["GET"])
+@read_replica
 def api_search_clienti(request):
     """API per ricerca clienti con autocompletamento"""
     try:
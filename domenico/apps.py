@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DomenicoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'domenico'
+
+    def ready(self):
+        import domenico.signals
+        import domenico.metrics  # registra il conteggio dei trattamenti per /metrics
@@ -0,0 +1,224 @@
+# domenico/bulk_treatments.py
+# Creazione di trattamenti in blocco: la stessa miscela di prodotti su molti clienti, cascine
+# o gruppi di terreni (es. dopo un allarme fitosanitario). I riferimenti sono validati con una
+# query per tabella e trattamenti, terreni e prodotti sono inseriti con bulk_create in
+# un'unica transazione: il numero di query non dipende dal numero di destinazioni.
+
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from .models import Cascina, Cliente, Prodotto, Terreno, Trattamento, TrattamentoProdotto
+
+MAX_DESTINAZIONI = 1000
+CAMPO_QUANTITA = TrattamentoProdotto._meta.get_field('quantita_per_ettaro')
+
+
+class BulkCreationError(Exception):
+    """Richiesta non valida: non viene creato nessun trattamento"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        # Errori per destinazione: [{'index': ..., 'error': ...}]
+        self.errors = errors or []
+
+
+def _id(value):
+    """Id positivo (anche come stringa, dai form), altrimenti None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _parse_data(data_esecuzione):
+    if not data_esecuzione:
+        return None
+    try:
+        data = parse_date(data_esecuzione) if isinstance(data_esecuzione, str) else None
+    except ValueError:
+        data = None
+    if data is None:
+        raise BulkCreationError(f"Data di esecuzione non valida: {data_esecuzione!r}")
+    return data
+
+
+def _parse_miscela(prodotti):
+    """
+    Returns:
+        dict {prodotto_id: quantita_per_ettaro}, prodotti verificati con una query
+    """
+    if not isinstance(prodotti, list) or not prodotti:
+        raise BulkCreationError("Specificare almeno un prodotto")
+
+    miscela = {}
+    for info in prodotti:
+        if not isinstance(info, dict):
+            raise BulkCreationError("Ogni prodotto deve essere un oggetto")
+        prodotto_id = _id(info.get('prodotto_id'))
+        try:
+            # Stesse regole del campo: minimo, cifre e decimali della colonna numeric(10, 3)
+            quantita = CAMPO_QUANTITA.clean(Decimal(str(info.get('quantita_per_ettaro'))), None)
+        except (InvalidOperation, ValidationError):
+            quantita = None
+        if prodotto_id is None or quantita is None:
+            raise BulkCreationError(f"Dati prodotto non validi: {info}")
+        if prodotto_id in miscela:
+            raise BulkCreationError(f"Prodotto ripetuto nella miscela: {prodotto_id}")
+        miscela[prodotto_id] = quantita
+
+    trovati = set(Prodotto.objects.filter(id__in=miscela).values_list('id', flat=True))
+    mancanti = sorted(set(miscela) - trovati)
+    if mancanti:
+        raise BulkCreationError(f"Prodotti non trovati: {', '.join(map(str, mancanti))}")
+    return miscela
+
+
+def _normalizza(target):
+    """Destinazione con id interi, o stringa d'errore"""
+    if not isinstance(target, dict):
+        return "Destinazione non valida"
+
+    livello = target.get('livello_applicazione') or 'cliente'
+    if livello not in dict(Trattamento.LIVELLI_APPLICAZIONE):
+        return f"Livello di applicazione non valido: {livello!r}"
+
+    cliente_id = _id(target.get('cliente'))
+    if target.get('cliente') not in (None, '') and cliente_id is None:
+        return f"Cliente non valido: {target.get('cliente')!r}"
+    cascina_id = _id(target.get('cascina'))
+    if target.get('cascina') not in (None, '') and cascina_id is None:
+        return f"Cascina non valida: {target.get('cascina')!r}"
+
+    terreni_ids = []
+    if livello == 'terreno':
+        terreni = target.get('terreni_selezionati')
+        if not isinstance(terreni, list) or not terreni:
+            return "Selezionare almeno un terreno"
+        terreni_ids = [_id(t) for t in terreni]
+        if None in terreni_ids:
+            return f"Terreni non validi: {terreni!r}"
+    elif livello == 'cascina' and cascina_id is None:
+        return "Cascina obbligatoria per il livello cascina"
+
+    return {
+        'livello_applicazione': livello,
+        'cliente_id': cliente_id,
+        'cascina_id': cascina_id,
+        'terreni_ids': list(dict.fromkeys(terreni_ids)),
+    }
+
+
+def _parse_destinazioni(targets):
+    """
+    Valida tutte le destinazioni (clienti, cascine e terreni con una query per tabella).
+    Il cliente può mancare se si ricava dalla cascina o dai terreni.
+
+    Returns:
+        lista di dict pronti per l'inserimento, nello stesso ordine di targets
+    """
+    if not isinstance(targets, list) or not targets:
+        raise BulkCreationError("Nessuna destinazione selezionata")
+    if len(targets) > MAX_DESTINAZIONI:
+        raise BulkCreationError(f"Troppe destinazioni: massimo {MAX_DESTINAZIONI} per richiesta")
+
+    righe = [_normalizza(target) for target in targets]
+    valide = [r for r in righe if isinstance(r, dict)]
+
+    clienti_ids = {r['cliente_id'] for r in valide if r['cliente_id']}
+    cascine_ids = {r['cascina_id'] for r in valide if r['cascina_id']}
+    terreni_ids = {t for r in valide for t in r['terreni_ids']}
+
+    clienti = set(Cliente.objects.filter(id__in=clienti_ids).values_list('id', flat=True)) if clienti_ids else set()
+    cascine = dict(Cascina.objects.filter(id__in=cascine_ids).values_list('id', 'cliente_id')) if cascine_ids else {}
+    terreni = dict(
+        Terreno.objects.filter(id__in=terreni_ids).values_list('id', 'cascina__cliente_id')
+    ) if terreni_ids else {}
+
+    errors = []
+    for index, riga in enumerate(righe):
+        if isinstance(riga, str):
+            errors.append({'index': index, 'error': riga})
+            continue
+
+        if riga['cascina_id'] and riga['cascina_id'] not in cascine:
+            errors.append({'index': index, 'error': f"Cascina non trovata: {riga['cascina_id']}"})
+            continue
+        mancanti = [t for t in riga['terreni_ids'] if t not in terreni]
+        if mancanti:
+            errors.append({'index': index, 'error': f"Terreni non trovati: {', '.join(map(str, mancanti))}"})
+            continue
+
+        proprietari = {cascine[riga['cascina_id']]} if riga['cascina_id'] else set()
+        proprietari.update(terreni[t] for t in riga['terreni_ids'])
+        cliente_id = riga['cliente_id'] or (next(iter(proprietari)) if len(proprietari) == 1 else None)
+        if cliente_id is None:
+            errors.append({'index': index, 'error': "Cliente è obbligatorio"})
+        elif riga['cliente_id'] and cliente_id not in clienti:
+            errors.append({'index': index, 'error': f"Cliente non trovato: {cliente_id}"})
+        elif proprietari - {cliente_id}:
+            errors.append({'index': index, 'error': "Cascina o terreni di un altro cliente"})
+        else:
+            riga['cliente_id'] = cliente_id
+
+    if errors:
+        raise BulkCreationError(f"{len(errors)} destinazioni non valide", errors)
+    return righe
+
+
+def create_treatments(targets, prodotti, data_esecuzione=None):
+    """
+    Crea un trattamento programmato per ogni destinazione, tutti con la stessa miscela.
+
+    Args:
+        targets: [{'livello_applicazione': 'cliente'|'cascina'|'terreno', 'cliente': id,
+                   'cascina': id, 'terreni_selezionati': [id, ...]}, ...]
+        prodotti: [{'prodotto_id': id, 'quantita_per_ettaro': numero}, ...]
+        data_esecuzione: data ISO opzionale, uguale per tutti
+
+    Returns:
+        lista di dict {'index', 'trattamento_id', 'cliente_id', 'cascina_id'} nell'ordine
+        delle destinazioni; BulkCreationError se qualcosa non è valido (niente viene creato)
+    """
+    data = _parse_data(data_esecuzione)
+    miscela = _parse_miscela(prodotti)
+    righe = _parse_destinazioni(targets)
+
+    with transaction.atomic():
+        trattamenti = Trattamento.objects.bulk_create([
+            Trattamento(
+                cliente_id=riga['cliente_id'],
+                cascina_id=riga['cascina_id'],
+                livello_applicazione=riga['livello_applicazione'],
+                data_esecuzione=data,
+                stato='programmato',
+            )
+            for riga in righe
+        ])
+
+        TrattamentoTerreno = Trattamento.terreni.through
+        TrattamentoTerreno.objects.bulk_create([
+            TrattamentoTerreno(trattamento_id=trattamento.pk, terreno_id=terreno_id)
+            for trattamento, riga in zip(trattamenti, righe)
+            for terreno_id in riga['terreni_ids']
+        ])
+        TrattamentoProdotto.objects.bulk_create([
+            TrattamentoProdotto(trattamento_id=trattamento.pk, prodotto_id=prodotto_id, quantita_per_ettaro=quantita)
+            for trattamento in trattamenti
+            for prodotto_id, quantita in miscela.items()
+        ])
+
+    return [
+        {
+            'index': index,
+            'trattamento_id': trattamento.pk,
+            'cliente_id': trattamento.cliente_id,
+            'cascina_id': trattamento.cascina_id,
+        }
+        for index, trattamento in enumerate(trattamenti)
+    ]
@@ -0,0 +1,127 @@
+# domenico/communication_preview.py
+# Anteprima della comunicazione dei trattamenti raggruppata per azienda, calcolata dal
+# database con una query per livello: aziende (superficie e numero di trattamenti
+# aggregati), trattamenti (superficie interessata già calcolata), prodotti con le dosi e
+# nomi dei terreni. Niente get_superficie_interessata() riga per riga.
+
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, Count, DecimalField, F, Func, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Terreno, Trattamento, TrattamentoProdotto
+
+SUPERFICIE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _somma_superfici(**filtri):
+    """Subquery scalare: SUM(superficie) dei terreni filtrati (Func evita il GROUP BY)"""
+    somma = Terreno.objects.filter(**filtri).order_by().annotate(
+        totale=Func(F('superficie'), function='SUM', output_field=SUPERFICIE_FIELD)
+    ).values('totale')
+    return Coalesce(Subquery(somma, output_field=SUPERFICIE_FIELD), Value(Decimal('0')), output_field=SUPERFICIE_FIELD)
+
+
+def superficie_interessata():
+    """
+    Espressione equivalente a Trattamento.get_superficie_interessata(): tutti i terreni
+    del cliente, della cascina o solo i terreni selezionati, secondo il livello
+    """
+    return Case(
+        When(livello_applicazione='cliente', then=_somma_superfici(cascina__cliente=OuterRef('cliente_id'))),
+        When(
+            livello_applicazione='cascina', cascina__isnull=False,
+            then=_somma_superfici(cascina=OuterRef('cascina_id'))
+        ),
+        When(livello_applicazione='terreno', then=_somma_superfici(trattamenti=OuterRef('pk'))),
+        default=Value(Decimal('0')),
+        output_field=SUPERFICIE_FIELD,
+    )
+
+
+def _float(value):
+    return float(value) if value else 0.0
+
+
+def build_preview(trattamenti_ids, exclude_communicated=False):
+    """
+    Anteprima dei trattamenti selezionati, per azienda (chiave: id del cliente, così due
+    aziende con lo stesso nome restano distinte).
+
+    Returns:
+        (stats, companies): stats è un dict con i conteggi, companies un generatore di
+        dict per azienda nel formato del wizard; tutte le query sono già eseguite
+    """
+    trattamenti = Trattamento.objects.filter(id__in=trattamenti_ids)
+    if exclude_communicated:
+        trattamenti = trattamenti.exclude(stato='comunicato')
+
+    clienti = list(
+        trattamenti.order_by().values('cliente_id', 'cliente__nome').annotate(
+            count_trattamenti=Count('id'),
+            superficie_totale=Sum(superficie_interessata()),
+        ).order_by('cliente__nome', 'cliente_id')
+    )
+    stats = {
+        'trattamenti_count': sum(c['count_trattamenti'] for c in clienti),
+        'clienti_count': len(clienti),
+    }
+    if not clienti:
+        return stats, iter(())
+
+    per_cliente = defaultdict(list)
+    for t in trattamenti.annotate(superficie=superficie_interessata()).values(
+        'id', 'cliente_id', 'cascina__nome', 'data_esecuzione', 'stato', 'superficie'
+    ).order_by('-data_inserimento', 'id'):
+        per_cliente[t['cliente_id']].append(t)
+
+    ids = [t['id'] for righe in per_cliente.values() for t in righe]
+    prodotti = defaultdict(list)
+    for tp in TrattamentoProdotto.objects.filter(trattamento_id__in=ids).values(
+        'trattamento_id', 'prodotto__nome', 'prodotto__unita_misura', 'quantita_per_ettaro'
+    ).order_by('trattamento_id', 'id'):
+        prodotti[tp['trattamento_id']].append({
+            'nome': tp['prodotto__nome'],
+            'dose': _float(tp['quantita_per_ettaro']),
+            'unita_misura': tp['prodotto__unita_misura'] or 'L',
+        })
+
+    terreni = defaultdict(list)
+    for trattamento_id, nome in Trattamento.terreni.through.objects.filter(trattamento_id__in=ids).values_list(
+        'trattamento_id', 'terreno__nome'
+    ).order_by('trattamento_id', 'terreno_id'):
+        terreni[trattamento_id].append(nome)
+
+    def companies():
+        for cliente in clienti:
+            yield {
+                'id': cliente['cliente_id'],
+                'nome': cliente['cliente__nome'],
+                'superficie_totale': _float(cliente['superficie_totale']),
+                'count_trattamenti': cliente['count_trattamenti'],
+                'trattamenti': [
+                    {
+                        'id': t['id'],
+                        'cascina_nome': t['cascina__nome'] or '',
+                        'data_programmata': t['data_esecuzione'].strftime('%d/%m/%Y') if t['data_esecuzione'] else '',
+                        'superficie': _float(t['superficie']),
+                        'prodotti': prodotti[t['id']],
+                        'stato': t['stato'],
+                        'terreni_nomi': terreni[t['id']],
+                    }
+                    for t in per_cliente[cliente['cliente_id']]
+                ],
+            }
+
+    return stats, companies()
+
+
+def stream_preview_json(stats, companies):
+    """Corpo JSON della risposta, un'azienda per blocco"""
+    yield '{"success": true, "stats": %s, "companies": [' % json.dumps(stats, cls=DjangoJSONEncoder)
+    for i, company in enumerate(companies):
+        yield (',' if i else '') + json.dumps(company, cls=DjangoJSONEncoder)
+    yield ']}'
@@ -0,0 +1,146 @@
+# domenico/content_store.py
+# Archivio dei contenuti delle comunicazioni: testi compressi e PDF indirizzati per hash
+
+import hashlib
+import logging
+import zlib
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Dizionari di compressione zlib: contengono le parti fisse dei corpi email generati
+# da generate_email_body / generate_digest_email_body, così ogni corpo salvato costa
+# poco più dei soli campi variabili. I dizionari già usati NON vanno mai modificati:
+# per cambiarli si aggiunge una nuova versione e si aggiorna DIZIONARIO_CORRENTE.
+DIZIONARI = {
+    1: """
+Gentile Contoterzista,
+
+in allegato la comunicazione riepilogativa di  trattamenti.
+
+RIEPILOGO TRATTAMENTI:
+I dettagli di prodotti e quantità per ogni trattamento sono nel PDF allegato.
+
+Si prega di confermare la ricezione e di comunicare l'avvenuta esecuzione dei trattamenti.
+
+Gentile Contoterzista,
+
+in allegato la comunicazione per il trattamento #.
+
+DETTAGLI TRATTAMENTO:
+• Cliente: Azienda Agricola
+• Superficie interessata:  ettari
+• Stato: Programmato
+• Data esecuzione prevista: /2025
+• Cascina: Cascina
+• Terreni:
+• Prodotti:  prodotti specificati
+
+PRODOTTI E QUANTITÀ:
+• : 1.000 L/ha (Totale: .000 L)
+• : 0.500 kg/ha (Totale: .000 kg)
+
+NOTE SPECIALI:
+
+Generato con: WEASYPRINT
+
+Si prega di confermare la ricezione e di comunicare l'avvenuta esecuzione del trattamento.
+
+Per qualsiasi chiarimento, non esitate a contattarci.
+
+Cordiali saluti,
+Domenico Franco
+Sistema di Gestione Trattamenti Agricoli
+@gmail.com, @libero.it, @hotmail.it, @outlook.it, @pec.it, @example.com
+""".encode('utf-8'),
+}
+
+DIZIONARIO_CORRENTE = 1
+
+# Percorso (nello storage di default) degli allegati PDF archiviati
+ALLEGATI_PATH = 'comunicazioni/allegati'
+
+# I contenuti più recenti non vengono toccati dalla pulizia degli orfani: un
+# ComunicazioneTrattamento.save() in corso potrebbe averli appena creati o riusati
+MARGINE_ORFANI = timedelta(hours=1)
+
+
+def calcola_hash(raw):
+    """SHA-256 esadecimale del contenuto"""
+    return hashlib.sha256(raw).hexdigest()
+
+
+def comprimi(raw, dizionario=DIZIONARIO_CORRENTE):
+    """Comprime i byte con il dizionario indicato (0 = nessun dizionario)"""
+    if dizionario:
+        compressore = zlib.compressobj(9, zdict=DIZIONARI[dizionario])
+    else:
+        compressore = zlib.compressobj(9)
+    return compressore.compress(raw) + compressore.flush()
+
+
+def decomprimi(dati, dizionario):
+    """Inverso di comprimi()"""
+    if dizionario:
+        decompressore = zlib.decompressobj(zdict=DIZIONARI[dizionario])
+    else:
+        decompressore = zlib.decompressobj()
+    return decompressore.decompress(bytes(dati)) + decompressore.flush()
+
+
+def percorso_allegato(hash_allegato):
+    return f"{ALLEGATI_PATH}/{hash_allegato[:2]}/{hash_allegato}.pdf"
+
+
+def salva_allegato(pdf_content):
+    """
+    Archivia un PDF nello storage indirizzandolo per hash (se già presente non
+    viene riscritto).
+
+    Returns:
+        hash del PDF
+    """
+    hash_allegato = calcola_hash(pdf_content)
+    percorso = percorso_allegato(hash_allegato)
+    if not default_storage.exists(percorso):
+        default_storage.save(percorso, ContentFile(pdf_content))
+        logger.info(f"Allegato archiviato: {percorso} ({len(pdf_content)} byte)")
+    return hash_allegato
+
+
+def apri_allegato(hash_allegato):
+    """Restituisce il contenuto del PDF archiviato, o None se non esiste"""
+    percorso = percorso_allegato(hash_allegato)
+    if not default_storage.exists(percorso):
+        return None
+    with default_storage.open(percorso, 'rb') as allegato:
+        return allegato.read()
+
+
+def elimina_contenuti_orfani():
+    """
+    Elimina i ContenutoComunicazione non più referenziati da nessuna comunicazione
+    (es. rimasti dopo la cancellazione dei trattamenti).
+
+    Returns:
+        numero di contenuti eliminati
+    """
+    from .models import ComunicazioneTrattamento, ContenutoComunicazione
+
+    usati_destinatari = ComunicazioneTrattamento.objects.filter(
+        contenuto_destinatari__isnull=False
+    ).values('contenuto_destinatari')
+    usati_corpo = ComunicazioneTrattamento.objects.filter(
+        contenuto_corpo__isnull=False
+    ).values('contenuto_corpo')
+
+    eliminati, _ = ContenutoComunicazione.objects.filter(
+        creato_il__lt=timezone.now() - MARGINE_ORFANI
+    ).exclude(hash__in=usati_destinatari).exclude(hash__in=usati_corpo).delete()
+    if eliminati:
+        logger.info(f"Contenuti comunicazione orfani eliminati: {eliminati}")
+    return eliminati
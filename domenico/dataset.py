@@ -0,0 +1,338 @@
+# domenico/dataset.py
+# Generatore deterministico di dataset sintetici (clienti, cascine, terreni, prodotti,
+# trattamenti per stagione, comunicazioni, log di attività) per benchmark e prove di carico.
+# Tutto viene inserito con bulk_create a blocchi di clienti: nessun segnale, memoria costante.
+
+import logging
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .activity_rollup import rebuild_rollup
+from .content_store import DIZIONARIO_CORRENTE, calcola_hash, comprimi
+from .models import (
+    ActivityLog, Cascina, Cliente, ComunicazioneTrattamento, ContattoEmail, ContenutoComunicazione,
+    Contoterzista, PrincipioAttivo, Prodotto, StartupChecksum, Terreno, Trattamento, TrattamentoProdotto
+)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+# Registrato solo quando il generatore popola un database vuoto (vedi is_synthetic_database)
+SYNTHETIC_MARKER = 'dataset:sintetico'
+CLIENTI_PER_BLOCCO = 100
+
+# Dimensioni predefinite; ogni valore può essere sovrascritto singolarmente
+SCALE = {
+    'small': {
+        'clienti': 20, 'cascine_per_cliente': 2, 'terreni_per_cascina': 4, 'prodotti': 40,
+        'contoterzisti': 5, 'trattamenti_per_stagione': 10, 'stagioni': 1, 'prodotti_per_trattamento': 2,
+        'attivita': 500,
+    },
+    'medium': {
+        'clienti': 200, 'cascine_per_cliente': 3, 'terreni_per_cascina': 5, 'prodotti': 150,
+        'contoterzisti': 15, 'trattamenti_per_stagione': 30, 'stagioni': 2, 'prodotti_per_trattamento': 3,
+        'attivita': 20000,
+    },
+    'large': {
+        'clienti': 2000, 'cascine_per_cliente': 3, 'terreni_per_cascina': 6, 'prodotti': 400,
+        'contoterzisti': 30, 'trattamenti_per_stagione': 50, 'stagioni': 3, 'prodotti_per_trattamento': 3,
+        'attivita': 1000000,
+    },
+}
+
+UNITA_MISURA = ['L', 'kg', 'g', 'ml']
+LIVELLI = ['cliente', 'cascina', 'cascina', 'terreno']
+NOMI_CASCINE = ['Nord', 'Sud', 'Est', 'Ovest', 'Alta', 'Bassa', 'Vecchia', 'Nuova']
+NOMI_TERRENI = ['Vigna', 'Campo', 'Frutteto', 'Prato', 'Noccioleto', 'Seminativo']
+
+# Stagione dei trattamenti: da marzo a ottobre
+INIZIO_STAGIONE = (3, 1)
+GIORNI_STAGIONE = 245
+
+
+def scale_params(scale='small', **overrides):
+    """Parametri della scala richiesta con le sostituzioni non nulle"""
+    if scale not in SCALE:
+        raise ValueError(f"Scala sconosciuta: {scale} (disponibili: {', '.join(SCALE)})")
+    params = dict(SCALE[scale])
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+
+@contextmanager
+def _explicit_timestamps(*fields):
+    """
+    Disattiva auto_now_add sui campi indicati (model, nome) per poter inserire date
+    storiche con bulk_create
+    """
+    campi = [model._meta.get_field(nome) for model, nome in fields]
+    originali = [campo.auto_now_add for campo in campi]
+    for campo in campi:
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, originale in zip(campi, originali):
+            campo.auto_now_add = originale
+
+
+def _aware(giorno, rng):
+    return timezone.make_aware(datetime.combine(giorno, time(rng.randint(7, 18), rng.randint(0, 59))))
+
+
+def _contenuto(testo, contenuti):
+    """ContenutoComunicazione per il testo (deduplicato per hash, inserito a fine blocco)"""
+    raw = testo.encode('utf-8')
+    chiave = calcola_hash(raw)
+    if chiave not in contenuti:
+        contenuti[chiave] = ContenutoComunicazione(
+            hash=chiave, dati=comprimi(raw), dizionario=DIZIONARIO_CORRENTE, dimensione=len(raw)
+        )
+    return chiave
+
+
+class DatasetGenerator:
+    """
+    Genera il dataset con un generatore casuale a seme fisso: stessi parametri e stesso
+    seme producono gli stessi dati (a parte i timestamp automatici e i log di attività,
+    distribuiti negli ultimi 90 giorni rispetto a oggi perché le dashboard li leggono così).
+    """
+
+    def __init__(self, params, seed=42, anno=None, progress=None):
+        self.params = params
+        self.seed = seed
+        self.anno = anno or timezone.localdate().year
+        self.progress = progress or (lambda messaggio: None)
+        self.rng = random.Random(seed)
+        self.counts = {}
+
+    def _count(self, nome, n):
+        self.counts[nome] = self.counts.get(nome, 0) + n
+
+    def generate(self):
+        """
+        Returns:
+            dict modello -> righe inserite
+        """
+        with _explicit_timestamps(
+            (Trattamento, 'data_inserimento'),
+            (ComunicazioneTrattamento, 'data_invio'),
+            (ActivityLog, 'timestamp'),
+        ):
+            with transaction.atomic():
+                contoterzisti = self._reference_data()
+            clienti = self.params['clienti']
+            for inizio in range(0, clienti, CLIENTI_PER_BLOCCO):
+                with transaction.atomic():
+                    self._clienti(inizio, min(inizio + CLIENTI_PER_BLOCCO, clienti), contoterzisti)
+                self.progress(f"Clienti {min(inizio + CLIENTI_PER_BLOCCO, clienti)}/{clienti}")
+            self._attivita()
+        return self.counts
+
+    # ---------- Anagrafiche comuni ----------
+
+    def _reference_data(self):
+        rng = self.rng
+        contoterzisti = Contoterzista.objects.bulk_create([
+            Contoterzista(nome=f"Contoterzista {n:03d}", email=f"contoterzista{n}@example.com")
+            for n in range(1, self.params['contoterzisti'] + 1)
+        ], batch_size=BATCH_SIZE)
+        self._count('contoterzisti', len(contoterzisti))
+
+        # Nomi unici anche se il database contiene già principi attivi
+        prefisso = f"PA-{self.seed}-"
+        esistenti = set(PrincipioAttivo.objects.filter(nome__startswith=prefisso).values_list('nome', flat=True))
+        PrincipioAttivo.objects.bulk_create([
+            PrincipioAttivo(nome=f"{prefisso}{n:04d}")
+            for n in range(1, max(1, self.params['prodotti'] // 2) + 1)
+            if f"{prefisso}{n:04d}" not in esistenti
+        ], batch_size=BATCH_SIZE)
+        principi = list(PrincipioAttivo.objects.filter(nome__startswith=prefisso))
+        self._count('principi_attivi', len(principi))
+
+        self.prodotti = Prodotto.objects.bulk_create([
+            Prodotto(nome=f"Prodotto {n:04d}", unita_misura=rng.choice(UNITA_MISURA))
+            for n in range(1, self.params['prodotti'] + 1)
+        ], batch_size=BATCH_SIZE)
+        self._count('prodotti', len(self.prodotti))
+
+        legami = [
+            Prodotto.principi_attivi.through(prodotto_id=prodotto.id, principioattivo_id=principio.id)
+            for prodotto in self.prodotti
+            for principio in rng.sample(principi, min(len(principi), rng.randint(1, 2)))
+        ]
+        Prodotto.principi_attivi.through.objects.bulk_create(legami, batch_size=BATCH_SIZE)
+        return contoterzisti
+
+    # ---------- Aziende e trattamenti ----------
+
+    def _clienti(self, inizio, fine, contoterzisti):
+        rng = self.rng
+        p = self.params
+
+        clienti = Cliente.objects.bulk_create([
+            Cliente(nome=f"Azienda Agricola {n + 1:05d}") for n in range(inizio, fine)
+        ], batch_size=BATCH_SIZE)
+        contatti = [
+            ContattoEmail(cliente=cliente, nome=f"{ruolo} {cliente.nome}", email=f"{ruolo.lower()}{cliente.id}@example.com")
+            for cliente in clienti
+            for ruolo in ('Titolare', 'Agronomo')
+        ]
+        ContattoEmail.objects.bulk_create(contatti, batch_size=BATCH_SIZE)
+
+        cascine = Cascina.objects.bulk_create([
+            Cascina(
+                nome=f"Cascina {NOMI_CASCINE[n % len(NOMI_CASCINE)]} {n + 1}",
+                cliente=cliente,
+                contoterzista=rng.choice(contoterzisti) if contoterzisti and rng.random() < 0.8 else None,
+            )
+            for cliente in clienti
+            for n in range(p['cascine_per_cliente'])
+        ], batch_size=BATCH_SIZE)
+
+        terreni = Terreno.objects.bulk_create([
+            Terreno(
+                nome=f"{NOMI_TERRENI[n % len(NOMI_TERRENI)]} {n + 1}",
+                cascina=cascina,
+                superficie=Decimal(rng.randint(20, 2500)) / 100,
+            )
+            for cascina in cascine
+            for n in range(p['terreni_per_cascina'])
+        ], batch_size=BATCH_SIZE)
+
+        cascine_cliente, terreni_cascina = {}, {}
+        for cascina in cascine:
+            cascine_cliente.setdefault(cascina.cliente_id, []).append(cascina)
+        for terreno in terreni:
+            terreni_cascina.setdefault(terreno.cascina_id, []).append(terreno)
+
+        trattamenti, terreni_trattamento = [], []
+        for cliente in clienti:
+            for stagione in range(self.anno - p['stagioni'] + 1, self.anno + 1):
+                inizio_stagione = date(stagione, *INIZIO_STAGIONE)
+                for _ in range(p['trattamenti_per_stagione']):
+                    livello = rng.choice(LIVELLI) if cascine_cliente.get(cliente.id) else 'cliente'
+                    cascina = rng.choice(cascine_cliente[cliente.id]) if livello != 'cliente' else None
+                    esecuzione = inizio_stagione + timedelta(days=rng.randrange(GIORNI_STAGIONE))
+                    if stagione < self.anno:
+                        stato = 'completato' if rng.random() < 0.9 else 'annullato'
+                    else:
+                        stato = rng.choice(['programmato', 'programmato', 'comunicato', 'completato', 'annullato'])
+                    trattamenti.append(Trattamento(
+                        cliente=cliente,
+                        cascina=cascina,
+                        livello_applicazione=livello,
+                        stato=stato,
+                        data_inserimento=_aware(esecuzione - timedelta(days=rng.randint(3, 20)), rng),
+                        data_comunicazione=_aware(esecuzione - timedelta(days=rng.randint(1, 3)), rng)
+                        if stato in ('comunicato', 'completato') else None,
+                        data_esecuzione=esecuzione if stato != 'programmato' or rng.random() < 0.7 else None,
+                    ))
+                    if livello == 'terreno':
+                        candidati = terreni_cascina.get(cascina.id, [])
+                        terreni_trattamento.append(rng.sample(candidati, min(len(candidati), rng.randint(1, 3))))
+                    else:
+                        terreni_trattamento.append([])
+
+        trattamenti = Trattamento.objects.bulk_create(trattamenti, batch_size=BATCH_SIZE)
+        Trattamento.terreni.through.objects.bulk_create([
+            Trattamento.terreni.through(trattamento_id=trattamento.id, terreno_id=terreno.id)
+            for trattamento, selezionati in zip(trattamenti, terreni_trattamento)
+            for terreno in selezionati
+        ], batch_size=BATCH_SIZE)
+
+        righe = [
+            TrattamentoProdotto(
+                trattamento=trattamento,
+                prodotto=prodotto,
+                quantita_per_ettaro=Decimal(rng.randint(50, 5000)) / 1000,
+            )
+            for trattamento in trattamenti
+            for prodotto in rng.sample(self.prodotti, min(len(self.prodotti), p['prodotti_per_trattamento']))
+        ]
+        TrattamentoProdotto.objects.bulk_create(righe, batch_size=BATCH_SIZE)
+
+        # Una comunicazione per ogni trattamento comunicato o completato
+        contenuti, comunicazioni = {}, []
+        email_cliente = {}
+        for contatto in contatti:
+            email_cliente.setdefault(contatto.cliente_id, []).append(contatto.email)
+        for trattamento in trattamenti:
+            if trattamento.data_comunicazione is None:
+                continue
+            comunicazioni.append(ComunicazioneTrattamento(
+                trattamento=trattamento,
+                data_invio=trattamento.data_comunicazione,
+                contenuto_destinatari_id=_contenuto(', '.join(email_cliente[trattamento.cliente_id]), contenuti),
+                oggetto=f"Comunicazione trattamento #{trattamento.id}",
+                contenuto_corpo_id=_contenuto(
+                    f"Gentile Contoterzista,\n\nin allegato la comunicazione per il trattamento #{trattamento.id}.",
+                    contenuti
+                ),
+                allegati=f"trattamento_{trattamento.id}.pdf",
+                inviato_con_successo=rng.random() < 0.97,
+            ))
+        ContenutoComunicazione.objects.bulk_create(contenuti.values(), batch_size=BATCH_SIZE, ignore_conflicts=True)
+        ComunicazioneTrattamento.objects.bulk_create(comunicazioni, batch_size=BATCH_SIZE)
+
+        for nome, n in (
+            ('clienti', len(clienti)), ('contatti_email', len(contatti)), ('cascine', len(cascine)),
+            ('terreni', len(terreni)), ('trattamenti', len(trattamenti)), ('trattamenti_prodotti', len(righe)),
+            ('comunicazioni', len(comunicazioni)),
+        ):
+            self._count(nome, n)
+
+    # ---------- Log di attività ----------
+
+    def _attivita(self):
+        rng = self.rng
+        totale = self.params['attivita']
+        tipi = [codice for codice, _ in ActivityLog.ACTIVITY_TYPES]
+        adesso = timezone.now()
+        periodo = 90 * 24 * 3600
+
+        for inizio in range(0, totale, BATCH_SIZE * 5):
+            blocco = []
+            for n in range(inizio, min(inizio + BATCH_SIZE * 5, totale)):
+                tipo = rng.choice(tipi)
+                blocco.append(ActivityLog(
+                    activity_type=tipo,
+                    title=f"Attività {n + 1}",
+                    description=f"Log sintetico {tipo}",
+                    timestamp=adesso - timedelta(seconds=rng.randrange(periodo)),
+                    extra_data={'dataset_seed': self.seed},
+                ))
+            with transaction.atomic():
+                ActivityLog.objects.bulk_create(blocco, batch_size=BATCH_SIZE)
+            self.progress(f"Log di attività {inizio + len(blocco)}/{totale}")
+
+        if totale:
+            # bulk_create non passa dai segnali che aggiornano il riepilogo giornaliero
+            rebuild_rollup(start=(adesso - timedelta(seconds=periodo)).date())
+        self._count('attivita', totale)
+
+
+def generate_dataset(scale='small', seed=42, anno=None, progress=None, **overrides):
+    """
+    Genera un dataset della scala indicata (vedi SCALE), con eventuali parametri sostituiti.
+
+    Returns:
+        dict modello -> righe inserite
+    """
+    params = scale_params(scale, **overrides)
+    logger.info(f"Generazione dataset {scale} (seed {seed}): {params}")
+    vuoto = not Cliente.objects.exists()
+    counts = DatasetGenerator(params, seed=seed, anno=anno, progress=progress).generate()
+    if vuoto:
+        StartupChecksum.objects.update_or_create(nome=SYNTHETIC_MARKER, defaults={'checksum': f'{scale}:{seed}'})
+    return counts
+
+
+def is_synthetic_database():
+    """True se i dati del database sono stati generati da generate_dataset partendo da un database vuoto"""
+    return StartupChecksum.objects.filter(nome=SYNTHETIC_MARKER).exists()
@@ -0,0 +1,42 @@
+# domenico/db_connections.py
+# Stato delle connessioni al database del processo corrente: connessioni persistenti o
+# pool di psycopg 3 (DB_POOL=1, vedi settings)
+
+from django.db import connections
+
+
+def _existing_pool(connection):
+    # Non usare connection.pool: creerebbe il pool solo per leggerne le statistiche
+    pools = getattr(type(connection), '_connection_pools', {})
+    return pools.get(connection.alias)
+
+
+def connection_stats():
+    """
+    Returns:
+        dict alias -> configurazione e, se il pool è attivo, le sue statistiche
+        (pool_size, pool_available, requests_waiting, requests_num, requests_wait_ms, ...)
+    """
+    stats = {}
+    for connection in connections.all(initialized_only=True):
+        settings_dict = connection.settings_dict
+        pooled = bool(settings_dict.get('OPTIONS', {}).get('pool'))
+        info = {
+            'vendor': connection.vendor,
+            'pooled': pooled,
+            'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+            'health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+            'connected': connection.connection is not None,
+        }
+        pool = _existing_pool(connection) if pooled else None
+        if pool is not None:
+            info['pool'] = pool.get_stats()
+        stats[connection.alias] = info
+    return stats
+
+
+def close_pools():
+    """Chiude i pool del processo (nel master di gunicorn prima del fork)"""
+    for connection in connections.all(initialized_only=True):
+        if _existing_pool(connection) is not None:
+            connection.close_pool()
@@ -0,0 +1,97 @@
+# domenico/db_routing.py
+# Letture delle pagine pesanti (dashboard, tabelle, ricerche, anteprime) sulla replica in
+# streaming, scritture sempre sul primario. Dopo una scrittura le letture della stessa
+# sessione restano sul primario per REPLICA_PIN_SECONDS (read-your-writes).
+
+import logging
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ALIAS = 'replica'
+PIN_COOKIE = 'db_pin'
+
+# Stato della richiesta corrente (un contesto per thread del worker)
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned = ContextVar('db_pinned', default=False)
+_wrote = ContextVar('db_wrote', default=False)
+
+
+def replica_configured():
+    return getattr(settings, 'REPLICA_READS', False) and REPLICA_ALIAS in connections
+
+
+def reading_from_replica():
+    """True se le letture correnti vanno alla replica"""
+    return _replica_reads.get() and not _pinned.get() and not _wrote.get() and replica_configured()
+
+
+class ReplicaRouter:
+    """
+    Router: la replica riceve solo le letture delle view marcate con @read_replica.
+    Nessuna regola per le migrazioni: `migrate` agisce solo sull'alias richiesto (default),
+    la replica in streaming riceve lo schema dal primario.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Da qui in poi la richiesta (e la sessione, vedi middleware) legge dal primario
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Stessi dati su entrambi gli alias
+        return True
+
+
+class ReplicaPinningMiddleware:
+    """
+    Gestisce lo stato di routing per richiesta e il pin sul primario dopo una scrittura:
+    un cookie con durata REPLICA_PIN_SECONDS, così le richieste successive della stessa
+    sessione non leggono dati che la replica non ha ancora ricevuto.
+
+    Va messo prima di SessionMiddleware, così anche il salvataggio della sessione conta
+    come scrittura.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned_token = _pinned.set(PIN_COOKIE in request.COOKIES)
+        wrote_token = _wrote.set(False)
+        replica_token = _replica_reads.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE, '1',
+                    max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                    httponly=True,
+                    samesite='Lax',
+                )
+            return response
+        finally:
+            _replica_reads.reset(replica_token)
+            _wrote.reset(wrote_token)
+            _pinned.reset(pinned_token)
+
+
+def read_replica(view_func):
+    """Decorator: le letture della view vanno alla replica (se configurata e non in pin)"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        token = _replica_reads.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
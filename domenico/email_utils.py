@@ -10,36 +10,15 @@ from django.utils import timezone
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 
+from . import pdf_engine
+
 # Configura logging
 logger = logging.getLogger('domenico.email_utils')
 
-try:
-    from weasyprint import HTML, CSS
-    from weasyprint.text.fonts import FontConfiguration
-    WEASYPRINT_AVAILABLE = True
-    PDF_ENGINE="weasyprint"
-    print("✅ WeasyPrint loaded successfully")
-
-except ImportError as e:
-    print(f"⚠️  WeasyPrint not available: {e}")
-    WEASYPRINT_AVAILABLE = False
-    PDF_ENGINE = "None"
-    
-    # Classi dummy per evitare errori
-    class HTML:
-        def __init__(self, *args, **kwargs):
-            pass
-        def write_pdf(self, target):
-            raise NotImplementedError("PDF generation not available - install WeasyPrint dependencies")
-    
-    class CSS:
-        def __init__(self, *args, **kwargs):
-            pass
-
 def generate_pdf_comunicazione(trattamento_id):
     """Genera un PDF per la comunicazione del trattamento"""
     
-    if not WEASYPRINT_AVAILABLE:
+    if not pdf_engine.is_available():
         raise NotImplementedError("PDF generation not available")
     
     try:
@@ -61,14 +40,8 @@ def generate_pdf_comunicazione(trattamento_id):
         template = get_template('comunicazione_trattamento.html')
         html = template.render(context)
         
-            # Usa WeasyPrint (più moderno e affidabile)
-        logger.info(f"Generazione PDF con WeasyPrint per trattamento {trattamento_id}")
-            
-            # Crea la configurazione font
-        font_config = FontConfiguration()
-            
-            # CSS aggiuntivo per WeasyPrint
-        css = CSS(string='''
+        logger.info(f"Generazione PDF con {pdf_engine.engine_name()} per trattamento {trattamento_id}")
+        pdf_bytes = pdf_engine.html_to_pdf(html, css='''
                 @page {
                     margin: 2cm;
                     size: A4;
@@ -76,13 +49,9 @@ def generate_pdf_comunicazione(trattamento_id):
                 body {
                     font-family: Arial, sans-serif;
                 }
-            ''', font_config=font_config)
-            
-            # Genera il PDF
-        html_doc = HTML(string=html)
-        pdf_bytes = html_doc.write_pdf(stylesheets=[css], font_config=font_config)
+            ''')
         
-        logger.info(f"PDF generato con successo con WeasyPrint per trattamento {trattamento_id}")
+        logger.info(f"PDF generato con successo per trattamento {trattamento_id}")
         return pdf_bytes
             
     except Exception as e:
@@ -90,58 +59,68 @@ def generate_pdf_comunicazione(trattamento_id):
         raise Exception(f"Errore nella generazione del PDF: {str(e)}")
 
 # Il resto delle funzioni rimane identico...
-def send_trattamento_communication(trattamento_id, force_send=False):
+def prepare_trattamento_communication(trattamento_id, force_send=False, include_pdf=True):
     """
-    Invia la comunicazione email per un trattamento
-    
+    Prepara l'email di comunicazione per un trattamento (destinatari, PDF, corpo)
+    senza inviarla.
+
     Args:
-        trattamento_id: ID del trattamento
-        force_send: Se True, invia anche se già comunicato
-    
+        include_pdf: se False non genera il PDF né l'email (usato dall'outbox,
+            che genera l'allegato al momento dell'invio)
+
     Returns:
-        dict con risultato dell'invio
+        dict con 'success'; se True contiene anche 'email', 'trattamento',
+        'destinatari', 'destinatari_info', 'oggetto', 'corpo_email', 'filename'
     """
-    try:
-        from .models import Trattamento, ComunicazioneTrattamento
-        
-        trattamento = Trattamento.objects.select_related(
-            'cliente'
-        ).prefetch_related(
-            'cliente__contatti_email'
-        ).get(id=trattamento_id)
-        
-        logger.info(f"Iniziando comunicazione per trattamento {trattamento_id}")
-        
-        # Verifica se il trattamento può essere comunicato
-        if trattamento.stato not in ['programmato', 'comunicato'] and not force_send:
-            return {
-                'success': False,
-                'error': f'Il trattamento è in stato "{trattamento.get_stato_display()}" e non può essere comunicato'
-            }
-        
-        # Ottieni i contatti email attivi per questo cliente
-        contatti_attivi = trattamento.cliente.contatti_email.filter(attivo=True).order_by('priorita', 'nome')
-        
-        if not contatti_attivi.exists():
-            return {
-                'success': False,
-                'error': 'Nessun contatto email attivo trovato per questo cliente'
-            }
-        
-        # Prepara la lista dei destinatari
-        destinatari = []
-        destinatari_info = []
-        
-        for contatto in contatti_attivi:
-            destinatari.append(contatto.email)
-            destinatari_info.append({
-                'nome': contatto.nome,
-                'email': contatto.email,
-                'ruolo': contatto.ruolo
-            })
-        
-        logger.info(f"Invio a {len(destinatari)} destinatari: {', '.join(destinatari)}")
-        
+    from .models import Trattamento
+
+    trattamento = Trattamento.objects.select_related(
+        'cliente', 'cascina'
+    ).prefetch_related(
+        'cliente__contatti_email', 'terreni', 'trattamentoprodotto_set__prodotto'
+    ).get(id=trattamento_id)
+
+    # Verifica se il trattamento può essere comunicato
+    if trattamento.stato not in ['programmato', 'comunicato'] and not force_send:
+        return {
+            'success': False,
+            'error': f'Il trattamento è in stato "{trattamento.get_stato_display()}" e non può essere comunicato'
+        }
+
+    # Ottieni i contatti email per questo cliente
+    contatti_attivi = sorted(trattamento.cliente.contatti_email.all(), key=lambda c: c.nome)
+
+    if not contatti_attivi:
+        return {
+            'success': False,
+            'error': 'Nessun contatto email attivo trovato per questo cliente'
+        }
+
+    # Prepara la lista dei destinatari
+    destinatari = []
+    destinatari_info = []
+
+    for contatto in contatti_attivi:
+        destinatari.append(contatto.email)
+        destinatari_info.append({
+            'nome': contatto.nome,
+            'email': contatto.email,
+            'ruolo': getattr(contatto, 'ruolo', '')
+        })
+
+    # Prepara l'oggetto dell'email
+    oggetto = f"Trattamento #{trattamento.id} - {trattamento.cliente.nome}"
+    if trattamento.data_esecuzione:
+        oggetto += f" - Esecuzione prevista: {trattamento.data_esecuzione.strftime('%d/%m/%Y')}"
+
+    # Prepara il corpo dell'email
+    corpo_email = generate_email_body(trattamento)
+
+    filename = f"Trattamento_{trattamento.id}_{trattamento.cliente.nome.replace(' ', '_')}.pdf"
+
+    email = None
+    pdf_content = None
+    if include_pdf:
         # Genera il PDF
         try:
             pdf_content = generate_pdf_comunicazione(trattamento_id)
@@ -151,64 +130,110 @@ def send_trattamento_communication(trattamento_id, force_send=False):
                 'success': False,
                 'error': f'Errore nella generazione del PDF: {str(e)}'
             }
-        
-        # Prepara l'oggetto dell'email
-        oggetto = f"Trattamento #{trattamento.id} - {trattamento.cliente.nome}"
-        if trattamento.data_esecuzione_prevista:
-            oggetto += f" - Esecuzione prevista: {trattamento.data_esecuzione_prevista.strftime('%d/%m/%Y')}"
-        
-        # Prepara il corpo dell'email
-        corpo_email = generate_email_body(trattamento)
-        
-        # Crea l'email
+
+        # Crea l'email con il PDF allegato
+        email = EmailMultiAlternatives(
+            subject=oggetto,
+            body=corpo_email,
+            from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@gestionale.com'),
+            to=destinatari
+        )
+        email.attach(filename, pdf_content, 'application/pdf')
+
+    return {
+        'success': True,
+        'email': email,
+        'trattamento': trattamento,
+        'destinatari': destinatari,
+        'destinatari_info': destinatari_info,
+        'oggetto': oggetto,
+        'corpo_email': corpo_email,
+        'filename': filename,
+        'pdf_content': pdf_content,
+    }
+
+
+def record_trattamento_communication(prepared, invio_riuscito, errore_invio=''):
+    """
+    Registra la comunicazione nel database e aggiorna lo stato del trattamento
+
+    Returns:
+        dict con risultato dell'invio
+    """
+    from .models import ComunicazioneTrattamento
+    from .content_store import salva_allegato
+
+    trattamento = prepared['trattamento']
+
+    # Il PDF inviato viene archiviato per hash, così resta recuperabile com'era
+    allegato_hash = ''
+    if prepared.get('pdf_content'):
         try:
-            email = EmailMultiAlternatives(
-                subject=oggetto,
-                body=corpo_email,
-                from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@gestionale.com'),
-                to=destinatari
-            )
-            
-            # Allega il PDF
-            filename = f"Trattamento_{trattamento.id}_{trattamento.cliente.nome.replace(' ', '_')}.pdf"
-            email.attach(filename, pdf_content, 'application/pdf')
-            
-            # Invia l'email
-            email.send()
-            invio_riuscito = True
-            errore_invio = ""
-            logger.info(f"Email inviata con successo per trattamento {trattamento_id}")
-            
+            allegato_hash = salva_allegato(prepared['pdf_content'])
         except Exception as e:
-            invio_riuscito = False
-            errore_invio = str(e)
-            logger.error(f"Errore invio email per trattamento {trattamento_id}: {str(e)}")
-        
-        # Registra la comunicazione nel database
-        comunicazione = ComunicazioneTrattamento.objects.create(
-            trattamento=trattamento,
-            destinatari=', '.join(destinatari),
-            oggetto=oggetto,
-            corpo_email=corpo_email,
-            allegati=filename,
-            inviato_con_successo=invio_riuscito,
-            errore=errore_invio
-        )
-        
-        # Aggiorna lo stato del trattamento se l'invio è riuscito
-        if invio_riuscito and trattamento.stato == 'programmato':
-            trattamento.stato = 'comunicato'
-            trattamento.save()
-            logger.info(f"Stato trattamento {trattamento_id} aggiornato a 'comunicato'")
-        
-        return {
-            'success': invio_riuscito,
-            'comunicazione_id': comunicazione.id,
-            'destinatari': destinatari_info,
-            'destinatari_count': len(destinatari),
-            'error': errore_invio if not invio_riuscito else None,
-            'pdf_engine': PDF_ENGINE
-        }
+            logger.error(f"Errore archiviazione PDF per trattamento {trattamento.id}: {e}")
+
+    comunicazione = ComunicazioneTrattamento.objects.create(
+        trattamento=trattamento,
+        destinatari=', '.join(prepared['destinatari']),
+        oggetto=prepared['oggetto'],
+        corpo_email=prepared['corpo_email'],
+        allegati=prepared['filename'],
+        allegato_hash=allegato_hash,
+        inviato_con_successo=invio_riuscito,
+        errore=errore_invio or ''
+    )
+
+    # Aggiorna lo stato del trattamento se l'invio è riuscito
+    if invio_riuscito and trattamento.stato == 'programmato':
+        trattamento.stato = 'comunicato'
+        trattamento.data_comunicazione = timezone.now()
+        trattamento.save(update_fields=['stato', 'data_comunicazione', 'aggiornato_il'])
+        logger.info(f"Stato trattamento {trattamento.id} aggiornato a 'comunicato'")
+
+    return {
+        'success': invio_riuscito,
+        'comunicazione_id': comunicazione.id,
+        'destinatari': prepared['destinatari_info'],
+        'destinatari_count': len(prepared['destinatari']),
+        'error': errore_invio if not invio_riuscito else None,
+        'pdf_engine': pdf_engine.engine_name()
+    }
+
+
+def send_trattamento_communication(trattamento_id, force_send=False, session=None):
+    """
+    Invia la comunicazione email per un trattamento
+    
+    Args:
+        trattamento_id: ID del trattamento
+        force_send: Se True, invia anche se già comunicato
+        session: DispatchSession già aperta da riusare (opzionale)
+    
+    Returns:
+        dict con risultato dell'invio
+    """
+    try:
+        logger.info(f"Iniziando comunicazione per trattamento {trattamento_id}")
+
+        prepared = prepare_trattamento_communication(trattamento_id, force_send=force_send)
+        if not prepared['success']:
+            return prepared
+
+        logger.info(f"Invio a {len(prepared['destinatari'])} destinatari: {', '.join(prepared['destinatari'])}")
+
+        if session is not None:
+            esito = session.send(prepared['email'])
+        else:
+            from .mail_dispatch import MailDispatchService
+            esito = MailDispatchService().send_messages([prepared['email']])[0]
+
+        if esito['success']:
+            logger.info(f"Email inviata con successo per trattamento {trattamento_id}")
+        else:
+            logger.error(f"Errore invio email per trattamento {trattamento_id}: {esito['error']}")
+
+        return record_trattamento_communication(prepared, esito['success'], esito['error'])
         
     except Exception as e:
         logger.error(f"Errore generale nella comunicazione per trattamento {trattamento_id}: {str(e)}")
@@ -217,6 +242,28 @@ def send_trattamento_communication(trattamento_id, force_send=False):
             'error': f'Errore durante l\'invio: {str(e)}'
         }
 
+
+def send_trattamenti_communications(trattamenti_ids, force_send=False):
+    """
+    Invia le comunicazioni di più trattamenti riusando un'unica connessione SMTP
+    per batch (vedi MailDispatchService).
+
+    Returns:
+        dict {trattamento_id: risultato} con lo stesso formato di send_trattamento_communication
+    """
+    from .mail_dispatch import MailDispatchService
+
+    risultati = {}
+    with MailDispatchService().session() as session:
+        for trattamento_id in trattamenti_ids:
+            risultati[trattamento_id] = send_trattamento_communication(
+                trattamento_id, force_send=force_send, session=session
+            )
+
+    riusciti = sum(1 for r in risultati.values() if r['success'])
+    logger.info(f"Invio in blocco completato: {riusciti}/{len(risultati)} comunicazioni inviate")
+    return risultati
+
 def generate_email_body(trattamento):
     """Genera il corpo dell'email per la comunicazione"""
     corpo_email = f"""
@@ -230,8 +277,8 @@ DETTAGLI TRATTAMENTO:
 • Stato: {trattamento.get_stato_display()}
 """
     
-    if trattamento.data_esecuzione_prevista:
-        corpo_email += f"• Data esecuzione prevista: {trattamento.data_esecuzione_prevista.strftime('%d/%m/%Y')}\n"
+    if trattamento.data_esecuzione:
+        corpo_email += f"• Data esecuzione prevista: {trattamento.data_esecuzione.strftime('%d/%m/%Y')}\n"
     
     if trattamento.livello_applicazione == 'cascina' and trattamento.cascina:
         corpo_email += f"• Cascina: {trattamento.cascina.nome}\n"
@@ -249,15 +296,16 @@ DETTAGLI TRATTAMENTO:
     
     corpo_email += "\n"
     
-    if trattamento.note:
+    note = getattr(trattamento, 'note', '')
+    if note:
         corpo_email += f"""
 NOTE SPECIALI:
-{trattamento.note}
+{note}
 
 """
     
     corpo_email += f"""
-Generato con: {PDF_ENGINE.upper() if PDF_ENGINE else 'Sistema Standard'}
+Generato con: {pdf_engine.engine_name().upper()}
 
 Si prega di confermare la ricezione e di comunicare l'avvenuta esecuzione del trattamento.
 
@@ -270,6 +318,39 @@ Sistema di Gestione Trattamenti Agricoli
     
     return corpo_email
 
+def generate_digest_email_body(trattamenti):
+    """Genera il corpo dell'email riepilogativa (digest) per più trattamenti"""
+    corpo_email = f"""
+Gentile Contoterzista,
+
+in allegato la comunicazione riepilogativa di {len(trattamenti)} trattamenti.
+
+RIEPILOGO TRATTAMENTI:
+"""
+
+    for trattamento in trattamenti:
+        corpo_email += f"• #{trattamento.id} - {trattamento.cliente.nome}"
+        if trattamento.livello_applicazione == 'cascina' and trattamento.cascina:
+            corpo_email += f" / {trattamento.cascina.nome}"
+        corpo_email += f": {trattamento.get_superficie_interessata():.2f} ettari"
+        if trattamento.data_esecuzione:
+            corpo_email += f", esecuzione prevista {trattamento.data_esecuzione.strftime('%d/%m/%Y')}"
+        corpo_email += "\n"
+
+    corpo_email += """
+I dettagli di prodotti e quantità per ogni trattamento sono nel PDF allegato.
+
+Si prega di confermare la ricezione e di comunicare l'avvenuta esecuzione dei trattamenti.
+
+Per qualsiasi chiarimento, non esitate a contattarci.
+
+Cordiali saluti,
+Domenico Franco
+Sistema di Gestione Trattamenti Agricoli
+"""
+
+    return corpo_email
+
 # Resto delle funzioni identiche ma con logging aggiornato
 def preview_comunicazione_pdf(request, trattamento_id):
     """View per visualizzare l'anteprima del PDF di comunicazione"""
@@ -423,7 +504,7 @@ Questo è un messaggio di test per verificare la configurazione email del sistem
 
 Se ricevi questo messaggio, la configurazione email funziona correttamente.
 
-Motore PDF utilizzato: {PDF_ENGINE.upper() if PDF_ENGINE else 'Non disponibile'}
+Motore PDF utilizzato: {pdf_engine.engine_name().upper() if pdf_engine.is_available() else 'Non disponibile'}
 Timestamp: {timezone.now().strftime('%d/%m/%Y %H:%M:%S')}
 Sistema: Gestionale Agricolo Domenico Franco
         '''
@@ -443,7 +524,7 @@ Sistema: Gestionale Agricolo Domenico Franco
         
         return {
             'success': True,
-            'message': f'Test email inviato con successo a {to_email}\nMotore PDF: {PDF_ENGINE or "Non disponibile"}'
+            'message': f'Test email inviato con successo a {to_email}\nMotore PDF: {pdf_engine.engine_name() if pdf_engine.is_available() else "Non disponibile"}'
         }
         
     except Exception as e:
@@ -490,8 +571,8 @@ def debug_email_settings():
         'EMAIL_USE_TLS': getattr(settings, 'EMAIL_USE_TLS', 'Non configurato'),
         'DEFAULT_FROM_EMAIL': getattr(settings, 'DEFAULT_FROM_EMAIL', 'Non configurato'),
         'EMAIL_HOST_USER': getattr(settings, 'EMAIL_HOST_USER', 'Non configurato')[:10] + '...' if getattr(settings, 'EMAIL_HOST_USER', '') else 'Non configurato',
-        'PDF_ENGINE': PDF_ENGINE or 'Non disponibile',
-        'PDF_AVAILABLE': PDF_AVAILABLE
+        'PDF_ENGINE': pdf_engine.engine_name() if pdf_engine.is_available() else 'Non disponibile',
+        'PDF_AVAILABLE': pdf_engine.is_available()
     }
     
     return email_settings
\ No newline at end of file
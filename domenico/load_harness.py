@@ -0,0 +1,399 @@
+# domenico/load_harness.py
+# Prova di carico locale: utenti virtuali che ripetono scenari realistici di alta stagione
+# (agronomi nel wizard di comunicazione, dashboard in polling, contoterzisti che scaricano i
+# PDF) contro un server HTTP reale. SMTP e WeatherAPI vengono sostituiti da server locali.
+
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+
+# ---------- WeatherAPI finta ----------
+
+CURRENT_WEATHER = {
+    'location': {
+        'name': 'Alba', 'region': 'Piemonte', 'country': 'Italy',
+        'lat': 44.7, 'lon': 8.03, 'tz_id': 'Europe/Rome', 'localtime': '2026-06-03 10:00',
+    },
+    'current': {
+        'temp_c': 21.0, 'is_day': 1, 'wind_kph': 4.0, 'humidity': 55, 'precip_mm': 0.0,
+        'condition': {'text': 'Soleggiato', 'code': 1000, 'icon': '//cdn.weatherapi.com/weather/64x64/day/113.png'},
+        'last_updated': '2026-06-03 10:00',
+    },
+}
+
+
+class _FakeWeatherHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        api = self.server.api
+        api._register_request()
+        if api.latency:
+            time.sleep(api.latency)
+
+        path = urlsplit(self.path).path
+        if path.endswith('/current.json') or path.endswith('/forecast.json'):
+            body = json.dumps(CURRENT_WEATHER).encode('utf-8')
+            self.send_response(200)
+        else:
+            body = b'{"error": {"code": 1005, "message": "API URL is invalid."}}'
+            self.send_response(400)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeWeatherAPI:
+    """
+    Server HTTP locale con le risposte di WeatherAPI (current.json), in un thread separato.
+
+    Uso:
+        with FakeWeatherAPI() as api:
+            ... WEATHER_API_URL=api.url, API_KEY_WEATHER=<qualsiasi> ...
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.host = host
+        self.requested_port = port
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1] if self._server else self.requested_port
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _register_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.requested_port), _FakeWeatherHandler)
+        self._server.daemon_threads = True
+        self._server.api = self
+        threading.Thread(target=self._server.serve_forever, name='fake-weather', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ---------- Misure ----------
+
+def percentile(sorted_values, q):
+    """Percentile q (0-100) con il metodo nearest-rank"""
+    if not sorted_values:
+        return 0
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    """Latenze ed errori per endpoint, condivisi tra gli utenti virtuali"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, endpoint, elapsed_ms, error=None):
+        with self._lock:
+            self._latencies.setdefault(endpoint, []).append(elapsed_ms)
+            if error is not None:
+                self._errors.setdefault(endpoint, []).append(error)
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def report(self):
+        """
+        Returns:
+            dict con 'durata', 'totale' e 'endpoint' (nome -> requests, errors, error_rate,
+            rps, p50, p95, p99 in millisecondi, primi errori)
+        """
+        durata = (self.finished or time.perf_counter()) - self.started
+        endpoint = {}
+        tutte = []
+        errori_totali = 0
+        with self._lock:
+            for nome, latenze in sorted(self._latencies.items()):
+                latenze = sorted(latenze)
+                errori = self._errors.get(nome, [])
+                tutte.extend(latenze)
+                errori_totali += len(errori)
+                endpoint[nome] = {
+                    'requests': len(latenze),
+                    'errors': len(errori),
+                    'error_rate': len(errori) / len(latenze),
+                    'rps': len(latenze) / durata if durata else 0,
+                    'p50': percentile(latenze, 50),
+                    'p95': percentile(latenze, 95),
+                    'p99': percentile(latenze, 99),
+                    'esempi_errori': sorted(set(str(e) for e in errori))[:3],
+                }
+        tutte.sort()
+        return {
+            'durata': durata,
+            'totale': {
+                'requests': len(tutte),
+                'errors': errori_totali,
+                'error_rate': errori_totali / len(tutte) if tutte else 0,
+                'rps': len(tutte) / durata if durata else 0,
+                'p50': percentile(tutte, 50),
+                'p95': percentile(tutte, 95),
+                'p99': percentile(tutte, 99),
+            },
+            'endpoint': endpoint,
+        }
+
+
+# ---------- Client HTTP con sessione ----------
+
+class LoadSession:
+    """
+    Browser minimale: cookie di sessione e CSRF, una connessione keep-alive.
+    Le richieste passano come HTTPS (X-Forwarded-Proto, come dietro nginx) così il server
+    può girare con DEBUG disattivato senza redirect né cookie rifiutati.
+    """
+
+    def __init__(self, base_url, recorder, timeout=60):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = {}
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def request(self, endpoint, method, path, params=None, form=None, json_body=None, expect=(200,)):
+        """
+        Esegue la richiesta e la registra sotto `endpoint`; uno stato fuori da `expect`
+        o un'eccezione contano come errore.
+
+        Returns:
+            (stato, corpo) - stato None se la richiesta è fallita
+        """
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        headers = {
+            'Host': 'localhost',
+            'X-Forwarded-Proto': 'https',
+            'Referer': f'https://localhost{path}',
+        }
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        if method != 'GET' and 'csrftoken' in self.cookies:
+            headers['X-CSRFToken'] = self.cookies['csrftoken']
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+        started = time.perf_counter()
+        try:
+            connection = self._connect()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+        except Exception as e:
+            self.close()
+            self.recorder.record(endpoint, (time.perf_counter() - started) * 1000, error=type(e).__name__)
+            return None, b''
+        elapsed = (time.perf_counter() - started) * 1000
+
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for nome, morsel in SimpleCookie(header).items():
+                if morsel.value:
+                    self.cookies[nome] = morsel.value
+                else:
+                    self.cookies.pop(nome, None)
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+
+        error = None if response.status in expect else f'HTTP {response.status}'
+        self.recorder.record(endpoint, elapsed, error=error)
+        return response.status, content
+
+    def json(self, *args, **kwargs):
+        status, content = self.request(*args, **kwargs)
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+
+# ---------- Scenari ----------
+
+class LoadContext:
+    """
+    Dati condivisi tra gli utenti virtuali: id esistenti nel database del server e la
+    coda dei trattamenti programmati da comunicare (ognuno viene comunicato una sola volta)
+    """
+
+    def __init__(self, clienti, cascine, comunicati, programmati, credentials, password):
+        self.clienti = clienti
+        self.cascine = cascine
+        self.comunicati = comunicati
+        self._programmati = list(programmati)
+        self._lock = threading.Lock()
+        self.credentials = credentials
+        self.password = password
+
+    @property
+    def programmati_rimanenti(self):
+        return len(self._programmati)
+
+    def take_programmati(self, n):
+        with self._lock:
+            presi, self._programmati = self._programmati[:n], self._programmati[n:]
+        return presi
+
+
+# Form di login di authentication (il nome 'login' è anche la vecchia route di redirect)
+LOGIN_PATH = '/auth/login/'
+
+
+def login(session, user, password):
+    session.request('login', 'GET', LOGIN_PATH)
+    session.request(
+        'login', 'POST', LOGIN_PATH,
+        form={'email': user, 'password': password, 'csrfmiddlewaretoken': session.cookies.get('csrftoken', '')},
+        expect=(302,)
+    )
+
+
+def scenario_agronomo(session, rng, ctx):
+    """Agronomo: tabella trattamenti filtrata, wizard, anteprima e comunicazione in blocco"""
+    session.request('trattamenti_table', 'GET', reverse('trattamenti'), params={'view': 'programmati'})
+    session.request('trattamenti_table', 'GET', reverse('trattamenti'), params={
+        'view': 'tutti', 'search': 'Azienda', 'page': rng.randint(1, 3)
+    })
+    session.request('comunicazione_wizard', 'GET', reverse('comunicazione_wizard'))
+
+    selezionati = ctx.take_programmati(rng.randint(1, 4))
+    if not selezionati:
+        return
+    session.request(
+        'api_communication_preview', 'POST', reverse('api_communication_preview'),
+        json_body={'trattamenti_ids': selezionati, 'exclude_communicated': True}
+    )
+    session.request(
+        'api_bulk_action_trattamenti (comunica)', 'POST', reverse('api_bulk_action_trattamenti'),
+        form={'action': 'comunica', 'communication_mode': 'send_only', 'trattamenti_ids': json.dumps(selezionati)}
+    )
+
+
+def scenario_aziende(session, rng, ctx):
+    """Consultazione delle anagrafiche: aziende, cascine, terreni"""
+    session.request('aziende', 'GET', reverse('aziende'))
+    if ctx.clienti:
+        session.request('api_cliente_cascine', 'GET', reverse('api_cliente_cascine', args=[rng.choice(ctx.clienti)]))
+    if ctx.cascine:
+        session.request('api_cascina_terreni', 'GET', reverse('api_cascina_terreni', args=[rng.choice(ctx.cascine)]))
+    session.request('api_search_clienti', 'GET', reverse('api_search_clienti'), params={'q': 'Azienda'})
+
+
+def scenario_dashboard(session, rng, ctx):
+    """Dashboard aperta: pagina iniziale e poi polling delle API di riepilogo e meteo"""
+    session.request('home', 'GET', reverse('home'))
+    for _ in range(3):
+        session.request('api_dashboard_summary', 'GET', reverse('api_dashboard_summary'))
+        session.request('api_recent_activities', 'GET', reverse('api_recent_activities'))
+        session.request('api_weather_current', 'GET', reverse('api_weather_current'))
+
+
+def scenario_contoterzista(session, rng, ctx):
+    """Contoterzista: scarica i PDF dei trattamenti comunicati"""
+    for trattamento_id in rng.sample(ctx.comunicati, min(len(ctx.comunicati), 2)):
+        session.request('api_download_comunicazione', 'GET', reverse('api_download_comunicazione', args=[trattamento_id]))
+
+
+# Nome -> (peso nel mix, funzione)
+SCENARIOS = {
+    'agronomo': (3, scenario_agronomo),
+    'aziende': (2, scenario_aziende),
+    'dashboard': (4, scenario_dashboard),
+    'contoterzista': (1, scenario_contoterzista),
+}
+# Scenari che modificano i dati: comunicano trattamenti (stato, ComunicazioneTrattamento, email)
+WRITE_SCENARIOS = {'agronomo'}
+
+
+def run_load_test(base_url, ctx, users=10, iterations=5, scenarios=None, think_time=0.0, seed=0, timeout=60):
+    """
+    Avvia `users` utenti virtuali in parallelo: ognuno fa login con le proprie credenziali
+    e poi esegue `iterations` scenari scelti col peso di SCENARIOS.
+
+    Returns:
+        report del Recorder, più i conteggi degli scenari eseguiti
+    """
+    nomi = scenarios or list(SCENARIOS)
+    pesi = [SCENARIOS[nome][0] for nome in nomi]
+    recorder = Recorder()
+    eseguiti = {nome: 0 for nome in nomi}
+    lock = threading.Lock()
+
+    def utente(numero):
+        rng = random.Random(seed + numero)
+        session = LoadSession(base_url, recorder, timeout=timeout)
+        try:
+            login(session, ctx.credentials[numero % len(ctx.credentials)], ctx.password)
+            for _ in range(iterations):
+                nome = rng.choices(nomi, weights=pesi)[0]
+                SCENARIOS[nome][1](session, rng, ctx)
+                with lock:
+                    eseguiti[nome] += 1
+                if think_time:
+                    time.sleep(rng.uniform(0, 2 * think_time))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=utente, args=(n,), name=f'load-user-{n}') for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.stop()
+
+    report = recorder.report()
+    report['scenari'] = eseguiti
+    return report
@@ -0,0 +1,170 @@
+# domenico/mail_dispatch.py
+# Servizio di invio email in blocco su una singola connessione SMTP
+
+import logging
+import smtplib
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from .metrics import SMTP_FAILURES, SMTP_SEND_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Errori che indicano una connessione caduta: si riconnette e si ritenta il messaggio
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# Codici SMTP con cui il server chiude la sessione (es. 421 "service not available")
+RECONNECT_SMTP_CODES = (421,)
+
+
+class RateLimiter:
+    """Limita il numero di messaggi al secondo (0 o None = nessun limite)"""
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_allowed = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self._next_allowed:
+            time.sleep(self._next_allowed - now)
+            now = self._next_allowed
+        self._next_allowed = now + self.interval
+
+
+class DispatchSession:
+    """
+    Sessione di invio: mantiene aperta una connessione e la riusa per tutti i messaggi.
+    La connessione viene riaperta ogni `batch_size` messaggi e dopo una disconnessione.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.connection = None
+        self.sent_on_connection = 0
+        self.connections_opened = 0
+        self.rate_limiter = RateLimiter(service.rate_limit)
+
+    def open(self):
+        self.connection = self.service.connection_factory(fail_silently=False)
+        self.connection.open()
+        self.sent_on_connection = 0
+        self.connections_opened += 1
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.close()
+        except Exception as e:
+            logger.warning(f"Chiusura connessione SMTP non pulita: {e}")
+        finally:
+            self.connection = None
+
+    def reconnect(self):
+        self.close()
+        self.open()
+
+    def send(self, message):
+        """
+        Invia un singolo messaggio sulla connessione della sessione.
+
+        Returns:
+            dict con 'success' e 'error'
+        """
+        try:
+            result = self._send(message)
+        except Exception:
+            # Apertura della connessione fallita: l'errore risale al chiamante
+            SMTP_FAILURES.inc()
+            raise
+        SMTP_SEND_SECONDS.labels('ok' if result['success'] else 'error').observe(result['duration'])
+        if not result['success']:
+            SMTP_FAILURES.inc()
+        return result
+
+    def _send(self, message):
+        if self.connection is None:
+            self.open()
+        elif self.service.batch_size and self.sent_on_connection >= self.service.batch_size:
+            self.reconnect()
+
+        attempts = 0
+        while True:
+            self.rate_limiter.wait()
+            started = time.monotonic()
+            try:
+                message.connection = self.connection
+                sent = self.connection.send_messages([message])
+                self.sent_on_connection += 1
+                if not sent:
+                    return {'success': False, 'error': 'Nessun destinatario valido', 'duration': time.monotonic() - started}
+                return {'success': True, 'error': None, 'duration': time.monotonic() - started}
+
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code in RECONNECT_SMTP_CODES and attempts < self.service.max_retries:
+                    attempts += 1
+                    logger.warning(f"Server SMTP ha chiuso la sessione ({e.smtp_code}), riconnessione {attempts}/{self.service.max_retries}")
+                    self.reconnect()
+                    continue
+                logger.error(f"Errore SMTP per '{message.subject}': {e}")
+                return {'success': False, 'error': str(e), 'duration': time.monotonic() - started}
+
+            except RECONNECT_ERRORS as e:
+                if attempts < self.service.max_retries:
+                    attempts += 1
+                    logger.warning(f"Connessione SMTP persa ({e}), riconnessione {attempts}/{self.service.max_retries}")
+                    try:
+                        self.reconnect()
+                    except Exception as reconnect_error:
+                        logger.error(f"Riconnessione SMTP fallita: {reconnect_error}")
+                        self.connection = None
+                        return {'success': False, 'error': str(reconnect_error), 'duration': time.monotonic() - started}
+                    continue
+                return {'success': False, 'error': str(e), 'duration': time.monotonic() - started}
+
+            except Exception as e:
+                logger.error(f"Errore invio email '{message.subject}': {e}")
+                return {'success': False, 'error': str(e), 'duration': time.monotonic() - started}
+
+
+class MailDispatchService:
+    """
+    Invia molti messaggi riusando una connessione per batch,
+    invece di aprire una connessione (e un handshake TLS) per ogni email.
+    """
+
+    def __init__(self, batch_size=None, rate_limit=None, max_retries=None, connection_factory=None):
+        self.batch_size = batch_size if batch_size is not None else getattr(settings, 'EMAIL_DISPATCH_BATCH_SIZE', 50)
+        self.rate_limit = rate_limit if rate_limit is not None else getattr(settings, 'EMAIL_DISPATCH_RATE_LIMIT', 0)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'EMAIL_DISPATCH_MAX_RETRIES', 2)
+        self.connection_factory = connection_factory or get_connection
+
+    @contextmanager
+    def session(self):
+        """Context manager che apre una sessione di invio e la chiude alla fine"""
+        session = DispatchSession(self)
+        try:
+            yield session
+        finally:
+            session.close()
+            if session.connections_opened:
+                logger.info(f"Sessione invio chiusa: {session.connections_opened} connessioni aperte")
+
+    def send_messages(self, messages):
+        """
+        Invia una lista di messaggi.
+
+        Returns:
+            lista di dict (uno per messaggio, nello stesso ordine) con 'success' e 'error'
+        """
+        results = []
+        with self.session() as session:
+            for message in messages:
+                results.append(session.send(message))
+        return results
@@ -0,0 +1,133 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+
+MODI = {
+    'fresh': 'nuova connessione per richiesta (CONN_MAX_AGE=0)',
+    'persistent': 'connessione persistente con health check (CONN_MAX_AGE>0)',
+    'pool': 'pool psycopg 3 (DB_POOL=1)',
+}
+
+
+def build_connection(alias, mode):
+    """
+    DatabaseWrapper separato da quelli di Django, con la configurazione del modo richiesto
+    applicata alle impostazioni dell'alias.
+    """
+    settings_dict = dict(connections.settings[alias])
+    options = {k: v for k, v in settings_dict.get('OPTIONS', {}).items() if k != 'pool'}
+    settings_dict['CONN_HEALTH_CHECKS'] = True
+
+    if mode == 'fresh':
+        settings_dict['CONN_MAX_AGE'] = 0
+    elif mode == 'persistent':
+        settings_dict['CONN_MAX_AGE'] = 600
+    else:
+        settings_dict['CONN_MAX_AGE'] = 0
+        options['pool'] = dict(connections.settings[alias].get('OPTIONS', {}).get('pool') or {}) or True
+
+    settings_dict['OPTIONS'] = options
+    backend = load_backend(settings_dict['ENGINE'])
+    # Alias distinto: il pool del benchmark non si mescola con quello dell'applicazione
+    return backend.DatabaseWrapper(settings_dict, alias=f'{alias}_benchmark_{mode}')
+
+
+def simulate_requests(connection, requests, query):
+    """
+    Ripete il ciclo di una richiesta HTTP: controllo della connessione all'inizio
+    (request_started), query, rilascio alla fine (request_finished).
+
+    Returns:
+        dict con 'mean', 'p50', 'p95' in millisecondi
+    """
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        connection.close_if_unusable_or_obsolete()
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            cursor.fetchall()
+        connection.close_if_unusable_or_obsolete()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies.sort()
+    return {
+        'mean': statistics.mean(latencies),
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Misura la latenza per richiesta con connessioni nuove, persistenti e con pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Alias del database (default: default)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Richieste simulate per modo (default: 200)'
+        )
+        parser.add_argument(
+            '--mode',
+            action='append',
+            choices=sorted(MODI),
+            dest='modes',
+            help='Modo da misurare, ripetibile (default: tutti quelli disponibili)'
+        )
+        parser.add_argument(
+            '--query',
+            default='SELECT 1',
+            help='Query eseguita a ogni richiesta (default: SELECT 1)'
+        )
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections.settings:
+            raise CommandError(f"Database '{alias}' non configurato")
+
+        vendor = connections[alias].vendor
+        modes = options['modes'] or ['fresh', 'persistent', 'pool']
+        if vendor != 'postgresql' and 'pool' in modes:
+            if options['modes']:
+                raise CommandError('Il pool è disponibile solo con PostgreSQL')
+            modes.remove('pool')
+
+        self.stdout.write(self.style.SUCCESS(f'🔌 Benchmark connessioni database ({vendor})'))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f"Richieste per modo: {options['requests']} - query: {options['query']}")
+
+        risultati = {}
+        for mode in modes:
+            connection = build_connection(alias, mode)
+            try:
+                # Prima richiesta fuori misura: apertura del pool, cache del tipo di database
+                simulate_requests(connection, 1, options['query'])
+                risultati[mode] = simulate_requests(connection, options['requests'], options['query'])
+            finally:
+                connection.close()
+                if mode == 'pool':
+                    connection.close_pool()
+
+            r = risultati[mode]
+            self.stdout.write(
+                f"  {mode:<11} {r['mean']:>7.2f}ms media, p50 {r['p50']:.2f}ms, p95 {r['p95']:.2f}ms  - {MODI[mode]}"
+            )
+
+        base = risultati.get('fresh')
+        if base:
+            self.stdout.write('\n' + '=' * 60)
+            for mode, r in risultati.items():
+                if mode != 'fresh' and r['mean']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"📈 {mode}: {base['mean'] / r['mean']:.1f}x più veloce di fresh per richiesta"
+                    ))
@@ -0,0 +1,99 @@
+import time
+
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.smtp import EmailBackend
+from django.core.management.base import BaseCommand
+
+from domenico.mail_dispatch import MailDispatchService
+from domenico.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = 'Misura i messaggi/secondo inviati con una connessione per email e con il servizio di invio in batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=200,
+            help='Numero di messaggi da inviare per ogni modalità (default: 200)'
+        )
+        parser.add_argument(
+            '--connect-delay',
+            type=float,
+            default=0.02,
+            help='Costo simulato di apertura connessione in secondi (default: 0.02)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Messaggi per connessione nel servizio di invio (default: 50)'
+        )
+        parser.add_argument(
+            '--attachment-kb',
+            type=int,
+            default=60,
+            help='Dimensione allegato PDF simulato in KB (default: 60)'
+        )
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        attachment = b'%PDF-1.4\n' + b'0' * (options['attachment_kb'] * 1024)
+
+        self.stdout.write(self.style.SUCCESS('📨 Benchmark invio comunicazioni'))
+        self.stdout.write('=' * 60)
+
+        with SMTPSink(connect_delay=options['connect_delay']) as sink:
+            def connection_factory(**kwargs):
+                return EmailBackend(host=sink.host, port=sink.port, use_tls=False, **kwargs)
+
+            def build_messages():
+                messages = []
+                for i in range(count):
+                    message = EmailMultiAlternatives(
+                        subject=f'Trattamento #{i} - Benchmark',
+                        body='Comunicazione di test per benchmark invio',
+                        from_email='benchmark@gestionale.local',
+                        to=[f'contatto{i}@example.com'],
+                    )
+                    message.attach(f'Trattamento_{i}.pdf', attachment, 'application/pdf')
+                    messages.append(message)
+                return messages
+
+            # 1. Una connessione per messaggio (comportamento di email.send())
+            messages = build_messages()
+            connections_before = sink.connections
+            started = time.perf_counter()
+            for message in messages:
+                message.connection = connection_factory()
+                message.send()
+            single_elapsed = time.perf_counter() - started
+            single_connections = sink.connections - connections_before
+
+            # 2. Servizio di invio con connessione riusata
+            messages = build_messages()
+            service = MailDispatchService(
+                batch_size=options['batch_size'],
+                rate_limit=0,
+                connection_factory=connection_factory
+            )
+            connections_before = sink.connections
+            started = time.perf_counter()
+            results = service.send_messages(messages)
+            batch_elapsed = time.perf_counter() - started
+            batch_connections = sink.connections - connections_before
+            failures = sum(1 for r in results if not r['success'])
+
+        self.stdout.write(f'\n📊 RISULTATI ({count} messaggi, handshake simulato {options["connect_delay"] * 1000:.0f} ms):')
+        self.stdout.write(
+            f'  • Una connessione per email: {count / single_elapsed:8.1f} msg/s '
+            f'({single_elapsed:.2f}s, {single_connections} connessioni)'
+        )
+        self.stdout.write(
+            f'  • Invio in batch:            {count / batch_elapsed:8.1f} msg/s '
+            f'({batch_elapsed:.2f}s, {batch_connections} connessioni, {failures} errori)'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'\n✅ Speedup: {single_elapsed / batch_elapsed:.1f}x')
+        )
@@ -0,0 +1,190 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_server(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_load(host, port, paths, total, concurrency, timeout=60):
+    """
+    Invia `total` richieste GET (percorsi a rotazione) con `concurrency` client paralleli.
+    I redirect non vengono seguiti: conta il tempo di risposta del server, non lo stato.
+
+    Returns:
+        dict con 'requests', 'errors', 'elapsed', 'rps', 'p50', 'p95' (millisecondi)
+    """
+    lock = threading.Lock()
+    counter = {'next': 0}
+    latencies = []
+    errors = []
+
+    def client():
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        while True:
+            with lock:
+                index = counter['next']
+                if index >= total:
+                    break
+                counter['next'] += 1
+            path = paths[index % len(paths)]
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Host': 'localhost'})
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    errors.append(response.status)
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+                    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+            except Exception as e:
+                errors.append(str(e))
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=timeout)
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'elapsed': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50': statistics.median(latencies) if latencies else 0,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] if latencies else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Misura richieste/secondo del server HTTP; con --compare confronta il vecchio avvio di gunicorn con gunicorn.conf.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            type=str,
+            default='http://127.0.0.1:8000',
+            help='Server da misurare (ignorato con --compare)'
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Percorso da richiedere, ripetibile (default: /api/prodotti/)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Numero totale di richieste (default: 500)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Client paralleli (default: 20)'
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Avvia in locale gunicorn con un worker sync e poi con gunicorn.conf.py e li confronta'
+        )
+        parser.add_argument(
+            '--startup-timeout',
+            type=int,
+            default=60,
+            help='Secondi di attesa per l\'avvio di gunicorn (default: 60)'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/api/prodotti/']
+
+        self.stdout.write(self.style.SUCCESS('🚀 Benchmark HTTP'))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f"Percorsi: {', '.join(paths)}")
+        self.stdout.write(f"Richieste: {options['requests']} - client paralleli: {options['concurrency']}")
+
+        if not options['compare']:
+            url = urlsplit(options['url'])
+            result = run_load(url.hostname, url.port or 80, paths, options['requests'], options['concurrency'])
+            self._print_result(options['url'], result)
+            return
+
+        profili = [
+            # Il vecchio comando di docker-compose; /dev/null evita che venga letto gunicorn.conf.py
+            ('gunicorn (1 worker sync)', ['-c', os.devnull, 'gestionale.wsgi:application']),
+            ('gunicorn.conf.py', ['-c', os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')]),
+        ]
+        risultati = []
+        for nome, argomenti in profili:
+            self.stdout.write(f"\n▶️  Avvio {nome}...")
+            result = self._run_with_server(argomenti, paths, options)
+            self._print_result(nome, result)
+            risultati.append(result)
+
+        base, nuovo = risultati
+        if base['rps']:
+            self.stdout.write('\n' + '=' * 60)
+            self.stdout.write(self.style.SUCCESS(
+                f"📈 Richieste/secondo: {base['rps']:.1f} → {nuovo['rps']:.1f} "
+                f"({nuovo['rps'] / base['rps']:.1f}x)"
+            ))
+
+    def _run_with_server(self, argomenti, paths, options):
+        port = _free_port()
+        env = dict(os.environ, GUNICORN_ACCESS_LOG='', GUNICORN_LOG_LEVEL='warning')
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}'] + argomenti,
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        try:
+            if not _wait_for_server('127.0.0.1', port, options['startup_timeout']):
+                raise CommandError('gunicorn non si è avviato in tempo')
+            # Una richiesta a vuoto per ogni percorso prima di misurare
+            run_load('127.0.0.1', port, paths, len(paths), 1)
+            return run_load('127.0.0.1', port, paths, options['requests'], options['concurrency'])
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def _print_result(self, nome, result):
+        self.stdout.write(
+            f"  {nome}: {result['rps']:.1f} req/s, p50 {result['p50']:.1f}ms, "
+            f"p95 {result['p95']:.1f}ms, errori {result['errors']}/{result['requests']}"
+        )
@@ -0,0 +1,121 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from domenico.analytics import NUMPY_AVAILABLE, compute_demand, load_columns
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+
+def synthetic_columns(rows, trattamenti, prodotti, settimane, contoterzisti, seed=0):
+    """
+    Array colonnari come quelli di load_columns, con `rows` righe TrattamentoProdotto
+    distribuite su `trattamenti` trattamenti.
+    """
+    rng = np.random.default_rng(seed)
+    # Lunedì delle settimane della stagione, più la settimana "non pianificata"
+    lunedi = 20458 + 7 * np.arange(settimane)  # 2026-01-05
+    lunedi = np.append(lunedi, -1)
+    return {
+        'trattamento': np.arange(1, trattamenti + 1, dtype=np.int64),
+        'area': rng.uniform(0.5, 80.0, trattamenti),
+        'settimana': rng.choice(lunedi, trattamenti),
+        'contoterzista': rng.integers(0, contoterzisti + 1, trattamenti),
+        'riga_trattamento': rng.integers(0, trattamenti, rows),
+        'prodotto': rng.integers(1, prodotti + 1, rows),
+        'dose': rng.uniform(0.1, 5.0, rows),
+    }
+
+
+def reference_demand(colonne, limit):
+    """Somma riga per riga in Python (come quantita_totale) sulle prime `limit` righe"""
+    totali = {}
+    for n in range(limit):
+        t = int(colonne['riga_trattamento'][n])
+        chiave = (int(colonne['prodotto'][n]), int(colonne['settimana'][t]), int(colonne['contoterzista'][t]))
+        totali[chiave] = totali.get(chiave, 0.0) + float(colonne['dose'][n]) * float(colonne['area'][t])
+    return totali
+
+
+class Command(BaseCommand):
+    help = 'Misura il calcolo vettoriale del fabbisogno prodotti (prodotto × settimana × contoterzista)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1_000_000,
+            help='Righe TrattamentoProdotto sintetiche (default: 1000000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Ripetizioni misurate (default: 5)'
+        )
+        parser.add_argument(
+            '--from-db',
+            action='store_true',
+            help='Misura anche la lettura colonnare dal database (load_columns)'
+        )
+
+    def handle(self, *args, **options):
+        if not NUMPY_AVAILABLE:
+            raise CommandError("NumPy non disponibile: installa numpy")
+
+        rows = options['rows']
+        repeat = max(1, options['repeat'])
+        trattamenti = max(1, rows // 4)
+        colonne = synthetic_columns(rows, trattamenti, prodotti=400, settimane=52, contoterzisti=30)
+
+        self.stdout.write(self.style.SUCCESS('🧮 Benchmark fabbisogno prodotti'))
+        self.stdout.write('=' * 60)
+        self.stdout.write(f'Righe: {rows:,} - trattamenti: {trattamenti:,} - ripetizioni: {repeat}')
+
+        tempi = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            domanda = compute_demand(colonne)
+            tempi.append((time.perf_counter() - started) * 1000)
+        tempi.sort()
+        self.stdout.write(
+            f"  vettoriale  {tempi[len(tempi) // 2]:>8.1f}ms mediana, min {tempi[0]:.1f}ms "
+            f"- matrice {'×'.join(str(n) for n in domanda['matrice'].shape)}"
+        )
+
+        # Confronto col ciclo Python su un campione, estrapolato a tutte le righe
+        campione = min(rows, 50_000)
+        started = time.perf_counter()
+        riferimento = reference_demand(colonne, campione)
+        ciclo_ms = (time.perf_counter() - started) * 1000 * rows / max(campione, 1)
+        self.stdout.write(f'  ciclo Python {ciclo_ms:>7.1f}ms stimati (campione di {campione:,} righe)')
+
+        # Verifica: il campione calcolato in modo vettoriale coincide col ciclo
+        parziale = compute_demand({**colonne, **{
+            k: colonne[k][:campione] for k in ('riga_trattamento', 'prodotto', 'dose')
+        }})
+        for (prodotto, settimana, contoterzista), quantita in riferimento.items():
+            i = np.searchsorted(parziale['prodotti'], prodotto)
+            j = np.searchsorted(parziale['settimane'], settimana)
+            k = np.searchsorted(parziale['contoterzisti'], contoterzista)
+            if not np.isclose(parziale['matrice'][i, j, k], quantita):
+                raise CommandError(f'Risultato diverso dal ciclo Python per {(prodotto, settimana, contoterzista)}')
+
+        if options['from_db']:
+            started = time.perf_counter()
+            colonne_db = load_columns()
+            caricamento_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            compute_demand(colonne_db)
+            calcolo_ms = (time.perf_counter() - started) * 1000
+            self.stdout.write(
+                f"  database    {caricamento_ms:>8.1f}ms lettura + {calcolo_ms:.1f}ms calcolo "
+                f"({len(colonne_db['dose']):,} righe)"
+            )
+
+        self.stdout.write('\n' + '=' * 60)
+        if tempi[0]:
+            self.stdout.write(self.style.SUCCESS(
+                f'📈 vettoriale: {ciclo_ms / tempi[len(tempi) // 2]:.0f}x più veloce del ciclo Python'
+            ))
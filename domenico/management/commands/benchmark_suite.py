@@ -0,0 +1,225 @@
+import json
+import os
+import platform
+import statistics
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from domenico.dataset import SCALE, generate_dataset
+from domenico.models import Cascina, Trattamento
+
+
+# Nome -> (nome URL, argomenti dell'URL, parametri GET); gli argomenti sono ricavati dal dataset
+TARGETS = {
+    'home': ('home', None, {}),
+    'dashboard': ('personal_dashboard', None, {}),
+    'aziende': ('aziende', None, {}),
+    'trattamenti': ('trattamenti', None, {}),
+    'database': ('database', None, {}),
+    'comunicazioni': ('comunicazioni_dashboard', None, {}),
+    'api_dashboard_summary': ('api_dashboard_summary', None, {}),
+    'api_recent_activities': ('api_recent_activities', None, {}),
+    'api_database_stats': ('api_database_stats', None, {}),
+    'api_search_clienti': ('api_search_clienti', None, {'q': 'Azienda'}),
+    'api_clienti': ('api_clienti', None, {}),
+    'api_prodotti': ('api_prodotti_list', None, {}),
+    'api_cliente_cascine': ('api_cliente_cascine', lambda ids: [ids['cliente']], {}),
+    'api_cascina_terreni': ('api_cascina_terreni', lambda ids: [ids['cascina']], {}),
+    'api_trattamento_detail': ('api_trattamento_detail', lambda ids: [ids['trattamento']], {}),
+    'api_sync_changes': ('api_sync_changes', None, {}),
+    'api_fabbisogno_prodotti': ('api_fabbisogno_prodotti', None, {}),
+}
+
+
+def authenticated_client(user):
+    """
+    Client con la sessione dell'utente creata direttamente: force_login invierebbe
+    user_logged_in, e l'audit asincrono scriverebbe fuori dalla transazione del benchmark
+    """
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = 'permissions.backends.RolePermissionBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+
+    client = Client()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+    return client
+
+
+def measure(client, url, params, repeat):
+    """
+    Esegue la richiesta `repeat` volte (più una di riscaldamento, esclusa)
+
+    Returns:
+        dict con 'status', 'queries', 'mean', 'p50', 'p95', 'min' (millisecondi), 'bytes'
+    """
+    client.get(url, params)
+    tempi = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url, params)
+            body = b''.join(response) if response.streaming else response.content
+            tempi.append((time.perf_counter() - started) * 1000)
+    tempi.sort()
+    return {
+        'status': response.status_code,
+        'queries': len(queries),
+        'mean': round(statistics.mean(tempi), 2),
+        'p50': round(statistics.median(tempi), 2),
+        'p95': round(tempi[max(0, int(len(tempi) * 0.95) - 1)], 2),
+        'min': round(tempi[0], 2),
+        'bytes': len(body),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Genera dataset sintetici a più scale e misura tempi e numero di query delle view e API principali'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            action='append',
+            choices=sorted(SCALE),
+            dest='scales',
+            help='Scala del dataset, ripetibile (default: small e medium)'
+        )
+        parser.add_argument(
+            '--target',
+            action='append',
+            choices=sorted(TARGETS),
+            dest='targets',
+            help='View o API da misurare, ripetibile (default: tutte)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Richieste misurate per view (default: 5)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Seme del generatore (default: 42)'
+        )
+        parser.add_argument(
+            '--output',
+            help='File JSON dei risultati (default: benchmarks/benchmark_<data>.json)'
+        )
+        parser.add_argument(
+            '--compare',
+            help='File JSON di una misura precedente da confrontare'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Non annullare i dati generati (solo con una scala)'
+        )
+
+    def handle(self, *args, **options):
+        scales = options['scales'] or ['small', 'medium']
+        targets = options['targets'] or list(TARGETS)
+        if options['keep'] and len(scales) > 1:
+            raise CommandError('--keep richiede una sola scala')
+
+        precedente = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    precedente = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Impossibile leggere {options['compare']}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f'📊 Benchmark suite ({connection.vendor})'))
+        self.stdout.write('=' * 60)
+
+        risultati = {
+            'creato_il': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'scale': {},
+        }
+        for scale in scales:
+            risultati['scale'][scale] = self._run_scale(scale, targets, options)
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks', f"benchmark_{timezone.localtime():%Y%m%d_%H%M%S}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(risultati, f, indent=2)
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS(f'💾 Risultati salvati in {output}'))
+
+        if precedente:
+            self._compare(precedente, risultati)
+
+    def _run_scale(self, scale, targets, options):
+        self.stdout.write(f'\n▶️  Scala {scale}: generazione dataset...')
+        # Il dataset vive in una transazione annullata alla fine (salvo --keep); la replica
+        # non la vedrebbe, quindi tutte le letture restano sul primario
+        with override_settings(
+            REPLICA_READS=False, INTERNAL_IPS=[], ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ), transaction.atomic():
+            started = time.perf_counter()
+            counts = generate_dataset(scale, seed=options['seed'])
+            generazione = time.perf_counter() - started
+            self.stdout.write(
+                f"  {sum(counts.values()):,} righe in {generazione:.1f}s "
+                f"({', '.join(f'{nome} {n:,}' for nome, n in counts.items())})"
+            )
+
+            ids = {
+                'cliente': Cascina.objects.order_by('id').values_list('cliente_id', flat=True).first(),
+                'cascina': Cascina.objects.order_by('id').values_list('id', flat=True).first(),
+                'trattamento': Trattamento.objects.order_by('id').values_list('id', flat=True).first(),
+            }
+            user, _ = get_user_model().objects.get_or_create(
+                username='benchmark', defaults={'is_staff': True, 'is_superuser': True}
+            )
+            client = authenticated_client(user)
+
+            misure = {}
+            for nome in targets:
+                url_name, url_args, params = TARGETS[nome]
+                url = reverse(url_name, args=url_args(ids) if url_args else None)
+                misure[nome] = measure(client, url, params, max(1, options['repeat']))
+                r = misure[nome]
+                self.stdout.write(
+                    f"  {nome:<26} {r['p50']:>8.1f}ms p50, {r['queries']:>4} query, HTTP {r['status']}"
+                )
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        return {'righe': counts, 'generazione_s': round(generazione, 2), 'misure': misure}
+
+    def _compare(self, precedente, risultati):
+        self.stdout.write(f"\n🔍 Confronto con la misura del {precedente.get('creato_il', '?')}")
+        for scale, dati in risultati['scale'].items():
+            prima = precedente.get('scale', {}).get(scale)
+            if not prima:
+                continue
+            self.stdout.write(f'  Scala {scale}:')
+            for nome, r in dati['misure'].items():
+                p = prima['misure'].get(nome)
+                if not p:
+                    continue
+                delta = (r['p50'] - p['p50']) / p['p50'] * 100 if p['p50'] else 0
+                self.stdout.write(
+                    f"    {nome:<26} {p['p50']:>8.1f} → {r['p50']:>8.1f}ms ({delta:+.0f}%), "
+                    f"query {p['queries']} → {r['queries']}"
+                )
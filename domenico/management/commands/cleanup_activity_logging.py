@@ -1,8 +1,11 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-from domenico.models import ActivityLog
+from django.db.models import Sum
+from domenico.models import ActivityLog, ActivityDailyRollup
 from domenico.activity_logging import cleanup_old_logs, get_activity_stats
+from domenico.activity_partitions import estimated_row_count
+from domenico.activity_rollup import count_activities
 
 class Command(BaseCommand):
     help = 'Pulisce i log di attività vecchi e mostra statistiche'
@@ -89,23 +92,19 @@ class Command(BaseCommand):
     def show_current_stats(self):
         """Mostra statistiche correnti dei log"""
         try:
-            # Statistiche base
-            total_logs = ActivityLog.objects.count()
+            # Statistiche base: stima da pg_class, un COUNT scansionerebbe tutta la tabella
+            total_logs = estimated_row_count()
             
-            # Log degli ultimi 7 giorni
-            week_ago = timezone.now() - timedelta(days=7)
-            logs_week = ActivityLog.objects.filter(timestamp__gte=week_ago).count()
-            
-            # Log degli ultimi 30 giorni
-            month_ago = timezone.now() - timedelta(days=30)
-            logs_month = ActivityLog.objects.filter(timestamp__gte=month_ago).count()
+            # Log degli ultimi 7 e 30 giorni (dal riepilogo giornaliero)
+            logs_week = count_activities(7)
+            logs_month = count_activities(30)
             
             # Log più vecchio e più recente
             oldest_log = ActivityLog.objects.order_by('timestamp').first()
             newest_log = ActivityLog.objects.order_by('-timestamp').first()
             
             self.stdout.write(f'\n📊 STATISTICHE ATTUALI LOG:')
-            self.stdout.write(f'  • Totali nel database: {total_logs}')
+            self.stdout.write(f'  • Totali nel database (stima): ~{total_logs}')
             self.stdout.write(f'  • Ultimi 7 giorni: {logs_week}')
             self.stdout.write(f'  • Ultimi 30 giorni: {logs_month}')
             
@@ -115,10 +114,9 @@ class Command(BaseCommand):
             if newest_log:
                 self.stdout.write(f'  • Log più recente: {newest_log.timestamp.strftime("%d/%m/%Y %H:%M")}')
             
-            # Top 5 tipi di attività
-            from django.db.models import Count
-            top_activities = ActivityLog.objects.values('activity_type').annotate(
-                count=Count('id')
+            # Top 5 tipi di attività (su tutto lo storico del riepilogo)
+            top_activities = ActivityDailyRollup.objects.values('activity_type').annotate(
+                count=Sum('count')
             ).order_by('-count')[:5]
             
             if top_activities:
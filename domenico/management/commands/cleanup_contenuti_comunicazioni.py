@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from domenico.content_store import MARGINE_ORFANI, elimina_contenuti_orfani
+
+
+class Command(BaseCommand):
+    help = 'Elimina i contenuti delle comunicazioni (corpo email, destinatari) non più referenziati'
+
+    def handle(self, *args, **options):
+        eliminati = elimina_contenuti_orfani()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Contenuti orfani eliminati: {eliminati} '
+            f'(esclusi quelli creati nelle ultime {MARGINE_ORFANI.total_seconds() / 3600:g} ore)'
+        ))
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from domenico.sync import cleanup_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Elimina le tombstone della sincronizzazione offline oltre il periodo di conservazione'
+
+    def handle(self, *args, **options):
+        eliminati = cleanup_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Tombstone eliminate: {eliminati} (conservazione {settings.SYNC_TOMBSTONE_RETENTION_DAYS} giorni)'
+        ))
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from domenico.season_clone import SeasonCloneError, clone_season
+
+
+class Command(BaseCommand):
+    help = 'Clona i trattamenti di una stagione come nuovi trattamenti programmati (date spostate, dosi scalabili)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cliente', type=int, action='append', dest='clienti', help='Id cliente (ripetibile)')
+        parser.add_argument('--cascina', type=int, action='append', dest='cascine', help='Id cascina (ripetibile)')
+        parser.add_argument('--dal', help='Data di esecuzione iniziale (AAAA-MM-GG)')
+        parser.add_argument('--al', help='Data di esecuzione finale (AAAA-MM-GG)')
+        parser.add_argument('--anni', type=int, default=1, help='Anni di spostamento delle date (default: 1)')
+        parser.add_argument('--giorni', type=int, default=0, help='Giorni di spostamento aggiuntivi (default: 0)')
+        parser.add_argument('--fattore-dose', default='1', help='Moltiplicatore delle dosi per ettaro (default: 1)')
+        parser.add_argument('--dry-run', action='store_true', help='Mostra le differenze senza creare nulla')
+        parser.add_argument('--mostra', type=int, default=20, help='Trattamenti da mostrare nel dry run (default: 20)')
+
+    def handle(self, *args, **options):
+        modalita = 'simulazione' if options['dry_run'] else 'clonazione'
+        self.stdout.write(self.style.SUCCESS(f'🌱 Stagione: {modalita}'))
+        self.stdout.write('=' * 60)
+
+        started = time.perf_counter()
+        try:
+            risultato = clone_season(
+                clienti=options['clienti'],
+                cascine=options['cascine'],
+                dal=options['dal'],
+                al=options['al'],
+                anni=options['anni'],
+                giorni=options['giorni'],
+                fattore_dose=options['fattore_dose'],
+                dry_run=options['dry_run'],
+            )
+        except SeasonCloneError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        if options['dry_run']:
+            for voce in risultato['diff'][:options['mostra']]:
+                prima, dopo = voce['data_esecuzione']
+                self.stdout.write(
+                    f"  • #{voce['origine']} {voce['cliente']} {voce['cascina']} "
+                    f"({voce['livello_applicazione']}, {voce['terreni']} terreni): {prima or '-'} → {dopo or '-'}"
+                )
+                for prodotto in voce['prodotti']:
+                    self.stdout.write(
+                        f"      {prodotto['nome']}: {prodotto['dose'][0]} → {prodotto['dose'][1]} {prodotto['unita_misura']}/ha"
+                    )
+            nascosti = len(risultato['diff']) - options['mostra']
+            if nascosti > 0:
+                self.stdout.write(f'  … altri {nascosti:,} trattamenti')
+
+        self.stdout.write('\n📊 Riepilogo:')
+        for nome in ('trattamenti', 'terreni', 'prodotti', 'clienti'):
+            self.stdout.write(f'  • {nome}: {risultato[nome]:,}')
+        verbo = 'da clonare' if options['dry_run'] else 'clonati'
+        self.stdout.write(self.style.SUCCESS(f"✅ {risultato['trattamenti']:,} trattamenti {verbo} in {elapsed:.1f}s"))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.db.models import Sum, Count, Q
+from django.utils import timezone
 from domenico.models import Cliente, Cascina, Terreno, Trattamento, Contoterzista, Prodotto
 
 class Command(BaseCommand):
@@ -186,7 +187,7 @@ class Command(BaseCommand):
         if cascine_senza_contoterzista.exists():
             primo_contoterzista = Contoterzista.objects.first()
             if primo_contoterzista:
-                cascine_senza_contoterzista.update(contoterzista=primo_contoterzista)
+                cascine_senza_contoterzista.update(contoterzista=primo_contoterzista, aggiornato_il=timezone.now())
                 fixed_count += cascine_senza_contoterzista.count()
                 self.stdout.write(f"  ✅ Assegnato contoterzista a {cascine_senza_contoterzista.count()} cascine")
         
@@ -0,0 +1,109 @@
+import json
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from domenico.mail_dispatch import MailDispatchService
+from domenico.outbox import dispatch_batch, outbox_metrics, release_stale_claims
+
+
+class Command(BaseCommand):
+    help = 'Invia le email accodate nell\'outbox con un pool di worker (più istanze possono girare in parallelo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Numero di worker (thread) di invio (default: 2)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Messaggi presi in carico per ogni claim (default: 20)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Resta in esecuzione e controlla la coda periodicamente'
+        )
+        parser.add_argument(
+            '--idle-sleep',
+            type=float,
+            default=5.0,
+            help='Secondi di attesa quando la coda è vuota, con --loop (default: 5)'
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Mostra solo le metriche della coda in JSON ed esce'
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(outbox_metrics(), indent=2))
+            return
+
+        release_stale_claims()
+
+        self.stop_event = threading.Event()
+        if options['loop'] and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *args: self.stop_event.set())
+            signal.signal(signal.SIGINT, lambda *args: self.stop_event.set())
+
+        host_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.totals = {'sent': 0, 'failed': 0, 'emails': 0}
+        self.totals_lock = threading.Lock()
+
+        started = time.monotonic()
+        workers = [
+            threading.Thread(
+                target=self.worker,
+                args=(f"{host_id}-w{i}", options),
+                name=f"outbox-worker-{i}",
+            )
+            for i in range(max(1, options['workers']))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+
+        metrics = outbox_metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f"📨 Outbox: {self.totals['sent']} inviati ({self.totals['emails']} email), "
+            f"{self.totals['failed']} falliti in {elapsed:.1f}s "
+            f"- in coda: {metrics['depth']['in_coda']}, "
+            f"più vecchio: {metrics['oldest_queued_age_seconds']:.0f}s"
+        ))
+
+    def worker(self, worker_id, options):
+        """Ciclo di un worker: claim, invio sulla propria sessione SMTP, ripeti"""
+        service = MailDispatchService()
+        try:
+            with service.session() as session:
+                while not self.stop_event.is_set():
+                    esito = dispatch_batch(worker_id, session, limit=options['batch_size'])
+                    with self.totals_lock:
+                        self.totals['sent'] += esito['sent']
+                        self.totals['failed'] += esito['failed']
+                        self.totals['emails'] += esito['emails']
+
+                    if esito['claimed']:
+                        continue
+                    if not options['loop']:
+                        break
+                    # Coda vuota: chiude la connessione SMTP finché non arriva altro
+                    session.close()
+                    self.stop_event.wait(options['idle_sleep'])
+                    release_stale_claims()
+        finally:
+            # Ogni thread ha la propria connessione al database
+            connections.close_all()
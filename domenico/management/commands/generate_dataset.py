@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from domenico.dataset import SCALE, generate_dataset, scale_params
+
+
+class Command(BaseCommand):
+    help = 'Genera un dataset sintetico deterministico (bulk insert) per benchmark e prove di carico'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            choices=sorted(SCALE),
+            default='small',
+            help='Dimensioni predefinite (default: small)'
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Seme del generatore (default: 42)')
+        parser.add_argument('--anno', type=int, help='Ultima stagione dei trattamenti (default: anno corrente)')
+        # Sostituzioni dei singoli parametri della scala
+        for nome in SCALE['small']:
+            parser.add_argument(f"--{nome.replace('_', '-')}", type=int, dest=nome)
+
+    def handle(self, *args, **options):
+        overrides = {nome: options[nome] for nome in SCALE['small']}
+        if any(v is not None and v < 0 for v in overrides.values()):
+            raise CommandError('I parametri devono essere positivi')
+
+        params = scale_params(options['scale'], **overrides)
+        self.stdout.write(self.style.SUCCESS(f"🏗️  Generazione dataset {options['scale']} (seed {options['seed']})"))
+        self.stdout.write('=' * 60)
+        for nome, valore in params.items():
+            self.stdout.write(f'  • {nome}: {valore:,}')
+
+        started = time.perf_counter()
+        counts = generate_dataset(
+            options['scale'],
+            seed=options['seed'],
+            anno=options['anno'],
+            progress=lambda messaggio: self.stdout.write(f'  ✅ {messaggio}'),
+            **overrides
+        )
+        elapsed = time.perf_counter() - started
+
+        totale = sum(counts.values())
+        self.stdout.write('\n📊 Riepilogo:')
+        for nome, n in counts.items():
+            self.stdout.write(f'  • {nome}: {n:,}')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {totale:,} righe in {elapsed:.1f}s ({totale / elapsed if elapsed else 0:,.0f} righe/s)'
+        ))
@@ -0,0 +1,116 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Riga di `python -X importtime`: "import time:  self [us] | cumulative | [spazi]modulo"
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( +)(\S+)\s*$')
+
+PROJECT_APPS = ['gestionale', 'domenico', 'users', 'core', 'permissions', 'tickets', 'authentication']
+
+TARGETS = {
+    # Quello che paga ogni comando di manage.py
+    'setup': 'import django; django.setup()',
+    # Avvio di un worker: setup più URLconf con tutti i moduli delle view
+    'urls': 'import django; django.setup(); from django.urls import get_resolver; get_resolver().url_patterns',
+}
+
+
+def parse_importtime(output):
+    """
+    Costi di import di primo livello (chi ha importato per primo un modulo ne paga il costo).
+
+    Returns:
+        dict pacchetto -> microsecondi cumulativi
+    """
+    costi = defaultdict(int)
+    for line in output.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        cumulativo, indent, modulo = int(match.group(2)), match.group(3), match.group(4)
+        if len(indent) == 1:
+            costi[modulo.split('.')[0]] += cumulativo
+    return dict(costi)
+
+
+def profile_imports(target='urls'):
+    """Esegue il target in un interprete nuovo con -X importtime"""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'gestionale.settings'))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', TARGETS[target]],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise CommandError(f"Import fallito:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr), wall
+
+
+class Command(BaseCommand):
+    help = 'Misura i costi di import (python -X importtime) per app e segnala le regressioni'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            choices=sorted(TARGETS),
+            default='urls',
+            help='setup: django.setup() come ogni comando; urls: anche tutte le view (default)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='Numero di pacchetti da mostrare (default: 15)'
+        )
+        parser.add_argument(
+            '--threshold-ms',
+            type=float,
+            help='Fallisce se il costo totale di import supera questa soglia'
+        )
+        parser.add_argument(
+            '--app-threshold-ms',
+            type=float,
+            help='Fallisce se una app del progetto supera questa soglia'
+        )
+
+    def handle(self, *args, **options):
+        costi, wall = profile_imports(options['target'])
+        totale_ms = sum(costi.values()) / 1000
+
+        self.stdout.write(self.style.SUCCESS(f"⏱️  Costi di import ({options['target']})"))
+        self.stdout.write('=' * 60)
+
+        self.stdout.write('\n📦 APP DEL PROGETTO:')
+        for app in PROJECT_APPS:
+            if app in costi:
+                self.stdout.write(f"  {app:<30} {costi[app] / 1000:>9.1f} ms")
+
+        self.stdout.write(f"\n🏆 TOP {options['top']} PACCHETTI:")
+        for pacchetto, costo in sorted(costi.items(), key=lambda c: -c[1])[:options['top']]:
+            self.stdout.write(f"  {pacchetto:<30} {costo / 1000:>9.1f} ms")
+
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(f"Totale import: {totale_ms:.1f} ms - processo completo: {wall * 1000:.0f} ms")
+
+        errori = []
+        if options['threshold_ms'] is not None and totale_ms > options['threshold_ms']:
+            errori.append(f"totale {totale_ms:.1f} ms > {options['threshold_ms']:.1f} ms")
+        if options['app_threshold_ms'] is not None:
+            for app in PROJECT_APPS:
+                costo_ms = costi.get(app, 0) / 1000
+                if costo_ms > options['app_threshold_ms']:
+                    errori.append(f"{app} {costo_ms:.1f} ms > {options['app_threshold_ms']:.1f} ms")
+
+        if errori:
+            raise CommandError(f"Regressione dei tempi di import: {'; '.join(errori)}")
+        self.stdout.write(self.style.SUCCESS('✅ Entro le soglie'))
@@ -0,0 +1,213 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from domenico.dataset import is_synthetic_database
+from domenico.load_harness import SCENARIOS, WRITE_SCENARIOS, FakeWeatherAPI, LoadContext, run_load_test
+from domenico.management.commands.benchmark_http import _free_port, _wait_for_server
+from domenico.models import Cascina, Cliente, Trattamento
+from domenico.smtp_sink import SMTPSink
+
+ACCOUNT_EMAIL = 'loadtest{n}@example.com'
+
+
+class Command(BaseCommand):
+    help = (
+        'Prova di carico con scenari realistici (login, aziende, tabella trattamenti, wizard, '
+        'comunicazioni, dashboard, PDF) contro gunicorn locale con SMTP sink e WeatherAPI finta'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Server già avviato da usare (SMTP e meteo vanno configurati a parte); default: avvia gunicorn in locale'
+        )
+        parser.add_argument('--users', type=int, default=10, help='Utenti virtuali in parallelo (default: 10)')
+        parser.add_argument('--iterations', type=int, default=5, help='Scenari per utente (default: 5)')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=sorted(SCENARIOS),
+            dest='scenarios',
+            help='Scenario da eseguire, ripetibile (default: tutti, col peso del mix)'
+        )
+        parser.add_argument('--think-time', type=float, default=0.0, help='Pausa media tra scenari in secondi (default: 0)')
+        parser.add_argument('--seed', type=int, default=0, help='Seme per la scelta degli scenari (default: 0)')
+        parser.add_argument('--password', default='loadtest-password', help='Password degli account di prova')
+        parser.add_argument(
+            '--allow-writes',
+            action='store_true',
+            help='Consente le scritture (comunicazioni, account loadtest*) anche su un database non generato '
+                 'con generate_dataset e, con --url, sul server indicato'
+        )
+        parser.add_argument(
+            '--smtp-delay',
+            type=float,
+            default=0.0,
+            help='Ritardo per connessione dello SMTP sink in secondi, simula il TLS (default: 0)'
+        )
+        parser.add_argument(
+            '--weather-latency',
+            type=float,
+            default=0.0,
+            help='Latenza della WeatherAPI finta in secondi (default: 0)'
+        )
+        parser.add_argument('--output', help='File JSON del report')
+        parser.add_argument(
+            '--startup-timeout',
+            type=int,
+            default=60,
+            help='Secondi di attesa per l\'avvio di gunicorn (default: 60)'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['iterations'] < 1:
+            raise CommandError('--users e --iterations devono essere almeno 1')
+        if not Cliente.objects.exists():
+            raise CommandError('Database vuoto: genera prima i dati con `manage.py generate_dataset`')
+        if not options['url'] and not options['allow_writes'] and not is_synthetic_database():
+            raise CommandError(
+                'Il database non è stato generato con `manage.py generate_dataset`: la prova di carico '
+                'comunica trattamenti e crea account loadtest*. Usa --allow-writes per eseguirla comunque'
+            )
+
+        # Con --url il database del server può essere di produzione: solo letture se non richiesto
+        scritture = options['allow_writes'] or not options['url']
+        if not scritture:
+            richiesti = options['scenarios'] or list(SCENARIOS)
+            options['scenarios'] = [nome for nome in richiesti if nome not in WRITE_SCENARIOS]
+            if not options['scenarios']:
+                raise CommandError('Con --url gli scenari richiesti scrivono dati: aggiungi --allow-writes')
+
+        ctx = self._build_context(options, scritture)
+        self.stdout.write(self.style.SUCCESS('🏋️  Prova di carico'))
+        self.stdout.write('=' * 60)
+        if not scritture:
+            self.stdout.write(f"Solo letture, scenari esclusi: {', '.join(sorted(WRITE_SCENARIOS))} (--allow-writes per includerli)")
+        self.stdout.write(
+            f"Utenti: {options['users']} - scenari per utente: {options['iterations']} - "
+            f"trattamenti da comunicare: {ctx.programmati_rimanenti}"
+        )
+
+        if options['url']:
+            report = self._run(options['url'], ctx, options)
+        else:
+            with SMTPSink(connect_delay=options['smtp_delay']) as sink, \
+                    FakeWeatherAPI(latency=options['weather_latency']) as weather:
+                report = self._run_with_server(ctx, options, sink, weather)
+                report['servizi_finti'] = {
+                    'smtp_messaggi': sink.messages_received,
+                    'smtp_connessioni': sink.connections,
+                    'weather_richieste': weather.requests,
+                }
+
+        self._print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"💾 Report salvato in {options['output']}"))
+
+    def _build_context(self, options, scritture):
+        User = get_user_model()
+        credentials = []
+        for n in range(1, min(options['users'], 20) + 1):
+            email = ACCOUNT_EMAIL.format(n=n)
+            user = User.objects.filter(email=email).first()
+            if user is not None and user.check_password(options['password']):
+                credentials.append(email)
+            elif scritture:
+                if user is None:
+                    User.objects.create_user(email=email, password=options['password'], first_name='Load', last_name=f'Test {n}')
+                else:
+                    user.set_password(options['password'])
+                    user.save()
+                credentials.append(email)
+        if not credentials:
+            raise CommandError(
+                f"Nessun account {ACCOUNT_EMAIL.format(n='N')} con la password indicata: "
+                "crealo oppure usa --allow-writes"
+            )
+
+        return LoadContext(
+            clienti=list(Cliente.objects.values_list('id', flat=True)[:500]),
+            cascine=list(Cascina.objects.values_list('id', flat=True)[:500]),
+            comunicati=list(Trattamento.objects.filter(stato='comunicato').values_list('id', flat=True)[:500]),
+            programmati=list(Trattamento.objects.filter(stato='programmato').order_by('id').values_list('id', flat=True)),
+            credentials=credentials,
+            password=options['password'],
+        )
+
+    def _run(self, url, ctx, options):
+        return run_load_test(
+            url, ctx,
+            users=options['users'],
+            iterations=options['iterations'],
+            scenarios=options['scenarios'],
+            think_time=options['think_time'],
+            seed=options['seed'],
+        )
+
+    def _run_with_server(self, ctx, options, sink, weather):
+        port = _free_port()
+        env = dict(
+            os.environ,
+            # Configurazione di produzione, dietro un proxy HTTPS simulato (X-Forwarded-Proto)
+            DEBUG='',
+            DJANGO_ALLOWED_HOSTS='localhost 127.0.0.1',
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=str(sink.port),
+            EMAIL_USE_TLS='0',
+            WEATHER_API_URL=weather.url,
+            API_KEY_WEATHER='loadtest',
+            GUNICORN_ACCESS_LOG='',
+            GUNICORN_LOG_LEVEL='warning',
+        )
+        self.stdout.write(f"▶️  Avvio gunicorn su 127.0.0.1:{port} (SMTP sink :{sink.port}, meteo {weather.url})")
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+             '-c', os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        try:
+            if not _wait_for_server('127.0.0.1', port, options['startup_timeout']):
+                raise CommandError('gunicorn non si è avviato in tempo')
+            return self._run(f'http://127.0.0.1:{port}', ctx, options)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def _print_report(self, report):
+        totale = report['totale']
+        self.stdout.write(f"\n📊 Endpoint ({report['durata']:.1f}s)")
+        self.stdout.write(f"  {'endpoint':<40} {'req':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'errori':>7}")
+        for nome, r in report['endpoint'].items():
+            riga = (
+                f"  {nome:<40} {r['requests']:>6} {r['rps']:>7.1f} {r['p50']:>6.0f}ms {r['p95']:>6.0f}ms "
+                f"{r['p99']:>6.0f}ms {r['error_rate']:>6.1%}"
+            )
+            self.stdout.write(self.style.ERROR(riga) if r['errors'] else riga)
+            for esempio in r['esempi_errori']:
+                self.stdout.write(f"      ↳ {esempio}")
+
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(f"Scenari eseguiti: {', '.join(f'{k} {v}' for k, v in report['scenari'].items())}")
+        if 'servizi_finti' in report:
+            finti = report['servizi_finti']
+            self.stdout.write(
+                f"SMTP sink: {finti['smtp_messaggi']} messaggi su {finti['smtp_connessioni']} connessioni • "
+                f"WeatherAPI finta: {finti['weather_richieste']} richieste"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"📈 {totale['requests']} richieste, {totale['rps']:.1f} req/s, p50 {totale['p50']:.0f}ms, "
+            f"p95 {totale['p95']:.0f}ms, p99 {totale['p99']:.0f}ms, errori {totale['error_rate']:.1%}"
+        ))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from domenico.activity_logging import cleanup_old_logs
+from domenico.activity_partitions import ensure_partitions, is_partitioned, list_partitions
+
+
+class Command(BaseCommand):
+    help = 'Crea le partizioni mensili future di ActivityLog ed elimina quelle scadute (da eseguire periodicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=2,
+            help='Mesi futuri per cui creare le partizioni (default: 2)'
+        )
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=None,
+            help='Se indicato, elimina i log più vecchi di questi giorni'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('🗂️  Partizioni Log Attività'))
+        self.stdout.write('=' * 60)
+
+        if not is_partitioned():
+            self.stdout.write(self.style.WARNING(
+                f'⚠️  Partizionamento non disponibile su {connection.vendor}: '
+                f'la retention usa l\'eliminazione a blocchi.'
+            ))
+        else:
+            create = ensure_partitions(months_ahead=options['ahead'])
+            for nome in create:
+                self.stdout.write(f'  + {nome}')
+
+        if options['retention_days'] is not None:
+            deleted = cleanup_old_logs(options['retention_days'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Retention {options["retention_days"]} giorni: eliminati ~{deleted} log'
+            ))
+
+        if is_partitioned():
+            self.stdout.write('\n📊 PARTIZIONI:')
+            for partizione in list_partitions():
+                self.stdout.write(
+                    f'  • {partizione["name"]}: {partizione["start"]:%d/%m/%Y} - '
+                    f'{partizione["end"]:%d/%m/%Y} (~{partizione["rows"]} righe)'
+                )
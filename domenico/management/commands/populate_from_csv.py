@@ -8,6 +8,15 @@ from domenico.models import (
     ContattoEmail, PrincipioAttivo
 )
 
+# Import in dependency order: (name, CSV file)
+CSV_IMPORTS = [
+    ('contoterzisti', 'Contoterzisti-Grid view.csv'),
+    ('prodotti', 'Prodotti-Grid view.csv'),
+    ('clienti', 'Cliente-Grid view.csv'),
+    ('cascine', 'Cascina-Grid view.csv'),
+    ('vigneti', 'Vigneto-Grid view.csv'),
+]
+
 class Command(BaseCommand):
     help = 'Populate database from CSV files in files_csv directory'
 
@@ -22,6 +31,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Skip records that already exist in the database'
         )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            choices=[name for name, _ in CSV_IMPORTS],
+            help='Run only the given imports (still in dependency order)'
+        )
 
     def find_best_cascina_match(self, cascina_name):
         """Find the best matching cascina using fuzzy string matching"""
@@ -71,12 +86,9 @@ class Command(BaseCommand):
         
         try:
             with transaction.atomic():
-                # Import in dependency order
-                self.import_contoterzisti()
-                self.import_prodotti()
-                self.import_clienti()
-                self.import_cascine()
-                self.import_vigneti()
+                for name, _ in CSV_IMPORTS:
+                    if not options['only'] or name in options['only']:
+                        getattr(self, f'import_{name}')()
                 # self.import_trattamenti()  # Complex, will implement after basic data
                 
                 if self.dry_run:
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from domenico.activity_rollup import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = 'Ricalcola il riepilogo giornaliero delle attività dai log grezzi (backfill o riconciliazione periodica)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Ricalcola solo gli ultimi N giorni (default: tutto lo storico dei log)'
+        )
+
+    def handle(self, *args, **options):
+        start = None
+        if options['days'] is not None:
+            start = timezone.localdate() - timedelta(days=options['days'] - 1)
+
+        righe = rebuild_rollup(start=start)
+
+        periodo = f'ultimi {options["days"]} giorni' if start else 'tutto lo storico'
+        self.stdout.write(self.style.SUCCESS(f'✅ Riepilogo attività ricalcolato ({periodo}): {righe} righe'))
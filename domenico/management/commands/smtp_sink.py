@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from domenico.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = 'Avvia un server SMTP locale che accetta e scarta i messaggi (per test e benchmark)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help='Indirizzo di ascolto (default: 127.0.0.1)'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=1025,
+            help='Porta di ascolto (default: 1025)'
+        )
+        parser.add_argument(
+            '--connect-delay',
+            type=float,
+            default=0.0,
+            help='Ritardo in secondi per ogni nuova connessione, simula handshake TLS (default: 0)'
+        )
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(
+            host=options['host'],
+            port=options['port'],
+            connect_delay=options['connect_delay']
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"📭 SMTP sink in ascolto su {options['host']}:{options['port']} (CTRL+C per uscire)")
+        )
+        self.stdout.write(
+            f"   Usa EMAIL_BACKEND=smtp con EMAIL_HOST={options['host']} EMAIL_PORT={options['port']} EMAIL_USE_TLS=False"
+        )
+
+        try:
+            sink.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            f'\n📊 Connessioni: {sink.connections} • Messaggi ricevuti: {sink.messages_received}'
+        )
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+from domenico.management.commands.populate_from_csv import CSV_IMPORTS
+
+CSV_DIR = os.path.join(settings.BASE_DIR, 'files_csv')
+STATIC_STAMP = '.startup_static.sha256'
+# Stessi pattern ignorati di default da collectstatic
+STATIC_IGNORE = ['CVS', '.*', '*~']
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pending_migrations():
+    """Migrazioni non ancora applicate al database"""
+    executor = MigrationExecutor(connection)
+    return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def static_manifest_checksum():
+    """
+    Checksum dei file statici sorgente (percorso + contenuto) e della configurazione
+    dello storage: cambia ogni volta che collectstatic produrrebbe un risultato diverso.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr(settings.STORAGES.get('staticfiles')).encode())
+    files = {}
+    for finder in finders.get_finders():
+        for path, storage in finder.list(STATIC_IGNORE):
+            prefixed = os.path.join(getattr(storage, 'prefix', None) or '', path)
+            # Come collectstatic, vince il primo file trovato per ogni percorso
+            files.setdefault(prefixed, storage.path(path))
+    for prefixed in sorted(files):
+        digest.update(prefixed.encode())
+        digest.update(file_checksum(files[prefixed]).encode())
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = 'Avvio del container: migrazioni, collectstatic e import CSV solo se qualcosa è cambiato'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Esegue tutte le fasi ignorando i checksum registrati'
+        )
+        parser.add_argument(
+            '--skip-static',
+            action='store_true',
+            help='Non esegue collectstatic'
+        )
+        parser.add_argument(
+            '--skip-csv',
+            action='store_true',
+            help='Non importa i file CSV'
+        )
+
+    def handle(self, *args, **options):
+        self.force = options['force']
+        self.verbosity = options['verbosity']
+
+        self.stdout.write(self.style.SUCCESS('🚀 Avvio gestionale'))
+        self.stdout.write('=' * 60)
+
+        # Le partizioni vanno create a ogni avvio, indipendentemente dai checksum
+        fasi = [('Migrazioni', self.phase_migrate), ('Partizioni log attività', self.phase_partitions)]
+        if not options['skip_static']:
+            fasi.append(('File statici', self.phase_static))
+        if not options['skip_csv']:
+            fasi.append(('Import CSV', self.phase_csv))
+
+        started = time.perf_counter()
+        for nome, fase in fasi:
+            fase_started = time.perf_counter()
+            esito = fase()
+            durata = time.perf_counter() - fase_started
+            self.stdout.write(f"  {nome}: {esito} ({durata:.2f}s)")
+
+        self.stdout.write('=' * 60)
+        self.stdout.write(self.style.SUCCESS(f"✅ Avvio completato in {time.perf_counter() - started:.2f}s"))
+
+    def phase_migrate(self):
+        piano = pending_migrations()
+        if not piano:
+            return 'nessuna migrazione da applicare'
+
+        call_command('migrate', interactive=False, verbosity=self.verbosity)
+        return f'{len(piano)} migrazioni applicate'
+
+    def phase_partitions(self):
+        from domenico.activity_partitions import ensure_partitions, is_partitioned
+
+        if not is_partitioned():
+            return 'tabella non partizionata'
+        create = ensure_partitions()
+        if not create:
+            return 'partizioni già presenti'
+        return f"create: {', '.join(create)}"
+
+    def phase_static(self):
+        checksum = static_manifest_checksum()
+        stamp_path = os.path.join(settings.STATIC_ROOT, STATIC_STAMP)
+
+        if not self.force and os.path.exists(stamp_path):
+            with open(stamp_path) as f:
+                if f.read().strip() == checksum:
+                    return 'invariati, collectstatic saltato'
+
+        call_command('collectstatic', interactive=False, verbosity=self.verbosity)
+        # Il volume degli statici sopravvive al container: il checksum va scritto lì
+        with open(stamp_path, 'w') as f:
+            f.write(checksum)
+        return 'collectstatic eseguito'
+
+    def phase_csv(self):
+        from domenico.models import StartupChecksum
+
+        registrati = dict(StartupChecksum.objects.values_list('nome', 'checksum'))
+        modificati = {}
+        for nome, filename in CSV_IMPORTS:
+            path = os.path.join(CSV_DIR, filename)
+            if not os.path.exists(path):
+                continue
+            checksum = file_checksum(path)
+            if self.force or registrati.get(f'csv:{filename}') != checksum:
+                modificati[nome] = (filename, checksum)
+
+        if not modificati:
+            return 'file invariati, import saltato'
+
+        try:
+            call_command('populate_from_csv', only=list(modificati), verbosity=self.verbosity)
+        except Exception as e:
+            # Come in passato un import fallito non blocca l'avvio; riproverà al prossimo
+            self.stdout.write(self.style.ERROR(f"❌ Import CSV fallito: {e}"))
+            return 'fallito, checksum non aggiornati'
+
+        for filename, checksum in modificati.values():
+            StartupChecksum.objects.update_or_create(nome=f'csv:{filename}', defaults={'checksum': checksum})
+        return f"importati: {', '.join(modificati)}"
@@ -0,0 +1,64 @@
+# domenico/metrics.py
+# Metriche di dominio esposte su /metrics (vedi core/metrics.py): render dei PDF, invio
+# SMTP, WeatherAPI e conteggio dei trattamenti per stato, letto dal database a ogni scrape.
+
+from django.db.models import Count
+
+from core.metrics import PROMETHEUS_AVAILABLE, counter, histogram, register_collector
+
+PDF_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+PDF_SIZE_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+SMTP_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+PDF_RENDER_SECONDS = histogram(
+    'pdf_render_duration_seconds',
+    'Durata del render HTML -> PDF per motore',
+    ['engine'],
+    buckets=PDF_BUCKETS,
+)
+PDF_SIZE_BYTES = histogram(
+    'pdf_size_bytes',
+    'Dimensione dei PDF generati per motore',
+    ['engine'],
+    buckets=PDF_SIZE_BUCKETS,
+)
+SMTP_SEND_SECONDS = histogram(
+    'smtp_send_duration_seconds',
+    'Durata dell\'invio di un messaggio SMTP (tentativi di riconnessione inclusi) per esito',
+    ['outcome'],
+    buckets=SMTP_BUCKETS,
+)
+SMTP_FAILURES = counter(
+    'smtp_failures',
+    'Messaggi SMTP non inviati',
+)
+WEATHER_API_SECONDS = histogram(
+    'weather_api_duration_seconds',
+    'Latenza delle chiamate a WeatherAPI per esito',
+    ['outcome'],
+)
+# Hit ratio: rate(..{result="hit"}) / rate(..) in PromQL
+WEATHER_CACHE_REQUESTS = counter(
+    'weather_cache_requests',
+    'Richieste meteo per esito della cache (hit, miss, stale)',
+    ['result'],
+)
+
+
+class TreatmentStateCollector:
+    """Numero di trattamenti per stato, una query GROUP BY a ogni scrape"""
+
+    def collect(self):
+        from prometheus_client.core import GaugeMetricFamily
+
+        from .models import Trattamento
+
+        family = GaugeMetricFamily('gestionale_trattamenti', 'Trattamenti per stato', labels=['stato'])
+        counts = dict(Trattamento.objects.order_by().values_list('stato').annotate(n=Count('id')))
+        for stato, _ in Trattamento.STATI_CHOICES:
+            family.add_metric([stato], counts.get(stato, 0))
+        yield family
+
+
+if PROMETHEUS_AVAILABLE:
+    register_collector(TreatmentStateCollector())
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domenico', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('destinatari', models.JSONField(default=list, help_text='Lista email destinatari')),
+                ('oggetto', models.CharField(max_length=500)),
+                ('corpo', models.TextField()),
+                ('mittente', models.CharField(blank=True, max_length=254)),
+                ('allegato_nome', models.CharField(blank=True, max_length=255)),
+                ('allegato_path', models.CharField(blank=True, help_text="Percorso del PDF nello storage; se vuoto il PDF del trattamento viene generato all'invio", max_length=500)),
+                ('stato', models.CharField(choices=[('in_coda', 'In coda'), ('in_invio', 'In invio'), ('inviato', 'Inviato'), ('fallito', 'Fallito')], default='in_coda', max_length=20)),
+                ('tentativi', models.PositiveIntegerField(default=0)),
+                ('max_tentativi', models.PositiveIntegerField(default=5)),
+                ('prossimo_tentativo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_errore', models.TextField(blank=True)),
+                ('bloccato_da', models.CharField(blank=True, max_length=100)),
+                ('bloccato_il', models.DateTimeField(blank=True, null=True)),
+                ('creato_il', models.DateTimeField(auto_now_add=True)),
+                ('inviato_il', models.DateTimeField(blank=True, null=True)),
+                ('trattamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='email_outbox', to='domenico.trattamento')),
+            ],
+            options={
+                'verbose_name': 'Email in Uscita',
+                'verbose_name_plural': 'Email in Uscita',
+                'ordering': ['creato_il'],
+                'indexes': [models.Index(fields=['stato', 'prossimo_tentativo'], name='domenico_em_stato_5d0732_idx')],
+            },
+        ),
+    ]
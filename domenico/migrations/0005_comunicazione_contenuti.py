@@ -0,0 +1,124 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from domenico.content_store import DIZIONARIO_CORRENTE, calcola_hash, comprimi, decomprimi
+
+
+def converti_comunicazioni(apps, schema_editor):
+    """Sposta corpo e destinatari delle comunicazioni esistenti in ContenutoComunicazione"""
+    ComunicazioneTrattamento = apps.get_model('domenico', 'ComunicazioneTrattamento')
+    ContenutoComunicazione = apps.get_model('domenico', 'ContenutoComunicazione')
+    db_alias = schema_editor.connection.alias
+
+    creati = set(ContenutoComunicazione.objects.using(db_alias).values_list('hash', flat=True))
+
+    def contenuto(testo):
+        raw = (testo or '').encode('utf-8')
+        hash_contenuto = calcola_hash(raw)
+        if hash_contenuto not in creati:
+            ContenutoComunicazione.objects.using(db_alias).create(
+                hash=hash_contenuto, dati=comprimi(raw),
+                dizionario=DIZIONARIO_CORRENTE, dimensione=len(raw)
+            )
+            creati.add(hash_contenuto)
+        return hash_contenuto
+
+    batch = []
+    queryset = ComunicazioneTrattamento.objects.using(db_alias).only('id', 'corpo_email', 'destinatari').order_by('id')
+    for comunicazione in queryset.iterator(chunk_size=500):
+        comunicazione.contenuto_corpo_id = contenuto(comunicazione.corpo_email)
+        comunicazione.contenuto_destinatari_id = contenuto(comunicazione.destinatari)
+        batch.append(comunicazione)
+        if len(batch) >= 500:
+            ComunicazioneTrattamento.objects.using(db_alias).bulk_update(batch, ['contenuto_corpo', 'contenuto_destinatari'])
+            batch = []
+    if batch:
+        ComunicazioneTrattamento.objects.using(db_alias).bulk_update(batch, ['contenuto_corpo', 'contenuto_destinatari'])
+
+
+def ripristina_comunicazioni(apps, schema_editor):
+    """Riporta corpo e destinatari nelle colonne di testo"""
+    ComunicazioneTrattamento = apps.get_model('domenico', 'ComunicazioneTrattamento')
+    db_alias = schema_editor.connection.alias
+
+    queryset = ComunicazioneTrattamento.objects.using(db_alias).select_related(
+        'contenuto_corpo', 'contenuto_destinatari'
+    ).order_by('id')
+    batch = []
+    for comunicazione in queryset.iterator(chunk_size=500):
+        for campo, riferimento in (('corpo_email', 'contenuto_corpo'), ('destinatari', 'contenuto_destinatari')):
+            contenuto = getattr(comunicazione, riferimento)
+            if contenuto is not None:
+                setattr(comunicazione, campo, decomprimi(contenuto.dati, contenuto.dizionario).decode('utf-8'))
+        batch.append(comunicazione)
+        if len(batch) >= 500:
+            ComunicazioneTrattamento.objects.using(db_alias).bulk_update(batch, ['corpo_email', 'destinatari'])
+            batch = []
+    if batch:
+        ComunicazioneTrattamento.objects.using(db_alias).bulk_update(batch, ['corpo_email', 'destinatari'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domenico', '0004_emailoutbox_digest_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContenutoComunicazione',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('dati', models.BinaryField()),
+                ('dizionario', models.PositiveSmallIntegerField(default=0, help_text='Versione del dizionario zlib usato')),
+                ('dimensione', models.PositiveIntegerField(help_text='Dimensione non compressa in byte')),
+                ('creato_il', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Contenuto Comunicazione',
+                'verbose_name_plural': 'Contenuti Comunicazioni',
+            },
+        ),
+        migrations.AddField(
+            model_name='comunicazionetrattamento',
+            name='allegato_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 del PDF archiviato (vedi content_store)', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='comunicazionetrattamento',
+            name='allegati',
+            field=models.TextField(blank=True, help_text='Lista nomi allegati (separati da virgola)'),
+        ),
+        migrations.AddField(
+            model_name='comunicazionetrattamento',
+            name='contenuto_corpo',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='domenico.contenutocomunicazione'),
+        ),
+        migrations.AddField(
+            model_name='comunicazionetrattamento',
+            name='contenuto_destinatari',
+            field=models.ForeignKey(blank=True, help_text='Lista email destinatari (separati da virgola)', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='domenico.contenutocomunicazione'),
+        ),
+        migrations.RunPython(converti_comunicazioni, ripristina_comunicazioni),
+        # blank=True così, in caso di rollback, le colonne vengono ricreate con default ''
+        migrations.AlterField(
+            model_name='comunicazionetrattamento',
+            name='corpo_email',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='comunicazionetrattamento',
+            name='destinatari',
+            field=models.TextField(blank=True, help_text='Lista email destinatari (separati da virgola)'),
+        ),
+        migrations.RemoveField(
+            model_name='comunicazionetrattamento',
+            name='corpo_email',
+        ),
+        migrations.RemoveField(
+            model_name='comunicazionetrattamento',
+            name='destinatari',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Partizionamento mensile di ActivityLog (solo PostgreSQL; sugli altri database non fa nulla)
+
+from django.db import migrations
+
+from domenico.activity_partitions import convert_to_partitioned, convert_to_plain, is_partitioned
+
+
+def partiziona(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql' and not is_partitioned(connection):
+        convert_to_partitioned(connection)
+
+
+def rimuovi_partizioni(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql' and is_partitioned(connection):
+        convert_to_plain(connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domenico', '0005_comunicazione_contenuti'),
+    ]
+
+    operations = [
+        migrations.RunPython(partiziona, rimuovi_partizioni),
+    ]
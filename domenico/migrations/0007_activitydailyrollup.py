@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:44
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def popola_riepilogo(apps, schema_editor):
+    """Calcola il riepilogo giornaliero dai log già presenti"""
+    ActivityLog = apps.get_model('domenico', 'ActivityLog')
+    ActivityDailyRollup = apps.get_model('domenico', 'ActivityDailyRollup')
+    db_alias = schema_editor.connection.alias
+
+    conteggi = (
+        ActivityLog.objects.using(db_alias).order_by()
+        .annotate(giorno=TruncDate('timestamp'))
+        .values('giorno', 'activity_type')
+        .annotate(totale=Count('id'))
+    )
+    ActivityDailyRollup.objects.using(db_alias).bulk_create([
+        ActivityDailyRollup(giorno=riga['giorno'], activity_type=riga['activity_type'], count=riga['totale'])
+        for riga in conteggi
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domenico', '0006_activitylog_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('giorno', models.DateField()),
+                ('activity_type', models.CharField(choices=[('cliente_created', 'Cliente Creato'), ('cascina_created', 'Cascina Creata'), ('terreno_created', 'Terreno Creato'), ('prodotto_created', 'Prodotto Creato'), ('contoterzista_created', 'Contoterzista Creato'), ('contatto_created', 'Contatto Email Creato'), ('trattamento_created', 'Trattamento Creato'), ('trattamento_updated', 'Trattamento Aggiornato'), ('comunicazione_sent', 'Comunicazione Inviata'), ('user_login', 'Accesso Utente'), ('data_export', 'Esportazione Dati'), ('backup_created', 'Backup Creato')], max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Riepilogo Giornaliero Attività',
+                'verbose_name_plural': 'Riepiloghi Giornalieri Attività',
+                'ordering': ['-giorno', 'activity_type'],
+                'unique_together': {('giorno', 'activity_type')},
+            },
+        ),
+        migrations.RunPython(popola_riepilogo, migrations.RunPython.noop),
+    ]
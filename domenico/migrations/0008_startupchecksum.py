@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domenico', '0007_activitydailyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StartupChecksum',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=200, unique=True)),
+                ('checksum', models.CharField(max_length=64)),
+                ('aggiornato_il', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Checksum Avvio',
+                'verbose_name_plural': 'Checksum Avvio',
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domenico', '0008_startupchecksum'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modello', models.CharField(max_length=50)),
+                ('oggetto_id', models.PositiveIntegerField()),
+                ('eliminato_il', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Eliminazione Sincronizzata',
+                'verbose_name_plural': 'Eliminazioni Sincronizzate',
+            },
+        ),
+        migrations.AddField(
+            model_name='cascina',
+            name='aggiornato_il',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='aggiornato_il',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='prodotto',
+            name='aggiornato_il',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='terreno',
+            name='aggiornato_il',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='trattamento',
+            name='aggiornato_il',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -1,7 +1,11 @@
-from django.db import models
+import logging
+
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+
+logger = logging.getLogger(__name__)
 User = get_user_model()
 
 
@@ -67,6 +71,8 @@ class UserSession(models.Model):
 class Cliente(models.Model):
     nome = models.CharField(max_length=200)
     creato_il = models.DateTimeField(auto_now_add=True)
+    # Sincronizzazione offline della PWA (vedi domenico/sync.py)
+    aggiornato_il = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.nome
@@ -123,6 +129,8 @@ class Cascina(models.Model):
         related_name='cascine',
         help_text="Contoterzista responsabile per questa cascina (opzionale)"
     )
+    # Sincronizzazione offline della PWA (vedi domenico/sync.py)
+    aggiornato_il = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.nome} - {self.cliente.nome}"
@@ -153,6 +161,8 @@ class Terreno(models.Model):
         validators=[MinValueValidator(0.01)],
         help_text="Superficie in ettari"
     )
+    # Sincronizzazione offline della PWA (vedi domenico/sync.py)
+    aggiornato_il = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.nome} - {self.cascina.nome} ({self.superficie} ha)"
@@ -185,6 +195,8 @@ class Prodotto(models.Model):
         default='L',
         help_text="Es: L, Kg, g, ml"
     )
+    # Sincronizzazione offline della PWA (vedi domenico/sync.py)
+    aggiornato_il = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.nome
@@ -237,6 +249,8 @@ class Trattamento(models.Model):
         default='programmato',
         help_text="Stato attuale del trattamento"
     )
+    # Sincronizzazione offline della PWA (vedi domenico/sync.py)
+    aggiornato_il = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['-data_inserimento']
@@ -263,7 +277,7 @@ class Trattamento(models.Model):
             return Decimal(str(superficie)) if superficie else Decimal('0')
             
         except Exception as e:
-            print(f"Errore calcolo superficie trattamento {self.id}: {e}")
+            logger.error(f"Errore calcolo superficie trattamento {self.id}: {e}")
             return Decimal('0')
     
     def get_contoterzista(self):
@@ -327,17 +341,111 @@ class TrattamentoProdotto(models.Model):
         verbose_name_plural = "Prodotti del Trattamento"
 
      
+class ContenutoComunicazione(models.Model):
+    """
+    Testo (corpo email, elenco destinatari) salvato compresso e indirizzato per hash:
+    i contenuti ripetuti vengono memorizzati una sola volta
+    """
+    hash = models.CharField(max_length=64, primary_key=True)
+    dati = models.BinaryField()
+    dizionario = models.PositiveSmallIntegerField(default=0, help_text="Versione del dizionario zlib usato")
+    dimensione = models.PositiveIntegerField(help_text="Dimensione non compressa in byte")
+    creato_il = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def salva(cls, testo):
+        """Restituisce il contenuto per il testo, creandolo se non esiste ancora"""
+        from .content_store import calcola_hash, comprimi, DIZIONARIO_CORRENTE
+
+        raw = (testo or '').encode('utf-8')
+        contenuto, _ = cls.objects.get_or_create(
+            hash=calcola_hash(raw),
+            defaults={
+                'dati': comprimi(raw),
+                'dizionario': DIZIONARIO_CORRENTE,
+                'dimensione': len(raw),
+            }
+        )
+        return contenuto
+
+    @property
+    def testo(self):
+        from .content_store import decomprimi
+        return decomprimi(self.dati, self.dizionario).decode('utf-8')
+
+    def __str__(self):
+        return f"{self.hash[:12]} ({self.dimensione} byte)"
+
+    class Meta:
+        verbose_name = "Contenuto Comunicazione"
+        verbose_name_plural = "Contenuti Comunicazioni"
+
+
 class ComunicazioneTrattamento(models.Model):
     """Traccia le comunicazioni inviate per ogni trattamento"""
     trattamento = models.ForeignKey(Trattamento, on_delete=models.CASCADE, related_name='comunicazioni')
     data_invio = models.DateTimeField(auto_now_add=True)
-    destinatari = models.TextField(help_text="Lista email destinatari (separati da virgola)")
+    contenuto_destinatari = models.ForeignKey(
+        ContenutoComunicazione, on_delete=models.PROTECT, related_name='+',
+        null=True, blank=True, help_text="Lista email destinatari (separati da virgola)"
+    )
     oggetto = models.CharField(max_length=500)
-    corpo_email = models.TextField()
-    allegati = models.TextField(blank=True, help_text="Lista percorsi allegati (separati da virgola)")
+    contenuto_corpo = models.ForeignKey(
+        ContenutoComunicazione, on_delete=models.PROTECT, related_name='+',
+        null=True, blank=True
+    )
+    allegati = models.TextField(blank=True, help_text="Lista nomi allegati (separati da virgola)")
+    allegato_hash = models.CharField(
+        max_length=64, blank=True, db_index=True,
+        help_text="SHA-256 del PDF archiviato (vedi content_store)"
+    )
     inviato_con_successo = models.BooleanField(default=False)
     errore = models.TextField(blank=True)
-    
+
+    # Accesso trasparente ai testi salvati in ContenutoComunicazione.
+    # Per le liste usare select_related('contenuto_destinatari') e non caricare il corpo.
+    # I testi assegnati restano in sospeso fino a save(): un'istanza mai salvata
+    # non lascia ContenutoComunicazione orfani.
+    def _testo(self, campo):
+        pendenti = self.__dict__.get('_testi_pendenti', {})
+        if campo in pendenti:
+            return pendenti[campo]
+        contenuto = getattr(self, campo) if getattr(self, f'{campo}_id') else None
+        return contenuto.testo if contenuto else ''
+
+    def _imposta_testo(self, campo, testo):
+        self.__dict__.setdefault('_testi_pendenti', {})[campo] = testo
+
+    @property
+    def destinatari(self):
+        return self._testo('contenuto_destinatari')
+
+    @destinatari.setter
+    def destinatari(self, testo):
+        self._imposta_testo('contenuto_destinatari', testo)
+
+    @property
+    def corpo_email(self):
+        return self._testo('contenuto_corpo')
+
+    @corpo_email.setter
+    def corpo_email(self, testo):
+        self._imposta_testo('contenuto_corpo', testo)
+
+    def save(self, *args, **kwargs):
+        pendenti = self.__dict__.get('_testi_pendenti')
+        if not pendenti:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic(using=kwargs.get('using')):
+            for campo, testo in pendenti.items():
+                setattr(self, campo, ContenutoComunicazione.salva(testo))
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | set(pendenti)
+            super().save(*args, **kwargs)
+        # Solo a salvataggio riuscito: se fallisce, il prossimo save() li risolve di nuovo
+        del self.__dict__['_testi_pendenti']
+
     def __str__(self):
         return f"Comunicazione {self.trattamento.id} - {self.data_invio.strftime('%d/%m/%Y %H:%M')}"
     
@@ -347,6 +455,61 @@ class ComunicazioneTrattamento(models.Model):
         ordering = ['-data_invio']
 
 
+class EmailOutbox(models.Model):
+    """
+    Coda persistente delle email di comunicazione: la request inserisce il messaggio,
+    il comando dispatch_outbox lo invia e gestisce i tentativi.
+    """
+
+    STATI_CHOICES = [
+        ('in_coda', 'In coda'),
+        ('in_invio', 'In invio'),
+        ('inviato', 'Inviato'),
+        ('fallito', 'Fallito'),
+    ]
+
+    trattamento = models.ForeignKey(
+        Trattamento, on_delete=models.CASCADE, related_name='email_outbox',
+        null=True, blank=True
+    )
+    destinatari = models.JSONField(default=list, help_text="Lista email destinatari")
+    oggetto = models.CharField(max_length=500)
+    corpo = models.TextField()
+    mittente = models.CharField(max_length=254, blank=True)
+    allegato_nome = models.CharField(max_length=255, blank=True)
+    allegato_path = models.CharField(
+        max_length=500, blank=True,
+        help_text="Percorso del PDF nello storage; se vuoto il PDF del trattamento viene generato all'invio"
+    )
+
+    stato = models.CharField(max_length=20, choices=STATI_CHOICES, default='in_coda')
+    tentativi = models.PositiveIntegerField(default=0)
+    max_tentativi = models.PositiveIntegerField(default=5)
+    prossimo_tentativo = models.DateTimeField(default=timezone.now)
+    ultimo_errore = models.TextField(blank=True)
+
+    # Modalità digest: i messaggi con la stessa chiave e finestra vengono inviati insieme
+    digest_key = models.CharField(max_length=100, blank=True, db_index=True)
+
+    # Claim del dispatcher: token del worker che sta inviando e momento del claim
+    bloccato_da = models.CharField(max_length=100, blank=True)
+    bloccato_il = models.DateTimeField(null=True, blank=True)
+
+    creato_il = models.DateTimeField(auto_now_add=True)
+    inviato_il = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Outbox #{self.id} - {self.oggetto} ({self.get_stato_display()})"
+
+    class Meta:
+        verbose_name = "Email in Uscita"
+        verbose_name_plural = "Email in Uscita"
+        ordering = ['creato_il']
+        indexes = [
+            models.Index(fields=['stato', 'prossimo_tentativo']),
+        ]
+
+
 
 class ActivityLog(models.Model):
     """Log delle attività dell'utente nel sistema"""
@@ -467,6 +630,58 @@ class ActivityLog(models.Model):
             models.Index(fields=['related_object_type', 'related_object_id']),
         ]
 
+
+class ActivityDailyRollup(models.Model):
+    """
+    Conteggio giornaliero delle attività per tipo: alimenta tutte le statistiche
+    senza scansionare ActivityLog (aggiornato a ogni log, vedi activity_rollup)
+    """
+    giorno = models.DateField()
+    activity_type = models.CharField(max_length=50, choices=ActivityLog.ACTIVITY_TYPES)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.giorno} - {self.activity_type}: {self.count}"
+
+    class Meta:
+        verbose_name = "Riepilogo Giornaliero Attività"
+        verbose_name_plural = "Riepiloghi Giornalieri Attività"
+        ordering = ['-giorno', 'activity_type']
+        unique_together = ['giorno', 'activity_type']
+
+
+class StartupChecksum(models.Model):
+    """
+    Checksum degli input già elaborati all'avvio del container (vedi comando startup).
+    Contiene anche il marcatore dei dataset sintetici (domenico.dataset.SYNTHETIC_MARKER).
+    """
+    nome = models.CharField(max_length=200, unique=True)
+    checksum = models.CharField(max_length=64)
+    aggiornato_il = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nome}: {self.checksum[:12]}"
+
+    class Meta:
+        verbose_name = "Checksum Avvio"
+        verbose_name_plural = "Checksum Avvio"
+
+class SyncTombstone(models.Model):
+    """
+    Record eliminato, conservato per la sincronizzazione delta: i client offline
+    ricevono gli id da rimuovere dalla copia locale
+    """
+    modello = models.CharField(max_length=50)
+    oggetto_id = models.PositiveIntegerField()
+    eliminato_il = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.modello} #{self.oggetto_id} eliminato il {self.eliminato_il:%d/%m/%Y %H:%M}"
+
+    class Meta:
+        verbose_name = "Eliminazione Sincronizzata"
+        verbose_name_plural = "Eliminazioni Sincronizzate"
+
 # ============ FUNZIONI HELPER PER LOGGING ============
 
 def log_activity(activity_type, title, description='', related_object=None, 
@@ -484,9 +699,9 @@ def log_activity(activity_type, title, description='', related_object=None,
     """
     try:
         # Prepara dati dell'oggetto correlato
-        related_object_type = None
+        related_object_type = ''
         related_object_id = None
-        related_object_name = None
+        related_object_name = ''
         
         if related_object:
             related_object_type = related_object.__class__.__name__
@@ -521,10 +736,10 @@ def log_activity(activity_type, title, description='', related_object=None,
             extra_data=extra_data or {}
         )
         
-        print(f"✅ Attività registrata: {title}")
+        logger.debug("✅ Attività registrata: %s", title)
         
     except Exception as e:
-        print(f"❌ Errore nel logging attività: {str(e)}")
+        logger.error(f"❌ Errore nel logging attività: {str(e)}")
 
 # ============ FUNZIONI SPECIFICHE PER OGNI AZIONE ============
 
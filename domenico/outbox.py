@@ -0,0 +1,377 @@
+# domenico/outbox.py
+# Outbox persistente per le email di comunicazione: la request accoda, i dispatcher inviano
+
+import hashlib
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMultiAlternatives
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_enabled():
+    """True se le comunicazioni devono passare dall'outbox invece che dall'invio diretto"""
+    return getattr(settings, 'EMAIL_OUTBOX_ENABLED', False)
+
+
+def digest_enabled():
+    """True se le comunicazioni accodate vanno raggruppate in digest"""
+    return getattr(settings, 'EMAIL_DIGEST_ENABLED', False)
+
+
+def digest_window_end(now=None):
+    """Fine della finestra di raggruppamento corrente (finestre allineate, es. ogni ora)"""
+    now = now or timezone.now()
+    finestra = getattr(settings, 'EMAIL_DIGEST_WINDOW', 3600)
+    if not finestra:
+        return now
+    fine = (int(now.timestamp()) // finestra + 1) * finestra
+    return datetime.fromtimestamp(fine, tz=dt_timezone.utc)
+
+
+def digest_group(trattamento, destinatari):
+    """
+    Chiave di raggruppamento e destinatari del digest per un trattamento.
+
+    Con EMAIL_DIGEST_GROUP_BY = 'contoterzista' i trattamenti delle cascine di uno
+    stesso contoterzista vanno a lui in un'unica email; senza contoterzista (o senza
+    email) si ricade sul raggruppamento per insieme di destinatari.
+    """
+    if getattr(settings, 'EMAIL_DIGEST_GROUP_BY', 'destinatari') == 'contoterzista':
+        contoterzista = trattamento.get_contoterzista()
+        if contoterzista and contoterzista.email:
+            return f"contoterzista:{contoterzista.id}", [contoterzista.email]
+
+    insieme = ','.join(sorted({email.lower() for email in destinatari}))
+    return f"destinatari:{hashlib.sha1(insieme.encode('utf-8')).hexdigest()}", destinatari
+
+
+def enqueue_trattamento_communication(trattamento_id, force_send=False):
+    """
+    Accoda la comunicazione di un trattamento. Non genera il PDF e non contatta
+    il server SMTP: lo farà il dispatcher. In modalità digest il messaggio resta
+    in attesa fino alla fine della finestra per essere raggruppato con gli altri.
+
+    Returns:
+        dict con 'success', 'queued', 'outbox_id', 'destinatari', 'destinatari_count'
+    """
+    from .email_utils import prepare_trattamento_communication
+
+    prepared = prepare_trattamento_communication(trattamento_id, force_send=force_send, include_pdf=False)
+    if not prepared['success']:
+        return prepared
+
+    destinatari = prepared['destinatari']
+    digest_key = ''
+    prossimo_tentativo = timezone.now()
+    if digest_enabled():
+        digest_key, destinatari = digest_group(prepared['trattamento'], destinatari)
+        prossimo_tentativo = digest_window_end()
+
+    messaggio = EmailOutbox.objects.create(
+        trattamento=prepared['trattamento'],
+        destinatari=destinatari,
+        digest_key=digest_key,
+        prossimo_tentativo=prossimo_tentativo,
+        oggetto=prepared['oggetto'],
+        corpo=prepared['corpo_email'],
+        mittente=getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@gestionale.com'),
+        allegato_nome=prepared['filename'],
+        max_tentativi=getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5),
+    )
+    logger.info(f"Comunicazione trattamento {trattamento_id} accodata (outbox #{messaggio.id})")
+
+    return {
+        'success': True,
+        'queued': True,
+        'digest': bool(digest_key),
+        'outbox_id': messaggio.id,
+        'destinatari': prepared['destinatari_info'],
+        'destinatari_count': len(destinatari),
+        'error': None,
+    }
+
+
+def enqueue_trattamenti_communications(trattamenti_ids, force_send=False):
+    """
+    Accoda le comunicazioni di più trattamenti.
+
+    Returns:
+        dict {trattamento_id: risultato} come send_trattamenti_communications
+    """
+    risultati = {}
+    for trattamento_id in trattamenti_ids:
+        try:
+            risultati[trattamento_id] = enqueue_trattamento_communication(trattamento_id, force_send=force_send)
+        except Exception as e:
+            logger.error(f"Errore accodamento comunicazione trattamento {trattamento_id}: {e}")
+            risultati[trattamento_id] = {'success': False, 'error': str(e)}
+    return risultati
+
+
+def compute_backoff(tentativi):
+    """Ritardo esponenziale (con jitter) prima del prossimo tentativo"""
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_BASE', 60)
+    massimo = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_MAX', 3600)
+    ritardo = min(massimo, base * (2 ** max(tentativi - 1, 0)))
+    # Jitter del ±10% per non far ripartire insieme i messaggi falliti nello stesso momento
+    return timedelta(seconds=ritardo * random.uniform(0.9, 1.1))
+
+
+def claim_batch(worker_id, limit=20):
+    """
+    Prende in carico fino a `limit` messaggi pronti per l'invio.
+
+    Su PostgreSQL usa SELECT ... FOR UPDATE SKIP LOCKED, così più dispatcher in
+    parallelo non si contendono le stesse righe. Sui database senza SKIP LOCKED
+    (SQLite) la sicurezza è garantita dall'UPDATE condizionato sullo stato.
+    I gruppi digest vengono presi in carico per intero.
+    """
+    token = f"{worker_id}:{uuid.uuid4().hex[:12]}"
+    now = timezone.now()
+
+    with transaction.atomic():
+        queryset = EmailOutbox.objects.filter(
+            stato='in_coda', prossimo_tentativo__lte=now
+        ).order_by('prossimo_tentativo', 'id')
+
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+
+        ids = list(queryset.values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+
+        filtro = Q(id__in=ids)
+        chiavi = set(
+            EmailOutbox.objects.filter(id__in=ids).exclude(digest_key='').values_list('digest_key', flat=True)
+        )
+        if chiavi:
+            # Un gruppo digest va inviato insieme, anche oltre il limite del batch
+            filtro |= Q(digest_key__in=chiavi, prossimo_tentativo__lte=now)
+
+        EmailOutbox.objects.filter(filtro, stato='in_coda').update(
+            stato='in_invio', bloccato_da=token, bloccato_il=now
+        )
+
+    return list(
+        EmailOutbox.objects.filter(bloccato_da=token, stato='in_invio')
+        .select_related('trattamento')
+        .order_by('prossimo_tentativo', 'id')
+    )
+
+
+def release_stale_claims(timeout=None):
+    """Rimette in coda i messaggi rimasti 'in_invio' oltre il timeout (dispatcher interrotto)"""
+    timeout = timeout if timeout is not None else getattr(settings, 'EMAIL_OUTBOX_CLAIM_TIMEOUT', 600)
+    limite = timezone.now() - timedelta(seconds=timeout)
+    rilasciati = EmailOutbox.objects.filter(stato='in_invio', bloccato_il__lt=limite).update(
+        stato='in_coda', bloccato_da='', bloccato_il=None
+    )
+    if rilasciati:
+        logger.warning(f"Outbox: {rilasciati} messaggi bloccati rimessi in coda")
+    return rilasciati
+
+
+def build_message(messaggio):
+    """Costruisce l'email da una riga dell'outbox, allegando il PDF se previsto"""
+    email = EmailMultiAlternatives(
+        subject=messaggio.oggetto,
+        body=messaggio.corpo,
+        from_email=messaggio.mittente or getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@gestionale.com'),
+        to=messaggio.destinatari,
+    )
+
+    if messaggio.allegato_path:
+        with default_storage.open(messaggio.allegato_path, 'rb') as allegato:
+            email.attach(messaggio.allegato_nome, allegato.read(), 'application/pdf')
+    elif messaggio.trattamento_id and messaggio.allegato_nome:
+        from .email_utils import generate_pdf_comunicazione
+        email.attach(messaggio.allegato_nome, generate_pdf_comunicazione(messaggio.trattamento_id), 'application/pdf')
+
+    return email
+
+
+def build_digest_message(messaggi):
+    """
+    Costruisce un'unica email per un gruppo digest, con un solo PDF che
+    riunisce tutti i trattamenti del gruppo.
+
+    Returns:
+        (email, nome_allegato)
+    """
+    from .api_communications import generate_company_communication_pdf
+    from .email_utils import generate_digest_email_body
+    from .models import Trattamento
+
+    trattamenti = list(
+        Trattamento.objects.filter(id__in=[m.trattamento_id for m in messaggi])
+        .select_related('cliente', 'cascina', 'cascina__contoterzista')
+        .prefetch_related('terreni__cascina', 'trattamentoprodotto_set__prodotto__principi_attivi')
+        .order_by('cliente__nome', 'data_esecuzione', 'id')
+    )
+
+    contoterzisti = {t.get_contoterzista() for t in trattamenti}
+    if messaggi[0].digest_key.startswith('contoterzista:') and len(contoterzisti) == 1:
+        intestazione = contoterzisti.pop().nome
+    else:
+        intestazione = ', '.join(sorted({t.cliente.nome for t in trattamenti}))
+
+    destinatari = sorted({email for messaggio in messaggi for email in messaggio.destinatari})
+    nome_allegato = f"Comunicazione_{len(trattamenti)}_trattamenti_{timezone.now():%Y%m%d_%H%M}.pdf"
+
+    email = EmailMultiAlternatives(
+        subject=f"Comunicazione {len(trattamenti)} trattamenti - {intestazione}",
+        body=generate_digest_email_body(trattamenti),
+        from_email=messaggi[0].mittente or getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@gestionale.com'),
+        to=destinatari,
+    )
+    email.attach(
+        nome_allegato,
+        generate_company_communication_pdf(trattamenti, intestazione=intestazione),
+        'application/pdf'
+    )
+    return email, nome_allegato
+
+
+def _record_result(messaggio, invio_riuscito, errore='', allegato=None, pdf_content=None, email=None):
+    """
+    Registra l'esito definitivo nello storico ComunicazioneTrattamento. Con `email` (digest)
+    vengono registrati oggetto, testo e destinatari effettivamente inviati.
+    """
+    if not messaggio.trattamento_id:
+        return
+
+    from .email_utils import record_trattamento_communication
+    from .activity_logging import log_comunicazione_sent
+
+    prepared = {
+        'trattamento': messaggio.trattamento,
+        'destinatari': email.to if email else messaggio.destinatari,
+        'destinatari_info': [],
+        'oggetto': email.subject if email else messaggio.oggetto,
+        'corpo_email': email.body if email else messaggio.corpo,
+        'filename': allegato or messaggio.allegato_nome,
+        'pdf_content': pdf_content,
+    }
+    record_trattamento_communication(prepared, invio_riuscito, errore)
+    if invio_riuscito:
+        log_comunicazione_sent(messaggio.trattamento, len(prepared['destinatari']))
+
+
+def mark_sent(messaggio, allegato=None, pdf_content=None, email=None):
+    messaggio.stato = 'inviato'
+    messaggio.tentativi += 1
+    messaggio.inviato_il = timezone.now()
+    messaggio.ultimo_errore = ''
+    messaggio.bloccato_da = ''
+    messaggio.bloccato_il = None
+    messaggio.save(update_fields=['stato', 'tentativi', 'inviato_il', 'ultimo_errore', 'bloccato_da', 'bloccato_il'])
+    _record_result(messaggio, True, allegato=allegato, pdf_content=pdf_content, email=email)
+
+
+def mark_failed(messaggio, errore, allegato=None, prossimo_tentativo=None, email=None):
+    """
+    Registra un tentativo fallito: rimette in coda con backoff o chiude come 'fallito'.
+    `prossimo_tentativo` impone l'orario del nuovo tentativo (uguale per tutto un digest).
+    """
+    messaggio.tentativi += 1
+    messaggio.ultimo_errore = str(errore)
+    messaggio.bloccato_da = ''
+    messaggio.bloccato_il = None
+
+    if messaggio.tentativi >= messaggio.max_tentativi:
+        messaggio.stato = 'fallito'
+        logger.error(f"Outbox #{messaggio.id} fallito dopo {messaggio.tentativi} tentativi: {errore}")
+    else:
+        messaggio.stato = 'in_coda'
+        messaggio.prossimo_tentativo = prossimo_tentativo or timezone.now() + compute_backoff(messaggio.tentativi)
+        logger.warning(
+            f"Outbox #{messaggio.id} tentativo {messaggio.tentativi}/{messaggio.max_tentativi} fallito, "
+            f"nuovo tentativo alle {messaggio.prossimo_tentativo:%H:%M:%S}: {errore}"
+        )
+
+    messaggio.save(update_fields=[
+        'stato', 'tentativi', 'ultimo_errore', 'prossimo_tentativo', 'bloccato_da', 'bloccato_il'
+    ])
+    if messaggio.stato == 'fallito':
+        _record_result(messaggio, False, messaggio.ultimo_errore, allegato=allegato, email=email)
+
+
+def dispatch_batch(worker_id, session, limit=20):
+    """
+    Prende in carico un batch e lo invia sulla sessione SMTP indicata.
+    I messaggi di uno stesso gruppo digest partono come un'unica email.
+
+    Returns:
+        dict con 'claimed', 'sent', 'failed' (messaggi in coda) e 'emails' (email inviate)
+    """
+    messaggi = claim_batch(worker_id, limit=limit)
+    inviati = falliti = email_inviate = 0
+
+    gruppi = {}
+    for messaggio in messaggi:
+        gruppi.setdefault(messaggio.digest_key or f"singolo:{messaggio.id}", []).append(messaggio)
+
+    for gruppo in gruppi.values():
+        allegato = None
+        # Un solo orario di ritentativo per gruppo: con orari diversi (jitter) claim_batch
+        # riprenderebbe i messaggi del digest separatamente e partirebbero più email
+        prossimo_tentativo = timezone.now() + compute_backoff(max(m.tentativi for m in gruppo) + 1)
+        try:
+            if len(gruppo) > 1:
+                email, allegato = build_digest_message(gruppo)
+            else:
+                email = build_message(gruppo[0])
+        except Exception as e:
+            logger.error(f"Outbox #{', #'.join(str(m.id) for m in gruppo)}: impossibile preparare il messaggio: {e}")
+            for messaggio in gruppo:
+                mark_failed(messaggio, e, prossimo_tentativo=prossimo_tentativo)
+            falliti += len(gruppo)
+            continue
+
+        esito = session.send(email)
+        pdf_content = email.attachments[0][1] if email.attachments else None
+        digest = email if len(gruppo) > 1 else None
+        for messaggio in gruppo:
+            if esito['success']:
+                mark_sent(messaggio, allegato, pdf_content, email=digest)
+            else:
+                mark_failed(messaggio, esito['error'], allegato, prossimo_tentativo=prossimo_tentativo, email=digest)
+
+        if esito['success']:
+            inviati += len(gruppo)
+            email_inviate += 1
+        else:
+            falliti += len(gruppo)
+
+    return {'claimed': len(messaggi), 'sent': inviati, 'failed': falliti, 'emails': email_inviate}
+
+
+def outbox_metrics():
+    """Profondità della coda per stato ed età del messaggio più vecchio in attesa"""
+    now = timezone.now()
+    per_stato = dict(
+        EmailOutbox.objects.order_by().values('stato').annotate(totale=Count('id')).values_list('stato', 'totale')
+    )
+    in_attesa = EmailOutbox.objects.filter(stato='in_coda').aggregate(
+        piu_vecchio=Min('creato_il'), prossimo=Min('prossimo_tentativo')
+    )
+
+    piu_vecchio = in_attesa['piu_vecchio']
+    return {
+        'depth': {stato: per_stato.get(stato, 0) for stato, _ in EmailOutbox.STATI_CHOICES},
+        'due': EmailOutbox.objects.filter(stato='in_coda', prossimo_tentativo__lte=now).count(),
+        'oldest_queued_age_seconds': (now - piu_vecchio).total_seconds() if piu_vecchio else 0,
+        'next_attempt_at': in_attesa['prossimo'].isoformat() if in_attesa['prossimo'] else None,
+    }
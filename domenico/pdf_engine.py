@@ -0,0 +1,92 @@
+# domenico/pdf_engine.py
+# Motore PDF caricato al primo utilizzo: WeasyPrint (cairo/pango) costa centinaia di
+# millisecondi all'import, che non devono pesare su ogni comando e su ogni worker
+
+import logging
+import time
+from io import BytesIO
+
+from .metrics import PDF_RENDER_SECONDS, PDF_SIZE_BYTES
+
+logger = logging.getLogger(__name__)
+
+_engine = None
+_loaded = False
+
+
+class PdfEngineUnavailable(Exception):
+    """Nessun motore PDF installato (o librerie di sistema mancanti)"""
+
+
+def _load():
+    global _engine, _loaded
+    if _loaded:
+        return _engine
+
+    try:
+        import weasyprint  # noqa: F401
+        _engine = 'weasyprint'
+    except (ImportError, OSError) as e:
+        # OSError: pacchetto installato ma librerie native (pango, cairo) assenti
+        logger.warning(f"WeasyPrint non disponibile: {e}")
+        try:
+            import xhtml2pdf  # noqa: F401
+            _engine = 'xhtml2pdf'
+        except ImportError:
+            _engine = None
+
+    _loaded = True
+    if _engine:
+        logger.info(f"Motore PDF caricato: {_engine}")
+    return _engine
+
+
+def engine_name():
+    """Nome del motore PDF disponibile ('weasyprint', 'xhtml2pdf') o 'None'"""
+    return _load() or 'None'
+
+
+def is_available():
+    return _load() is not None
+
+
+def html_to_pdf(html, css=None):
+    """
+    Converte HTML in PDF con il motore disponibile.
+
+    Args:
+        html: documento HTML
+        css: foglio di stile aggiuntivo (stringa), opzionale
+
+    Returns:
+        bytes del PDF
+    """
+    engine = _load()
+    started = time.perf_counter()
+    pdf = _render(engine, html, css)
+    PDF_RENDER_SECONDS.labels(engine).observe(time.perf_counter() - started)
+    PDF_SIZE_BYTES.labels(engine).observe(len(pdf))
+    return pdf
+
+
+def _render(engine, html, css):
+    if engine == 'weasyprint':
+        from weasyprint import CSS, HTML
+        from weasyprint.text.fonts import FontConfiguration
+
+        font_config = FontConfiguration()
+        stylesheets = [CSS(string=css, font_config=font_config)] if css else None
+        return HTML(string=html).write_pdf(stylesheets=stylesheets, font_config=font_config)
+
+    if engine == 'xhtml2pdf':
+        from xhtml2pdf import pisa
+
+        if css:
+            html = f'<style>{css}</style>{html}'
+        result = BytesIO()
+        pdf = pisa.pisaDocument(BytesIO(html.encode('UTF-8')), result)
+        if pdf.err:
+            raise Exception("Errore durante la generazione del PDF con xhtml2pdf")
+        return result.getvalue()
+
+    raise PdfEngineUnavailable("Nessun motore PDF disponibile. Installa WeasyPrint o xhtml2pdf.")
@@ -0,0 +1,317 @@
+# domenico/profiling.py
+# Profilazione su richiesta per lo staff: `?_profile=1` (o header X-Profile) su qualunque
+# pagina registra lo stack campionato in formato "folded" (flamegraph.pl, speedscope,
+# inferno) e la sequenza delle query SQL; `?_profile=cprofile` usa il profiler
+# deterministico e salva un .prof leggibile con pstats/snakeviz. Le catture finiscono in
+# PROFILING_DIR, limitate alle ultime PROFILING_MAX_CAPTURES.
+
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+MODES = ('sample', 'cprofile')
+# Limiti di una singola cattura
+MAX_SQL_ENTRIES = 2000
+MAX_SQL_LENGTH = 2000
+HOTSPOTS = 25
+
+# Un solo cProfile attivo alla volta: da Python 3.12 il profiler è globale all'interprete
+_cprofile_lock = threading.Lock()
+
+
+def profiling_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def requested_mode(request):
+    """
+    Modalità richiesta ('sample' o 'cprofile'), None se la richiesta non chiede profilazione.
+    Il primo controllo è su stringhe già presenti in META: le richieste normali non pagano
+    né il parsing della query string né l'accesso all'utente.
+    """
+    header = request.META.get(PROFILE_HEADER)
+    if header is None and PROFILE_PARAM not in request.META.get('QUERY_STRING', ''):
+        return None
+    value = header if header is not None else request.GET.get(PROFILE_PARAM)
+    if value is None:
+        return None
+    return value if value in MODES else 'sample'
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        filename = os.path.relpath(filename, base)
+    else:
+        marker = filename.rfind('site-packages' + os.sep)
+        if marker != -1:
+            filename = filename[marker + len('site-packages') + 1:]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Profiler a campionamento: un thread legge lo stack del thread della richiesta ogni
+    `interval` secondi e conta gli stack uguali. Il risultato è nel formato "folded"
+    (frame separati da ';' dalla radice alla foglia, poi il numero di campioni).
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hotspots(self):
+        """Funzioni in cima allo stack (tempo proprio), in campioni"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        return [{'funzione': nome, 'campioni': n} for nome, n in leaves.most_common(HOTSPOTS)]
+
+
+class SQLTimeline:
+    """execute_wrapper: registra ogni query con inizio relativo alla richiesta e durata"""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+        self.dropped = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            end = time.perf_counter()
+            if len(self.queries) < MAX_SQL_ENTRIES:
+                self.queries.append({
+                    'inizio_ms': round((start - self.started) * 1000, 3),
+                    'durata_ms': round((end - start) * 1000, 3),
+                    'alias': context['connection'].alias,
+                    'many': many,
+                    'sql': sql[:MAX_SQL_LENGTH],
+                })
+            else:
+                self.dropped += 1
+
+    def summary(self):
+        return {
+            'numero': len(self.queries) + self.dropped,
+            'totale_ms': round(sum(q['durata_ms'] for q in self.queries), 3),
+            'scartate': self.dropped,
+            'timeline': self.queries,
+        }
+
+
+class ProfileStore:
+    """
+    Catture su disco: `<id>.json` con i metadati e la timeline SQL, accanto al profilo
+    (`<id>.folded` o `<id>.prof`). Dopo ogni salvataggio restano le ultime `max_captures`.
+    """
+
+    EXTENSIONS = {'sample': 'folded', 'cprofile': 'prof'}
+
+    def __init__(self, directory=None, max_captures=None):
+        self.directory = directory or profiling_dir()
+        self.max_captures = max_captures or getattr(settings, 'PROFILING_MAX_CAPTURES', 50)
+
+    def path(self, capture_id, extension):
+        # Gli id arrivano anche dagli URL: niente separatori di percorso
+        if os.path.basename(capture_id) != capture_id or capture_id.startswith('.'):
+            raise ValueError(f"Id cattura non valido: {capture_id}")
+        return os.path.join(self.directory, f"{capture_id}.{extension}")
+
+    def save(self, meta, profile_data):
+        os.makedirs(self.directory, exist_ok=True)
+        # Ordinabili per nome: la data (al microsecondo) viene prima del suffisso casuale
+        capture_id = f"{timezone.localtime():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}"
+        extension = self.EXTENSIONS[meta['modalita']]
+        meta = dict(meta, id=capture_id, file_profilo=f"{capture_id}.{extension}")
+
+        if isinstance(profile_data, str):
+            profile_data = profile_data.encode('utf-8')
+        with open(self.path(capture_id, extension), 'wb') as f:
+            f.write(profile_data)
+        with open(self.path(capture_id, 'json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        self.prune()
+        return capture_id
+
+    def _ids(self):
+        """Id delle catture, dalla più recente"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name[:-5] for name in names if name.endswith('.json')), reverse=True)
+
+    def prune(self):
+        for capture_id in self._ids()[self.max_captures:]:
+            for extension in ('json', *self.EXTENSIONS.values()):
+                try:
+                    os.remove(self.path(capture_id, extension))
+                except FileNotFoundError:
+                    pass
+
+    def load(self, capture_id):
+        """Metadati della cattura, None se non esiste"""
+        try:
+            with open(self.path(capture_id, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def recent(self, limit=None):
+        captures = []
+        for capture_id in self._ids()[:limit]:
+            meta = self.load(capture_id)
+            if meta is not None:
+                meta.pop('sql', None)
+                captures.append(meta)
+        return captures
+
+
+def _cprofile_hotspots(profile):
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    righe = []
+    for (filename, line, name), (cc, nc, tt, ct, callers) in stats.stats.items():
+        righe.append({
+            'funzione': f"{name} ({filename}:{line})",
+            'chiamate': nc,
+            'proprio_ms': round(tt * 1000, 3),
+            'cumulativo_ms': round(ct * 1000, 3),
+        })
+    righe.sort(key=lambda r: r['cumulativo_ms'], reverse=True)
+    return righe[:HOTSPOTS]
+
+
+class ProfilingMiddleware:
+    """
+    Profila le richieste dello staff che lo chiedono e aggiunge l'header X-Profile-Id con
+    l'id della cattura. Va dopo AuthenticationMiddleware (serve request.user); le richieste
+    senza flag passano dopo un solo controllo su META. Le risposte in streaming sono
+    profilate fino alla costruzione della risposta, non durante l'invio del corpo.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff:
+            return self.get_response(request)
+        return self._profile(request, mode)
+
+    def _profile(self, request, mode):
+        profile = None
+        if mode == 'cprofile':
+            if _cprofile_lock.acquire(blocking=False):
+                profile = cProfile.Profile()
+            else:
+                mode = 'sample'
+        sampler = StackSampler(getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.001)) if mode == 'sample' else None
+
+        started = time.perf_counter()
+        timeline = SQLTimeline(started)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all(initialized_only=False):
+                    stack.enter_context(connection.execute_wrapper(timeline))
+                if sampler:
+                    sampler.start()
+                    stack.callback(sampler.stop)
+                else:
+                    profile.enable()
+                    stack.callback(profile.disable)
+                response = self.get_response(request)
+        finally:
+            if profile is not None:
+                _cprofile_lock.release()
+        duration = time.perf_counter() - started
+
+        meta = {
+            'creato_il': timezone.now().isoformat(),
+            'modalita': mode,
+            'metodo': request.method,
+            'percorso': request.get_full_path(),
+            'utente': request.user.get_username(),
+            'status': response.status_code,
+            'durata_ms': round(duration * 1000, 3),
+            'sql': timeline.summary(),
+        }
+        meta['sql_numero'] = meta['sql']['numero']
+        meta['sql_totale_ms'] = meta['sql']['totale_ms']
+        if sampler:
+            meta['campioni'] = sampler.samples
+            meta['intervallo_ms'] = sampler.interval * 1000
+            meta['hotspot'] = sampler.hotspots()
+            data = sampler.folded()
+        else:
+            profile.create_stats()
+            # Stesso contenuto di Profile.dump_stats, senza passare da un file temporaneo;
+            # prima di pstats.Stats, che svuota profile.stats
+            data = marshal.dumps(profile.stats)
+            meta['hotspot'] = _cprofile_hotspots(profile)
+
+        try:
+            response['X-Profile-Id'] = ProfileStore().save(meta, data)
+        except OSError:
+            logger.exception("Impossibile salvare la cattura di %s", meta['percorso'])
+        return response
+
@@ -0,0 +1,50 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
+from .profiling import ProfileStore
+
+RECENT_CAPTURES = 100
+
+
+@staff_member_required
+def profiling_captures(request):
+    """Elenco delle ultime catture di profilazione"""
+    store = ProfileStore()
+    return render(request, 'profiling/captures.html', {
+        'title': 'Profilazioni',
+        'captures': store.recent(RECENT_CAPTURES),
+        'max_captures': store.max_captures,
+    })
+
+
+def _load_or_404(store, capture_id):
+    try:
+        meta = store.load(capture_id)
+    except ValueError:
+        meta = None
+    if meta is None:
+        raise Http404('Cattura non trovata')
+    return meta
+
+
+@staff_member_required
+def profiling_capture_detail(request, capture_id):
+    """Timeline SQL e funzioni più costose di una cattura"""
+    meta = _load_or_404(ProfileStore(), capture_id)
+    return render(request, 'profiling/capture_detail.html', {
+        'title': f"Profilazione {meta['id']}",
+        'capture': meta,
+    })
+
+
+@staff_member_required
+def profiling_capture_download(request, capture_id):
+    """Profilo grezzo: .folded per i flame graph, .prof per pstats/snakeviz"""
+    store = ProfileStore()
+    meta = _load_or_404(store, capture_id)
+    try:
+        f = open(store.path(capture_id, store.EXTENSIONS[meta['modalita']]), 'rb')
+    except FileNotFoundError:
+        raise Http404('Profilo non trovato')
+    return FileResponse(f, as_attachment=True, filename=meta['file_profilo'], content_type='application/octet-stream')
@@ -0,0 +1,73 @@
+# domenico/reference_data.py
+# Dati di riferimento (prodotti, contoterzisti) letti spesso e modificati raramente:
+# vengono tenuti in cache e invalidati dai segnali in domenico/signals.py
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Contoterzista, Prodotto
+
+logger = logging.getLogger(__name__)
+
+PRODOTTI_KEY = 'reference:prodotti'
+CONTOTERZISTI_KEY = 'reference:contoterzisti'
+
+
+def _timeout():
+    # La cache locmem è per processo: il timeout limita quanto un altro worker
+    # può servire dati vecchi dopo una modifica
+    return getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 60)
+
+
+def _carica_prodotti():
+    return [
+        {
+            'id': prodotto.id,
+            'nome': prodotto.nome,
+            'unita_misura': prodotto.unita_misura,
+            'descrizione': prodotto.descrizione,
+            'principi_attivi': prodotto.get_principi_attivi_list()
+        }
+        for prodotto in Prodotto.objects.prefetch_related('principi_attivi').order_by('nome')
+    ]
+
+
+def _carica_contoterzisti():
+    return [
+        {
+            'id': contoterzista.id,
+            'nome': contoterzista.nome,
+            'email': contoterzista.email,
+            'cascine_count': contoterzista.cascine_count
+        }
+        for contoterzista in Contoterzista.objects.annotate(cascine_count=Count('cascine')).order_by('nome')
+    ]
+
+
+def get_prodotti():
+    """Lista dei prodotti con i principi attivi, ordinata per nome"""
+    return cache.get_or_set(PRODOTTI_KEY, _carica_prodotti, _timeout())
+
+
+def get_contoterzisti():
+    """Lista dei contoterzisti con il numero di cascine, ordinata per nome"""
+    return cache.get_or_set(CONTOTERZISTI_KEY, _carica_contoterzisti, _timeout())
+
+
+def invalidate_prodotti():
+    cache.delete(PRODOTTI_KEY)
+
+
+def invalidate_contoterzisti():
+    cache.delete(CONTOTERZISTI_KEY)
+
+
+def warm_reference_cache():
+    """Ricarica tutti i dati di riferimento in cache; restituisce il numero di elementi caricati"""
+    prodotti = _carica_prodotti()
+    contoterzisti = _carica_contoterzisti()
+    cache.set_many({PRODOTTI_KEY: prodotti, CONTOTERZISTI_KEY: contoterzisti}, _timeout())
+    return len(prodotti) + len(contoterzisti)
@@ -0,0 +1,209 @@
+# domenico/season_clone.py
+# Clonazione di una stagione: i trattamenti selezionati (per cliente, cascina e periodo)
+# diventano nuovi trattamenti programmati con la data di esecuzione spostata, gli stessi
+# terreni e le stesse dosi (eventualmente scalate). La copia lavora a blocchi: per ogni
+# blocco due query leggono terreni e prodotti di origine e tre bulk_create inseriscono
+# trattamenti, legami ai terreni e dosi. Con dry_run restituisce le differenze senza scrivere.
+
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from .models import Trattamento, TrattamentoProdotto
+
+BATCH_SIZE = 1000
+DOSE_MINIMA = Decimal('0.001')
+# Spostamenti oltre questi limiti sono errori di battitura (e oltre l'anno 9999 date() fallisce)
+MAX_ANNI = 100
+MAX_GIORNI = 3660
+
+
+class SeasonCloneError(Exception):
+    """Parametri della clonazione non validi"""
+
+
+def _data(valore, nome):
+    if valore in (None, '') or isinstance(valore, date):
+        return valore or None
+    try:
+        data = parse_date(valore)
+    except (TypeError, ValueError):
+        data = None
+    if data is None:
+        raise SeasonCloneError(f"{nome} non valida: {valore!r}")
+    return data
+
+
+def _ids(valori, nome):
+    if valori in (None, []):
+        return None
+    # Una stringa è iterabile: "12" diventerebbe [1, 2]
+    if not isinstance(valori, (list, tuple)) or any(isinstance(v, bool) for v in valori):
+        raise SeasonCloneError(f"Elenco {nome} non valido: {valori!r}")
+    try:
+        return [int(v) for v in valori]
+    except (TypeError, ValueError):
+        raise SeasonCloneError(f"Elenco {nome} non valido: {valori!r}")
+
+
+def sposta_data(giorno, anni=0, giorni=0):
+    """Sposta una data di `anni` (il 29 febbraio diventa 28 se serve) e di `giorni`"""
+    if giorno is None:
+        return None
+    if anni:
+        anno = giorno.year + anni
+        giorno = giorno.replace(year=anno, day=min(giorno.day, calendar.monthrange(anno, giorno.month)[1]))
+    return giorno + timedelta(days=giorni)
+
+
+def scala_dose(quantita, fattore):
+    """Dose per ettaro moltiplicata per il fattore, arrotondata ai decimali del campo"""
+    return max((quantita * fattore).quantize(DOSE_MINIMA), DOSE_MINIMA)
+
+
+def trattamenti_origine(clienti=None, cascine=None, dal=None, al=None):
+    """Trattamenti da clonare: filtri su cliente, cascina e data di esecuzione (annullati esclusi)"""
+    trattamenti = Trattamento.objects.exclude(stato='annullato')
+    if clienti:
+        trattamenti = trattamenti.filter(cliente_id__in=clienti)
+    if cascine:
+        trattamenti = trattamenti.filter(cascina_id__in=cascine)
+    if dal:
+        trattamenti = trattamenti.filter(data_esecuzione__gte=dal)
+    if al:
+        trattamenti = trattamenti.filter(data_esecuzione__lte=al)
+    return trattamenti
+
+
+def clone_season(clienti=None, cascine=None, dal=None, al=None, anni=1, giorni=0,
+                 fattore_dose=1, dry_run=False, batch_size=BATCH_SIZE):
+    """
+    Clona i trattamenti selezionati come nuovi trattamenti programmati.
+
+    Args:
+        clienti, cascine: liste di id per filtrare l'origine (None = tutti; per scrivere serve
+            almeno un filtro tra clienti, cascine e periodo)
+        dal, al: periodo di esecuzione dei trattamenti di origine (date o stringhe ISO)
+        anni, giorni: spostamento della data di esecuzione
+        fattore_dose: moltiplicatore delle dosi per ettaro (es. 0.9)
+        dry_run: calcola le differenze senza scrivere nel database
+
+    Returns:
+        dict con i conteggi ('trattamenti', 'terreni', 'prodotti', 'clienti') e, per ogni
+        trattamento di origine, 'diff' (dry_run) oppure 'creati' ({'origine', 'trattamento_id'})
+    """
+    clienti, cascine = _ids(clienti, 'clienti'), _ids(cascine, 'cascine')
+    dal, al = _data(dal, 'Data iniziale'), _data(al, 'Data finale')
+    if dal and al and dal > al:
+        raise SeasonCloneError("La data iniziale è successiva alla data finale")
+    try:
+        anni, giorni = int(anni or 0), int(giorni or 0)
+        fattore_dose = Decimal(str(fattore_dose))
+    except (TypeError, ValueError, InvalidOperation):
+        raise SeasonCloneError("Spostamento o fattore di dose non validi")
+    if not fattore_dose.is_finite() or fattore_dose <= 0:
+        raise SeasonCloneError(f"Fattore di dose non valido: {fattore_dose}")
+    if not anni and not giorni:
+        raise SeasonCloneError("Specificare uno spostamento di anni o giorni")
+    if abs(anni) > MAX_ANNI or abs(giorni) > MAX_GIORNI:
+        raise SeasonCloneError(f"Spostamento troppo grande: massimo {MAX_ANNI} anni e {MAX_GIORNI} giorni")
+    if not dry_run and not (clienti or cascine or dal or al):
+        # Senza filtri verrebbe clonato l'intero archivio dei trattamenti
+        raise SeasonCloneError("Specificare un periodo, dei clienti o delle cascine da clonare")
+
+    origine = trattamenti_origine(clienti, cascine, dal, al).order_by('id')
+    if dry_run:
+        origine = origine.values('id', 'cliente_id', 'cliente__nome', 'cascina_id', 'cascina__nome',
+                                 'livello_applicazione', 'data_esecuzione')
+    else:
+        origine = origine.values('id', 'cliente_id', 'cascina_id', 'livello_applicazione', 'data_esecuzione')
+
+    # Origine letta per intero prima di inserire: le copie non devono finire nella selezione
+    righe = list(origine)
+    risultato = {
+        'trattamenti': 0,
+        'terreni': 0,
+        'prodotti': 0,
+        'clienti': len({riga['cliente_id'] for riga in righe}),
+        'dry_run': dry_run,
+        'diff' if dry_run else 'creati': [],
+    }
+    with transaction.atomic():
+        for inizio in range(0, len(righe), batch_size):
+            _clona_blocco(righe[inizio:inizio + batch_size], anni, giorni, fattore_dose, dry_run, risultato)
+    return risultato
+
+
+def _clona_blocco(blocco, anni, giorni, fattore_dose, dry_run, risultato):
+    ids = [riga['id'] for riga in blocco]
+
+    terreni = defaultdict(list)
+    for trattamento_id, terreno_id in Trattamento.terreni.through.objects.filter(
+        trattamento_id__in=ids
+    ).values_list('trattamento_id', 'terreno_id').order_by('trattamento_id', 'terreno_id'):
+        terreni[trattamento_id].append(terreno_id)
+
+    campi_prodotto = ['trattamento_id', 'prodotto_id', 'quantita_per_ettaro']
+    if dry_run:
+        campi_prodotto += ['prodotto__nome', 'prodotto__unita_misura']
+    prodotti = defaultdict(list)
+    for tp in TrattamentoProdotto.objects.filter(trattamento_id__in=ids).values(*campi_prodotto).order_by('trattamento_id', 'id'):
+        prodotti[tp['trattamento_id']].append(tp)
+
+    risultato['trattamenti'] += len(blocco)
+    risultato['terreni'] += sum(len(terreni[i]) for i in ids)
+    risultato['prodotti'] += sum(len(prodotti[i]) for i in ids)
+
+    if dry_run:
+        for riga in blocco:
+            nuova_data = sposta_data(riga['data_esecuzione'], anni, giorni)
+            risultato['diff'].append({
+                'origine': riga['id'],
+                'cliente': riga['cliente__nome'],
+                'cascina': riga['cascina__nome'] or '',
+                'livello_applicazione': riga['livello_applicazione'],
+                'data_esecuzione': [riga['data_esecuzione'], nuova_data],
+                'terreni': len(terreni[riga['id']]),
+                'prodotti': [
+                    {
+                        'nome': tp['prodotto__nome'],
+                        'unita_misura': tp['prodotto__unita_misura'],
+                        'dose': [tp['quantita_per_ettaro'], scala_dose(tp['quantita_per_ettaro'], fattore_dose)],
+                    }
+                    for tp in prodotti[riga['id']]
+                ],
+            })
+        return
+
+    nuovi = Trattamento.objects.bulk_create([
+        Trattamento(
+            cliente_id=riga['cliente_id'],
+            cascina_id=riga['cascina_id'],
+            livello_applicazione=riga['livello_applicazione'],
+            data_esecuzione=sposta_data(riga['data_esecuzione'], anni, giorni),
+            stato='programmato',
+        )
+        for riga in blocco
+    ])
+    copie = {riga['id']: nuovo.pk for riga, nuovo in zip(blocco, nuovi)}
+
+    TrattamentoTerreno = Trattamento.terreni.through
+    TrattamentoTerreno.objects.bulk_create([
+        TrattamentoTerreno(trattamento_id=copie[origine], terreno_id=terreno_id)
+        for origine in ids
+        for terreno_id in terreni[origine]
+    ])
+    TrattamentoProdotto.objects.bulk_create([
+        TrattamentoProdotto(
+            trattamento_id=copie[origine],
+            prodotto_id=tp['prodotto_id'],
+            quantita_per_ettaro=scala_dose(tp['quantita_per_ettaro'], fattore_dose),
+        )
+        for origine in ids
+        for tp in prodotti[origine]
+    ])
+    risultato['creati'].extend({'origine': origine, 'trattamento_id': copie[origine]} for origine in ids)
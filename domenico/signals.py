@@ -0,0 +1,87 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    ActivityLog, Cascina, Cliente, Contoterzista, PrincipioAttivo, Prodotto, Terreno, Trattamento,
+    TrattamentoProdotto
+)
+
+
+@receiver(post_save, sender=ActivityLog)
+def update_activity_rollup(sender, instance, created, **kwargs):
+    """Aggiorna il riepilogo giornaliero a ogni nuovo log di attività"""
+    if created:
+        from .activity_rollup import record_activity
+        record_activity(instance.activity_type, instance.timestamp)
+
+
+@receiver([post_save, post_delete], sender=Prodotto)
+@receiver([post_save, post_delete], sender=PrincipioAttivo)
+@receiver(m2m_changed, sender=Prodotto.principi_attivi.through)
+def invalidate_prodotti_cache(sender, **kwargs):
+    """Svuota la cache dei prodotti quando cambiano prodotti o principi attivi"""
+    from .reference_data import invalidate_prodotti
+    invalidate_prodotti()
+
+
+@receiver([post_save, post_delete], sender=Contoterzista)
+@receiver([post_save, post_delete], sender=Cascina)
+def invalidate_contoterzisti_cache(sender, **kwargs):
+    """Svuota la cache dei contoterzisti (il conteggio cascine cambia con le cascine)"""
+    from .reference_data import invalidate_contoterzisti
+    invalidate_contoterzisti()
+
+
+# ---------- Sincronizzazione offline (domenico/sync.py) ----------
+
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Cascina)
+@receiver(post_delete, sender=Terreno)
+@receiver(post_delete, sender=Prodotto)
+@receiver(post_delete, sender=Trattamento)
+def record_sync_tombstone(sender, instance, **kwargs):
+    """Registra l'eliminazione per i client offline (anche per le eliminazioni a cascata)"""
+    from .sync import record_tombstone
+    record_tombstone(instance)
+
+
+@receiver([post_save, post_delete], sender=TrattamentoProdotto)
+def touch_trattamento_prodotti(sender, instance, **kwargs):
+    """Prodotti e quantità fanno parte del trattamento sincronizzato"""
+    Trattamento.objects.filter(pk=instance.trattamento_id).update(aggiornato_il=timezone.now())
+
+
+@receiver(m2m_changed, sender=Trattamento.terreni.through)
+def touch_trattamento_terreni(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        Trattamento.objects.filter(pk=instance.pk).update(aggiornato_il=timezone.now())
+    elif pk_set:
+        Trattamento.objects.filter(pk__in=pk_set).update(aggiornato_il=timezone.now())
+
+
+@receiver(m2m_changed, sender=Prodotto.principi_attivi.through)
+def touch_prodotto_principi(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        Prodotto.objects.filter(pk=instance.pk).update(aggiornato_il=timezone.now())
+    elif pk_set:
+        Prodotto.objects.filter(pk__in=pk_set).update(aggiornato_il=timezone.now())
+
+
+@receiver(post_save, sender=PrincipioAttivo)
+def touch_prodotti_principio(sender, instance, created, **kwargs):
+    """I prodotti sincronizzati riportano il nome dei principi attivi"""
+    if not created:
+        Prodotto.objects.filter(principi_attivi=instance).update(aggiornato_il=timezone.now())
+
+
+@receiver(post_save, sender=Contoterzista)
+@receiver(pre_delete, sender=Contoterzista)
+def touch_cascine_contoterzista(sender, instance, **kwargs):
+    """Le cascine sincronizzate riportano il contoterzista (eliminandolo diventa NULL senza save)"""
+    if not kwargs.get('created'):
+        Cascina.objects.filter(contoterzista=instance).update(aggiornato_il=timezone.now())
@@ -0,0 +1,134 @@
+# domenico/smtp_sink.py
+# Server SMTP locale che accetta e scarta i messaggi, per test e benchmark di invio
+
+import socketserver
+import threading
+import time
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Implementa il minimo del protocollo SMTP necessario a smtplib"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        sink = self.server.sink
+        if sink.connect_delay:
+            # Simula il costo di handshake/TLS di un server reale
+            time.sleep(sink.connect_delay)
+        sink._register_connection()
+        self.reply('220 smtp-sink ESMTP ready')
+
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                if verb == 'EHLO':
+                    self.reply('250-smtp-sink')
+                    self.reply('250-8BITMIME')
+                    self.reply('250 SMTPUTF8')
+                else:
+                    self.reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data_line)
+                sink._register_message(recipients, size)
+                recipients = []
+                self.reply('250 OK queued')
+            elif verb == 'RSET':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """
+    Sink SMTP in un thread separato.
+
+    Uso:
+        with SMTPSink(port=0) as sink:
+            ... EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port ...
+            sink.messages_received
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, connect_delay=0.0):
+        self.host = host
+        self.requested_port = port
+        self.connect_delay = connect_delay
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.connections = 0
+        self.recipients = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1] if self._server else self.requested_port
+
+    def _register_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def _register_message(self, recipients, size):
+        with self._lock:
+            self.messages_received += 1
+            self.bytes_received += size
+            self.recipients.extend(recipients)
+
+    def start(self):
+        self._server = _ThreadingSMTPServer((self.host, self.requested_port), _SMTPSinkHandler)
+        self._server.sink = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def serve_forever(self):
+        """Avvia il sink in primo piano (usato dal comando smtp_sink)"""
+        self._server = _ThreadingSMTPServer((self.host, self.requested_port), _SMTPSinkHandler)
+        self._server.sink = self
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
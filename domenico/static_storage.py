@@ -0,0 +1,117 @@
+# domenico/static_storage.py
+# Storage dei file statici per la produzione: nomi con hash del contenuto (cache immutabile),
+# copie precompresse .gz/.br servite direttamente da nginx e service worker generato
+# con la lista dei file da precaricare
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.txt', '.html', '.xml', '.map', '.ico', '.ttf', '.eot')
+# Sotto questa soglia la compressione non fa risparmiare nulla di significativo
+MIN_COMPRESS_SIZE = 256
+
+SERVICE_WORKER = 'sw.js'
+SW_VERSION_PLACEHOLDER = '__STATIC_VERSION__'
+SW_PRECACHE_PLACEHOLDER = '/* __STATIC_PRECACHE__ */'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage con compressione gzip/brotli e generazione del service worker.
+
+    I file referenziati dai template ma assenti (es. icone non ancora aggiunte) restituiscono
+    l'URL senza hash invece di far fallire il rendering della pagina.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        self.write_service_worker(paths)
+        compressi = 0
+        for name in sorted(set(self.hashed_files) | set(self.hashed_files.values())):
+            compressi += self.compress(name)
+        logger.info(f"File statici compressi: {compressi}")
+
+    # ---------- Compressione ----------
+
+    def _save_sibling(self, name, data):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(data))
+
+    def compress(self, name):
+        """Scrive name.gz (e name.br se brotli è installato) quando riducono la dimensione"""
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+            return 0
+
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return 0
+
+        scritti = 0
+        # mtime=0: stesso input, stesso file compresso (build riproducibili)
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            self._save_sibling(f'{name}.gz', compressed)
+            scritti += 1
+        if BROTLI_AVAILABLE:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                self._save_sibling(f'{name}.br', compressed)
+                scritti += 1
+        return scritti
+
+    # ---------- Service worker ----------
+
+    def precache_names(self, paths):
+        """File statici del progetto (STATICFILES_DIRS) da precaricare nel service worker"""
+        project_dirs = [os.path.abspath(str(d)) for d in settings.STATICFILES_DIRS]
+        names = []
+        for name, (storage, path) in paths.items():
+            location = os.path.abspath(getattr(storage, 'location', '') or '')
+            if name != SERVICE_WORKER and location in project_dirs:
+                names.append(name)
+        return sorted(names)
+
+    def write_service_worker(self, paths):
+        """
+        Riscrive sw.js in STATIC_ROOT sostituendo la versione della cache e la lista di
+        precaricamento con gli URL con hash: a ogni deploy con file cambiati la cache
+        del browser viene rinnovata, altrimenti resta valida.
+        """
+        if not self.exists(SERVICE_WORKER):
+            return
+
+        urls = [self.url(name, force=True) for name in self.precache_names(paths)]
+        version = hashlib.sha256(json.dumps(urls).encode()).hexdigest()[:12]
+
+        with self.open(SERVICE_WORKER) as f:
+            source = f.read().decode('utf-8')
+        source = source.replace(SW_VERSION_PLACEHOLDER, version)
+        source = source.replace(SW_PRECACHE_PLACEHOLDER, ',\n  '.join(json.dumps(url) for url in urls))
+        self._save_sibling(SERVICE_WORKER, source.encode('utf-8'))
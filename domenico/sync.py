@@ -0,0 +1,265 @@
+# domenico/sync.py
+# Sincronizzazione delta per la PWA offline: il client invia il watermark ricevuto all'ultima
+# sincronizzazione e riceve solo i record modificati (aggiornato_il, indicizzato) e gli id
+# eliminati (SyncTombstone); le modifiche fatte offline tornano in un unico batch.
+
+import logging
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Cascina, Cliente, Prodotto, SyncTombstone, Terreno, Trattamento, TrattamentoProdotto
+
+logger = logging.getLogger(__name__)
+
+
+class SyncError(Exception):
+    """Watermark o batch di modifiche non valido"""
+
+
+# ---------- Serializzazione ----------
+
+def format_timestamp(value):
+    """
+    ISO 8601 in UTC con i microsecondi: il JSON encoder di Django li tronca ai millisecondi,
+    e un aggiornato_il troncato rimandato dal client risulterebbe sempre "modificato"
+    """
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _rows(queryset, *fields):
+    righe = list(queryset.values(*fields))
+    for riga in righe:
+        riga['aggiornato_il'] = format_timestamp(riga['aggiornato_il'])
+    return righe
+
+
+def _clienti(queryset):
+    return _rows(queryset, 'id', 'nome', 'aggiornato_il')
+
+
+def _cascine(queryset):
+    return _rows(queryset, 'id', 'nome', 'cliente_id', 'contoterzista_id', 'contoterzista__nome', 'aggiornato_il')
+
+
+def _terreni(queryset):
+    return [
+        {**riga, 'superficie': str(riga['superficie'])}
+        for riga in _rows(queryset, 'id', 'nome', 'cascina_id', 'superficie', 'aggiornato_il')
+    ]
+
+
+def _prodotti(queryset):
+    return [
+        {
+            'id': prodotto.id,
+            'nome': prodotto.nome,
+            'unita_misura': prodotto.unita_misura,
+            'principi_attivi': [pa.nome for pa in prodotto.principi_attivi.all()],
+            'aggiornato_il': format_timestamp(prodotto.aggiornato_il),
+        }
+        for prodotto in queryset.prefetch_related('principi_attivi')
+    ]
+
+
+def _trattamenti(queryset):
+    trattamenti = _rows(
+        queryset, 'id', 'cliente_id', 'cascina_id', 'livello_applicazione', 'stato',
+        'data_esecuzione', 'data_comunicazione', 'aggiornato_il'
+    )
+    ids = [t['id'] for t in trattamenti]
+
+    terreni = {}
+    for trattamento_id, terreno_id in Trattamento.terreni.through.objects.filter(
+        trattamento_id__in=ids
+    ).values_list('trattamento_id', 'terreno_id'):
+        terreni.setdefault(trattamento_id, []).append(terreno_id)
+
+    prodotti = {}
+    for riga in TrattamentoProdotto.objects.filter(trattamento_id__in=ids).values(
+        'trattamento_id', 'prodotto_id', 'quantita_per_ettaro'
+    ):
+        prodotti.setdefault(riga['trattamento_id'], []).append({
+            'prodotto_id': riga['prodotto_id'],
+            'quantita_per_ettaro': str(riga['quantita_per_ettaro']),
+        })
+
+    for trattamento in trattamenti:
+        trattamento['terreni'] = terreni.get(trattamento['id'], [])
+        trattamento['prodotti'] = prodotti.get(trattamento['id'], [])
+    return trattamenti
+
+
+# Nome nel payload -> (modello, serializzatore)
+SYNCED_MODELS = {
+    'clienti': (Cliente, _clienti),
+    'cascine': (Cascina, _cascine),
+    'terreni': (Terreno, _terreni),
+    'prodotti': (Prodotto, _prodotti),
+    'trattamenti': (Trattamento, _trattamenti),
+}
+TOMBSTONE_NAMES = {model._meta.model_name: nome for nome, (model, _) in SYNCED_MODELS.items()}
+
+
+# ---------- Watermark ----------
+
+def issue_watermark(now=None):
+    """
+    Watermark da restituire al client. È arretrato di SYNC_WATERMARK_LAG secondi: le
+    transazioni ancora aperte durante la sincronizzazione (salvate con un aggiornato_il
+    precedente al loro commit) vengono rimandate alla sincronizzazione successiva.
+    """
+    now = now or timezone.now()
+    return format_timestamp(now - timedelta(seconds=getattr(settings, 'SYNC_WATERMARK_LAG', 30)))
+
+
+def parse_watermark(value):
+    watermark = parse_datetime(value or '')
+    if watermark is None:
+        raise SyncError(f"Watermark non valido: {value!r}")
+    if timezone.is_naive(watermark):
+        watermark = timezone.make_aware(watermark, dt_timezone.utc)
+    return watermark
+
+
+def tombstone_cutoff(now=None):
+    return (now or timezone.now()) - timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+# ---------- Download ----------
+
+def changes_since(since=None):
+    """
+    Record modificati ed eliminati dopo il watermark `since` (stringa ISO emessa dal server).
+
+    Senza watermark, o se è più vecchio della conservazione delle eliminazioni, restituisce
+    l'intero dataset con full=True: il client deve sostituire la copia locale.
+
+    Returns:
+        dict con 'watermark', 'full', 'changes' (nome -> record), 'deleted' (nome -> id)
+    """
+    now = timezone.now()
+    watermark = parse_watermark(since) if since else None
+    full = watermark is None or watermark < tombstone_cutoff(now)
+
+    changes = {}
+    for nome, (model, serialize) in SYNCED_MODELS.items():
+        queryset = model.objects.order_by('id')
+        if not full:
+            queryset = queryset.filter(aggiornato_il__gt=watermark)
+        changes[nome] = serialize(queryset)
+
+    deleted = {nome: [] for nome in SYNCED_MODELS}
+    if not full:
+        for modello, oggetto_id in SyncTombstone.objects.filter(eliminato_il__gt=watermark).values_list(
+            'modello', 'oggetto_id'
+        ).order_by('eliminato_il'):
+            if modello in TOMBSTONE_NAMES:
+                deleted[TOMBSTONE_NAMES[modello]].append(oggetto_id)
+
+    return {
+        'watermark': issue_watermark(now),
+        'full': full,
+        'changes': changes,
+        'deleted': deleted,
+    }
+
+
+def record_tombstone(instance):
+    SyncTombstone.objects.create(modello=instance._meta.model_name, oggetto_id=instance.pk)
+
+
+def cleanup_tombstones():
+    """Elimina le tombstone oltre il periodo di conservazione; restituisce il numero eliminato"""
+    eliminati, _ = SyncTombstone.objects.filter(eliminato_il__lt=tombstone_cutoff()).delete()
+    return eliminati
+
+
+# ---------- Upload ----------
+
+def _apply_trattamento_stato(change):
+    """
+    Cambio di stato fatto offline, es. {'tipo': 'trattamento_stato', 'trattamento_id': 12,
+    'stato': 'completato', 'data_esecuzione': '2026-06-03', 'base': <aggiornato_il letto dal client>}
+
+    Returns:
+        None se applicato, altrimenti dict del conflitto
+    """
+    stati_validi = dict(Trattamento.STATI_CHOICES)
+    stato = change.get('stato')
+    if stato not in stati_validi:
+        raise SyncError(f"Stato non valido: {stato!r}")
+
+    data_esecuzione = change.get('data_esecuzione')
+    if data_esecuzione and parse_date(data_esecuzione) is None:
+        raise SyncError(f"Data di esecuzione non valida: {data_esecuzione!r}")
+
+    trattamento_id = change.get('trattamento_id')
+    if not isinstance(trattamento_id, int):
+        raise SyncError(f"trattamento_id non valido: {trattamento_id!r}")
+
+    trattamento = Trattamento.objects.select_for_update().filter(pk=trattamento_id).first()
+    if trattamento is None:
+        return {'motivo': 'eliminato'}
+
+    if trattamento.stato == stato:
+        # Già nello stato richiesto (stessa modifica fatta online o batch ripetuto)
+        return None
+
+    base = change.get('base')
+    if base and trattamento.aggiornato_il > parse_watermark(base):
+        return {
+            'motivo': 'modificato',
+            'server': {'stato': trattamento.stato, 'aggiornato_il': format_timestamp(trattamento.aggiornato_il)},
+        }
+
+    trattamento.stato = stato
+    update_fields = ['stato', 'aggiornato_il']
+    if stato == 'completato':
+        trattamento.data_esecuzione = parse_date(data_esecuzione) if data_esecuzione else timezone.localdate()
+        update_fields.append('data_esecuzione')
+    trattamento.save(update_fields=update_fields)
+    return None
+
+
+CHANGE_HANDLERS = {
+    'trattamento_stato': _apply_trattamento_stato,
+}
+
+
+def apply_changes(changes):
+    """
+    Applica in una sola transazione le modifiche accodate offline. Un conflitto non blocca
+    le altre modifiche; un batch malformato non applica nulla (SyncError).
+
+    Returns:
+        dict con 'applied' (id delle modifiche del client), 'conflicts', 'watermark'
+    """
+    if not isinstance(changes, list):
+        raise SyncError("'changes' deve essere una lista")
+
+    applied, conflicts = [], []
+    with transaction.atomic():
+        for change in changes:
+            if not isinstance(change, dict):
+                raise SyncError("Ogni modifica deve essere un oggetto")
+            handler = CHANGE_HANDLERS.get(change.get('tipo'))
+            if handler is None:
+                raise SyncError(f"Tipo di modifica non supportato: {change.get('tipo')!r}")
+
+            conflict = handler(change)
+            if conflict is None:
+                applied.append(change.get('id'))
+            else:
+                conflicts.append({'id': change.get('id'), **conflict})
+
+    if conflicts:
+        logger.info(f"Sincronizzazione: {len(applied)} modifiche applicate, {len(conflicts)} conflitti")
+    return {
+        'applied': applied,
+        'conflicts': conflicts,
+        'watermark': issue_watermark(),
+    }
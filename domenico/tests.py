@@ -1,3 +1,1265 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import pstats
+import shutil
+import smtplib
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.finders import FileSystemFinder
+from django.core.cache import cache
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.core.management import CommandError, call_command
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.metrics import PROMETHEUS_AVAILABLE
+from domenico.activity_logging import cleanup_old_logs, get_activity_stats, log_activity
+from domenico.activity_partitions import estimated_row_count
+from domenico.activity_rollup import activity_summary, rebuild_rollup
+from domenico.analytics import demand_rows, product_demand
+from domenico.content_store import MARGINE_ORFANI, elimina_contenuti_orfani
+from domenico.dataset import generate_dataset, is_synthetic_database
+from domenico.db_connections import connection_stats
+from domenico.db_routing import ReplicaPinningMiddleware, read_replica
+from domenico.load_harness import FakeWeatherAPI, LoadContext, percentile, run_load_test
+from domenico.email_utils import generate_email_body, record_trattamento_communication
+from domenico.mail_dispatch import MailDispatchService
+from domenico.management.commands.import_profile import TARGETS, parse_importtime
+from domenico.metrics import TreatmentStateCollector
+from domenico.models import (
+    ActivityDailyRollup, ActivityLog, Cascina, Cliente, ComunicazioneTrattamento, ContattoEmail, ContenutoComunicazione, Contoterzista,
+    EmailOutbox, PrincipioAttivo, Prodotto, StartupChecksum, SyncTombstone, Terreno, Trattamento,
+    TrattamentoProdotto
+)
+from domenico.profiling import ProfileStore
+from domenico.outbox import (
+    claim_batch, dispatch_batch, enqueue_trattamento_communication, enqueue_trattamenti_communications,
+    mark_sent, outbox_metrics
+)
+from domenico.reference_data import get_contoterzisti, get_prodotti
+from domenico.season_clone import clone_season, scala_dose, sposta_data
+from domenico.smtp_sink import SMTPSink
+from domenico.static_storage import CompressedManifestStaticFilesStorage
+from domenico.weather_service import WeatherService
+
+
+def post_json(client, url, data):
+    return client.post(url, data=json.dumps(data), content_type='application/json')
+
+
+def build_message(i):
+    return EmailMessage(
+        subject=f'Trattamento #{i}',
+        body='Comunicazione di test',
+        from_email='test@gestionale.local',
+        to=[f'contatto{i}@example.com'],
+    )
+
+
+class FlakyBackend(BaseEmailBackend):
+    """Backend di test che fallisce secondo uno script di errori"""
+
+    opened = 0
+
+    def __init__(self, errors, **kwargs):
+        super().__init__(**kwargs)
+        self.errors = errors
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        error = self.errors.pop(0) if self.errors else None
+        if error:
+            raise error
+        return len(messages)
+
+
+class MailDispatchServiceTest(SimpleTestCase):
+    """Test per il servizio di invio email in blocco"""
+
+    def setUp(self):
+        FlakyBackend.opened = 0
+
+    def test_reuses_connection_per_batch(self):
+        """Test che i messaggi condividano una connessione per batch"""
+        with SMTPSink() as sink:
+            def factory(**kwargs):
+                return EmailBackend(host=sink.host, port=sink.port, use_tls=False, **kwargs)
+
+            service = MailDispatchService(batch_size=2, rate_limit=0, connection_factory=factory)
+            results = service.send_messages([build_message(i) for i in range(5)])
+
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual(sink.messages_received, 5)
+        self.assertEqual(sink.connections, 3)
+
+    def test_reconnects_after_disconnect(self):
+        """Test riconnessione dopo la caduta della connessione"""
+        errors = [smtplib.SMTPServerDisconnected('connection lost')]
+        service = MailDispatchService(
+            batch_size=50, rate_limit=0, max_retries=2,
+            connection_factory=lambda **kwargs: FlakyBackend(errors, **kwargs)
+        )
+
+        results = service.send_messages([build_message(1)])
+
+        self.assertTrue(results[0]['success'])
+        self.assertEqual(FlakyBackend.opened, 2)
+
+    def test_failure_does_not_stop_batch(self):
+        """Test che un errore su un messaggio non blocchi gli altri"""
+        errors = [None, smtplib.SMTPRecipientsRefused({'x@example.com': (550, b'no')}), None]
+        service = MailDispatchService(
+            batch_size=50, rate_limit=0,
+            connection_factory=lambda **kwargs: FlakyBackend(errors, **kwargs)
+        )
+
+        results = service.send_messages([build_message(i) for i in range(3)])
+
+        self.assertEqual([r['success'] for r in results], [True, False, True])
+        self.assertEqual(FlakyBackend.opened, 1)
+
+
+@override_settings(EMAIL_OUTBOX_BACKOFF_BASE=60, EMAIL_OUTBOX_BACKOFF_MAX=3600)
+class EmailOutboxTest(TestCase):
+    """Test per la coda email persistente e il dispatcher"""
+
+    def setUp(self):
+        FlakyBackend.opened = 0
+
+    def queue_message(self, i, **kwargs):
+        return EmailOutbox.objects.create(
+            destinatari=[f'contatto{i}@example.com'],
+            oggetto=f'Trattamento #{i}',
+            corpo='Comunicazione di test',
+            **kwargs
+        )
+
+    def test_enqueue_does_not_send(self):
+        """Test che l'accodamento non invii e non cambi lo stato del trattamento"""
+        cliente = Cliente.objects.create(nome='Azienda Test')
+        ContattoEmail.objects.create(cliente=cliente, nome='Mario', email='mario@example.com')
+        trattamento = Trattamento.objects.create(cliente=cliente)
+
+        risultato = enqueue_trattamento_communication(trattamento.id)
+
+        self.assertTrue(risultato['queued'])
+        messaggio = EmailOutbox.objects.get(id=risultato['outbox_id'])
+        self.assertEqual(messaggio.destinatari, ['mario@example.com'])
+        self.assertEqual(messaggio.stato, 'in_coda')
+        trattamento.refresh_from_db()
+        self.assertEqual(trattamento.stato, 'programmato')
+
+    def test_claims_do_not_overlap(self):
+        """Test che due dispatcher non prendano in carico gli stessi messaggi"""
+        for i in range(5):
+            self.queue_message(i)
+
+        primo = claim_batch('w1', limit=3)
+        secondo = claim_batch('w2', limit=3)
+
+        self.assertEqual(len(primo), 3)
+        self.assertEqual(len(secondo), 2)
+        self.assertFalse({m.id for m in primo} & {m.id for m in secondo})
+        self.assertEqual(claim_batch('w3'), [])
+
+    def test_failure_is_retried_with_backoff(self):
+        """Test che un invio fallito torni in coda con backoff, poi venga inviato"""
+        messaggio = self.queue_message(1)
+        errors = [smtplib.SMTPRecipientsRefused({'contatto1@example.com': (450, b'busy')})]
+        service = MailDispatchService(
+            rate_limit=0, connection_factory=lambda **kwargs: FlakyBackend(errors, **kwargs)
+        )
+
+        with service.session() as session:
+            esito = dispatch_batch('w1', session)
+        self.assertEqual(esito['failed'], 1)
+
+        messaggio.refresh_from_db()
+        self.assertEqual(messaggio.stato, 'in_coda')
+        self.assertEqual(messaggio.tentativi, 1)
+        self.assertGreater(messaggio.prossimo_tentativo, timezone.now())
+
+        # Non ancora pronto: il backoff lo esclude dal claim
+        self.assertEqual(claim_batch('w1'), [])
+
+        EmailOutbox.objects.filter(id=messaggio.id).update(prossimo_tentativo=timezone.now())
+        with service.session() as session:
+            esito = dispatch_batch('w1', session)
+        self.assertEqual(esito['sent'], 1)
+
+        messaggio.refresh_from_db()
+        self.assertEqual(messaggio.stato, 'inviato')
+        self.assertEqual(messaggio.tentativi, 2)
+
+    def test_gives_up_after_max_attempts(self):
+        """Test che dopo l'ultimo tentativo il messaggio sia marcato fallito"""
+        messaggio = self.queue_message(1, max_tentativi=1)
+        errors = [smtplib.SMTPDataError(554, b'rejected')]
+        service = MailDispatchService(
+            rate_limit=0, connection_factory=lambda **kwargs: FlakyBackend(errors, **kwargs)
+        )
+
+        with service.session() as session:
+            dispatch_batch('w1', session)
+
+        messaggio.refresh_from_db()
+        self.assertEqual(messaggio.stato, 'fallito')
+        self.assertIn('rejected', messaggio.ultimo_errore)
+
+    def test_metrics(self):
+        """Test delle metriche di profondità ed età della coda"""
+        self.queue_message(1)
+        self.queue_message(2, stato='inviato')
+
+        metrics = outbox_metrics()
+
+        self.assertEqual(metrics['depth']['in_coda'], 1)
+        self.assertEqual(metrics['depth']['inviato'], 1)
+        self.assertEqual(metrics['due'], 1)
+        self.assertGreaterEqual(metrics['oldest_queued_age_seconds'], 0)
+
+
+@override_settings(EMAIL_DIGEST_ENABLED=True, EMAIL_DIGEST_WINDOW=3600)
+class EmailDigestTest(TestCase):
+    """Test per il raggruppamento in digest delle comunicazioni accodate"""
+
+    def setUp(self):
+        self.contoterzista = Contoterzista.objects.create(nome='Agri Service', email='agri@example.com')
+        self.trattamenti = []
+        for nome in ('Azienda A', 'Azienda B'):
+            cliente = Cliente.objects.create(nome=nome)
+            ContattoEmail.objects.create(cliente=cliente, nome='Titolare', email=f'{nome[-1].lower()}@example.com')
+            cascina = Cascina.objects.create(nome=f'Cascina {nome[-1]}', cliente=cliente, contoterzista=self.contoterzista)
+            for _ in range(3):
+                self.trattamenti.append(
+                    Trattamento.objects.create(cliente=cliente, cascina=cascina, livello_applicazione='cascina')
+                )
+
+    def test_groups_by_recipient_set(self):
+        """Test che i trattamenti con gli stessi destinatari condividano chiave e finestra"""
+        enqueue_trattamenti_communications([t.id for t in self.trattamenti])
+
+        chiavi = set(EmailOutbox.objects.values_list('digest_key', flat=True))
+        self.assertEqual(len(chiavi), 2)
+        self.assertTrue(all(m.prossimo_tentativo > timezone.now() for m in EmailOutbox.objects.all()))
+
+    @override_settings(EMAIL_DIGEST_GROUP_BY='contoterzista')
+    def test_groups_by_contoterzista(self):
+        """Test del raggruppamento per contoterzista della cascina"""
+        enqueue_trattamenti_communications([t.id for t in self.trattamenti])
+
+        messaggi = EmailOutbox.objects.all()
+        self.assertEqual({m.digest_key for m in messaggi}, {f'contoterzista:{self.contoterzista.id}'})
+        self.assertTrue(all(m.destinatari == ['agri@example.com'] for m in messaggi))
+
+    @override_settings(EMAIL_DIGEST_GROUP_BY='contoterzista')
+    def test_claims_whole_group(self):
+        """Test che un gruppo digest venga preso in carico per intero"""
+        enqueue_trattamenti_communications([t.id for t in self.trattamenti])
+        EmailOutbox.objects.update(prossimo_tentativo=timezone.now())
+
+        messaggi = claim_batch('w1', limit=1)
+
+        self.assertEqual(len(messaggi), len(self.trattamenti))
+
+    @override_settings(EMAIL_DIGEST_GROUP_BY='contoterzista')
+    def test_failed_digest_is_retried_as_one_email(self):
+        """Test che un digest fallito ritenti con un solo orario e che lo storico registri il digest inviato"""
+        enqueue_trattamenti_communications([t.id for t in self.trattamenti])
+        EmailOutbox.objects.update(prossimo_tentativo=timezone.now())
+        errors = [smtplib.SMTPDataError(451, b'try later')]
+        service = MailDispatchService(
+            rate_limit=0, connection_factory=lambda **kwargs: FlakyBackend(errors, **kwargs)
+        )
+
+        with service.session() as session:
+            self.assertEqual(dispatch_batch('w1', session)['emails'], 0)
+        self.assertEqual(EmailOutbox.objects.values('prossimo_tentativo').distinct().count(), 1)
+
+        digest = EmailMultiAlternatives(subject='Comunicazione digest', body='Testo del digest', to=['agri@example.com'])
+        for messaggio in EmailOutbox.objects.select_related('trattamento'):
+            mark_sent(messaggio, email=digest)
+
+        comunicazioni = ComunicazioneTrattamento.objects.filter(inviato_con_successo=True)
+        self.assertEqual(comunicazioni.count(), len(self.trattamenti))
+        self.assertEqual({(c.oggetto, c.corpo_email) for c in comunicazioni}, {('Comunicazione digest', 'Testo del digest')})
+        self.assertEqual({c.destinatari for c in comunicazioni}, {'agri@example.com'})
+
+
+class ComunicazioneStorageTest(TestCase):
+    """Test per l'archiviazione compressa e deduplicata delle comunicazioni"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nome='Azienda Agricola Rossi')
+        self.trattamenti = [Trattamento.objects.create(cliente=self.cliente) for _ in range(3)]
+
+    def registra(self, trattamento):
+        return ComunicazioneTrattamento.objects.create(
+            trattamento=trattamento,
+            destinatari='mario@example.com, anna@example.com',
+            oggetto=f'Trattamento #{trattamento.id}',
+            corpo_email=generate_email_body(trattamento),
+            inviato_con_successo=True,
+        )
+
+    def test_round_trip(self):
+        """Test che corpo e destinatari vengano riletti identici"""
+        comunicazione = self.registra(self.trattamenti[0])
+
+        comunicazione = ComunicazioneTrattamento.objects.get(id=comunicazione.id)
+        self.assertEqual(comunicazione.destinatari, 'mario@example.com, anna@example.com')
+        self.assertEqual(comunicazione.corpo_email, generate_email_body(self.trattamenti[0]))
+
+    def test_deduplicates_and_compresses(self):
+        """Test che i contenuti ripetuti siano salvati una volta e compressi"""
+        for trattamento in self.trattamenti:
+            self.registra(trattamento)
+
+        # Un elenco destinatari condiviso + un corpo per trattamento
+        self.assertEqual(ContenutoComunicazione.objects.count(), 1 + len(self.trattamenti))
+
+        corpo = ComunicazioneTrattamento.objects.first().contenuto_corpo
+        self.assertLess(len(corpo.dati) * 4, corpo.dimensione)
+
+    def test_texts_are_stored_on_save(self):
+        """Test che un'istanza non salvata non scriva contenuti"""
+        comunicazione = ComunicazioneTrattamento(
+            trattamento=self.trattamenti[0], destinatari='mario@example.com',
+            oggetto='Bozza', corpo_email='Testo della bozza'
+        )
+        self.assertEqual(comunicazione.corpo_email, 'Testo della bozza')
+        self.assertFalse(ContenutoComunicazione.objects.exists())
+
+        comunicazione.save()
+        self.assertEqual(ContenutoComunicazione.objects.count(), 2)
+        self.assertEqual(comunicazione.contenuto_corpo.testo, 'Testo della bozza')
+
+    def test_orphan_cleanup(self):
+        """Test che la pulizia elimini solo i contenuti non referenziati e non recenti"""
+        self.registra(self.trattamenti[0])
+        orfano = ContenutoComunicazione.salva('Corpo di una comunicazione eliminata')
+        ContenutoComunicazione.objects.update(creato_il=timezone.now() - MARGINE_ORFANI * 2)
+        ContenutoComunicazione.salva('Corpo appena creato')
+
+        self.assertEqual(elimina_contenuti_orfani(), 1)
+        self.assertFalse(ContenutoComunicazione.objects.filter(hash=orfano.hash).exists())
+        self.assertEqual(ContenutoComunicazione.objects.count(), 3)
+
+
+class ActivityLogRetentionTest(TestCase):
+    """Test per la retention dei log di attività"""
+
+    def test_chunked_cleanup(self):
+        """Test che la pulizia a blocchi elimini solo i log scaduti"""
+        for giorni in (200, 150, 100, 95, 10, 0):
+            log = ActivityLog.objects.create(activity_type='user_login', title=f'Accesso {giorni}')
+            ActivityLog.objects.filter(id=log.id).update(timestamp=timezone.now() - timedelta(days=giorni))
+
+        deleted = cleanup_old_logs(90, batch_size=3)
+
+        self.assertEqual(deleted, 4)
+        self.assertEqual(ActivityLog.objects.count(), 2)
+
+    def test_stats_only_reports_estimate(self):
+        """Test che --stats-only mostri il totale stimato senza eliminare nulla"""
+        for _ in range(3):
+            log_activity('user_login', 'Accesso')
+
+        out = StringIO()
+        call_command('cleanup_activity_logging', '--stats-only', stdout=out)
+
+        self.assertIn('Totali nel database (stima): ~3', out.getvalue())
+        self.assertEqual(estimated_row_count(), 3)
+        self.assertEqual(ActivityLog.objects.count(), 3)
+
+
+class ActivityRollupTest(TestCase):
+    """Test per il riepilogo giornaliero delle attività"""
+
+    def crea_log(self, activity_type, giorni_fa):
+        log = ActivityLog.objects.create(activity_type=activity_type, title='Test')
+        ActivityLog.objects.filter(id=log.id).update(timestamp=timezone.now() - timedelta(days=giorni_fa))
+
+    def test_updated_on_write(self):
+        """Test che ogni log incrementi il contatore del giorno"""
+        log_activity('user_login', 'Accesso')
+        log_activity('user_login', 'Accesso')
+        log_activity('cliente_created', 'Nuovo cliente')
+
+        riga = ActivityDailyRollup.objects.get(giorno=timezone.localdate(), activity_type='user_login')
+        self.assertEqual(riga.count, 2)
+        self.assertEqual(get_activity_stats(7)['total'], 3)
+
+    def test_summary_from_rebuilt_rollup(self):
+        """Test di crescita e top attività calcolati dal riepilogo ricostruito"""
+        for giorni_fa in (0, 1, 2):
+            self.crea_log('user_login', giorni_fa)
+        self.crea_log('cliente_created', 3)
+        self.crea_log('user_login', 10)
+
+        rebuild_rollup()
+        riepilogo = activity_summary()
+
+        self.assertEqual(riepilogo['attivita_settimana'], 4)
+        self.assertEqual(riepilogo['attivita_settimana_precedente'], 1)
+        self.assertEqual(riepilogo['crescita'], 3)
+        self.assertEqual(riepilogo['top_activities'][0], {'activity_type': 'user_login', 'count': 3})
+
+
+class ReferenceDataCacheTest(TestCase):
+    """Test per la cache dei dati di riferimento"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_prodotti_invalidated_on_change(self):
+        """Test che nuovi prodotti e principi attivi svuotino la cache"""
+        self.assertEqual(get_prodotti(), [])
+
+        prodotto = Prodotto.objects.create(nome='Rame')
+        self.assertEqual(len(get_prodotti()), 1)
+        with self.assertNumQueries(0):
+            get_prodotti()
+        prodotto.principi_attivi.add(PrincipioAttivo.objects.create(nome='Idrossido di rame'))
+
+        self.assertEqual(get_prodotti()[0]['principi_attivi'], ['Idrossido di rame'])
+
+    def test_contoterzisti_count_cascine(self):
+        """Test del conteggio cascine aggiornato quando cambia una cascina"""
+        contoterzista = Contoterzista.objects.create(nome='Agri Service')
+        self.assertEqual(get_contoterzisti()[0]['cascine_count'], 0)
+
+        cliente = Cliente.objects.create(nome='Azienda Test')
+        Cascina.objects.create(nome='Cascina Alta', cliente=cliente, contoterzista=contoterzista)
+
+        self.assertEqual(get_contoterzisti()[0]['cascine_count'], 1)
+
+
+class StartupCommandTest(TestCase):
+    """Test per il comando di avvio del container"""
+
+    def run_startup(self):
+        out = StringIO()
+        call_command('startup', skip_static=True, verbosity=0, stdout=out)
+        return out.getvalue()
+
+    def test_csv_import_skipped_when_unchanged(self):
+        """Test che i CSV già importati non vengano reimportati"""
+        output = self.run_startup()
+        self.assertIn('nessuna migrazione da applicare', output)
+        self.assertIn('importati:', output)
+        self.assertTrue(Cliente.objects.exists())
+        self.assertTrue(StartupChecksum.objects.filter(nome__startswith='csv:').exists())
+
+        output = self.run_startup()
+        self.assertIn('import saltato', output)
+
+        StartupChecksum.objects.filter(nome='csv:Prodotti-Grid view.csv').update(checksum='vecchio')
+        output = self.run_startup()
+        self.assertIn('importati: prodotti', output)
+
+
+class ImportProfileTest(SimpleTestCase):
+    """Test per il caricamento differito delle dipendenze pesanti"""
+
+    def test_parse_importtime(self):
+        """Test che vengano sommati solo gli import di primo livello"""
+        output = "\n".join([
+            'import time: self [us] | cumulative | imported package',
+            'import time:       100 |        300 | domenico.views',
+            'import time:       200 |        200 |   domenico.pdf_engine',
+            'import time:        50 |         50 | domenico.urls',
+            'import time:       400 |        900 | weasyprint',
+        ])
+        self.assertEqual(parse_importtime(output), {'domenico': 350, 'weasyprint': 900})
+
+    def test_heavy_dependencies_not_imported_at_startup(self):
+        """Test che l'avvio di un worker non importi motore PDF, qrcode e cryptography"""
+        script = TARGETS['urls'] + (
+            "; import sys; print(' '.join(m for m in ('weasyprint', 'xhtml2pdf', 'qrcode', 'cryptography') "
+            "if m in sys.modules))"
+        )
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '')
+
+
+class StaticStorageTest(SimpleTestCase):
+    """Test per lo storage dei file statici con hash e compressione"""
+
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+
+    def collect_project_static(self):
+        """Come collectstatic, ma solo per i file di STATICFILES_DIRS"""
+        storage = CompressedManifestStaticFilesStorage(location=self.static_root, base_url='/static/')
+        paths = {}
+        for path, source in FileSystemFinder().list(['.*', '*~']):
+            with source.open(path) as f:
+                storage.save(path, f)
+            paths[path] = (source, path)
+        list(storage.post_process(paths))
+        return storage
+
+    def test_hashed_compressed_files_and_service_worker(self):
+        """Test di nomi con hash, copie .gz e lista di precaricamento del service worker"""
+        storage = self.collect_project_static()
+
+        hashed = storage.stored_name('tickets/js/feedback-widget.js')
+        self.assertRegex(hashed, r'^tickets/js/feedback-widget\.[0-9a-f]{12}\.js$')
+        with open(os.path.join(self.static_root, hashed), 'rb') as f:
+            originale = f.read()
+        with open(os.path.join(self.static_root, f'{hashed}.gz'), 'rb') as f:
+            self.assertEqual(gzip.decompress(f.read()), originale)
+
+        with open(os.path.join(self.static_root, 'sw.js')) as f:
+            service_worker = f.read()
+        self.assertIn(f'"/static/{hashed}"', service_worker)
+        self.assertNotIn('__STATIC_VERSION__', service_worker)
+        self.assertNotIn('__STATIC_PRECACHE__', service_worker)
+
+    def test_missing_file_keeps_plain_url(self):
+        """Test che un file statico inesistente non faccia fallire i template"""
+        storage = self.collect_project_static()
+        self.assertEqual(storage.url('icons/inesistente.png'), '/static/icons/inesistente.png')
+
+
+@override_settings(REPLICA_READS=True)
+class ReplicaRoutingTest(TestCase):
+    """Test del routing delle letture sulla replica (seconda SQLite, senza replicazione)"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Una seconda SQLite in memoria fa da replica: quello che si scrive su default non
+        # c'è, come su una replica in ritardo. Dichiarata solo per questi test, dopo che il
+        # test runner ha preparato i database.
+        connections.settings['replica'] = connections.configure_settings({
+            'default': dict(connections.settings['default']),
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        })['replica']
+        nome = connections['replica'].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cls.addClassCleanup(connections.settings.pop, 'replica')
+        cls.addClassCleanup(connections.__delitem__, 'replica')
+        cls.addClassCleanup(connections['replica'].creation.destroy_test_db, nome, verbosity=0)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_request(self, view, cookies=None):
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinningMiddleware(view)(request)
+
+    def test_reads_routed_to_replica(self):
+        """Test che solo le view marcate leggano dalla replica e che le scritture restino sul primario"""
+        Cliente.objects.using('replica').create(nome='Sulla replica')
+        nomi = []
+
+        @read_replica
+        def view(request):
+            nomi.append(list(Cliente.objects.values_list('nome', flat=True)))
+            Cliente.objects.create(nome='Sul primario')
+            # Dopo la scrittura la stessa richiesta legge dal primario
+            nomi.append(list(Cliente.objects.values_list('nome', flat=True)))
+            return HttpResponse()
+
+        response = self.run_request(view)
+
+        self.assertEqual(nomi, [['Sulla replica'], ['Sul primario']])
+        self.assertEqual(Cliente.objects.get().nome, 'Sul primario')
+        self.assertIn('db_pin', response.cookies)
+
+    def test_pinned_session_reads_primary(self):
+        """Test read-your-writes: con il cookie di pin anche le view marcate leggono dal primario"""
+        Cliente.objects.create(nome='Appena scritto')
+        conteggi = []
+
+        @read_replica
+        def view(request):
+            conteggi.append(Cliente.objects.count())
+            return HttpResponse()
+
+        response = self.run_request(view, cookies={'db_pin': '1'})
+        self.run_request(view)
+
+        self.assertEqual(conteggi, [1, 0])
+        self.assertNotIn('db_pin', response.cookies)
+
+
+class DbConnectionStatsTest(TestCase):
+    """Test delle metriche di connessione al database"""
+
+    def test_connection_stats(self):
+        Cliente.objects.exists()
+        stats = connection_stats()['default']
+        self.assertEqual(stats['pooled'], settings.DB_POOL)
+        self.assertTrue(stats['health_checks'])
+        self.assertTrue(stats['connected'])
+        self.assertEqual('pool' in stats, settings.DB_POOL)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_stats_api_requires_token_or_staff(self):
+        url = reverse('api_db_connection_stats')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('default', response.json()['databases'])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_db_connections', requests=5, stdout=out)
+        self.assertIn('persistent', out.getvalue())
+        self.assertIn('fresh', out.getvalue())
+
+
+@override_settings(SYNC_WATERMARK_LAG=0)
+class OfflineSyncTest(TestCase):
+    """Test della sincronizzazione delta per la PWA offline"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nome='Azienda Agricola Bianchi')
+        self.cascina = Cascina.objects.create(nome='Cascina Nord', cliente=self.cliente)
+        self.terreno = Terreno.objects.create(nome='Vigna', cascina=self.cascina, superficie='2.50')
+        self.trattamento = Trattamento.objects.create(
+            cliente=self.cliente, cascina=self.cascina, livello_applicazione='cascina', stato='comunicato'
+        )
+
+    def sync(self, since=None):
+        params = {'since': since} if since else {}
+        response = self.client.get(reverse('api_sync_changes'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def upload(self, changes):
+        return post_json(self.client, reverse('api_sync_upload'), {'changes': changes})
+
+    def test_full_then_delta(self):
+        """Test che dopo la prima sincronizzazione arrivino solo modifiche ed eliminazioni"""
+        completa = self.sync()
+        self.assertTrue(completa['full'])
+        self.assertEqual([c['nome'] for c in completa['changes']['clienti']], ['Azienda Agricola Bianchi'])
+
+        terreno_id = self.terreno.pk
+        self.terreno.delete()
+        self.cascina.nome = 'Cascina Sud'
+        self.cascina.save()
+
+        delta = self.sync(completa['watermark'])
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['changes']['clienti'], [])
+        self.assertEqual([c['nome'] for c in delta['changes']['cascine']], ['Cascina Sud'])
+        self.assertEqual(delta['deleted']['terreni'], [terreno_id])
+        self.assertEqual(SyncTombstone.objects.count(), 1)
+
+        self.assertEqual(self.sync(delta['watermark'])['changes']['cascine'], [])
+
+    def test_child_changes_touch_trattamento(self):
+        """Test che terreni e prodotti modifichino aggiornato_il del trattamento"""
+        watermark = self.sync()['watermark']
+        self.trattamento.terreni.add(self.terreno)
+
+        trattamenti = self.sync(watermark)['changes']['trattamenti']
+        self.assertEqual([(t['id'], t['terreni']) for t in trattamenti], [(self.trattamento.pk, [self.terreno.pk])])
+
+    def test_communication_reaches_delta(self):
+        """Test che il cambio di stato alla comunicazione arrivi nella sincronizzazione delta"""
+        programmato = Trattamento.objects.create(cliente=self.cliente, stato='programmato')
+        Trattamento.objects.filter(pk__in=[programmato.pk, self.trattamento.pk]).update(
+            aggiornato_il=timezone.now() - timedelta(hours=1)
+        )
+        watermark = self.sync()['watermark']
+        self.assertEqual(self.sync(watermark)['changes']['trattamenti'], [])
+
+        record_trattamento_communication({
+            'trattamento': programmato,
+            'pdf_content': None,
+            'destinatari': ['contoterzista@example.com'],
+            'destinatari_info': [],
+            'oggetto': f'Trattamento #{programmato.pk}',
+            'corpo_email': 'Comunicazione',
+            'filename': '',
+        }, invio_riuscito=True)
+
+        trattamenti = self.sync(watermark)['changes']['trattamenti']
+        self.assertEqual([(t['id'], t['stato']) for t in trattamenti], [(programmato.pk, 'comunicato')])
+
+    def base(self, trattamento):
+        """aggiornato_il del trattamento come lo riceve il client"""
+        trattamenti = {t['id']: t for t in self.sync()['changes']['trattamenti']}
+        return trattamenti[trattamento.pk]['aggiornato_il']
+
+    def test_upload_applies_and_reports_conflicts(self):
+        """Test dell'upload: modifiche applicate, conflitti segnalati, batch non valido rifiutato"""
+        base = self.base(self.trattamento)
+        altro = Trattamento.objects.create(cliente=self.cliente, stato='programmato')
+        altro_base = self.base(altro)
+        # Modificato sul server dopo la lettura del client
+        altro.stato = 'annullato'
+        altro.save()
+
+        response = self.upload([
+            {'id': 'a', 'tipo': 'trattamento_stato', 'trattamento_id': self.trattamento.pk,
+             'stato': 'completato', 'data_esecuzione': '2026-06-03', 'base': base},
+            {'id': 'b', 'tipo': 'trattamento_stato', 'trattamento_id': altro.pk,
+             'stato': 'completato', 'base': altro_base},
+            {'id': 'c', 'tipo': 'trattamento_stato', 'trattamento_id': 999999, 'stato': 'completato'},
+        ])
+        risultato = response.json()
+
+        self.assertEqual(risultato['applied'], ['a'])
+        self.assertEqual([(c['id'], c['motivo']) for c in risultato['conflicts']], [('b', 'modificato'), ('c', 'eliminato')])
+        self.trattamento.refresh_from_db()
+        self.assertEqual(self.trattamento.stato, 'completato')
+        self.assertEqual(str(self.trattamento.data_esecuzione), '2026-06-03')
+
+        # Con la base aggiornata la stessa modifica viene applicata
+        response = self.upload([{'id': 'b', 'tipo': 'trattamento_stato', 'trattamento_id': altro.pk,
+                                 'stato': 'completato', 'base': self.base(altro)}])
+        self.assertEqual(response.json()['applied'], ['b'])
+        altro.refresh_from_db()
+        self.assertEqual(altro.stato, 'completato')
+
+        response = self.upload([{'id': 'd', 'tipo': 'trattamento_stato', 'trattamento_id': altro.pk, 'stato': 'sconosciuto'}])
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductDemandTest(TestCase):
+    """Test del fabbisogno prodotti calcolato con NumPy"""
+
+    def setUp(self):
+        self.contoterzista = Contoterzista.objects.create(nome='Agri Service')
+        self.cliente = Cliente.objects.create(nome='Azienda Agricola Verdi')
+        self.nord = Cascina.objects.create(nome='Cascina Nord', cliente=self.cliente, contoterzista=self.contoterzista)
+        self.sud = Cascina.objects.create(nome='Cascina Sud', cliente=self.cliente)
+        self.vigna = Terreno.objects.create(nome='Vigna', cascina=self.nord, superficie='2.50')
+        self.campo = Terreno.objects.create(nome='Campo', cascina=self.nord, superficie='1.50')
+        Terreno.objects.create(nome='Prato', cascina=self.sud, superficie='6.00')
+        self.rame = Prodotto.objects.create(nome='Rame', unita_misura='kg')
+        self.zolfo = Prodotto.objects.create(nome='Zolfo', unita_misura='kg')
+
+        # Mercoledì 3 e venerdì 5 giugno 2026: stessa settimana (lunedì 1 giugno)
+        self.trattamenti = [
+            self.trattamento('cliente', date(2026, 6, 3), self.sud, rame='1.000'),
+            self.trattamento('cascina', date(2026, 6, 5), self.nord, rame='2.000', zolfo='0.500'),
+            self.trattamento('terreno', None, self.nord, terreni=[self.vigna], zolfo='4.000'),
+        ]
+        # Escluso: già completato
+        self.trattamento('cliente', date(2026, 6, 3), self.sud, stato='completato', rame='9.000')
+
+    def trattamento(self, livello, data_esecuzione, cascina, terreni=(), stato='programmato', **dosi):
+        trattamento = Trattamento.objects.create(
+            cliente=self.cliente, cascina=cascina if livello != 'cliente' else None,
+            livello_applicazione=livello, stato=stato, data_esecuzione=data_esecuzione
+        )
+        trattamento.terreni.set(terreni)
+        prodotti = {'rame': self.rame, 'zolfo': self.zolfo}
+        for nome, dose in dosi.items():
+            TrattamentoProdotto.objects.create(trattamento=trattamento, prodotto=prodotti[nome], quantita_per_ettaro=dose)
+        return trattamento
+
+    def test_matches_quantita_totale(self):
+        """Test che la matrice coincida con quantita_totale riga per riga"""
+        domanda = product_demand()
+        self.assertAlmostEqual(float(domanda['matrice'].sum()), sum(
+            float(tp.quantita_totale) for tp in TrattamentoProdotto.objects.filter(trattamento__in=self.trattamenti)
+        ))
+
+        righe = {(r['settimana'], r['prodotto'], r['contoterzista']): r['quantita'] for r in demand_rows(domanda)}
+        self.assertEqual(righe, {
+            # cliente: 10 ha × 1 kg/ha (senza contoterzista: il livello cliente non ha cascina)
+            ('2026-06-01', 'Rame', 'Senza contoterzista'): 10.0,
+            # cascina Nord: 4 ha × 2 kg/ha e 4 ha × 0,5 kg/ha
+            ('2026-06-01', 'Rame', 'Agri Service'): 8.0,
+            ('2026-06-01', 'Zolfo', 'Agri Service'): 2.0,
+            # terreno Vigna, senza data: 2,5 ha × 4 kg/ha
+            (None, 'Zolfo', 'Agri Service'): 10.0,
+        })
+
+    def test_date_filter_and_csv(self):
+        """Test del filtro per data e dell'esportazione CSV"""
+        url = reverse('api_fabbisogno_prodotti')
+        risposta = self.client.get(url, {'da': '2026-06-04', 'a': '2026-06-30'}).json()
+        self.assertEqual([(r['prodotto'], r['quantita']) for r in risposta['righe']], [('Rame', 8.0), ('Zolfo', 2.0)])
+
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        righe = response.content.decode().splitlines()
+        self.assertEqual(righe[0], 'Settimana;Prodotto;Unità;Contoterzista;Quantità')
+        self.assertIn('Non pianificata;Zolfo;kg;Agri Service;10,000', righe)
+
+        self.assertEqual(self.client.get(url, {'stati': 'sconosciuto'}).status_code, 400)
+
+    def test_benchmark_command(self):
+        """Test del comando di benchmark (il calcolo vettoriale coincide con il ciclo Python)"""
+        out = StringIO()
+        call_command('benchmark_product_demand', rows=2000, repeat=1, from_db=True, stdout=out)
+        self.assertIn('più veloce del ciclo Python', out.getvalue())
+        self.assertIn('(4 righe)', out.getvalue())
+
+
+class DatasetGeneratorTest(TestCase):
+    """Test del generatore di dataset sintetici e della benchmark suite"""
+
+    PARAMS = {
+        'clienti': 3, 'cascine_per_cliente': 2, 'terreni_per_cascina': 2, 'prodotti': 6, 'contoterzisti': 2,
+        'trattamenti_per_stagione': 4, 'stagioni': 2, 'prodotti_per_trattamento': 2, 'attivita': 30,
+    }
+
+    def snapshot(self):
+        return (
+            list(Terreno.objects.order_by('id').values_list('nome', 'superficie')),
+            list(Trattamento.objects.order_by('id').values_list('livello_applicazione', 'stato', 'data_esecuzione')),
+            list(TrattamentoProdotto.objects.order_by('id').values_list('prodotto__nome', 'quantita_per_ettaro')),
+        )
+
+    def test_marks_only_empty_databases_as_synthetic(self):
+        Cliente.objects.create(nome='Azienda reale')
+        generate_dataset('small', seed=7, anno=2026, **self.PARAMS)
+        self.assertFalse(is_synthetic_database())
+
+        Cliente.objects.all().delete()
+        generate_dataset('small', seed=7, anno=2026, **self.PARAMS)
+        self.assertTrue(is_synthetic_database())
+
+    def test_counts_and_determinism(self):
+        """Test che i conteggi corrispondano ai parametri e che lo stesso seme dia gli stessi dati"""
+        counts = generate_dataset('small', seed=7, anno=2026, **self.PARAMS)
+
+        self.assertEqual(counts['clienti'], Cliente.objects.count())
+        self.assertEqual(counts['terreni'], 3 * 2 * 2)
+        self.assertEqual(Trattamento.objects.count(), 3 * 4 * 2)
+        self.assertEqual(TrattamentoProdotto.objects.count(), 3 * 4 * 2 * 2)
+        self.assertEqual(ComunicazioneTrattamento.objects.count(), counts['comunicazioni'])
+        self.assertEqual(ActivityLog.objects.count(), 30)
+        # Date storiche: auto_now_add non le sovrascrive
+        self.assertFalse(Trattamento.objects.filter(data_inserimento__year__gt=2026).exists())
+        self.assertTrue(Trattamento.objects.filter(data_inserimento__year=2025).exists())
+
+        primo = self.snapshot()
+        for model in (Trattamento, Cliente, Prodotto, Contoterzista):
+            model.objects.all().delete()
+        generate_dataset('small', seed=7, anno=2026, **self.PARAMS)
+        self.assertEqual(self.snapshot(), primo)
+
+    def test_benchmark_suite_writes_json_and_rolls_back(self):
+        """Test della benchmark suite: risultati in JSON, dataset annullato alla fine"""
+        with tempfile.TemporaryDirectory() as cartella:
+            output = os.path.join(cartella, 'risultati.json')
+            out = StringIO()
+            call_command(
+                'benchmark_suite', scales=['small'], targets=['api_dashboard_summary', 'api_trattamento_detail'],
+                repeat=1, output=output, stdout=out
+            )
+            with open(output, encoding='utf-8') as f:
+                risultati = json.load(f)
+
+            call_command('benchmark_suite', scales=['small'], targets=['api_dashboard_summary'],
+                         repeat=1, output=output, compare=output, stdout=out)
+
+        misure = risultati['scale']['small']['misure']
+        self.assertEqual(misure['api_dashboard_summary']['status'], 200)
+        self.assertEqual(misure['api_trattamento_detail']['status'], 200)
+        self.assertGreater(misure['api_dashboard_summary']['queries'], 0)
+        self.assertGreater(risultati['scale']['small']['righe']['trattamenti'], 0)
+        self.assertIn('Confronto con la misura', out.getvalue())
+        self.assertEqual(Cliente.objects.count(), 0)
+
+
+@override_settings(AUTH_AUDIT_ASYNC=False)
+class LoadHarnessTest(LiveServerTestCase):
+    """Test della prova di carico contro un server reale, con la WeatherAPI finta"""
+
+    def setUp(self):
+        cache.clear()
+        generate_dataset('small', seed=1, clienti=3, attivita=10)
+        get_user_model().objects.create_user(
+            email='loadtest1@example.com', password='loadtest-password',
+            first_name='Load', last_name='Test'
+        )
+
+    def test_refuses_to_write_to_real_data(self):
+        """Test che la prova di carico scriva solo su un dataset sintetico o con --allow-writes"""
+        self.assertTrue(is_synthetic_database())
+        StartupChecksum.objects.all().delete()
+
+        with self.assertRaisesMessage(CommandError, '--allow-writes'):
+            call_command('load_test', users=1, iterations=1, stdout=StringIO())
+        # Con --url solo letture: lo scenario che comunica trattamenti viene escluso
+        with self.assertRaisesMessage(CommandError, '--allow-writes'):
+            call_command('load_test', url=self.live_server_url, scenarios=['agronomo'], stdout=StringIO())
+
+    def test_percentile(self):
+        valori = list(range(1, 101))
+        self.assertEqual((percentile(valori, 50), percentile(valori, 95), percentile(valori, 99)), (50, 95, 99))
+        self.assertEqual(percentile([], 95), 0)
+
+    def test_scenarios_with_fake_weather(self):
+        """Test degli scenari con login, dashboard e aziende: nessun errore, meteo dal server finto"""
+        with FakeWeatherAPI() as weather, override_settings(WEATHER_API_URL=weather.url, WEATHER_API_KEY='test'):
+            ctx = LoadContext(
+                clienti=list(Cliente.objects.values_list('id', flat=True)),
+                cascine=list(Cascina.objects.values_list('id', flat=True)),
+                comunicati=[],
+                programmati=[],
+                credentials=['loadtest1@example.com'],
+                password='loadtest-password',
+            )
+            # Un solo utente: il server di test condivide tra i thread la stessa connessione
+            # SQLite in memoria, e due richieste concorrenti possono bloccarsi a vicenda
+            report = run_load_test(self.live_server_url, ctx, users=1, iterations=4, scenarios=['dashboard', 'aziende'])
+
+        self.assertEqual(report['totale']['errors'], 0, report['endpoint'])
+        self.assertEqual(sum(report['scenari'].values()), 4)
+        self.assertEqual(report['endpoint']['login']['requests'], 2)
+        self.assertGreaterEqual(weather.requests, 1)
+        for metrica in ('p50', 'p95', 'p99', 'rps', 'error_rate'):
+            self.assertIn(metrica, report['totale'])
+
+
+@override_settings(AUTH_AUDIT_ASYNC=False)
+class ProfilingTest(TestCase):
+    """Test della profilazione su richiesta per lo staff"""
+
+    def setUp(self):
+        self.cartella = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cartella.cleanup)
+        self.enterContext(override_settings(PROFILING_DIR=self.cartella.name, PROFILING_MAX_CAPTURES=3))
+        User = get_user_model()
+        self.staff = User.objects.create_user(email='staff@example.com', password='x', is_staff=True)
+        self.utente = User.objects.create_user(email='utente@example.com', password='x')
+        Cliente.objects.create(nome='Azienda Profilata')
+
+    def test_staff_capture_with_sql_timeline(self):
+        """Test della cattura a campionamento: file folded, timeline SQL e pagina di elenco"""
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/dashboard/summary/', {'_profile': '1'})
+        capture_id = response['X-Profile-Id']
+
+        meta = ProfileStore().load(capture_id)
+        self.assertEqual(meta['modalita'], 'sample')
+        self.assertEqual(meta['status'], 200)
+        self.assertGreater(meta['sql']['numero'], 0)
+        self.assertIn('SELECT', meta['sql']['timeline'][0]['sql'])
+
+        download = self.client.get(f'/profilazioni/{capture_id}/download/')
+        self.assertEqual(download['Content-Disposition'], f'attachment; filename="{capture_id}.folded"')
+        for riga in b''.join(download.streaming_content).decode().splitlines():
+            stack, campioni = riga.rsplit(' ', 1)
+            self.assertTrue(int(campioni) > 0 and stack)
+
+        self.assertContains(self.client.get('/profilazioni/'), '/api/dashboard/summary/')
+        self.assertContains(self.client.get(f'/profilazioni/{capture_id}/'), 'Timeline SQL')
+
+    def test_cprofile_header_and_bounded_store(self):
+        """Test della modalità cProfile via header e del limite sul numero di catture"""
+        self.client.force_login(self.staff)
+        ids = [self.client.get('/api/dashboard/summary/', HTTP_X_PROFILE='cprofile')['X-Profile-Id'] for _ in range(5)]
+
+        store = ProfileStore()
+        self.assertEqual([c['id'] for c in store.recent()], ids[:-4:-1])
+        self.assertEqual(len(os.listdir(self.cartella.name)), 6)
+        meta = store.load(ids[-1])
+        self.assertEqual(meta['modalita'], 'cprofile')
+        self.assertTrue(meta['hotspot'])
+        stats = pstats.Stats(store.path(ids[-1], 'prof'))
+        self.assertGreater(stats.total_calls, 0)
+        self.assertEqual(self.client.get('/profilazioni/../etc/download/').status_code, 404)
+
+    def test_non_staff_and_plain_requests_not_profiled(self):
+        """Test che utenti normali e richieste senza flag non vengano profilati"""
+        self.client.force_login(self.utente)
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/dashboard/summary/', {'_profile': '1'}))
+        self.assertNotEqual(self.client.get('/profilazioni/').status_code, 200)
+
+        self.client.force_login(self.staff)
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/dashboard/summary/'))
+        self.assertEqual(ProfileStore().recent(), [])
+
+
+class DomainMetricsTest(TestCase):
+    """Test delle metriche di dominio (SMTP, WeatherAPI, trattamenti per stato)"""
+
+    def setUp(self):
+        if not PROMETHEUS_AVAILABLE:
+            self.skipTest('prometheus_client non installato')
+
+    def sample(self, name, **labels):
+        from prometheus_client import REGISTRY
+
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_smtp_duration_and_failures(self):
+        """Test che ogni invio venga misurato e i fallimenti contati"""
+        errors = [None, smtplib.SMTPRecipientsRefused({'x@example.com': (550, b'no')})]
+        service = MailDispatchService(
+            batch_size=50, rate_limit=0,
+            connection_factory=lambda **kwargs: FlakyBackend(errors, **kwargs)
+        )
+        ok = self.sample('gestionale_smtp_send_duration_seconds_count', outcome='ok')
+        falliti = self.sample('gestionale_smtp_failures_total')
+
+        service.send_messages([build_message(i) for i in range(2)])
+
+        self.assertEqual(self.sample('gestionale_smtp_send_duration_seconds_count', outcome='ok'), ok + 1)
+        self.assertEqual(self.sample('gestionale_smtp_failures_total'), falliti + 1)
+
+    def test_weather_latency_and_cache(self):
+        """Test di latenza WeatherAPI e hit/miss della cache"""
+        cache.clear()
+        prima = {r: self.sample('gestionale_weather_cache_requests_total', result=r) for r in ('hit', 'miss')}
+        chiamate = self.sample('gestionale_weather_api_duration_seconds_count', outcome='ok')
+
+        with FakeWeatherAPI() as weather, override_settings(WEATHER_API_URL=weather.url, WEATHER_API_KEY='test'):
+            service = WeatherService()
+            service.get_current_weather('Milano')
+            service.get_current_weather('Milano')
+
+        self.assertEqual(self.sample('gestionale_weather_cache_requests_total', result='miss'), prima['miss'] + 1)
+        self.assertEqual(self.sample('gestionale_weather_cache_requests_total', result='hit'), prima['hit'] + 1)
+        self.assertEqual(self.sample('gestionale_weather_api_duration_seconds_count', outcome='ok'), chiamate + 1)
+
+    def test_treatment_state_counts(self):
+        """Test del conteggio dei trattamenti per stato letto a ogni scrape"""
+        cliente = Cliente.objects.create(nome='Azienda Metriche')
+        for stato in ('programmato', 'programmato', 'comunicato'):
+            Trattamento.objects.create(cliente=cliente, livello_applicazione='cliente', stato=stato)
+
+        family = next(TreatmentStateCollector().collect())
+        counts = {s.labels['stato']: s.value for s in family.samples}
+        self.assertEqual((counts['programmato'], counts['comunicato'], counts['annullato']), (2, 1, 0))
+
+
+class CommunicationPreviewTest(TestCase):
+    """Test dell'anteprima comunicazioni calcolata con query raggruppate"""
+
+    def post_preview(self, ids, **extra):
+        return post_json(self.client, reverse('api_communication_preview'), {'trattamenti_ids': ids, **extra})
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_matches_model_and_keeps_same_name_clients_apart(self):
+        """Test che superfici e raggruppamento coincidano con il modello, con aziende omonime distinte"""
+        generate_dataset('small', seed=3, anno=2026, clienti=4, trattamenti_per_stagione=5, stagioni=1, attivita=0)
+        Cliente.objects.filter(id__in=Cliente.objects.order_by('id').values('id')[:2]).update(nome='Azienda Omonima')
+        ids = list(Trattamento.objects.values_list('id', flat=True))
+
+        with self.assertNumQueries(4):
+            data = self.read(self.post_preview(ids))
+
+        self.assertEqual(data['stats']['trattamenti_count'], len(ids))
+        self.assertEqual(data['stats']['clienti_count'], 4)
+        self.assertEqual([c['nome'] for c in data['companies']].count('Azienda Omonima'), 2)
+        for company in data['companies']:
+            self.assertEqual(company['count_trattamenti'], len(company['trattamenti']))
+            self.assertAlmostEqual(company['superficie_totale'], sum(t['superficie'] for t in company['trattamenti']), places=2)
+            for t in company['trattamenti']:
+                trattamento = Trattamento.objects.get(id=t['id'])
+                self.assertEqual(trattamento.cliente_id, company['id'])
+                self.assertAlmostEqual(t['superficie'], float(trattamento.get_superficie_interessata()), places=2)
+                self.assertEqual(
+                    sorted(p['nome'] for p in t['prodotti']),
+                    sorted(trattamento.trattamentoprodotto_set.values_list('prodotto__nome', flat=True))
+                )
+                self.assertEqual(sorted(t['terreni_nomi']), sorted(trattamento.terreni.values_list('nome', flat=True)))
+
+    def test_exclude_communicated(self):
+        """Test del filtro sui trattamenti già comunicati"""
+        cliente = Cliente.objects.create(nome='Azienda Comunicata')
+        trattamento = Trattamento.objects.create(cliente=cliente, livello_applicazione='cliente', stato='comunicato')
+
+        data = self.post_preview([trattamento.id], exclude_communicated=True).json()
+        self.assertEqual(data['companies'], [])
+        self.assertTrue(data['stats']['all_communicated'])
+
+        data = self.read(self.post_preview([trattamento.id]))
+        self.assertEqual(data['companies'][0]['trattamenti'][0]['superficie'], 0.0)
+
+
+class BulkTreatmentCreationTest(TestCase):
+    """Test della creazione di trattamenti in blocco"""
+
+    def setUp(self):
+        generate_dataset('small', seed=5, anno=2026, clienti=6, trattamenti_per_stagione=0, stagioni=1, attivita=0)
+        self.prodotti = [
+            {'prodotto_id': p.id, 'quantita_per_ettaro': 1.25 + i}
+            for i, p in enumerate(Prodotto.objects.order_by('id')[:3])
+        ]
+
+    def post_bulk(self, targets, prodotti=None, **extra):
+        prodotti = self.prodotti if prodotti is None else prodotti
+        return post_json(self.client, reverse('api_bulk_create_trattamenti'), {'targets': targets, 'prodotti': prodotti, **extra})
+
+    def test_creates_every_target_with_constant_queries(self):
+        """Test di trattamenti, terreni e prodotti creati con un numero di query indipendente dalle destinazioni"""
+        cascine = list(Cascina.objects.order_by('id'))
+        terreno = Terreno.objects.order_by('id').first()
+
+        def build(cascine):
+            targets = [{'livello_applicazione': 'cascina', 'cascina': c.id} for c in cascine]
+            targets.append({'livello_applicazione': 'terreno', 'terreni_selezionati': [terreno.id, str(terreno.id)]})
+            targets.append({'livello_applicazione': 'cliente', 'cliente': cascine[0].cliente_id})
+            return targets
+
+        # La prima richiesta crea anche la riga del riepilogo attività del giorno
+        self.post_bulk(build(cascine[:1]))
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.post_bulk(build(cascine[:1])).status_code, 200)
+
+        targets = build(cascine)
+        with CaptureQueriesContext(connection) as many:
+            response = self.post_bulk(targets, data_esecuzione='2026-06-03')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(many), len(few))
+        creati = response.json()['trattamenti']
+        self.assertEqual([c['index'] for c in creati], list(range(len(targets))))
+
+        for target, creato in zip(targets, creati):
+            trattamento = Trattamento.objects.get(id=creato['trattamento_id'])
+            self.assertEqual(trattamento.livello_applicazione, target['livello_applicazione'])
+            self.assertEqual(trattamento.stato, 'programmato')
+            self.assertEqual(str(trattamento.data_esecuzione), '2026-06-03')
+            self.assertEqual(
+                sorted(trattamento.trattamentoprodotto_set.values_list('prodotto_id', flat=True)),
+                [p['prodotto_id'] for p in self.prodotti]
+            )
+        cascina_trattamento = Trattamento.objects.get(id=creati[0]['trattamento_id'])
+        self.assertEqual(cascina_trattamento.cliente_id, cascine[0].cliente_id)
+        terreno_trattamento = Trattamento.objects.get(id=creati[-2]['trattamento_id'])
+        self.assertEqual(list(terreno_trattamento.terreni.values_list('id', flat=True)), [terreno.id])
+        self.assertEqual(terreno_trattamento.cliente_id, terreno.cascina.cliente_id)
+
+    def test_invalid_target_creates_nothing(self):
+        """Test che una destinazione non valida annulli tutta la richiesta con l'errore per indice"""
+        cascine = list(Cascina.objects.order_by('cliente_id', 'id'))
+        altra = next(c for c in cascine if c.cliente_id != cascine[0].cliente_id)
+        before = Trattamento.objects.count()
+
+        response = self.post_bulk([
+            {'livello_applicazione': 'cascina', 'cascina': cascine[0].id},
+            {'livello_applicazione': 'cascina', 'cliente': cascine[0].cliente_id, 'cascina': altra.id},
+            {'livello_applicazione': 'cascina', 'cascina': 999999},
+            {'livello_applicazione': 'terreno', 'terreni_selezionati': []},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.json()['errors']], [1, 2, 3])
+        self.assertEqual(Trattamento.objects.count(), before)
+
+        response = self.post_bulk([{'cliente': cascine[0].cliente_id}], prodotti=[{'prodotto_id': 999999, 'quantita_per_ettaro': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999999', response.json()['error'])
+        self.assertEqual(Trattamento.objects.count(), before)
+
+    def test_dose_must_fit_the_column(self):
+        """Test che le dosi fuori dai decimali o dalle cifre di quantita_per_ettaro vengano rifiutate"""
+        target = [{'cliente': Cliente.objects.order_by('id').first().id}]
+        prodotto_id = self.prodotti[0]['prodotto_id']
+        before = Trattamento.objects.count()
+
+        for quantita in (0, -1, 0.0001, 123456789, 'NaN', 'abc'):
+            response = self.post_bulk(target, prodotti=[{'prodotto_id': prodotto_id, 'quantita_per_ettaro': quantita}])
+            self.assertEqual(response.status_code, 400, quantita)
+        self.assertEqual(Trattamento.objects.count(), before)
+
+        response = self.post_bulk(target, prodotti=[{'prodotto_id': prodotto_id, 'quantita_per_ettaro': 1.1}])
+        self.assertEqual(response.status_code, 200)
+        creato = TrattamentoProdotto.objects.get(trattamento_id=response.json()['trattamenti'][0]['trattamento_id'])
+        self.assertEqual(creato.quantita_per_ettaro, Decimal('1.1'))
+
+
+class SeasonCloneTest(TestCase):
+    """Test della clonazione di una stagione di trattamenti"""
+
+    def setUp(self):
+        generate_dataset('small', seed=9, anno=2025, clienti=4, trattamenti_per_stagione=6, stagioni=1, attivita=0)
+        self.origine = Trattamento.objects.exclude(stato='annullato').filter(
+            data_esecuzione__year=2025
+        ).order_by('id')
+
+    def post_clone(self, **data):
+        return post_json(self.client, reverse('api_clone_season'), data)
+
+    def test_dry_run_diff_writes_nothing(self):
+        """Test che il dry run riporti date e dosi prima/dopo senza creare trattamenti"""
+        before = Trattamento.objects.count()
+
+        response = self.post_clone(dal='2025-01-01', al='2025-12-31', fattore_dose=0.5, dry_run=True)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(Trattamento.objects.count(), before)
+        self.assertEqual(data['trattamenti'], self.origine.count())
+        voce = data['diff'][0]
+        sorgente = Trattamento.objects.get(id=voce['origine'])
+        self.assertEqual(voce['data_esecuzione'], [str(sorgente.data_esecuzione), str(sorgente.data_esecuzione.replace(year=2026))])
+        dose = sorgente.trattamentoprodotto_set.order_by('id').first().quantita_per_ettaro
+        self.assertEqual([Decimal(d) for d in voce['prodotti'][0]['dose']], [dose, (dose / 2).quantize(Decimal('0.001'))])
+
+    def test_clone_copies_fields_and_doses_in_batches(self):
+        """Test di terreni e dosi copiati con query per blocco, non per trattamento"""
+        cliente_id = self.origine.first().cliente_id
+        sorgenti = list(self.origine.filter(cliente_id=cliente_id))
+
+        with CaptureQueriesContext(connection) as queries:
+            risultato = clone_season(clienti=[cliente_id], dal=date(2025, 1, 1), al=date(2025, 12, 31), fattore_dose='1.1', batch_size=2)
+
+        self.assertEqual(risultato['trattamenti'], len(sorgenti))
+        blocchi = -(-len(sorgenti) // 2)
+        # selezione + transazione + 5 query per blocco (2 letture, 3 inserimenti)
+        self.assertLessEqual(len(queries), 3 + 5 * blocchi)
+
+        copie = {c['origine']: c['trattamento_id'] for c in risultato['creati']}
+        for sorgente in sorgenti:
+            copia = Trattamento.objects.get(id=copie[sorgente.id])
+            self.assertEqual(copia.stato, 'programmato')
+            self.assertEqual((copia.cliente_id, copia.cascina_id, copia.livello_applicazione),
+                             (sorgente.cliente_id, sorgente.cascina_id, sorgente.livello_applicazione))
+            self.assertEqual(copia.data_esecuzione, sorgente.data_esecuzione.replace(year=2026))
+            self.assertEqual(list(copia.terreni.order_by('id')), list(sorgente.terreni.order_by('id')))
+            self.assertEqual(
+                list(copia.trattamentoprodotto_set.order_by('id').values_list('prodotto_id', 'quantita_per_ettaro')),
+                [(tp.prodotto_id, scala_dose(tp.quantita_per_ettaro, Decimal('1.1'))) for tp in sorgente.trattamentoprodotto_set.order_by('id')]
+            )
+
+    def test_date_shift_and_validation(self):
+        """Test dello spostamento delle date e dei parametri non validi"""
+        self.assertEqual(sposta_data(date(2024, 2, 29), anni=1), date(2025, 2, 28))
+        self.assertEqual(sposta_data(date(2025, 3, 1), anni=1, giorni=-7), date(2026, 2, 22))
+        self.assertIsNone(sposta_data(None, anni=1))
+
+        before = Trattamento.objects.count()
+        self.assertEqual(self.post_clone(dal='2025-12-31', al='2025-01-01').status_code, 400)
+        self.assertEqual(self.post_clone(dal='2025-01-01', fattore_dose=0).status_code, 400)
+        self.assertEqual(self.post_clone(dal='2025-01-01', anni=0, giorni=0).status_code, 400)
+        self.assertEqual(self.post_clone(dal='2025-01-01', anni=10 ** 6).status_code, 400)
+        self.assertEqual(self.post_clone(clienti=['x']).status_code, 400)
+        # Una stringa non è un elenco di id ("12" non diventa [1, 2])
+        self.assertEqual(self.post_clone(clienti='12').status_code, 400)
+        # Senza filtri si può solo simulare: niente copia dell'intero archivio
+        self.assertEqual(self.post_clone().status_code, 400)
+        self.assertEqual(self.post_clone(dry_run=True).status_code, 200)
+        self.assertEqual(Trattamento.objects.count(), before)
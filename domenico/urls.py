@@ -1,7 +1,7 @@
 # domenico/urls.py - Versione completa aggiornata
 
 from django.urls import path
-from . import views, api_views, api_communications, auth_views
+from . import views, api_views, api_communications, api_sync, api_analytics, auth_views, profiling_views
 
 # Legacy auth URLs - redirect to new auth system
 legacy_auth_urlpatterns = [
@@ -23,6 +23,7 @@ urlpatterns = [
     # ============ PAGINE PRINCIPALI ============
     path('', views.home, name='home'),
     path('offline/', views.offline_page, name='offline'),
+    path('sw.js', views.service_worker, name='service_worker'),
     path('landing/', views.public_landing, name='public_landing'),
     path('dashboard/', views.personal_dashboard, name='personal_dashboard'),
     path('aziende/', views.aziende, name='aziende'),
@@ -39,14 +40,19 @@ urlpatterns = [
     path('api/terreni/<int:cascina_id>/', views.api_terreni_by_cascina, name='api_terreni_by_cascina'),
     path('api/cascina/<int:cascina_id>/contoterzista/', views.api_cascina_contoterzista, name='api_cascina_contoterzista'),
     path('api/trattamenti/', api_views.api_create_trattamento, name='api_create_trattamento'),
+    path('api/trattamenti/bulk-create/', api_views.api_bulk_create_trattamenti, name='api_bulk_create_trattamenti'),
+    path('api/trattamenti/clona-stagione/', api_views.api_clone_season, name='api_clone_season'),
     path('api/trattamenti/<int:trattamento_id>/', views.api_trattamento_detail, name='api_trattamento_detail'),
     path('api/trattamenti/<int:trattamento_id>/stato/', views.api_update_trattamento_stato, name='api_update_trattamento_stato'),
     
     # API per comunicazioni email
     path('api/trattamenti/<int:trattamento_id>/send/', api_views.api_send_comunicazione, name='api_send_comunicazione'),
+    path('api/comunicazioni/outbox/stats/', api_views.api_outbox_stats, name='api_outbox_stats'),
+    path('api/db/connections/stats/', api_views.api_db_connection_stats, name='api_db_connection_stats'),
     path('api/trattamenti/<int:trattamento_id>/preview-pdf/', views.api_preview_comunicazione, name='api_preview_comunicazione'),
     path('api/trattamenti/<int:trattamento_id>/download-pdf/', views.api_download_comunicazione, name='api_download_comunicazione'),
     path('api/trattamenti/<int:trattamento_id>/comunicazioni/', views.api_comunicazioni_trattamento, name='api_comunicazioni_trattamento'),
+    path('api/comunicazioni/<int:comunicazione_id>/allegato/', views.api_comunicazione_allegato, name='api_comunicazione_allegato'),
     
     # API per gestione contatti email esistenti
     path('api/clienti/<int:cliente_id>/contatti/', views.api_contatti_cliente, name='api_contatti_cliente'),
@@ -132,4 +138,16 @@ urlpatterns = [
 
     path('api/trattamenti/communication-status/', views.api_communication_status_check, name='api_communication_status'),
     path('api/trattamenti/communication-preview/', api_communications.api_communication_preview, name='api_communication_preview'),
+
+    # Sincronizzazione offline della PWA
+    path('api/sync/changes/', api_sync.api_sync_changes, name='api_sync_changes'),
+    path('api/sync/upload/', api_sync.api_sync_upload, name='api_sync_upload'),
+
+    # Analisi
+    path('api/analytics/fabbisogno-prodotti/', api_analytics.api_fabbisogno_prodotti, name='api_fabbisogno_prodotti'),
+
+    # Profilazione su richiesta (staff)
+    path('profilazioni/', profiling_views.profiling_captures, name='profiling_captures'),
+    path('profilazioni/<str:capture_id>/', profiling_views.profiling_capture_detail, name='profiling_capture_detail'),
+    path('profilazioni/<str:capture_id>/download/', profiling_views.profiling_capture_download, name='profiling_capture_download'),
 ] + legacy_auth_urlpatterns
\ No newline at end of file
@@ -11,6 +11,7 @@ from django.core.exceptions import ValidationError
 import json
 from .models import *
 from .weather_service import weather_service
+from . import pdf_engine
 import logging
 from django.contrib import messages
 from django.urls import reverse
@@ -32,12 +33,15 @@ from .email_utils import (
     test_email_configuration,
     get_comunicazioni_stats
 )
+from .outbox import outbox_enabled, enqueue_trattamenti_communications
+from .db_routing import read_replica
 
 
 def public_landing(request):
     """Vista landing page pubblica per utenti non autenticati"""
     return render(request, 'public_landing.html')
 
+@read_replica
 def personal_dashboard(request):
     """Vista dashboard personale per utenti autenticati"""
     from django.db.models import Sum, Count, Q
@@ -102,6 +106,27 @@ def offline_page(request):
     return render(request, 'offline.html')
 
 
+def service_worker(request):
+    """
+    Service worker servito dalla radice, così il suo scope copre tutto il sito.
+    In produzione è la versione generata da collectstatic con gli URL con hash.
+    """
+    from django.contrib.staticfiles import finders
+    from django.contrib.staticfiles.storage import staticfiles_storage
+
+    if not settings.DEBUG and staticfiles_storage.exists('sw.js'):
+        with staticfiles_storage.open('sw.js') as f:
+            content = f.read()
+    else:
+        with open(finders.find('sw.js'), 'rb') as f:
+            content = f.read()
+
+    response = HttpResponse(content, content_type='application/javascript')
+    # Il browser deve sempre ricontrollare il service worker per accorgersi dei deploy
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
 def aziende(request):
     """Vista aziende con ricerca e ordinamento case-insensitive"""
     from django.db.models import Sum, Count, Q
@@ -188,6 +213,7 @@ def trattamenti(request):
     else:
         return trattamenti_table(request, view_type)
 
+@read_replica
 def trattamenti_dashboard(request):
     """Dashboard trattamenti con statistiche (senza in_esecuzione)"""
     from django.db.models import Count
@@ -213,6 +239,7 @@ def trattamenti_dashboard(request):
     
     return render(request, 'trattamenti.html', context)
 
+@read_replica
 def trattamenti_table(request, view_type):
     """Vista tabella trattamenti con filtri (senza in_esecuzione)"""
     from django.core.paginator import Paginator
@@ -387,6 +414,7 @@ def gestione_contatti_email(request):
     return render(request, 'gestione_contatti_email.html', context)
 
 
+@read_replica
 def comunicazioni_dashboard(request):
     """Dashboard per visualizzare lo storico delle comunicazioni"""
     from django.core.paginator import Paginator
@@ -400,9 +428,11 @@ def comunicazioni_dashboard(request):
     solo_errori = request.GET.get('solo_errori', False)
     
     # Query base
+    # La lista mostra solo metadati: il corpo (contenuto_corpo) non viene caricato
+    # e l'eventuale traccia d'errore resta differita
     comunicazioni = ComunicazioneTrattamento.objects.select_related(
-        'trattamento__cliente', 'trattamento__cascina'
-    ).order_by('-data_invio')
+        'trattamento__cliente', 'trattamento__cascina', 'contenuto_destinatari'
+    ).defer('errore').order_by('-data_invio')
     
     # Applica filtri
     if cliente_filter:
@@ -560,7 +590,9 @@ def api_comunicazioni_trattamento(request, trattamento_id):
     """API per ottenere lo storico delle comunicazioni di un trattamento"""
     try:
         trattamento = get_object_or_404(Trattamento, id=trattamento_id)
-        comunicazioni = trattamento.comunicazioni.all().order_by('-data_invio')
+        comunicazioni = trattamento.comunicazioni.select_related(
+            'contenuto_destinatari'
+        ).order_by('-data_invio')
         
         comunicazioni_data = []
         for comunicazione in comunicazioni:
@@ -571,7 +603,10 @@ def api_comunicazioni_trattamento(request, trattamento_id):
                 'oggetto': comunicazione.oggetto,
                 'inviato_con_successo': comunicazione.inviato_con_successo,
                 'errore': comunicazione.errore,
-                'allegati': comunicazione.allegati.split(', ') if comunicazione.allegati else []
+                'allegati': comunicazione.allegati.split(', ') if comunicazione.allegati else [],
+                'allegato_url': (
+                    f'/api/comunicazioni/{comunicazione.id}/allegato/' if comunicazione.allegato_hash else None
+                )
             })
         
         return JsonResponse({
@@ -618,7 +653,7 @@ def api_trattamento_detail(request, trattamento_id):
         trattamento = get_object_or_404(
             Trattamento.objects.select_related(
                 'cliente', 'cascina', 'cascina__contoterzista'
-            ).prefetch_related('terreni', 'prodotti'),
+            ).prefetch_related('terreni', 'trattamentoprodotto_set__prodotto'),
             id=trattamento_id
         )
         
@@ -673,14 +708,34 @@ def api_trattamento_detail(request, trattamento_id):
 # ============ RESTO DELLE VIEWS ESISTENTI ============
 # (home, aziende, trattamenti, ecc. rimangono invariate) e:
 
+@read_replica
 def api_preview_comunicazione(request, trattamento_id):
     """API per visualizzare l'anteprima PDF della comunicazione"""
     return preview_comunicazione_pdf(request, trattamento_id)
 
+@read_replica
 def api_download_comunicazione(request, trattamento_id):
     """API per scaricare il PDF della comunicazione"""
     return download_comunicazione_pdf(request, trattamento_id)
 
+def api_comunicazione_allegato(request, comunicazione_id):
+    """API per scaricare il PDF archiviato così come è stato inviato"""
+    from .content_store import apri_allegato
+
+    comunicazione = get_object_or_404(
+        ComunicazioneTrattamento.objects.only('id', 'allegati', 'allegato_hash'), id=comunicazione_id
+    )
+    pdf_content = apri_allegato(comunicazione.allegato_hash) if comunicazione.allegato_hash else None
+    if pdf_content is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Allegato non disponibile'
+        }, status=404)
+
+    response = HttpResponse(pdf_content, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{comunicazione.allegati or "comunicazione.pdf"}"'
+    return response
+
 def api_contatti_cliente(request, cliente_id):
     """API per ottenere i contatti email di un cliente"""
     try:
@@ -903,17 +958,9 @@ def generate_company_communication_pdf(trattamenti, custom_notes=''):
     Genera un PDF di comunicazione per un'azienda con tutti i suoi trattamenti
     """
     try:
-        # Import per PDF (prova prima WeasyPrint, poi xhtml2pdf)
-        pdf_engine = None
-        try:
-            from weasyprint import HTML, CSS
-            pdf_engine = 'weasyprint'
-        except ImportError:
-            try:
-                from xhtml2pdf import pisa
-                pdf_engine = 'xhtml2pdf'
-            except ImportError:
-                raise Exception("Nessun motore PDF disponibile. Installa WeasyPrint o xhtml2pdf.")
+        # Motore PDF (WeasyPrint o xhtml2pdf), caricato al primo utilizzo
+        if not pdf_engine.is_available():
+            raise Exception("Nessun motore PDF disponibile. Installa WeasyPrint o xhtml2pdf.")
         
         # Prepara i dati per il template
         cliente = trattamenti.first().cliente
@@ -957,31 +1004,18 @@ def generate_company_communication_pdf(trattamenti, custom_notes=''):
         except Exception as e:
             raise Exception(f"Errore nel rendering del template: {str(e)}")
         
-        # Genera PDF in base al motore disponibile
-        if pdf_engine == 'weasyprint':
-            # CSS per il PDF (inline per semplicità)
-            css_content = """
-                @page { size: A4; margin: 2cm; }
-                body { font-family: Arial, sans-serif; font-size: 11pt; line-height: 1.4; }
-                .header { text-align: center; margin-bottom: 30px; border-bottom: 2px solid #0d6efd; padding-bottom: 20px; }
-                .company-info { background: #f8f9fa; padding: 15px; border-radius: 8px; margin-bottom: 20px; }
-                .treatment-item { border: 1px solid #dee2e6; margin-bottom: 15px; padding: 15px; page-break-inside: avoid; }
-                table { width: 100%; border-collapse: collapse; }
-                th, td { border: 1px solid #dee2e6; padding: 8px; text-align: left; }
-                th { background: #f8f9fa; font-weight: bold; }
-            """
-            
-            html_doc = HTML(string=html_content)
-            pdf_content = html_doc.write_pdf(stylesheets=[CSS(string=css_content)])
-            
-        else:  # xhtml2pdf
-            result = io.BytesIO()
-            pdf = pisa.pisaDocument(io.BytesIO(html_content.encode('UTF-8')), result)
-            
-            if not pdf.err:
-                pdf_content = result.getvalue()
-            else:
-                raise Exception("Errore nella generazione del PDF con xhtml2pdf")
+        # CSS per il PDF (inline per semplicità)
+        css_content = """
+            @page { size: A4; margin: 2cm; }
+            body { font-family: Arial, sans-serif; font-size: 11pt; line-height: 1.4; }
+            .header { text-align: center; margin-bottom: 30px; border-bottom: 2px solid #0d6efd; padding-bottom: 20px; }
+            .company-info { background: #f8f9fa; padding: 15px; border-radius: 8px; margin-bottom: 20px; }
+            .treatment-item { border: 1px solid #dee2e6; margin-bottom: 15px; padding: 15px; page-break-inside: avoid; }
+            table { width: 100%; border-collapse: collapse; }
+            th, td { border: 1px solid #dee2e6; padding: 8px; text-align: left; }
+            th { background: #f8f9fa; font-weight: bold; }
+        """
+        pdf_content = pdf_engine.html_to_pdf(html_content, css=css_content)
         
         return pdf_content
         
@@ -1055,6 +1089,18 @@ def api_bulk_action_trattamenti(request):
         comunicazioni_inviate = 0
         pdf_downloads = []
         
+        # Invio email in blocco su un'unica connessione SMTP (prima della transazione,
+        # così la latenza SMTP non tiene aperti i lock sul database)
+        risultati_invio = {}
+        if action == 'comunica' and communication_mode in ['send_only', 'send_and_download']:
+            ids_da_inviare = [t.id for t in trattamenti if t.stato == 'programmato']
+            if outbox_enabled():
+                # Le email vengono solo accodate: le invia il comando dispatch_outbox
+                risultati_invio = enqueue_trattamenti_communications(ids_da_inviare)
+            else:
+                from .email_utils import send_trattamenti_communications
+                risultati_invio = send_trattamenti_communications(ids_da_inviare)
+        
         with transaction.atomic():
             for trattamento in trattamenti:
                 try:
@@ -1066,24 +1112,22 @@ def api_bulk_action_trattamenti(request):
                         
                         # Gestisci diverse modalità di comunicazione
                         email_sent = False
+                        email_queued = False
                         pdf_generated = False
                         
                         if communication_mode in ['send_only', 'send_and_download']:
-                            # Invia email
-                            try:
-                                from .email_utils import send_trattamento_communication
-                                risultato = send_trattamento_communication(trattamento.id)
-                                
-                                if risultato['success']:
-                                    email_sent = True
-                                    comunicazioni_inviate += 1
-                                else:
-                                    errori.append(f'Trattamento #{trattamento.id}: {risultato["error"]}')
-                                    continue
-                            except ImportError:
-                                # Se email_utils non è disponibile, segna come inviato ma aggiungi warning
-                                email_sent = True
-                                errori.append(f'Trattamento #{trattamento.id}: comunicato ma email non inviata (modulo email non disponibile)')
+                            # Esito dell'invio email in blocco
+                            risultato = risultati_invio.get(trattamento.id)
+                            
+                            if risultato and risultato['success']:
+                                # In coda: lo stato passa a 'comunicato' quando il dispatcher invia
+                                email_queued = bool(risultato.get('queued'))
+                                email_sent = not email_queued
+                                comunicazioni_inviate += 1
+                            else:
+                                errore = risultato['error'] if risultato else 'email non inviata'
+                                errori.append(f'Trattamento #{trattamento.id}: {errore}')
+                                continue
                         
                         if communication_mode in ['download_only', 'send_and_download']:
                             # Genera PDF per download
@@ -1109,11 +1153,14 @@ def api_bulk_action_trattamenti(request):
                                 errori.append(f'Trattamento #{trattamento.id}: errore generazione PDF - {str(e)}')
                                 continue
                         
-                        # Aggiorna stato solo se almeno una operazione è riuscita
-                        if email_sent or (communication_mode == 'download_only' and pdf_generated):
+                        # L'invio riuscito ha già aggiornato lo stato (record_trattamento_communication),
+                        # l'accodamento lo aggiorna alla spedizione: qui resta solo il download
+                        if communication_mode == 'download_only' and pdf_generated:
                             trattamento.stato = 'comunicato'
                             trattamento.data_comunicazione = timezone.now()
-                            trattamento.save()
+                            trattamento.save(update_fields=['stato', 'data_comunicazione', 'aggiornato_il'])
+                            successi += 1
+                        elif email_sent or email_queued:
                             successi += 1
                     
                     elif action == 'completa':
@@ -1152,7 +1199,10 @@ def api_bulk_action_trattamenti(request):
                 message = f'{successi} trattament{("o" if successi == 1 else "i")} comunicat{("o" if successi == 1 else "i")} via email + PDF scaricati'
             
             if comunicazioni_inviate > 0:
-                message += f' ({comunicazioni_inviate} email inviate)'
+                if outbox_enabled():
+                    message += f' ({comunicazioni_inviate} email in coda di invio)'
+                else:
+                    message += f' ({comunicazioni_inviate} email inviate)'
                 
         elif action == 'completa':
             message = f'{successi} trattament{("o" if successi == 1 else "i")} completat{("o" if successi == 1 else "i")} con successo'
@@ -1776,6 +1826,7 @@ def edit_terreno(request, terreno_id):
     
 
 @require_http_methods(["GET"])
+@read_replica
 def api_search_aziende(request):
     """API per ricerca aziende in tempo reale"""
 
@@ -1822,6 +1873,7 @@ def api_search_aziende(request):
         }, status=500)
 
 @require_http_methods(["GET"])
+@read_replica
 def api_search_cascine(request, cliente_id):
     """API per ricerca cascine di un'azienda"""
 
@@ -0,0 +1,97 @@
+# domenico/warmup.py
+# Riscaldamento di un worker appena avviato (vedi gunicorn.conf.py): la prima richiesta
+# non paga più il caricamento del motore PDF, dei template e degli URL
+
+import logging
+import os
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# HTML minimo ma con CSS e testo: forza il caricamento di fontconfig e delle font
+_PDF_WARMUP_HTML = """
+<html><head><style>
+@page { size: A4; margin: 1cm; }
+body { font-family: Arial, sans-serif; font-size: 10pt; }
+</style></head>
+<body><h1>Warmup</h1><table><tr><td>Trattamento</td><td>1,00 L/ha</td></tr></table></body></html>
+"""
+
+
+def warm_pdf_engine():
+    """Esegue un render PDF di prova; restituisce False se nessun motore PDF è disponibile"""
+    from . import pdf_engine
+    if not pdf_engine.is_available():
+        return False
+
+    pdf_engine.html_to_pdf(_PDF_WARMUP_HTML)
+    return True
+
+
+def warm_templates():
+    """Compila i template delle app del progetto (escluse le librerie installate)"""
+    from django.template import engines
+    from django.template.loader import get_template
+
+    base_dir = str(settings.BASE_DIR)
+    caricati = 0
+    for engine in engines.all():
+        for template_dir in engine.template_dirs:
+            template_dir = str(template_dir)
+            if not template_dir.startswith(base_dir):
+                continue
+            for root, _dirs, files in os.walk(template_dir):
+                for filename in files:
+                    if not filename.endswith('.html'):
+                        continue
+                    nome = os.path.relpath(os.path.join(root, filename), template_dir)
+                    try:
+                        get_template(nome.replace(os.sep, '/'))
+                        caricati += 1
+                    except Exception as e:
+                        logger.debug(f"Template {nome} non compilato: {e}")
+    return caricati
+
+
+def warm_urls():
+    """Popola il resolver degli URL (regex compilate e dizionario di reverse)"""
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    return len(resolver.reverse_dict)
+
+
+def warm_reference_data():
+    from .reference_data import warm_reference_cache
+    return warm_reference_cache()
+
+
+STEPS = [
+    ('pdf', warm_pdf_engine),
+    ('templates', warm_templates),
+    ('urls', warm_urls),
+    ('reference_data', warm_reference_data),
+]
+
+
+def warmup(steps=None):
+    """
+    Esegue i passi di riscaldamento; un errore in un passo non blocca gli altri.
+
+    Returns:
+        dict nome_passo -> {'success', 'result' o 'error', 'duration'}
+    """
+    risultati = {}
+    for nome, funzione in STEPS:
+        if steps and nome not in steps:
+            continue
+        started = time.perf_counter()
+        try:
+            risultati[nome] = {'success': True, 'result': funzione()}
+        except Exception as e:
+            logger.warning(f"Warmup '{nome}' fallito: {e}")
+            risultati[nome] = {'success': False, 'error': str(e)}
+        risultati[nome]['duration'] = time.perf_counter() - started
+    return risultati
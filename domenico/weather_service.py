@@ -1,10 +1,12 @@
-import requests
 import json
+import time
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.core.cache import cache
 import logging
 
+from .metrics import WEATHER_API_SECONDS, WEATHER_CACHE_REQUESTS
+
 logger = logging.getLogger(__name__)
 
 class WeatherService:
@@ -12,11 +14,18 @@ class WeatherService:
     
     def __init__(self):
         # Configurazione - AGGIUNGI QUESTE IMPOSTAZIONI AL TUO settings.py
-        self.api_key = getattr(settings, 'WEATHER_API_KEY', '')
-        self.base_url = 'https://api.weatherapi.com/v1'
         self.default_location = getattr(settings, 'WEATHER_LOCATION', 'Alba, Piemonte, Italy')
         self.cache_timeout = 600  # 10 minuti
         self.timeout = 10  # 10 secondi timeout
+
+    # Lette a ogni chiamata: il servizio è un'istanza globale (vedi views.py)
+    @property
+    def api_key(self):
+        return getattr(settings, 'WEATHER_API_KEY', '')
+
+    @property
+    def base_url(self):
+        return getattr(settings, 'WEATHER_API_URL', 'https://api.weatherapi.com/v1')
         
     
     def get_current_weather(self, location=None):
@@ -32,6 +41,7 @@ class WeatherService:
         # Controlla cache
         cached_data = cache.get(cache_key)
         if cached_data:
+            WEATHER_CACHE_REQUESTS.labels('hit').inc()
             logger.info(f"📦 Weather data served from cache for {location}")
             # Aggiungi flag per indicare che viene dalla cache
             cached_data['from_cache'] = True
@@ -39,6 +49,7 @@ class WeatherService:
             return cached_data
             
         # Se non in cache, chiama API
+        WEATHER_CACHE_REQUESTS.labels('miss').inc()
         try:
             logger.info(f"🌐 Calling WeatherAPI for fresh data: {location}")
             data = self._fetch_current_weather(location)
@@ -60,6 +71,7 @@ class WeatherService:
             # Prova a restituire cache scaduta come fallback
             cached_data = cache.get(cache_key + '_backup')
             if cached_data:
+                WEATHER_CACHE_REQUESTS.labels('stale').inc()
                 logger.warning(f"Serving stale weather data for {location}")
                 cached_data['is_stale'] = True
                 cached_data['from_cache'] = True
@@ -107,6 +119,7 @@ class WeatherService:
         
         logger.info(f"Fetching weather data for {location}")
         
+        import requests
         response = requests.get(url, params=params, timeout=self.timeout)
         
         if response.status_code == 401:
@@ -215,7 +228,14 @@ class WeatherService:
         logger.info(f"🔗 URL chiamata: {url}")
         logger.info(f"📋 Parametri: {params}")
         
-        response = requests.get(url, params=params, timeout=self.timeout)
+        import requests
+        started = time.perf_counter()
+        try:
+            response = requests.get(url, params=params, timeout=self.timeout)
+        except Exception:
+            WEATHER_API_SECONDS.labels('error').observe(time.perf_counter() - started)
+            raise
+        WEATHER_API_SECONDS.labels('ok' if response.status_code == 200 else 'error').observe(time.perf_counter() - started)
         
         if response.status_code == 401:
             raise ValueError("API Key WeatherAPI non valida")
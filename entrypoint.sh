@@ -8,9 +8,7 @@ until pg_isready -h db -p 5432 -U gestionale_user; do
 done
 echo "PostgreSQL is up - executing command"
 
-# Resto dello script...
-python manage.py migrate --noinput
-python manage.py collectstatic --noinput
-python manage.py populate_from_csv
+# Migrazioni, collectstatic e import CSV solo se ci sono modifiche (vedi domenico/management/commands/startup.py)
+python manage.py startup
 
 exec "$@"
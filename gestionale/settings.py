@@ -12,14 +12,13 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
 
 # Load environment variables
 try:
     from dotenv import load_dotenv
     load_dotenv()
 except ImportError:
-    pass  # dotenv not required if using decouple
+    pass  # dotenv not required if variables come from the environment
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,10 +30,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ.get('SECRET_KEY', 'fallback-key')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = bool(os.environ.get('DEBUG', 1))
+DEBUG = os.environ.get('DEBUG', '1').lower() in ('1', 'true', 'yes')
 
 ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(' ')
-print(ALLOWED_HOSTS)
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -74,12 +73,16 @@ if DEBUG:
     INSTALLED_APPS += ['debug_toolbar']
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.middleware.RequestIdMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'domenico.db_routing.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'domenico.profiling.ProfilingMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django_otp.middleware.OTPMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -126,6 +129,44 @@ DATABASES = {
     }
 }
 
+# Connessioni persistenti: senza, ogni richiesta paga connessione TCP e autenticazione.
+# Il health check scarta all'inizio della richiesta le connessioni chiuse dal server.
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# DB_POOL=1 (solo PostgreSQL con psycopg 3): pool di connessioni per processo al posto delle
+# connessioni persistenti. Ogni thread di gunicorn usa al massimo una connessione, quindi il
+# default di max_size è GUNICORN_THREADS; il totale verso Postgres è workers × max_size.
+DB_POOL = os.environ.get('DB_POOL', '0') == '1' and 'postgresql' in DATABASES['default']['ENGINE']
+if DB_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # richiesto da Django con il pool
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE') or os.environ.get('GUNICORN_THREADS') or 4),
+            # Secondi di attesa di una connessione libera prima dell'errore
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 600)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+        },
+    }
+
+# Replica in streaming per le letture delle view marcate con @read_replica
+# (domenico.db_routing); senza DB_REPLICA_HOST tutto resta sul database di default
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST', '')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['domenico.db_routing.ReplicaRouter']
+REPLICA_READS = bool(DB_REPLICA_HOST)
+# Secondi in cui una sessione legge dal primario dopo una scrittura (ritardo massimo della replica)
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -162,6 +203,17 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# collectstatic scrive nomi con hash del contenuto, copie .gz/.br e il service worker
+# con la lista dei file da precaricare (vedi domenico/static_storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'domenico.static_storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -171,34 +223,78 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Configurazione email per sviluppo (usa console backend)
 if DEBUG:
-    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+    EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 else:
     # Configurazione email per produzione
-    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-    EMAIL_HOST = 'smtp.gmail.com'
-    EMAIL_PORT = 587
-    EMAIL_USE_TLS = True
+    EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+    EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
+    EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
+    EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '1') == '1'
+    EMAIL_TIMEOUT = int(os.environ.get('EMAIL_TIMEOUT', 30))
     
-    # Usa variabili d'ambiente per produzione
-    try:
-        from decouple import config
-        EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
-        EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
-    except ImportError:
-        # Fallback se decouple non è disponibile
-        EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
-        EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+    # Usa variabili d'ambiente per produzione (il file .env è già caricato da dotenv)
+    EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+    EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 
 # Email predefinita per l'invio
 DEFAULT_FROM_EMAIL = 'Domenico Franco <domenico.franco@example.com>'
 SERVER_EMAIL = DEFAULT_FROM_EMAIL
 
+# Invio in blocco: messaggi per connessione SMTP, limite messaggi/secondo (0 = nessun limite)
+# e tentativi di riconnessione per messaggio
+EMAIL_DISPATCH_BATCH_SIZE = int(os.environ.get('EMAIL_DISPATCH_BATCH_SIZE', 50))
+EMAIL_DISPATCH_RATE_LIMIT = float(os.environ.get('EMAIL_DISPATCH_RATE_LIMIT', 0))
+EMAIL_DISPATCH_MAX_RETRIES = int(os.environ.get('EMAIL_DISPATCH_MAX_RETRIES', 2))
+
+# Outbox: se attivo le request accodano le comunicazioni e le invia `manage.py dispatch_outbox`.
+# Backoff esponenziale tra i tentativi: BASE * 2^(tentativo-1) secondi, fino a MAX
+EMAIL_OUTBOX_ENABLED = os.environ.get('EMAIL_OUTBOX_ENABLED', '0') == '1'
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_BACKOFF_BASE = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_BASE', 60))
+EMAIL_OUTBOX_BACKOFF_MAX = int(os.environ.get('EMAIL_OUTBOX_BACKOFF_MAX', 3600))
+EMAIL_OUTBOX_CLAIM_TIMEOUT = int(os.environ.get('EMAIL_OUTBOX_CLAIM_TIMEOUT', 600))
+
+# Digest (richiede l'outbox): le comunicazioni accodate nella stessa finestra (secondi)
+# partono come un'unica email con un PDF riepilogativo, raggruppate per insieme di
+# destinatari ('destinatari') o per contoterzista della cascina ('contoterzista')
+EMAIL_DIGEST_ENABLED = os.environ.get('EMAIL_DIGEST_ENABLED', '0') == '1'
+EMAIL_DIGEST_WINDOW = int(os.environ.get('EMAIL_DIGEST_WINDOW', 3600))
+EMAIL_DIGEST_GROUP_BY = os.environ.get('EMAIL_DIGEST_GROUP_BY', 'destinatari')
+
+# ============ RETENTION LOG ATTIVITÀ ============
+# Eliminazione a blocchi dei log scaduti (righe per transazione, pausa in secondi tra i blocchi).
+# Su PostgreSQL i mesi interamente scaduti si eliminano con DROP della partizione
+# (vedi `manage.py manage_activity_partitions`).
+ACTIVITY_LOG_DELETE_BATCH_SIZE = int(os.environ.get('ACTIVITY_LOG_DELETE_BATCH_SIZE', 1000))
+ACTIVITY_LOG_DELETE_PAUSE = float(os.environ.get('ACTIVITY_LOG_DELETE_PAUSE', 0))
+
+# Secondi di validità della cache dei dati di riferimento (prodotti, contoterzisti).
+# Le modifiche svuotano subito la cache del processo corrente; con la cache locmem
+# gli altri worker gunicorn le vedono al più dopo questo intervallo.
+REFERENCE_CACHE_TIMEOUT = int(os.environ.get('REFERENCE_CACHE_TIMEOUT', 60))
+
 # ============ CONFIGURAZIONE MEDIA FILES ============
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # ============ CONFIGURAZIONE LOGGING ============
+# Log strutturati (core/structured_logging.py): JSON con request id, scritti da un thread
+# dedicato (QueueHandler/QueueListener) così le richieste non attendono mai il disco.
+LOGGING_CONFIG = 'core.structured_logging.configure_logging'
+LOG_ASYNC = os.environ.get('LOG_ASYNC', '1') == '1'
+# Oltre questo numero di record in coda i nuovi vengono scartati invece di bloccare
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# Formato della console: 'json' o 'verbose' (testo)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'verbose' if DEBUG else 'json')
+# Frazione dei record DEBUG conservati (eventi ad alto volume, es. attività registrate)
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+# File JSON delle comunicazioni, scritto da tutti i processi (worker gunicorn, dispatcher):
+# nessuna rotazione interna, che con più processi perderebbe o mescolerebbe righe. Lo ruota
+# logrotate (WatchedFileHandler riapre il file spostato); vuoto = solo console/stdout.
+LOG_FILE = os.environ.get('LOG_FILE', os.path.join(BASE_DIR, 'logs', 'email_comunicazioni.log'))
+LOG_FILE_HANDLERS = ['file', 'console'] if LOG_FILE else ['console']
 
 LOGGING = {
     'version': 1,
@@ -208,23 +304,65 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.structured_logging.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sample_debug': {
+            '()': 'core.structured_logging.DebugSamplingFilter',
+            'rate': LOG_DEBUG_SAMPLE_RATE,
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'logs', 'email_comunicazioni.log'),
-            'formatter': 'verbose',
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': LOG_FILE,
+            'delay': True,
+            'encoding': 'utf-8',
+            'formatter': 'json',
+            'filters': ['sample_debug'],
         },
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+            'formatter': LOG_FORMAT,
+            'filters': ['sample_debug'],
         },
     },
+    'root': {
+        'handlers': ['console'],
+        'level': 'WARNING',
+    },
     'loggers': {
+        'domenico': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'core': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'tickets': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
         'domenico.email_utils': {
-            'handlers': ['file', 'console'],
+            'handlers': LOG_FILE_HANDLERS,
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'domenico.mail_dispatch': {
+            'handlers': LOG_FILE_HANDLERS,
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'domenico.outbox': {
+            'handlers': LOG_FILE_HANDLERS,
             'level': 'INFO',
             'propagate': False,
         },
@@ -236,9 +374,14 @@ LOGGING = {
     },
 }
 
+if not LOG_FILE:
+    del LOGGING['handlers']['file']
+
 # ============== CONFIGURAZIONE API METEO ======================
 
 WEATHER_API_KEY = os.getenv("API_KEY_WEATHER") 
+# Sostituibile con un server finto nelle prove di carico (vedi load_test)
+WEATHER_API_URL = os.environ.get('WEATHER_API_URL', 'https://api.weatherapi.com/v1')
 WEATHER_LOCATION = 'Alba, Piemonte, Italy'  # Località predefinita
 
 # Cache configuration (se non già presente)
@@ -275,9 +418,10 @@ SIMPLE_JWT = {
 
 # ============ DJANGO ALLAUTH ============
 AUTHENTICATION_BACKENDS = [
-    'axes.backends.AxesBackend',
-    'django.contrib.auth.backends.ModelBackend',
-    'allauth.account.auth_backends.AuthenticationBackend',
+    # Standalone: only the lockout check, permissions are resolved by the next backend
+    'axes.backends.AxesStandaloneBackend',
+    'permissions.backends.RolePermissionBackend',
+    'permissions.backends.EmailAuthenticationBackend',
 ]
 
 ACCOUNT_LOGIN_METHODS = {'email'}
@@ -294,10 +438,10 @@ AXES_LOCKOUT_TEMPLATE = 'authentication/lockout.html'
 
 # ============ CORS SETTINGS ============
 CORS_ALLOW_ALL_ORIGINS = DEBUG
-CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='http://localhost:3000', cast=lambda v: [s.strip() for s in v.split(',')])
+CORS_ALLOWED_ORIGINS = [s.strip() for s in os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:3000').split(',')]
 
 # ============ REDIS SETTINGS ============
-REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
 # ============ CELERY SETTINGS ============
 CELERY_BROKER_URL = REDIS_URL
@@ -308,18 +452,86 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
 # ============ CACHE SETTINGS ============
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'gestionale-cache',
+# Con più worker gunicorn serve una cache condivisa (contatori dei login falliti,
+# dati di riferimento): CACHE_URL=redis://redis:6379/1. Senza, cache locale per processo.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL.startswith('redis://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
     }
-}
+    # Lockout di axes sulla cache condivisa invece di una riga AccessAttempt per tentativo
+    AXES_HANDLER = 'axes.handlers.cache.AxesCacheHandler'
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'gestionale-cache',
+        }
+    }
+
+# ============ LOGIN SECURITY ============
+# Login falliti contati nella cache con una finestra scorrevole (vedi core.utils.SecurityUtils)
+LOGIN_FAILURE_WINDOW = int(os.environ.get('LOGIN_FAILURE_WINDOW', 3600))
+LOGIN_MAX_FAILURES_PER_EMAIL = int(os.environ.get('LOGIN_MAX_FAILURES_PER_EMAIL', 10))
+LOGIN_MAX_FAILURES_PER_IP = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 50))
+
+# LoginAttempt e UserSession scritti in batch da un thread in background (core.audit).
+# I test che leggono queste righe lo disattivano con override_settings: il thread non
+# vedrebbe la transazione del test.
+AUTH_AUDIT_ASYNC = os.environ.get('AUTH_AUDIT_ASYNC', '1') == '1'
+AUTH_AUDIT_BATCH_SIZE = int(os.environ.get('AUTH_AUDIT_BATCH_SIZE', 100))
+AUTH_AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUTH_AUDIT_FLUSH_INTERVAL', 2.0))
+
+# ============ PERMISSION CACHE ============
+# Permessi effettivi (gruppi, ruoli attivi, flag del profilo) risolti una volta per utente
+# e tenuti in cache; invalidati dai segnali di permissions.signals e alla scadenza dei ruoli
+PERMISSION_CACHE_TIMEOUT = int(os.environ.get('PERMISSION_CACHE_TIMEOUT', 300))
+
+# ============ SINCRONIZZAZIONE OFFLINE ============
+# Watermark arretrato di questi secondi: le transazioni in corso durante una sincronizzazione
+# vengono riconsegnate alla successiva (domenico/sync.py)
+SYNC_WATERMARK_LAG = int(os.environ.get('SYNC_WATERMARK_LAG', 30))
+# Oltre questa età le eliminazioni vengono dimenticate e il client riceve l'intero dataset
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+# ============ METRICHE PROMETHEUS ============
+# /metrics in formato Prometheus (core/metrics.py, domenico/metrics.py). Con gunicorn i
+# worker condividono i valori tramite PROMETHEUS_MULTIPROC_DIR, impostata da gunicorn.conf.py.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+# Token per lo scraper (Authorization: Bearer ...); senza token /metrics risponde solo
+# allo staff
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# ============ PROFILAZIONE SU RICHIESTA ============
+# Lo staff aggiunge ?_profile=1 (campionamento, flame graph) o ?_profile=cprofile, oppure
+# l'header X-Profile, a qualunque richiesta; catture consultabili su /profilazioni/
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1') == '1'
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+# Le catture più vecchie vengono eliminate oltre questo numero
+PROFILING_MAX_CAPTURES = int(os.environ.get('PROFILING_MAX_CAPTURES', 50))
+PROFILING_SAMPLE_INTERVAL = float(os.environ.get('PROFILING_SAMPLE_INTERVAL', 0.001))
+
+# ============ TICKET NOTIFICATIONS ============
+# Notifiche Telegram dei nuovi ticket, inviate in background (tickets.notifications).
+# 'local' tiene i messaggi in memoria, nessuna chiamata esterna (test e sviluppo).
+TICKET_NOTIFICATION_TRANSPORT = os.environ.get('TICKET_NOTIFICATION_TRANSPORT', 'telegram')
+TELEGRAM_BOT_TOKEN = os.environ.get('BOT_TOKEN', '')
+TELEGRAM_CHAT_ID = os.environ.get('CHAT_ID', '')
+TELEGRAM_TIMEOUT = float(os.environ.get('TELEGRAM_TIMEOUT', 5.0))
+# Ticket arrivati entro questa finestra vengono uniti in un solo messaggio
+TICKET_NOTIFICATION_BATCH_WINDOW = float(os.environ.get('TICKET_NOTIFICATION_BATCH_WINDOW', 2.0))
+TICKET_NOTIFICATION_RETRIES = int(os.environ.get('TICKET_NOTIFICATION_RETRIES', 3))
 
 # ============ SESSION SETTINGS ============
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
 # ============ SECURITY SETTINGS ============
 SECURE_SSL_REDIRECT = not DEBUG
+# Prometheus fa lo scrape in HTTP direttamente sul server applicativo
+SECURE_REDIRECT_EXEMPT = [r'^metrics$']
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = 'DENY'
@@ -19,9 +19,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('auth/', include('authentication.urls')),
     path('api/auth/', include('authentication.api_urls')),
     path('accounts/', include('allauth.urls')),  # Enable registration/signup
@@ -0,0 +1,120 @@
+# gunicorn.conf.py
+# Profilo di produzione di gunicorn: `gunicorn -c gunicorn.conf.py`
+# Tutti i valori si possono sovrascrivere con variabili d'ambiente GUNICORN_*
+
+import glob
+import multiprocessing
+import os
+import shutil
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+# ============ APPLICAZIONE ============
+wsgi_app = 'gestionale.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# L'app viene caricata una volta nel master e condivisa con i worker (copy-on-write):
+# avvio più rapido e meno memoria per worker
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# ============ WORKER ============
+# gthread: un render WeasyPrint lento occupa un thread, non l'intero worker
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = _env_int('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+threads = _env_int('GUNICORN_THREADS', 4)
+
+# Riciclo periodico dei worker (limita la crescita di memoria di WeasyPrint);
+# il jitter evita che tutti i worker ripartano insieme
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+# I PDF delle comunicazioni aziendali possono richiedere decine di secondi
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# Heartbeat dei worker su tmpfs (nei container /tmp può essere su overlayfs, lento)
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# ============ METRICHE ============
+# I worker scrivono le metriche Prometheus su file mmap in questa cartella e /metrics le
+# aggrega tutte; va impostata prima che prometheus_client venga importato dall'app.
+# Senza PROMETHEUS_MULTIPROC_DIR ogni master usa una cartella sua, rimossa all'uscita
+_METRICS_DIR_OWNED = 'PROMETHEUS_MULTIPROC_DIR' not in os.environ
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp', f'gestionale-metrics-{os.getpid()}')
+)
+# Qui e non in on_starting: con preload_app l'app (e prometheus_client) è già caricata prima.
+# Le metriche di un'esecuzione precedente vengono scartate, i contatori ripartono da zero
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+for _path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, '*.db')):
+    os.remove(_path)
+
+# ============ LOGGING ============
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+# ============ HOOK ============
+WARMUP_ENABLED = os.environ.get('GUNICORN_WARMUP', '1') == '1'
+
+
+def _warmup(log, worker):
+    from django.db import connections
+    from domenico.warmup import warmup
+
+    risultati = warmup()
+    connections.close_all()
+
+    dettagli = ', '.join(
+        f"{nome} {r['duration'] * 1000:.0f}ms" + ('' if r['success'] else ' (errore)')
+        for nome, r in risultati.items()
+    )
+    log.info(f"Worker {worker.pid} pronto: {dettagli}")
+
+
+def child_exit(server, worker):
+    """Rimuove i gauge del worker terminato dalla somma dei processi vivi"""
+    from core.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _METRICS_DIR_OWNED:
+        shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    """Chiude nel master le connessioni (e i pool) al database aperti durante il preload"""
+    if preload_app:
+        from django.db import connections
+        from domenico.db_connections import close_pools
+        connections.close_all()
+        # I thread di un pool non sopravvivono al fork e i socket sarebbero condivisi
+        close_pools()
+
+
+def post_fork(server, worker):
+    """Riscalda il worker prima che accetti richieste (app già caricata dal master)"""
+    if preload_app and WARMUP_ENABLED:
+        _warmup(server.log, worker)
+
+
+def post_worker_init(worker):
+    """Senza preload l'app è caricata solo qui, dentro il worker"""
+    if not preload_app and WARMUP_ENABLED:
+        _warmup(worker.log, worker)
+
+
+def worker_exit(server, worker):
+    """Scrive i log di sicurezza e invia le notifiche ancora in coda prima che il worker termini"""
+    from core.audit import audit_writer
+    from tickets.notifications import drain_ticket_channel
+    audit_writer.flush()
+    drain_ticket_channel()
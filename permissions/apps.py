@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+class PermissionsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'permissions'
+    verbose_name = 'Permissions'
+    
+    def ready(self):
+        # Registers the permission cache invalidation receivers
+        import permissions.signals  # noqa: F401
@@ -0,0 +1,34 @@
+from django.contrib.auth.backends import ModelBackend
+from allauth.account.auth_backends import AuthenticationBackend
+
+from .resolver import get_effective_permissions
+
+
+class RolePermissionBackend(ModelBackend):
+    """
+    ModelBackend whose permission checks use the cached effective permission set
+    (user and group permissions, active roles and profile flags).
+
+    Authentication is unchanged; object-level permissions are not supported.
+    """
+    
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        return get_effective_permissions(user_obj)
+
+
+class EmailAuthenticationBackend(AuthenticationBackend):
+    """
+    allauth backend used for authentication only: as a ModelBackend subclass it would
+    answer every denied permission check with its own queries.
+    """
+    
+    def get_user_permissions(self, user_obj, obj=None):
+        return set()
+    
+    def get_group_permissions(self, user_obj, obj=None):
+        return set()
+    
+    def get_all_permissions(self, user_obj, obj=None):
+        return set()
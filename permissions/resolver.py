@@ -0,0 +1,146 @@
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import UserRole
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'perms:user:{}'
+# Attribute used to memoize the resolved set on the user instance for the rest of the request
+INSTANCE_CACHE_ATTR = '_effective_perm_cache'
+
+# Boolean flags of domenico.UserProfile, exposed as "domenico.<flag>" permissions
+PROFILE_FLAGS = (
+    'can_manage_users',
+    'can_export_data',
+    'can_manage_clients',
+    'can_manage_treatments',
+    'can_view_reports',
+)
+
+
+def _cache_key(user_id):
+    return CACHE_KEY.format(user_id)
+
+
+def _model_permissions(user):
+    """Direct and group permissions, resolved the same way as ModelBackend"""
+    backend = ModelBackend()
+    return backend.get_user_permissions(user) | backend.get_group_permissions(user)
+
+
+def _role_permissions(user, now):
+    """
+    Permissions granted by active, non-expired roles.
+
+    Returns:
+        (set of "app_label.codename", earliest future expiry or None)
+    """
+    rows = (
+        UserRole.objects
+        .filter(user_id=user.pk, is_active=True, role__is_active=True)
+        .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        .values_list('role__permissions__content_type__app_label', 'role__permissions__codename', 'expires_at')
+    )
+
+    perms = set()
+    next_expiry = None
+    for app_label, codename, expires_at in rows:
+        if codename:
+            perms.add(f'{app_label}.{codename}')
+        if expires_at and (next_expiry is None or expires_at < next_expiry):
+            next_expiry = expires_at
+    return perms, next_expiry
+
+
+def _profile_permissions(user):
+    """can_* flags of the domenico profile; the admin role implies all of them"""
+    try:
+        profile_model = apps.get_model('domenico', 'UserProfile')
+    except LookupError:
+        return set()
+
+    profile = profile_model.objects.filter(user_id=user.pk).values('role', 'is_active_custom', *PROFILE_FLAGS).first()
+    if not profile or not profile['is_active_custom']:
+        return set()
+    if profile['role'] == 'admin':
+        return {f'domenico.{flag}' for flag in PROFILE_FLAGS}
+    return {f'domenico.{flag}' for flag in PROFILE_FLAGS if profile[flag]}
+
+
+def compute_effective_permissions(user):
+    """
+    Resolve the full permission set of a user from the database.
+
+    Returns:
+        (frozenset of "app_label.codename", cache timeout in seconds)
+    """
+    timeout = getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 300)
+    if not user.is_active:
+        return frozenset(), timeout
+
+    now = timezone.now()
+    role_perms, next_expiry = _role_permissions(user, now)
+    perms = _model_permissions(user) | role_perms | _profile_permissions(user)
+
+    if next_expiry is not None:
+        # The cached set must not outlive the first role that expires
+        timeout = max(1, min(timeout, int((next_expiry - now).total_seconds()) + 1))
+    return frozenset(perms), timeout
+
+
+def get_effective_permissions(user):
+    """
+    Effective permission set of a user: memoized on the instance, then the shared cache,
+    then resolved from the database.
+    """
+    if not user or not user.is_authenticated or not user.is_active:
+        return frozenset()
+
+    perms = getattr(user, INSTANCE_CACHE_ATTR, None)
+    if perms is not None:
+        return perms
+
+    key = _cache_key(user.pk)
+    cached = cache.get(key)
+    if cached is not None:
+        perms = frozenset(cached)
+    else:
+        perms, timeout = compute_effective_permissions(user)
+        cache.set(key, tuple(perms), timeout)
+
+    setattr(user, INSTANCE_CACHE_ATTR, perms)
+    return perms
+
+
+def has_effective_perm(user, perm):
+    if user and user.is_active and user.is_superuser:
+        return True
+    return perm in get_effective_permissions(user)
+
+
+def has_effective_perms(user, perms):
+    if user and user.is_active and user.is_superuser:
+        return True
+    effective = get_effective_permissions(user)
+    return all(perm in effective for perm in perms)
+
+
+def invalidate_user(*user_ids):
+    """Drop the cached permission sets of the given users"""
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if user_ids:
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+        logger.debug(f'Permission cache invalidated for {len(user_ids)} user(s)')
+
+
+def invalidate_role(*role_ids):
+    """Drop the cached permission sets of every user holding one of the roles"""
+    user_ids = UserRole.objects.filter(role_id__in=role_ids).values_list('user_id', flat=True).distinct()
+    invalidate_user(*user_ids)
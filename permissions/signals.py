@@ -0,0 +1,70 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from users.models import User
+from .models import Role, UserRole
+from .resolver import invalidate_role, invalidate_user
+
+M2M_ACTIONS = ('post_add', 'post_remove', 'post_clear', 'pre_clear')
+
+
+@receiver([post_save, post_delete], sender=UserRole)
+def invalidate_user_role(sender, instance, **kwargs):
+    """Role assigned, revoked, expired or re-activated"""
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Role)
+def invalidate_role_change(sender, instance, created, **kwargs):
+    # Role deletion cascades to UserRole, whose post_delete handles it
+    if not created:
+        invalidate_role(instance.pk)
+
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def invalidate_role_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    if not reverse:
+        invalidate_role(instance.pk)
+    elif pk_set:
+        invalidate_role(*pk_set)
+    else:
+        invalidate_role(*instance.role_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    if not reverse:
+        invalidate_user(instance.pk)
+    elif pk_set:
+        invalidate_user(*pk_set)
+    else:
+        invalidate_user(*instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    group_ids = [instance.pk] if not reverse else (pk_set or instance.group_set.values_list('pk', flat=True))
+    invalidate_user(*User.objects.filter(groups__in=group_ids).values_list('pk', flat=True).distinct())
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_flags(sender, instance, created, update_fields, **kwargs):
+    """is_active / is_superuser changes"""
+    if created:
+        return
+    # e.g. update_last_login on every login
+    if update_fields and not {'is_active', 'is_superuser'} & set(update_fields):
+        return
+    invalidate_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender='domenico.UserProfile')
+def invalidate_profile_flags(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
@@ -1,16 +1,24 @@
 // Service Worker per Gestionale Agricolo Agriolo
-const CACHE_NAME = 'agriolo-v1.0.0';
+// Servito da /sw.js; versione e lista STATIC_PRECACHE vengono scritte da collectstatic
+// (vedi domenico/static_storage.py) con gli URL dei file statici con hash
+const CACHE_NAME = 'agriolo-__STATIC_VERSION__';
 const OFFLINE_URL = '/offline/';
 
+// File statici del progetto con hash nel nome: immutabili
+const STATIC_PRECACHE = [
+  /* __STATIC_PRECACHE__ */
+];
+
 // Risorse da cachare per il funzionamento offline
 const CACHE_URLS = [
   '/',
-  '/static/manifest.json',
-  // CSS essenziali (Bootstrap sarà caricato dai template)
-  // JS essenziali
-  // Immagini essenziali (quando le aggiungeremo)
+  OFFLINE_URL,
+  ...STATIC_PRECACHE,
 ];
 
+// Nomi generati da ManifestStaticFilesStorage: nome.<12 caratteri hex>.estensione
+const HASHED_STATIC = /^\/static\/.+\.[0-9a-f]{12}\.\w+$/;
+
 // Installazione del service worker
 self.addEventListener('install', event => {
   console.log('[SW] Installing service worker...');
@@ -61,6 +69,22 @@ self.addEventListener('fetch', event => {
     return;
   }
 
+  // File statici con hash: Cache First, il contenuto di un URL non cambia mai
+  if (HASHED_STATIC.test(new URL(event.request.url).pathname)) {
+    event.respondWith(
+      caches.match(event.request).then(cached => {
+        return cached || fetch(event.request).then(response => {
+          if (response.status === 200) {
+            const responseClone = response.clone();
+            caches.open(CACHE_NAME).then(cache => cache.put(event.request, responseClone));
+          }
+          return response;
+        });
+      })
+    );
+    return;
+  }
+
   event.respondWith(
     fetch(event.request)
       .then(response => {
@@ -0,0 +1,306 @@
+# tickets/notifications.py
+# Notifiche dei ticket inviate da un thread in background: la richiesta che crea il ticket
+# paga solo l'INSERT, mai la latenza (o l'irraggiungibilità) di Telegram
+
+import html
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Limite di Telegram per il testo di un messaggio
+TELEGRAM_MAX_LENGTH = 4096
+BATCH_SEPARATOR = '\n\n— — —\n\n'
+
+
+class NotificationError(Exception):
+    """Invio fallito dal transport (errore di rete o risposta non valida)"""
+
+
+# ---------- Transport ----------
+
+class TelegramTransport:
+    """Invio tramite Bot API di Telegram (sendMessage)"""
+
+    def __init__(self, token, chat_id, timeout=5.0):
+        self.token = token
+        self.chat_id = chat_id
+        self.timeout = timeout
+
+    def send(self, text):
+        import requests
+
+        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        payload = {
+            'chat_id': self.chat_id,
+            'text': text,
+            'parse_mode': 'HTML',
+        }
+        try:
+            response = requests.post(url, data=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise NotificationError(str(e)) from e
+        if response.status_code != 200:
+            raise NotificationError(f"Telegram HTTP {response.status_code}: {response.text[:200]}")
+
+
+class LocalTransport:
+    """Transport in memoria per test e sviluppo: i messaggi restano in outbox"""
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, text):
+        self.outbox.append(text)
+
+
+# ---------- Circuit breaker ----------
+
+class CircuitBreaker:
+    """
+    Dopo `threshold` invii falliti consecutivi smette di provare per `cooldown` secondi,
+    poi lascia passare un tentativo: se riesce il circuito si richiude.
+    """
+
+    def __init__(self, threshold=5, cooldown=60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self):
+        return not self.is_open
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def escape_truncated(text, limit):
+    """html.escape di `text` tagliato prima dell'escape, in modo che il risultato stia in `limit` caratteri"""
+    escaped = html.escape(text)
+    if len(escaped) <= limit:
+        return escaped
+    parti, lunghezza = [], 0
+    for carattere in text:
+        parte = html.escape(carattere)
+        if lunghezza + len(parte) > limit - 1:
+            break
+        parti.append(parte)
+        lunghezza += len(parte)
+    return ''.join(parti) + '…'
+
+
+def _cut(text):
+    """Ultima difesa per un singolo messaggio troppo lungo: taglio prima di un tag o un'entità incompleti"""
+    if len(text) <= TELEGRAM_MAX_LENGTH:
+        return text
+    text = text[:TELEGRAM_MAX_LENGTH - 1]
+    for apertura, chiusura in (('&', ';'), ('<', '>')):
+        if text.rfind(apertura) > text.rfind(chiusura):
+            text = text[:text.rfind(apertura)]
+    return text + '…'
+
+
+# ---------- Canale ----------
+
+class NotificationChannel:
+    """
+    Coda di notifiche consumata da un thread in background.
+
+    I messaggi che arrivano entro `batch_window` secondi dal primo vengono uniti in un unico
+    invio (una raffica di feedback = un messaggio). Ogni invio ha `retries` tentativi con
+    backoff; con il circuito aperto i messaggi vengono scartati e registrati nel log
+    (i ticket restano comunque nel database).
+    """
+
+    def __init__(self, transport, batch_window=2.0, max_batch=20, retries=3, backoff=1.0,
+                 breaker=None, max_queue=1000):
+        self.transport = transport
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def notify(self, text):
+        """Accoda un messaggio; non blocca mai il chiamante"""
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            logger.warning(f"Coda notifiche piena, messaggio scartato: {text[:100]}")
+            return False
+        self._ensure_thread()
+        return True
+
+    def pending_count(self):
+        return self._queue.qsize()
+
+    def drain(self):
+        """Invia subito tutti i messaggi in coda nel thread chiamante (uscita del worker, test)"""
+        inviati = 0
+        while True:
+            batch = self._take_batch(wait=0)
+            if not batch:
+                return inviati
+            if self._deliver(batch):
+                inviati += len(batch)
+
+    # ---------- Interni ----------
+
+    def _take_batch(self, wait):
+        """Primo messaggio (attendendo al massimo `wait` secondi) più quelli arrivati nella finestra"""
+        try:
+            first = self._queue.get(timeout=wait) if wait else self._queue.get_nowait()
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + (self.batch_window if wait else 0)
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _format_batch(self, batch):
+        """
+        Testi da inviare per il batch: i messaggi interi vengono raggruppati finché stanno nel
+        limite di Telegram, senza mai tagliare un messaggio a metà (con parse_mode HTML un
+        taglio potrebbe spezzare un'entità o un tag).
+        """
+        if len(batch) == 1:
+            return [_cut(batch[0])]
+
+        gruppi = [[]]
+        for text in batch:
+            gruppo = gruppi[-1] + [text]
+            # Margine per l'intestazione del gruppo
+            if gruppi[-1] and len(BATCH_SEPARATOR.join(gruppo)) > TELEGRAM_MAX_LENGTH - 100:
+                gruppi.append([text])
+            else:
+                gruppi[-1] = gruppo
+
+        testi = []
+        for numero, gruppo in enumerate(gruppi, 1):
+            header = f"📬 {len(batch)} nuovi ticket"
+            if len(gruppi) > 1:
+                header += f" ({numero}/{len(gruppi)})"
+            testi.append(_cut(header + BATCH_SEPARATOR + BATCH_SEPARATOR.join(gruppo)))
+        return testi
+
+    def _deliver(self, batch):
+        with self._send_lock:
+            if not self.breaker.allow():
+                logger.warning(f"Circuito notifiche aperto, {len(batch)} messaggi scartati")
+                return False
+            return all([self._send(text) for text in self._format_batch(batch)])
+
+    def _send(self, text):
+        for tentativo in range(1, self.retries + 1):
+            try:
+                self.transport.send(text)
+                self.breaker.record_success()
+                return True
+            except Exception as e:
+                logger.warning(f"Invio notifica fallito (tentativo {tentativo}/{self.retries}): {e}")
+                if tentativo < self.retries:
+                    time.sleep(self.backoff * 2 ** (tentativo - 1))
+
+        self.breaker.record_failure()
+        logger.error(f"Notifica non inviata dopo {self.retries} tentativi: {text[:200]}")
+        return False
+
+    def _ensure_thread(self):
+        # Dopo un fork (gunicorn con preload) il thread del processo padre non esiste nel figlio
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='ticket-notifier', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._take_batch(wait=60)
+            if not batch:
+                continue
+            try:
+                self._deliver(batch)
+            except Exception as e:
+                logger.error(f"Errore del notificatore: {e}")
+
+
+# ---------- Canale dei ticket ----------
+
+_channel = None
+_channel_lock = threading.Lock()
+
+
+def build_transport():
+    """Transport configurato in TICKET_NOTIFICATION_TRANSPORT ('telegram' o 'local')"""
+    if getattr(settings, 'TICKET_NOTIFICATION_TRANSPORT', 'telegram') == 'local':
+        return LocalTransport()
+    return TelegramTransport(
+        token=settings.TELEGRAM_BOT_TOKEN,
+        chat_id=settings.TELEGRAM_CHAT_ID,
+        timeout=getattr(settings, 'TELEGRAM_TIMEOUT', 5.0),
+    )
+
+
+def get_ticket_channel():
+    global _channel
+    if _channel is None:
+        with _channel_lock:
+            if _channel is None:
+                _channel = NotificationChannel(
+                    build_transport(),
+                    batch_window=getattr(settings, 'TICKET_NOTIFICATION_BATCH_WINDOW', 2.0),
+                    retries=getattr(settings, 'TICKET_NOTIFICATION_RETRIES', 3),
+                )
+    return _channel
+
+
+def drain_ticket_channel():
+    """Invia le notifiche in coda, se il canale è stato creato (uscita del worker)"""
+    if _channel is not None:
+        return _channel.drain()
+    return 0
+
+
+def format_ticket(ticket):
+    # parse_mode HTML: il testo inserito dall'utente va sottoposto a escape
+    header = f"Ticket {html.escape(ticket.priority)}: {html.escape(ticket.ticket_type)}\n\n"
+    return header + escape_truncated(ticket.description or '', TELEGRAM_MAX_LENGTH - len(header))
+
+
+def notify_ticket(ticket):
+    """Notifica un nuovo ticket sul canale configurato (non bloccante)"""
+    transport = getattr(settings, 'TICKET_NOTIFICATION_TRANSPORT', 'telegram')
+    if transport == 'telegram' and not (settings.TELEGRAM_BOT_TOKEN and settings.TELEGRAM_CHAT_ID):
+        logger.debug("Notifiche Telegram non configurate (BOT_TOKEN/CHAT_ID)")
+        return False
+    return get_ticket_channel().notify(format_ticket(ticket))
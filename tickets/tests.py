@@ -1,3 +1,94 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from tickets import notifications
+from tickets.models import Ticket
+from tickets.notifications import CircuitBreaker, LocalTransport, NotificationChannel, NotificationError
+
+
+class FailingTransport:
+    def __init__(self):
+        self.calls = 0
+
+    def send(self, text):
+        self.calls += 1
+        raise NotificationError('unreachable')
+
+
+def make_channel(transport, **kwargs):
+    # Nessun thread in background: i messaggi restano in coda fino a drain()
+    channel = NotificationChannel(transport, backoff=0, **kwargs)
+    channel._ensure_thread = lambda: None
+    return channel
+
+
+class NotificationChannelTest(TestCase):
+
+    def test_burst_is_batched(self):
+        transport = LocalTransport()
+        channel = make_channel(transport)
+        for i in range(3):
+            channel.notify(f'ticket {i}')
+
+        self.assertEqual(channel.pending_count(), 3)
+        self.assertEqual(channel.drain(), 3)
+        self.assertEqual(len(transport.outbox), 1)
+        self.assertIn('3 nuovi ticket', transport.outbox[0])
+        self.assertIn('ticket 2', transport.outbox[0])
+
+    def test_long_burst_is_split_between_messages(self):
+        transport = LocalTransport()
+        channel = make_channel(transport)
+        messaggi = [f'ticket {i} ' + '&amp;' * 300 for i in range(5)]
+        for text in messaggi:
+            channel.notify(text)
+
+        self.assertEqual(channel.drain(), 5)
+        self.assertGreater(len(transport.outbox), 1)
+        self.assertTrue(all(len(text) <= notifications.TELEGRAM_MAX_LENGTH for text in transport.outbox))
+        # Nessun messaggio tagliato: ognuno arriva intero in uno degli invii
+        for text in messaggi:
+            self.assertEqual(sum(text in inviato for inviato in transport.outbox), 1)
+
+    def test_long_ticket_is_truncated_before_escaping(self):
+        ticket = Ticket(priority='high', ticket_type='bug', description='<' * 5000)
+        text = notifications.format_ticket(ticket)
+
+        self.assertLessEqual(len(text), notifications.TELEGRAM_MAX_LENGTH)
+        self.assertTrue(text.endswith('&lt;…'))
+
+    def test_retries_then_circuit_opens(self):
+        transport = FailingTransport()
+        channel = make_channel(transport, retries=2, breaker=CircuitBreaker(threshold=1, cooldown=60))
+
+        channel.notify('primo')
+        self.assertEqual(channel.drain(), 0)
+        self.assertEqual(transport.calls, 2)
+
+        # Circuito aperto: nessun altro tentativo verso il transport
+        channel.notify('secondo')
+        channel.drain()
+        self.assertEqual(transport.calls, 2)
+
+
+@override_settings(TICKET_NOTIFICATION_TRANSPORT='local')
+class SubmitFeedbackTest(TestCase):
+
+    def setUp(self):
+        notifications._channel = make_channel(LocalTransport())
+
+    def tearDown(self):
+        notifications._channel = None
+
+    def test_feedback_is_queued_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('tickets:submit_feedback'), {
+                'description': '<b>Il PDF</b> non si scarica',
+            })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Ticket.objects.count(), 1)
+
+        channel = notifications.get_ticket_channel()
+        channel.drain()
+        self.assertEqual(channel.transport.outbox, ['Ticket medium: other\n\n&lt;b&gt;Il PDF&lt;/b&gt; non si scarica'])
@@ -3,10 +3,11 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.shortcuts import render
 from .models import Ticket, TicketComment
+from .notifications import notify_ticket
 from .serializers import TicketSerializer, TicketCreateSerializer, TicketCommentSerializer
-import requests
 
 User = get_user_model()
 
@@ -73,27 +74,8 @@ def submit_feedback(request):
             ticket = serializer.save()
             response_serializer = TicketSerializer(ticket)
 
-            try:
-                from decouple import config
-                BOT_TOKEN = config('BOT_TOKEN', default='')
-                CHAT_ID = config('CHAT_ID', default='')
-            except ImportError:
-                import os
-
-                BOT_TOKEN = os.environ.get('BOT_TOKEN', '')
-                CHAT_ID = os.environ.get('CHAT_ID', '')
-                
-
-            output = f"Ticket {data.get('priority')}: {data.get('ticket_type')}\n\n{data.get('description')}"
-
-            url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-            payload = {
-                "chat_id": CHAT_ID,
-                "text": output,
-                "parse_mode": "HTML"
-            }
-
-            response = requests.post(url, data=payload)
+            # Inviata da un thread in background dopo il commit: Telegram non rallenta la risposta
+            transaction.on_commit(lambda: notify_ticket(ticket))
 
             return Response({
                 'success': True,
@@ -2,7 +2,6 @@ from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from core.models import TimeStampedModel, UUIDModel
-from cryptography.fernet import Fernet
 from django.conf import settings
 import os
 
@@ -95,6 +94,8 @@ class UserProfile(TimeStampedModel):
     
     def encrypt_sensitive_data(self, data):
         """Encrypt sensitive user data"""
+        from cryptography.fernet import Fernet
+
         if not hasattr(settings, 'ENCRYPTION_KEY'):
             settings.ENCRYPTION_KEY = Fernet.generate_key()
         
@@ -107,6 +108,7 @@ class UserProfile(TimeStampedModel):
         if not self.encrypted_data:
             return None
         
+        from cryptography.fernet import Fernet
         fernet = Fernet(settings.ENCRYPTION_KEY)
         return fernet.decrypt(self.encrypted_data).decode()
 
@@ -128,6 +130,7 @@ class LoginAttempt(TimeStampedModel):
     email = models.EmailField()
     ip_address = models.GenericIPAddressField()
     success = models.BooleanField()
+    blocked = models.BooleanField(default=False, help_text=_('Rejected by the failed login limits before authentication'))
     user_agent = models.TextField()
     
     class Meta:
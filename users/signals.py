@@ -1,6 +1,8 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in, user_login_failed
+from core.audit import audit_writer
+from core.utils import SecurityUtils
 from .models import User, UserProfile, UserSession, LoginAttempt
 
 @receiver(post_save, sender=User)
@@ -9,43 +11,37 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
+    return ip or '127.0.0.1'  # Fallback if no IP found
+
 @receiver(user_logged_in)
 def create_user_session(sender, request, user, **kwargs):
-    """Create session record on login"""
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        return ip or '127.0.0.1'  # Fallback if no IP found
-    
-    ip_address = get_client_ip(request)
+    """Create session record on login (written in batches by the audit writer)"""
     session_key = request.session.session_key or 'test-session'
     
-    UserSession.objects.create(
+    audit_writer.record(UserSession(
         user=user,
         session_key=session_key,
-        ip_address=ip_address,
+        ip_address=get_client_ip(request),
         user_agent=request.META.get('HTTP_USER_AGENT', '')
-    )
+    ))
 
 @receiver(user_login_failed)
 def log_failed_login(sender, credentials, request, **kwargs):
-    """Log failed login attempts"""
-    def get_client_ip(request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        return ip or '127.0.0.1'  # Fallback if no IP found
+    """Count the failure in the cache and log the attempt (written in batches)"""
+    email = credentials.get('username', '') or credentials.get('email', '')
+    ip_address = get_client_ip(request) if request is not None else None
+    SecurityUtils.record_login_failure(email, ip_address)
     
-    email = credentials.get('username', '')
-    if email:
-        LoginAttempt.objects.create(
+    if email and ip_address:
+        audit_writer.record(LoginAttempt(
             email=email,
-            ip_address=get_client_ip(request),
+            ip_address=ip_address,
             success=False,
             user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
\ No newline at end of file
+        ))